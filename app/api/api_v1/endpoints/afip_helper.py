@@ -1,15 +1,17 @@
-import tempfile
-from pathlib import Path
+import logging
 from datetime import datetime
 from typing import Optional, Any
 from app.services.afip.afip_client import create_invoice, get_last_voucher_number
+from app.services.afip.credentials import get_afip_credentials
 
-async def procesar_facturacion_afip(client: Any, negocio_id: str, venta_id: str, cliente_id: Optional[str], total: float, items: list, sucursal_id: Optional[str] = None):
+logger = logging.getLogger(__name__)
+
+
+def obtener_config_facturable(client: Any, negocio_id: str) -> Optional[dict]:
     """
-    Procesa la facturación ARCA para una venta.
-    Devuelve los datos de la factura si fue exitosa, o None.
+    Devuelve la configuración fiscal si el negocio puede facturar
+    (habilitada y con certificado + clave), o None.
     """
-    # Obtener config
     config_resp = client.table("configuracion_fiscal").select("*").eq("negocio_id", negocio_id).execute()
     if not config_resp.data:
         print("Facturación omitida: No hay config fiscal")
@@ -19,6 +21,72 @@ async def procesar_facturacion_afip(client: Any, negocio_id: str, venta_id: str,
     if not config.get("habilitada") or not config.get("cert_path") or not config.get("key_path"):
         print("Facturación omitida: Configuración no habilitada o faltan certificados")
         return None
+    return config
+
+
+def encolar_facturacion_afip(client: Any, negocio_id: str, venta_id: str, cliente_id: Optional[str], total: float, items: list, sucursal_id: Optional[str] = None) -> Optional[dict]:
+    """
+    Registra la factura en estado 'pendiente' y delega la emisión ARCA a la cola
+    `afip_invoicing` (ver app.workers.afip_worker). No espera al servicio SOAP.
+    Devuelve la fila pendiente (con su id) o None si el negocio no factura.
+    """
+    config = obtener_config_facturable(client, negocio_id)
+    if not config:
+        return None
+
+    pendiente = {
+        "negocio_id": negocio_id,
+        "venta_id": venta_id,
+        "punto_venta": config.get("punto_venta", 1),
+        "fecha": datetime.now().date().isoformat(),
+        "imp_total": round(total, 2),
+        "estado": "pendiente",
+    }
+    if sucursal_id:
+        pendiente["sucursal_id"] = sucursal_id
+    factura_resp = client.table("facturas").insert(pendiente).execute()
+    if not factura_resp.data:
+        raise Exception("No se pudo registrar la factura pendiente")
+    factura = factura_resp.data[0]
+
+    try:
+        from app.workers.afip_worker import emitir_factura_afip
+
+        emitir_factura_afip.delay(
+            factura["id"], negocio_id, venta_id, cliente_id, float(total), items, sucursal_id
+        )
+    except Exception as e:
+        logger.error("No se pudo encolar la factura %s: %s", factura["id"], e)
+        client.table("facturas").update({
+            "estado": "error",
+            "error_detalle": f"No se pudo encolar la facturación: {e}",
+        }).eq("id", factura["id"]).execute()
+        factura["estado"] = "error"
+    return factura
+
+
+def adjuntar_pdf_factura(client: Any, factura_data: dict, config: dict) -> Optional[str]:
+    """Genera el PDF de una factura emitida, lo sube y guarda su ruta en `facturas`."""
+    from app.services.pdf_factura import generar_y_subir_pdf_factura
+
+    pdf_path = generar_y_subir_pdf_factura(factura_data, {}, config)
+    if pdf_path:
+        client.table("facturas").update({"pdf_url": pdf_path}).eq("id", factura_data["id"]).execute()
+        factura_data["pdf_url"] = pdf_path
+    return pdf_path
+
+
+async def procesar_facturacion_afip(client: Any, negocio_id: str, venta_id: str, cliente_id: Optional[str], total: float, items: list, sucursal_id: Optional[str] = None, factura_id: Optional[str] = None, generar_pdf: bool = True):
+    """
+    Procesa la facturación ARCA para una venta.
+    Si se indica `factura_id` (factura pendiente encolada), actualiza esa fila
+    en lugar de insertar una nueva. Con `generar_pdf=False` el PDF queda a cargo
+    del llamador (ver adjuntar_pdf_factura).
+    Devuelve los datos de la factura si fue exitosa, o None.
+    """
+    config = obtener_config_facturable(client, negocio_id)
+    if not config:
+        return None
         
     # Extraer datos de cliente
     doc_tipo = 99 # Consumidor Final por defecto
@@ -66,112 +134,105 @@ async def procesar_facturacion_afip(client: Any, negocio_id: str, venta_id: str,
     cuit = config.get("cuit")
     pto_vta = config.get("punto_venta", 1)
     
-    with tempfile.TemporaryDirectory() as tmpdir:
-        cert_path = Path(tmpdir) / "cert.crt"
-        key_path = Path(tmpdir) / "key.key"
+    try:
+        # Certificado y clave en memoria (se descargan una vez por proceso y negocio)
+        credentials = get_afip_credentials(client, negocio_id, config)
+        cert_path = credentials.cert_pem
+        key_path = credentials.key_pem
         
-        try:
-            cert_bytes = client.storage.from_("certificados_afip").download(config.get("cert_path"))
-            with open(cert_path, "wb") as f: f.write(cert_bytes)
-                
-            key_bytes = client.storage.from_("certificados_afip").download(config.get("key_path"))
-            with open(key_path, "wb") as f: f.write(key_bytes)
-            
-            # Obtener ultimo comprobante
-            ult_cbte = await get_last_voucher_number(pto_vta, cbte_tipo, cert_path, key_path, wsaa_wsdl, wsfe_wsdl, cuit, "wsfe", client, negocio_id)
-            siguiente = ult_cbte + 1
-            
-            # Preparar invoice_data
-            imp_total = round(total, 2)
-            invoice_data = {
-                'punto_venta': pto_vta,
-                'tipo_comprobante': cbte_tipo,
-                'concepto': concepto,
-                'doc_tipo': doc_tipo,
-                'doc_nro': doc_nro,
-                'cbte_desde': siguiente,
-                'cbte_hasta': siguiente,
-                'cbte_fecha': datetime.now().strftime('%Y%m%d'),
-                'imp_total': imp_total,
-                'imp_neto': imp_total,
-                'imp_iva': 0.0,
-                'imp_tot_conc': 0.0,
-                'imp_op_ex': 0.0,
-                'imp_trib': 0.0
-            }
-            
-            if cbte_tipo in (1, 6): # Factura A o B (RI) requiere desglose de IVA (Asumimos 21%)
-                neto = round(imp_total / 1.21, 2)
-                iva = round(imp_total - neto, 2)
-                invoice_data['imp_neto'] = neto
-                invoice_data['imp_iva'] = iva
-                invoice_data['iva'] = [{
-                    'id': 5, # 21%
-                    'base_imp': neto,
-                    'importe': iva
-                }]
-                
-            if concepto in (2, 3):
-                invoice_data['fch_serv_desde'] = invoice_data['cbte_fecha']
-                invoice_data['fch_serv_hasta'] = invoice_data['cbte_fecha']
-                invoice_data['fch_vto_pago'] = invoice_data['cbte_fecha']
-                
-            # Llamar ARCA
-            res = await create_invoice(invoice_data, cert_path, key_path, wsaa_wsdl, wsfe_wsdl, cuit, "wsfe", client, negocio_id)
+        # Obtener ultimo comprobante
+        ult_cbte = await get_last_voucher_number(pto_vta, cbte_tipo, cert_path, key_path, wsaa_wsdl, wsfe_wsdl, cuit, "wsfe", client, negocio_id)
+        siguiente = ult_cbte + 1
+        
+        # Preparar invoice_data
+        imp_total = round(total, 2)
+        invoice_data = {
+            'punto_venta': pto_vta,
+            'tipo_comprobante': cbte_tipo,
+            'concepto': concepto,
+            'doc_tipo': doc_tipo,
+            'doc_nro': doc_nro,
+            'cbte_desde': siguiente,
+            'cbte_hasta': siguiente,
+            'cbte_fecha': datetime.now().strftime('%Y%m%d'),
+            'imp_total': imp_total,
+            'imp_neto': imp_total,
+            'imp_iva': 0.0,
+            'imp_tot_conc': 0.0,
+            'imp_op_ex': 0.0,
+            'imp_trib': 0.0
+        }
+        
+        if cbte_tipo in (1, 6): # Factura A o B (RI) requiere desglose de IVA (Asumimos 21%)
+            neto = round(imp_total / 1.21, 2)
+            iva = round(imp_total - neto, 2)
+            invoice_data['imp_neto'] = neto
+            invoice_data['imp_iva'] = iva
+            invoice_data['iva'] = [{
+                'id': 5, # 21%
+                'base_imp': neto,
+                'importe': iva
+            }]
             
-            # Extraer CAE del resultado (puede ser SimpleNamespace o dict)
-            def _get_attr(obj, *keys, default=""):
-                """Accede a atributos o keys, soportando tanto SimpleNamespace como dict."""
-                curr = obj
-                for key in keys:
-                    if curr is None:
-                        return default
-                    if isinstance(curr, dict):
-                        curr = curr.get(key)
-                    else:
-                        curr = getattr(curr, key, None)
-                return curr if curr is not None else default
+        if concepto in (2, 3):
+            invoice_data['fch_serv_desde'] = invoice_data['cbte_fecha']
+            invoice_data['fch_serv_hasta'] = invoice_data['cbte_fecha']
+            invoice_data['fch_vto_pago'] = invoice_data['cbte_fecha']
             
-            det_resp = _get_attr(res, "FeDetResp", "FECAEDetResponse")
-            det0 = det_resp[0] if isinstance(det_resp, list) and det_resp else det_resp
-            cae = _get_attr(det0, "CAE", default="")
-            cae_fch_vto = _get_attr(det0, "CAEFchVto", default="")
+        # Llamar ARCA
+        res = await create_invoice(invoice_data, cert_path, key_path, wsaa_wsdl, wsfe_wsdl, cuit, "wsfe", client, negocio_id)
+        
+        # Extraer CAE del resultado (puede ser SimpleNamespace o dict)
+        def _get_attr(obj, *keys, default=""):
+            """Accede a atributos o keys, soportando tanto SimpleNamespace como dict."""
+            curr = obj
+            for key in keys:
+                if curr is None:
+                    return default
+                if isinstance(curr, dict):
+                    curr = curr.get(key)
+                else:
+                    curr = getattr(curr, key, None)
+            return curr if curr is not None else default
+        
+        det_resp = _get_attr(res, "FeDetResp", "FECAEDetResponse")
+        det0 = det_resp[0] if isinstance(det_resp, list) and det_resp else det_resp
+        cae = _get_attr(det0, "CAE", default="")
+        cae_fch_vto = _get_attr(det0, "CAEFchVto", default="")
+        
+        factura_data = {
+            "negocio_id": negocio_id,
+            "venta_id": venta_id,
+            "tipo_comprobante": cbte_tipo,
+            "punto_venta": pto_vta,
+            "numero": siguiente,
+            "fecha": datetime.now().date().isoformat(),
+            "cae": cae,
+            "cae_vencimiento": datetime.strptime(cae_fch_vto, '%Y%m%d').date().isoformat() if cae_fch_vto else None,
+            "imp_total": imp_total,
+            "imp_neto": invoice_data.get('imp_neto', imp_total),
+            "imp_iva": invoice_data.get('imp_iva', 0.0),
+            "cliente_cuit_dni": str(doc_nro) if doc_nro > 0 else None,
+            "estado": "emitida" if cae else "error",
+            "error_detalle": None if cae else "Error al generar factura en AFIP"
+        }
+        if sucursal_id:
+            factura_data["sucursal_id"] = sucursal_id
             
-            factura_data = {
-                "negocio_id": negocio_id,
-                "venta_id": venta_id,
-                "tipo_comprobante": cbte_tipo,
-                "punto_venta": pto_vta,
-                "numero": siguiente,
-                "fecha": datetime.now().date().isoformat(),
-                "cae": cae,
-                "cae_vencimiento": datetime.strptime(cae_fch_vto, '%Y%m%d').date().isoformat() if cae_fch_vto else None,
-                "imp_total": imp_total,
-                "imp_neto": invoice_data.get('imp_neto', imp_total),
-                "imp_iva": invoice_data.get('imp_iva', 0.0),
-                "cliente_cuit_dni": str(doc_nro) if doc_nro > 0 else None,
-                "estado": "emitida" if cae else "error",
-                "error_detalle": None if cae else "Error al generar factura en AFIP"
-            }
-            if sucursal_id:
-                factura_data["sucursal_id"] = sucursal_id
-                
+        if factura_id:
+            factura_resp = client.table("facturas").update(factura_data).eq("id", factura_id).execute()
+        else:
             factura_resp = client.table("facturas").insert(factura_data).execute()
+        
+        if factura_resp.data:
+            factura_id = factura_resp.data[0]["id"]
+            factura_data["id"] = factura_id
             
-            if factura_resp.data:
-                factura_id = factura_resp.data[0]["id"]
-                factura_data["id"] = factura_id
-                
-                # Import PDF Generator
-                from app.services.pdf_factura import generar_y_subir_pdf_factura
-                
-                pdf_path = generar_y_subir_pdf_factura(factura_data, {}, config)
-                if pdf_path:
-                    client.table("facturas").update({"pdf_url": pdf_path}).eq("id", factura_id).execute()
-                    factura_data["pdf_url"] = pdf_path
-            
-            return factura_data
-            
-        except Exception as e:
-            print(f"Error procesando factura ARCA: {e}")
-            raise Exception(f"Error ARCA: {str(e)}")
+            if generar_pdf:
+                adjuntar_pdf_factura(client, factura_data, config)
+        
+        return factura_data
+        
+    except Exception as e:
+        print(f"Error procesando factura ARCA: {e}")
+        raise Exception(f"Error ARCA: {str(e)}")
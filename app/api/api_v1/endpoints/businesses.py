@@ -16,6 +16,7 @@ from app.db.supabase_client import (
 from app.schemas.business import BusinessCreate, Business
 from app.schemas.branch import Branch, BranchCreate, BranchUpdate
 from app.schemas.invitacion import InvitacionCreate, InvitacionResponse, UsuarioNegocioUpdate
+from app.services.access_cache import invalidate_business_access, invalidate_user_access
 from supabase.lib.client_options import ClientOptions
 from datetime import datetime, timezone
 
@@ -676,6 +677,7 @@ async def create_business_branch(business_id: str, payload: BranchCreate, reques
                     "activo": True,
                 }
             ).execute()
+            invalidate_user_access(business_id, user_id_str)
     except Exception as exc:
         logger.warning(
             "Unable to auto-assign branch %s to user %s: %s",
@@ -859,6 +861,7 @@ async def delete_business(business_id: str, request: Request) -> Any:
                 detail=f"Error deleting business: {str(e)}"
             )
 
+        invalidate_business_access(business_id)
         logger.info(f"✅ Business {business_id} deleted successfully")
         return {"message": "Business deleted successfully", "business_id": business_id}
 
@@ -1229,6 +1232,7 @@ async def aprobar_usuario_negocio(
         
         # No need to check for .error - Supabase raises exceptions on errors
         
+        invalidate_business_access(business_id)
         logger.info("✅ Aprobación completada exitosamente")
         
         return {
@@ -1261,6 +1265,7 @@ async def rechazar_usuario_pendiente(business_id: str, usuario_negocio_id: str,
         raise HTTPException(status_code=403, detail="Solo el admin puede rechazar usuarios.")
     # Cambiar estado a rechazado en lugar de eliminar
     supabase.table("usuarios_negocios").update({"estado": "rechazado"}).eq("id", usuario_negocio_id).execute()
+    invalidate_business_access(business_id)
     return {"message": "Usuario rechazado", "usuario_negocio_id": usuario_negocio_id}
 
 @router.get("/public/buscar-negocios")
@@ -1452,6 +1457,7 @@ async def actualizar_permisos_usuario(
                 .execute()
         
         # No need to check for .error - Supabase raises exceptions on errors
+        invalidate_business_access(business_id)
         
         return {"message": "Permisos actualizados correctamente", "permisos": response.data[0] if response.data else {}}
         
@@ -1489,6 +1495,7 @@ async def remover_usuario_negocio(business_id: str, usuario_negocio_id: str, req
     
     # Eliminar relación usuario-negocio
     supabase.table("usuarios_negocios").delete().eq("id", usuario_negocio_id).execute()
+    invalidate_user_access(business_id, usuario_check.data[0]["usuario_id"])
     
     return {"message": "Usuario removido del negocio correctamente"}
 
@@ -1691,6 +1698,8 @@ async def actualizar_estado_usuario_negocio(
             except Exception as permisos_error:
                 logger.error(f"⚠️ Warning: Error creando permisos básicos: {permisos_error}")
         
+        invalidate_user_access(business_id, relacion["usuario_id"])
+        
         return {
             "message": f"Estado actualizado a '{estado_data.estado}' correctamente",
             "estado": estado_data.estado,
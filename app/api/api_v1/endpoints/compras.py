@@ -26,6 +26,43 @@ def _get_user_id_from_token(authorization: str) -> str:
         raise HTTPException(status_code=401, detail=f"Error al procesar token: {str(e)}")
 
 
+def _require_stock_branch(context: Any) -> None:
+    """Con inventario por sucursal el stock de una compra necesita una sucursal activa."""
+    settings = context.branch_settings or {}
+    if settings.get("inventario_modo", "centralizado") == "por_sucursal" and not context.branch_id:
+        raise HTTPException(
+            status_code=400,
+            detail="El inventario es por sucursal: seleccioná una sucursal para registrar el stock de la compra",
+        )
+
+
+def _apply_purchase_stock(client: Any, business_id: str, context: Any, items: List[dict], signo: int, con_precio: bool = False) -> List[dict]:
+    """
+    Aplica el stock de todas las líneas de una compra en un solo RPC transaccional
+    (apply_stock_batch, migrations/20_apply_stock_batch.sql) con incrementos relativos.
+    signo=1 ingresa la mercadería, signo=-1 la revierte (sin bajar de 0).
+    """
+    _require_stock_branch(context)
+    settings = context.branch_settings or {}
+    payload = [
+        {
+            "producto_id": it["producto_id"],
+            "cantidad": signo * float(it["cantidad"]),
+            "precio_compra": float(it["precio_unitario"]) if con_precio and it.get("precio_unitario") is not None else None,
+        }
+        for it in items
+    ]
+    if not payload:
+        return []
+    resp = client.rpc("apply_stock_batch", {
+        "p_negocio_id": business_id,
+        "p_sucursal_id": context.branch_id,
+        "p_items": payload,
+        "p_inventario_modo": settings.get("inventario_modo", "centralizado"),
+    }).execute()
+    return resp.data or []
+
+
 @router.get(
     "/",
     dependencies=[Depends(PermissionDependency("stock", "ver"))]
@@ -176,16 +213,18 @@ async def create_purchase(
         # Validar productos y preparar items
         items_preparados: List[dict] = []
         total = 0.0
+        producto_ids = list({it.producto_id for it in compra_in.items})
+        prod_resp = (
+            client
+            .table("productos")
+            .select("id")
+            .in_("id", producto_ids)
+            .eq("negocio_id", business_id)
+            .execute()
+        )
+        encontrados = {row["id"] for row in prod_resp.data or []}
         for it in compra_in.items:
-            prod_resp = (
-                client
-                .table("productos")
-                .select("id, nombre, stock_actual")
-                .eq("id", it.producto_id)
-                .eq("negocio_id", business_id)
-                .execute()
-            )
-            if not prod_resp.data:
+            if it.producto_id not in encontrados:
                 raise HTTPException(status_code=404, detail=f"Producto {it.producto_id} no encontrado o no pertenece al negocio")
             subtotal = float(it.cantidad) * float(it.precio_unitario)
             total += subtotal
@@ -221,6 +260,8 @@ async def create_purchase(
         else:
             _norm = "no_entregado"
         estado_value = _norm if _norm in {"entregado", "no_entregado"} else "no_entregado"
+        if estado_value == "entregado":
+            _require_stock_branch(context)
 
         compra_data = {
             "id": compra_id,
@@ -259,59 +300,7 @@ async def create_purchase(
         if estado_value == "entregado":
             try:
                 print(f"[COMPRAS] Actualizando stock para compra entregada: {compra_id}")
-                svc = get_supabase_service_client()
-                settings = context.branch_settings or {}
-                inventario_modo = settings.get("inventario_modo", "centralizado")
-                print(f"[COMPRAS] inventario_modo resuelto a: {inventario_modo}")
-                for it in items_preparados:
-                    print(f"[COMPRAS] Procesando item: {it['producto_id']} con cantidad {it['cantidad']}")
-                    if inventario_modo == "por_sucursal":
-                        inv_resp2 = (
-                            svc
-                            .table("inventario_sucursal")
-                            .select("id, stock_actual")
-                            .eq("producto_id", it["producto_id"])
-                            .eq("sucursal_id", context.branch_id)
-                            .eq("negocio_id", business_id)
-                            .execute()
-                        )
-                        actual = inv_resp2.data[0].get("stock_actual", 0) if inv_resp2.data else 0
-                        nuevo = float(actual) + float(it["cantidad"])
-                        print(f"[COMPRAS] Sucursal - stock actual: {actual}, nuevo: {nuevo}")
-                        if inv_resp2.data:
-                            svc.table("inventario_sucursal").update({
-                                "stock_actual": nuevo
-                            }).eq("producto_id", it["producto_id"]).eq("sucursal_id", context.branch_id).execute()
-                        else:
-                            svc.table("inventario_sucursal").insert({
-                                "negocio_id": business_id,
-                                "sucursal_id": context.branch_id,
-                                "producto_id": it["producto_id"],
-                                "stock_actual": nuevo,
-                            }).execute()
-                        svc.table("productos").update({
-                            "precio_compra": float(it["precio_unitario"]) if it.get("precio_unitario") is not None else None,
-                        }).eq("id", it["producto_id"]).execute()
-                    else:
-                        prod_resp2 = (
-                            svc
-                            .table("productos")
-                            .select("id, stock_actual")
-                            .eq("id", it["producto_id"])
-                            .eq("negocio_id", business_id)
-                            .execute()
-                        )
-                        if prod_resp2.data:
-                            actual = prod_resp2.data[0].get("stock_actual", 0) or 0
-                            nuevo = float(actual) + float(it["cantidad"])
-                            print(f"[COMPRAS] Centralizado - stock actual: {actual}, nuevo: {nuevo}")
-                            svc.table("productos").update({
-                                "stock_actual": nuevo,
-                                "precio_compra": float(it["precio_unitario"]) if it.get("precio_unitario") is not None else None,
-                            }).eq("id", it["producto_id"]).execute()
-                            svc.table("inventario_negocio").update({
-                                "stock_total": nuevo
-                            }).eq("producto_id", it["producto_id"]).eq("negocio_id", business_id).execute()
+                _apply_purchase_stock(client, business_id, context, items_preparados, signo=1, con_precio=True)
             except Exception as stock_exc:
                 print(f"⚠️ [COMPRAS] Error al actualizar stock: {stock_exc}")
                 # Rollback de la compra y sus detalles
@@ -451,66 +440,10 @@ async def update_purchase(
             items = det_resp.data or []
             if current_estado != "entregado" and new_estado == "entregado":
                 # Incrementar stock y actualizar precio_compra
-                from app.db.supabase_client import get_supabase_service_client
-                svc = get_supabase_service_client()
-                settings = context.branch_settings or {}
-                inventario_modo = settings.get("inventario_modo", "centralizado")
-                for it in items:
-                    if inventario_modo == "por_sucursal":
-                        inv_resp2 = svc.table("inventario_sucursal").select("stock_actual").eq("producto_id", it["producto_id"]).eq("sucursal_id", context.branch_id).eq("negocio_id", business_id).execute()
-                        actual = inv_resp2.data[0].get("stock_actual", 0) if inv_resp2.data else 0
-                        nuevo = float(actual) + float(it["cantidad"])
-                        svc.table("inventario_sucursal").update({"stock_actual": nuevo}).eq("producto_id", it["producto_id"]).eq("sucursal_id", context.branch_id).execute()
-                        svc.table("productos").update({"precio_compra": float(it["precio_unitario"]) if it.get("precio_unitario") is not None else None}).eq("id", it["producto_id"]).eq("negocio_id", business_id).execute()
-                    else:
-                        prod_resp2 = (
-                            svc
-                            .table("productos")
-                            .select("stock_actual")
-                            .eq("id", it["producto_id"])
-                            .eq("negocio_id", business_id)
-                            .execute()
-                        )
-                        if prod_resp2.data:
-                            actual = prod_resp2.data[0].get("stock_actual", 0) or 0
-                            nuevo = float(actual) + float(it["cantidad"])
-                            svc.table("productos").update({
-                                "stock_actual": nuevo,
-                                "precio_compra": float(it["precio_unitario"]) if it.get("precio_unitario") is not None else None,
-                            }).eq("id", it["producto_id"]).eq("negocio_id", business_id).execute()
-                            svc.table("inventario_negocio").update({"stock_total": nuevo}).eq("producto_id", it["producto_id"]).eq("negocio_id", business_id).execute()
+                _apply_purchase_stock(client, business_id, context, items, signo=1, con_precio=True)
             elif current_estado == "entregado" and new_estado != "entregado":
                 # Decrementar stock (sin ir por debajo de 0)
-                from app.db.supabase_client import get_supabase_service_client
-                svc = get_supabase_service_client()
-                settings = context.branch_settings or {}
-                inventario_modo = settings.get("inventario_modo", "centralizado")
-                for it in items:
-                    if inventario_modo == "por_sucursal":
-                        inv_resp2 = svc.table("inventario_sucursal").select("stock_actual").eq("producto_id", it["producto_id"]).eq("sucursal_id", context.branch_id).eq("negocio_id", business_id).execute()
-                        actual = inv_resp2.data[0].get("stock_actual", 0) if inv_resp2.data else 0
-                        nuevo = float(actual) - float(it["cantidad"])
-                        if nuevo < 0:
-                            nuevo = 0
-                        svc.table("inventario_sucursal").update({"stock_actual": nuevo}).eq("producto_id", it["producto_id"]).eq("sucursal_id", context.branch_id).execute()
-                    else:
-                        prod_resp2 = (
-                            svc
-                            .table("productos")
-                            .select("stock_actual")
-                            .eq("id", it["producto_id"])
-                            .eq("negocio_id", business_id)
-                            .execute()
-                        )
-                        if prod_resp2.data:
-                            actual = prod_resp2.data[0].get("stock_actual", 0) or 0
-                            nuevo = float(actual) - float(it["cantidad"])
-                            if nuevo < 0:
-                                nuevo = 0
-                            svc.table("productos").update({
-                                "stock_actual": nuevo,
-                            }).eq("id", it["producto_id"]).eq("negocio_id", business_id).execute()
-                            svc.table("inventario_negocio").update({"stock_total": nuevo}).eq("producto_id", it["producto_id"]).eq("negocio_id", business_id).execute()
+                _apply_purchase_stock(client, business_id, context, items, signo=-1)
 
         # Validar proveedor si cambia
         if update_data.get("proveedor_id"):
@@ -570,6 +503,9 @@ async def delete_purchase(
         if not header_sel.data:
             raise HTTPException(status_code=404, detail="Compra no encontrada")
         estado_actual = header_sel.data.get("estado")
+        if estado_actual == "entregado":
+            # Validar antes de borrar: sin sucursal no se podría revertir el stock
+            _require_stock_branch(context)
 
         det_resp = (
             client
@@ -592,34 +528,7 @@ async def delete_purchase(
 
         # Revertir stock solo si estaba entregada
         if estado_actual == "entregado":
-            from app.db.supabase_client import get_supabase_service_client
-            svc = get_supabase_service_client()
-            settings = context.branch_settings or {}
-            inventario_modo = settings.get("inventario_modo", "centralizado")
-            for it in items:
-                if inventario_modo == "por_sucursal":
-                    inv_resp2 = svc.table("inventario_sucursal").select("stock_actual").eq("producto_id", it["producto_id"]).eq("sucursal_id", context.branch_id).eq("negocio_id", business_id).execute()
-                    actual = inv_resp2.data[0].get("stock_actual", 0) if inv_resp2.data else 0
-                    nuevo = float(actual) - float(it["cantidad"])
-                    if nuevo < 0:
-                        nuevo = 0
-                    svc.table("inventario_sucursal").update({"stock_actual": nuevo}).eq("producto_id", it["producto_id"]).eq("sucursal_id", context.branch_id).execute()
-                else:
-                    prod_resp = (
-                        svc
-                        .table("productos")
-                        .select("stock_actual")
-                        .eq("id", it["producto_id"])
-                        .eq("negocio_id", business_id)
-                        .execute()
-                    )
-                    if prod_resp.data:
-                        actual = prod_resp.data[0].get("stock_actual", 0) or 0
-                        nuevo = float(actual) - float(it["cantidad"])
-                        if nuevo < 0:
-                            nuevo = 0
-                        svc.table("productos").update({"stock_actual": nuevo}).eq("id", it["producto_id"]).eq("negocio_id", business_id).execute()
-                        svc.table("inventario_negocio").update({"stock_total": nuevo}).eq("producto_id", it["producto_id"]).eq("negocio_id", business_id).execute()
+            _apply_purchase_stock(client, business_id, context, items, signo=-1)
 
         return {"message": "Compra eliminada correctamente"}
     except HTTPException:
@@ -3,13 +3,13 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from datetime import datetime, date, timedelta
 import logging
 
-from app.api.context import BusinessScopedClientDep, ScopedClientContext
+from app.api.context import AsyncBusinessScopedClientDep, AsyncScopedClientContext
+from app.db.concurrent_reads import run_reads
 
 from app.schemas.dashboard import (
     DashboardSummaryResponse, AlertItem, TodaySummary, 
     TrendPoint, TopProduct, LowStockProduct, InventoryHealth
 )
-from app.services.config_cache import get_negocio_config
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -18,7 +18,7 @@ logger = logging.getLogger(__name__)
 async def get_dashboard_summary(
     business_id: str,
     request: Request,
-    scoped: ScopedClientContext = Depends(BusinessScopedClientDep)
+    scoped: AsyncScopedClientContext = Depends(AsyncBusinessScopedClientDep)
 ) -> Any:
     """Get optimized dashboard summary tailored for action and speed."""
     supabase = scoped.client
@@ -39,15 +39,38 @@ async def get_dashboard_summary(
     status_indicator = "healthy"
     alerts: List[AlertItem] = []
     
+    # Inventory mode comes with the request context (negocio_configuracion, cached)
+    config_data = scoped.context.branch_settings or {}
+    inventario_modo = config_data.get("inventario_modo") or "centralizado"
+    
     # -------------------------------------------------------------------------
-    # 1. Config Check (ARCA & Inventory Mode)
+    # 0. All reads are independent: fan them out and wait for the slowest one.
+    #    A failed or timed-out read only degrades its own section.
     # -------------------------------------------------------------------------
-    config_data = get_negocio_config(business_id, supabase)
-    inventario_modo = config_data.get("inventario_modo", "centralizado")
+    rpc_scope = {"p_negocio_id": business_id, "p_sucursal_id": branch_id}
+    if inventario_modo == "por_sucursal" and branch_id:
+        low_stock_read = supabase.table("inventario_sucursal").select("stock_actual, producto_id, productos(nombre, stock_minimo)").eq("negocio_id", business_id).eq("sucursal_id", branch_id).execute()
+    else:
+        low_stock_read = supabase.table("productos").select("id, nombre, stock_actual, stock_minimo").eq("negocio_id", business_id).eq("activo", True).execute()
     
-    # ARCA Check
-    arca_resp = supabase.table("configuracion_fiscal").select("habilitada, cert_path").eq("negocio_id", business_id).execute()
-    if arca_resp.data:
+    reads = await run_reads({
+        "arca": supabase.table("configuracion_fiscal").select("habilitada, cert_path").eq("negocio_id", business_id).execute(),
+        "top_products": supabase.rpc("get_dashboard_top_products", {**rpc_scope, "p_start_date": thirty_days_ago_str}).execute(),
+        "sales_trend": supabase.rpc("get_dashboard_sales_trend", {**rpc_scope, "p_start_date": seven_days_ago_str}).execute(),
+        "recent_sales": supabase.table("ventas").select("id").eq("negocio_id", business_id).gte("fecha", f"{three_days_ago_str}T00:00:00").limit(1).execute(),
+        "sales_today": supabase.rpc("get_dashboard_sales_today", {**rpc_scope, "p_target_date": today_str}).execute(),
+        "cash_flow": supabase.rpc("get_dashboard_cash_flow_today", {**rpc_scope, "p_target_date": today_str}).execute(),
+        "low_stock": low_stock_read,
+        "tareas": supabase.table("tareas").select("id").eq("negocio_id", business_id).in_("estado", ["pendiente", "en_progreso"]).execute(),
+    })
+    
+    # -------------------------------------------------------------------------
+    # 1. Config Check (ARCA)
+    # -------------------------------------------------------------------------
+    arca_resp = reads["arca"]
+    if not arca_resp.ok:
+        logger.warning("Dashboard: no se pudo verificar la configuración fiscal de %s", business_id)
+    elif arca_resp.data:
         config = arca_resp.data[0]
         if not config.get("habilitada") or not config.get("cert_path"):
             alerts.append(AlertItem(
@@ -71,14 +94,8 @@ async def get_dashboard_summary(
     # -------------------------------------------------------------------------
     # 2. Sales Trend (Last 7 Days) & Top Products (Last 30 Days)
     # -------------------------------------------------------------------------
-    # Fetch Top Products via RPC
     top_selling = []
-    top_prod_resp = supabase.rpc(
-        "get_dashboard_top_products",
-        {"p_negocio_id": business_id, "p_sucursal_id": branch_id, "p_start_date": thirty_days_ago_str}
-    ).execute()
-    
-    for tp in (top_prod_resp.data or []):
+    for tp in reads["top_products"].data:
         top_selling.append(TopProduct(
             id=tp["producto_id"],
             name=tp["nombre"],
@@ -86,13 +103,7 @@ async def get_dashboard_summary(
             revenue=float(tp["total_ingresos"])
         ))
 
-    # Fetch Sales Trend via RPC
-    trend_resp = supabase.rpc(
-        "get_dashboard_sales_trend",
-        {"p_negocio_id": business_id, "p_sucursal_id": branch_id, "p_start_date": seven_days_ago_str}
-    ).execute()
-    
-    trend_data = trend_resp.data or []
+    trend_data = reads["sales_trend"].data
     # Fill missing days with 0
     sales_trend_dict = { (now - timedelta(days=i)).strftime('%Y-%m-%d'): 0.0 for i in range(7) }
     for t in trend_data:
@@ -100,8 +111,8 @@ async def get_dashboard_summary(
     sales_trend = [TrendPoint(date=k, amount=v) for k, v in sorted(sales_trend_dict.items())]
 
     # Check recent sales (last 3 days)
-    recent_sales_resp = supabase.table("ventas").select("id").eq("negocio_id", business_id).gte("fecha", f"{three_days_ago_str}T00:00:00").limit(1).execute()
-    if not recent_sales_resp.data and status_indicator == "healthy":
+    recent_sales_resp = reads["recent_sales"]
+    if recent_sales_resp.ok and not recent_sales_resp.data and status_indicator == "healthy":
         alerts.append(AlertItem(
             id="no_sales",
             type="sales",
@@ -110,30 +121,21 @@ async def get_dashboard_summary(
         ))
         status_indicator = "attention"
         
-    # Today's Sales via RPC
-    today_sales_resp = supabase.rpc(
-        "get_dashboard_sales_today",
-        {"p_negocio_id": business_id, "p_sucursal_id": branch_id, "p_target_date": today_str}
-    ).execute()
-    
+    # Today's Sales
     today_sales_amount = 0.0
     today_sales_count = 0
-    if today_sales_resp.data:
-        today_sales_amount = float(today_sales_resp.data[0].get("total_sales") or 0.0)
-        today_sales_count = int(today_sales_resp.data[0].get("sales_count") or 0)
+    today_sales_data = reads["sales_today"].data
+    if today_sales_data:
+        today_sales_amount = float(today_sales_data[0].get("total_sales") or 0.0)
+        today_sales_count = int(today_sales_data[0].get("sales_count") or 0)
 
     # -------------------------------------------------------------------------
     # 3. Cash Position (Today's Cash Flow)
     # -------------------------------------------------------------------------
-    cash_flow_resp = supabase.rpc(
-        "get_dashboard_cash_flow_today",
-        {"p_negocio_id": business_id, "p_sucursal_id": branch_id, "p_target_date": today_str}
-    ).execute()
-    
     ingresos = today_sales_amount # Start with sales
     egresos = 0.0
     
-    for mov in (cash_flow_resp.data or []):
+    for mov in reads["cash_flow"].data:
         if mov["tipo"] == "ingreso":
             ingresos += float(mov["total"])
         else:
@@ -147,10 +149,8 @@ async def get_dashboard_summary(
     low_stock_items = []
     
     if inventario_modo == "por_sucursal" and branch_id:
-        # Complex query: join inventario_sucursal with productos
-        inv_resp = supabase.table("inventario_sucursal").select("stock_actual, producto_id, productos(nombre, stock_minimo)").eq("negocio_id", business_id).eq("sucursal_id", branch_id).execute()
-        
-        for item in (inv_resp.data or []):
+        # inventario_sucursal joined with productos
+        for item in reads["low_stock"].data:
             prod = item.get("productos")
             if not prod: continue
             
@@ -166,8 +166,7 @@ async def get_dashboard_summary(
                 })
     else:
         # Centralized
-        prod_resp = supabase.table("productos").select("id, nombre, stock_actual, stock_minimo").eq("negocio_id", business_id).eq("activo", True).execute()
-        for prod in (prod_resp.data or []):
+        for prod in reads["low_stock"].data:
             stock_actual = float(prod.get("stock_actual", 0))
             stock_min = float(prod.get("stock_minimo") or 0)
             if stock_min > 0 and stock_actual <= stock_min:
@@ -193,9 +192,7 @@ async def get_dashboard_summary(
     # -------------------------------------------------------------------------
     # 5. Pending Tasks
     # -------------------------------------------------------------------------
-    query_tareas = supabase.table("tareas").select("id").eq("negocio_id", business_id).in_("estado", ["pendiente", "en_progreso"])
-    tareas_resp = query_tareas.execute()
-    pending_tasks_count = len(tareas_resp.data or [])
+    pending_tasks_count = len(reads["tareas"].data)
     
     if pending_tasks_count > 0:
         alerts.append(AlertItem(
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request, Header,
 from typing import Optional
 from app.db.supabase_client import get_supabase_user_client, get_supabase_service_client
 from app.core.permissions import check_subscription_access
-from app.schemas.facturacion import ConfiguracionFiscalResponse, AfipStatusResponse, CsrRequest, CsrResponse
+from app.schemas.facturacion import ConfiguracionFiscalResponse, AfipStatusResponse, CsrRequest, CsrResponse, FacturaEstadoResponse
 
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import rsa
@@ -11,6 +11,7 @@ from cryptography.x509.oid import NameOID
 from cryptography.hazmat.primitives import hashes
 # Import ARCA client
 from app.services.afip import get_server_status, get_last_voucher_number
+from app.services.afip.credentials import invalidate_afip_credentials, get_afip_credentials
 
 router = APIRouter()
 
@@ -135,7 +136,8 @@ async def upsert_configuracion_fiscal(
         
         if not response.data:
             raise HTTPException(status_code=400, detail="Error al guardar configuración")
-            
+        
+        invalidate_afip_credentials(business_id)
         return response.data[0]
     except HTTPException:
         raise
@@ -144,9 +146,6 @@ async def upsert_configuracion_fiscal(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error del servidor detallado: {repr(general_e)}")
 
-import tempfile
-from pathlib import Path
-
 @router.get("/status", response_model=AfipStatusResponse)
 async def check_afip_status(
     request: Request,
@@ -156,7 +155,6 @@ async def check_afip_status(
 ):
     """
     Check connection to ARCA using the uploaded certificates.
-    Downloads certs from Storage to a temporary directory just for the check.
     """
     client = get_supabase_user_client(authorization)
     
@@ -183,63 +181,95 @@ async def check_afip_status(
     pto_vta = config.get("punto_venta", 1)
     cond_fiscal = config.get("condicion_fiscal")
     
-    # Use temporary directory to download certs
-    with tempfile.TemporaryDirectory() as tmpdir:
-        cert_path = Path(tmpdir) / "cert.crt"
-        key_path = Path(tmpdir) / "key.key"
+    try:
+        # Cert/key in memory (downloaded once per process while the stored paths don't change)
+        credentials = get_afip_credentials(client, business_id, config)
+        cert_path = credentials.cert_pem
+        key_path = credentials.key_pem
+            
+        # Check server status
+        status_data = await get_server_status(
+            cert_path=cert_path,
+            key_path=key_path,
+            wsaa_wsdl=wsaa_wsdl,
+            wsfe_wsdl=wsfe_wsdl,
+            cuit=cuit
+        )
+        
+        # Form response
+        res = {
+            "status": "OK" if status_data.get("appserver") == "OK" else "ERROR",
+            "appserver": status_data.get("appserver", "Error"),
+            "dbserver": status_data.get("dbserver", "Error"),
+            "authserver": status_data.get("authserver", "Error"),
+            "cuit": cuit,
+            "punto_venta": pto_vta,
+            "ultimo_comprobante_a": None,
+            "ultimo_comprobante_b": None,
+            "ultimo_comprobante_c": None
+        }
+        
+        # Optional: query last vouchers if connection is OK
+        if res["status"] == "OK":
+            try:
+                if cond_fiscal == "responsable_inscripto":
+                    # A = 1, B = 6
+                    res["ultimo_comprobante_a"] = await get_last_voucher_number(pto_vta, 1, cert_path, key_path, wsaa_wsdl, wsfe_wsdl, cuit)
+                    res["ultimo_comprobante_b"] = await get_last_voucher_number(pto_vta, 6, cert_path, key_path, wsaa_wsdl, wsfe_wsdl, cuit)
+                else:
+                    # C = 11
+                    res["ultimo_comprobante_c"] = await get_last_voucher_number(pto_vta, 11, cert_path, key_path, wsaa_wsdl, wsfe_wsdl, cuit)
+            except Exception as e:
+                print(f"Error checking last vouchers: {e}")
+        
+        return res
+        
+    except Exception as e:
+        error_msg = str(e)
+        if "PGRST301" in error_msg or "JWT expired" in error_msg:
+            raise HTTPException(status_code=401, detail="Su sesión ha expirado. Por favor, inicie sesión nuevamente.")
+        raise HTTPException(status_code=500, detail=f"Error validando conexión con ARCA: {error_msg}")
+
+@router.get("/facturas/{factura_id}", response_model=FacturaEstadoResponse)
+async def get_estado_factura(
+    request: Request,
+    business_id: str,
+    factura_id: str,
+    authorization: str = Header(..., description="Bearer token"),
+    subscription_check: bool = Depends(check_subscription_access)
+):
+    """
+    Estado de una factura encolada al registrar una venta con `facturar=True`.
+    Cuando está emitida y tiene PDF, devuelve una URL firmada por 24 horas.
+    """
+    client = get_supabase_user_client(authorization)
+    
+    response = client.table("facturas").select(
+        "id, venta_id, estado, tipo_comprobante, punto_venta, numero, cae, cae_vencimiento, error_detalle, pdf_url"
+    ).eq("id", factura_id).eq("negocio_id", business_id).limit(1).execute()
+    
+    if not response.data:
+        raise HTTPException(status_code=404, detail="Factura no encontrada")
         
+    factura = response.data[0]
+    pdf_path = factura.get("pdf_url")
+    factura["pdf_url"] = None
+    if factura.get("estado") == "emitida" and pdf_path:
         try:
-            # Download certs from Supabase Storage
-            cert_bytes = client.storage.from_("certificados_afip").download(config.get("cert_path"))
-            with open(cert_path, "wb") as f:
-                f.write(cert_bytes)
-                
-            key_bytes = client.storage.from_("certificados_afip").download(config.get("key_path"))
-            with open(key_path, "wb") as f:
-                f.write(key_bytes)
-                
-            # Check server status
-            status_data = await get_server_status(
-                cert_path=cert_path,
-                key_path=key_path,
-                wsaa_wsdl=wsaa_wsdl,
-                wsfe_wsdl=wsfe_wsdl,
-                cuit=cuit
-            )
-            
-            # Form response
-            res = {
-                "status": "OK" if status_data.get("appserver") == "OK" else "ERROR",
-                "appserver": status_data.get("appserver", "Error"),
-                "dbserver": status_data.get("dbserver", "Error"),
-                "authserver": status_data.get("authserver", "Error"),
-                "cuit": cuit,
-                "punto_venta": pto_vta,
-                "ultimo_comprobante_a": None,
-                "ultimo_comprobante_b": None,
-                "ultimo_comprobante_c": None
-            }
-            
-            # Optional: query last vouchers if connection is OK
-            if res["status"] == "OK":
-                try:
-                    if cond_fiscal == "responsable_inscripto":
-                        # A = 1, B = 6
-                        res["ultimo_comprobante_a"] = await get_last_voucher_number(pto_vta, 1, cert_path, key_path, wsaa_wsdl, wsfe_wsdl, cuit)
-                        res["ultimo_comprobante_b"] = await get_last_voucher_number(pto_vta, 6, cert_path, key_path, wsaa_wsdl, wsfe_wsdl, cuit)
-                    else:
-                        # C = 11
-                        res["ultimo_comprobante_c"] = await get_last_voucher_number(pto_vta, 11, cert_path, key_path, wsaa_wsdl, wsfe_wsdl, cuit)
-                except Exception as e:
-                    print(f"Error checking last vouchers: {e}")
-            
-            return res
-            
+            signed_url_resp = get_supabase_service_client().storage.from_("facturas_pdf").create_signed_url(pdf_path, 86400) # 24 horas
+            if isinstance(signed_url_resp, dict):
+                factura["pdf_url"] = signed_url_resp.get("signedURL") or signed_url_resp.get("signedUrl")
+            elif isinstance(signed_url_resp, str):
+                factura["pdf_url"] = signed_url_resp
         except Exception as e:
-            error_msg = str(e)
-            if "PGRST301" in error_msg or "JWT expired" in error_msg:
-                raise HTTPException(status_code=401, detail="Su sesión ha expirado. Por favor, inicie sesión nuevamente.")
-            raise HTTPException(status_code=500, detail=f"Error validando conexión con ARCA: {error_msg}")
+            print(f"Error al generar signed url para PDF: {e}")
+    
+    for key in ("id", "venta_id"):
+        if factura.get(key) is not None:
+            factura[key] = str(factura[key])
+    if factura.get("cae_vencimiento") is not None:
+        factura["cae_vencimiento"] = str(factura["cae_vencimiento"])
+    return factura
 
 @router.post("/generar-csr", response_model=CsrResponse)
 async def generar_csr(
@@ -323,6 +353,8 @@ async def generar_csr(
             "habilitada": False
         }).execute()
 
+    invalidate_afip_credentials(business_id)
+
     # 4. Generate CSR
     try:
         builder = x509.CertificateSigningRequestBuilder()
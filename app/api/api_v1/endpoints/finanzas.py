@@ -9,7 +9,12 @@ from dateutil.relativedelta import relativedelta
 
 from app.types.auth import User
 from app.api.deps import get_current_user_from_request as get_current_user
-from app.api.context import BusinessScopedClientDep, ScopedClientContext
+from app.api.context import (
+    AsyncBusinessScopedClientDep,
+    AsyncScopedClientContext,
+    BusinessScopedClientDep,
+    ScopedClientContext,
+)
 from app.schemas.finanzas import (
     CategoriaFinancieraCreate, CategoriaFinancieraUpdate, CategoriaFinanciera,
     MovimientoFinancieroCreate, MovimientoFinancieroUpdate, MovimientoFinanciero, MovimientoFinancieroConCategoria,
@@ -17,6 +22,7 @@ from app.schemas.finanzas import (
     ResumenFinanciero, FlujoCajaMensual, FlujoCajaDiario
 )
 from app.dependencies import PermissionDependency
+from app.services import report_export
 import logging
 
 router = APIRouter()
@@ -224,6 +230,21 @@ async def delete_categoria_financiera(business_id: str,
 # MOVIMIENTOS FINANCIEROS
 # ============================================================================
 
+MOVIMIENTOS_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_movimientos_cursor(row: dict) -> str:
+    """Cursor opaco para la siguiente página: '<fecha>|<id>' de la última fila."""
+    return f"{str(row['fecha'])[:10]}|{row['id']}"
+
+
+def _decode_movimientos_cursor(cursor: str) -> tuple:
+    fecha_str, sep, row_id = cursor.partition("|")
+    if not sep or not row_id:
+        raise ValueError("cursor sin id")
+    return date.fromisoformat(fecha_str), row_id
+
+
 @router.get("/movimientos", response_model=List[MovimientoFinancieroConCategoria],
     dependencies=[Depends(PermissionDependency("facturacion", "ver"))]
 )
@@ -233,155 +254,67 @@ async def get_movimientos_financieros(
     categoria_id: Optional[str] = Query(None),
     fecha_desde: Optional[date] = Query(None),
     fecha_hasta: Optional[date] = Query(None),
-    limit: int = Query(100, le=500),
+    limit: int = Query(100, ge=1, le=500),
     offset: int = Query(0, ge=0),
-    scoped: ScopedClientContext = Depends(BusinessScopedClientDep),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    scoped: AsyncScopedClientContext = Depends(AsyncBusinessScopedClientDep),
 ) -> Any:
-    """Get financial movements for a business with filters."""
+    """
+    Get financial movements (manual movements + sales) for a business with filters.
+
+    The merge, filters and ordering (fecha desc, id desc) run in the
+    `get_movimientos_feed` RPC (migrations/18_movimientos_feed.sql), which reads
+    at most one page per source. Pagination is keyset: pass the
+    `X-Next-Cursor` response header back as `cursor` to get the next page; the
+    header is omitted on the last page. `offset` is still accepted for old
+    clients but costs offset + limit rows — prefer `cursor`.
+    """
     supabase = scoped.client
-    
+
+    cursor_fecha = cursor_id = None
+    if cursor:
+        try:
+            cursor_fecha, cursor_id = _decode_movimientos_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor de paginación inválido"
+            )
+        offset = 0
+
     try:
-        # Base query for manual financial movements
-        query_movimientos = supabase.table("movimientos_financieros").select("""
-            *,
-            categorias_financieras!inner(nombre),
-            clientes(nombre, apellido)
-        """).eq("negocio_id", business_id)
-        if scoped.context.branch_id:
-            query_movimientos = query_movimientos.eq("sucursal_id", scoped.context.branch_id)
-        
-        # Apply filters to manual movements
-        if tipo and tipo != "ingreso":  # Solo aplicar filtro si no es ingreso (para incluir ventas)
-            query_movimientos = query_movimientos.eq("tipo", tipo)
-        if categoria_id:
-            query_movimientos = query_movimientos.eq("categoria_id", categoria_id)
-        if fecha_desde:
-            query_movimientos = query_movimientos.gte("fecha", fecha_desde.isoformat())
-        if fecha_hasta:
-            query_movimientos = query_movimientos.lte("fecha", fecha_hasta.isoformat())
-        
-        # Get manual movements
-        response_movimientos = query_movimientos.order("fecha", desc=True).execute()
-        
-        # Query sales (ventas) if we want ingresos or no type filter
-        ventas_data = []
-        if not tipo or tipo == "ingreso":
-            query_ventas = supabase.table("ventas").select("""
-                id, total, fecha, observaciones,
-                clientes(nombre, apellido)
-            """).eq("negocio_id", business_id)
-            if scoped.context.branch_id:
-                query_ventas = query_ventas.eq("sucursal_id", scoped.context.branch_id)
-            
-            # Apply date filters to sales
-            if fecha_desde:
-                query_ventas = query_ventas.gte("fecha", fecha_desde.isoformat())
-            if fecha_hasta:
-                query_ventas = query_ventas.lte("fecha", fecha_hasta.isoformat())
-            
-            response_ventas = query_ventas.order("fecha", desc=True).execute()
-            ventas_data = response_ventas.data if response_ventas.data else []
-        
-        # Transform manual movements
-        movements = []
-        for item in response_movimientos.data if response_movimientos.data else []:
-            # Create a copy of the item to modify safely
-            item_copy = dict(item)
-            
-            # Convert Decimal to float for JSON serialization
-            if isinstance(item_copy.get('monto'), Decimal):
-                item_copy['monto'] = float(item_copy['monto'])
-            
-            # Ensure fecha is in string format
-            if isinstance(item_copy.get('fecha'), str):
-                fecha_str = item_copy['fecha']
-                if 'T' in fecha_str:  # If it's a datetime string, extract date part
-                    item_copy['fecha'] = fecha_str.split('T')[0]
-            elif isinstance(item_copy.get('fecha'), date):
-                item_copy['fecha'] = item_copy['fecha'].strftime('%Y-%m-%d')
-            
-            # Ensure creado_en and actualizado_en are in ISO format with T separator
-            for field in ['creado_en', 'actualizado_en']:
-                if isinstance(item_copy.get(field), str) and 'T' not in item_copy.get(field, ''):
-                    # Si es una fecha simple YYYY-MM-DD, convertir a formato ISO 8601
-                    fecha_value = item_copy.get(field)
-                    if fecha_value and len(fecha_value) == 10:  # YYYY-MM-DD
-                        item_copy[field] = f"{fecha_value}T00:00:00"
-                elif isinstance(item_copy.get(field), date) and not isinstance(item_copy.get(field), datetime):
-                    # Si es un objeto date pero no datetime, convertir a ISO
-                    item_copy[field] = f"{item_copy[field].strftime('%Y-%m-%d')}T00:00:00"
-            
-            movement = MovimientoFinancieroConCategoria(**item_copy)
-            movement.categoria_nombre = item.get("categorias_financieras", {}).get("nombre")
-            if item.get("clientes"):
-                client = item["clientes"]
-                movement.cliente_nombre = f"{client.get('nombre', '')} {client.get('apellido', '')}" .strip()
-            movements.append(movement)
-        
-        # Transform sales into movement format
-        for venta in ventas_data:
-            # Convert Decimal to float for JSON serialization
-            monto_value = float(venta["total"]) if isinstance(venta["total"], Decimal) else venta["total"]
-            
-            # Convert timestamp to date string for fecha field
-            fecha_value = venta["fecha"]
-            if isinstance(fecha_value, str):
-                # Handle string date/datetime
-                if 'T' in fecha_value:
-                    # Extract date part from timestamp string (keep as string)
-                    fecha_value = fecha_value.split('T')[0]
-                # fecha_value is already a string in YYYY-MM-DD format
-            elif hasattr(fecha_value, 'strftime'):
-                # Convert datetime/date to string
-                fecha_value = fecha_value.strftime('%Y-%m-%d')
-            
-            # Create a movement-like object for each sale
-            # Convertir fecha_value a datetime ISO completo para los campos datetime
-            fecha_iso_format = None
-            if isinstance(venta.get("creado_en"), datetime):
-                fecha_iso_format = venta.get("creado_en").isoformat()
-            elif isinstance(venta.get("fecha"), datetime):
-                fecha_iso_format = venta.get("fecha").isoformat()
-            else:
-                # Si no hay datetime disponible, crear uno a partir de la fecha
-                if isinstance(fecha_value, str) and len(fecha_value) == 10:  # YYYY-MM-DD
-                    fecha_iso_format = f"{fecha_value}T00:00:00"
-                else:
-                    # Último recurso: fecha actual en formato ISO
-                    fecha_iso_format = datetime.now().isoformat()
-                    
-            movement_dict = {
-                "id": f"venta_{venta['id']}",  # Prefix to distinguish from manual movements
-                "negocio_id": business_id,
-                "tipo": "ingreso",
-                "categoria_id": None,
-                "monto": monto_value,
-                "fecha": fecha_value,
-                "metodo_pago": "venta",
-                "descripcion": f"Venta #{venta['id'][:8]}...",
-                "observaciones": venta.get("observaciones", ""),
-                "cliente_id": None,
-                "venta_id": venta["id"],
-                "creado_en": fecha_iso_format,  # Ahora usa formato ISO 8601 completo
-                "actualizado_en": fecha_iso_format,  # Ahora usa formato ISO 8601 completo
-                "creado_por": None
-            }
-            
-            movement = MovimientoFinancieroConCategoria(**movement_dict)
-            movement.categoria_nombre = "Ventas"  # Categoría virtual para ventas
-            
-            if venta.get("clientes"):
-                client = venta["clientes"]
-                movement.cliente_nombre = f"{client.get('nombre', '')} {client.get('apellido', '')}".strip()
-            
-            movements.append(movement)
-        
-        # Sort all movements by date (desc) and apply pagination
-        movements.sort(key=lambda x: x.fecha, reverse=True)
-        paginated_movements = movements[offset:offset + limit]
-        
-        return JSONResponse(status_code=200, content=[serialize_for_json(m.dict()) for m in paginated_movements])
-        
+        # Una fila extra para saber si hay página siguiente
+        response = await supabase.rpc("get_movimientos_feed", {
+            "p_negocio_id": business_id,
+            "p_sucursal_id": scoped.context.branch_id,
+            "p_tipo": tipo,
+            "p_categoria_id": categoria_id,
+            "p_desde": fecha_desde.isoformat() if fecha_desde else None,
+            "p_hasta": fecha_hasta.isoformat() if fecha_hasta else None,
+            "p_cursor_fecha": cursor_fecha.isoformat() if cursor_fecha else None,
+            "p_cursor_id": cursor_id,
+            "p_limit": offset + limit + 1,
+        }).execute()
+        rows = (response.data or [])[offset:]
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        movements = [
+            MovimientoFinancieroConCategoria(negocio_id=business_id, **row)
+            for row in rows
+        ]
+
+        headers = {}
+        if has_more and rows:
+            headers[MOVIMIENTOS_CURSOR_HEADER] = _encode_movimientos_cursor(rows[-1])
+
+        return JSONResponse(
+            status_code=200,
+            content=[serialize_for_json(m.dict()) for m in movements],
+            headers=headers,
+        )
+
     except Exception as e:
         logger.error(f"Error fetching financial movements: {str(e)}")
         raise HTTPException(
@@ -389,6 +322,46 @@ async def get_movimientos_financieros(
             detail="Error al obtener los movimientos financieros"
         )
 
+@router.get("/movimientos/export",
+    dependencies=[Depends(PermissionDependency("facturacion", "ver"))]
+)
+async def export_movimientos_financieros(
+    business_id: str,
+    formato: str = Query("csv", regex="^(csv|xlsx)$"),
+    tipo: Optional[str] = Query(None, regex="^(ingreso|egreso)$"),
+    categoria_id: Optional[str] = Query(None),
+    fecha_desde: Optional[date] = Query(None),
+    fecha_hasta: Optional[date] = Query(None),
+    en_segundo_plano: bool = Query(False),
+    scoped: ScopedClientContext = Depends(BusinessScopedClientDep),
+) -> Any:
+    """
+    Export the movements feed (same filters as GET /movimientos) to CSV/XLSX.
+    Short ranges stream directly; long or open ranges are generated by Celery
+    and answered with 202 + `task_id`.
+    """
+    filtros = {
+        "tipo": tipo,
+        "categoria_id": categoria_id,
+        "fecha_desde": fecha_desde.isoformat() if fecha_desde else None,
+        "fecha_hasta": fecha_hasta.isoformat() if fecha_hasta else None,
+        "sucursal_id": scoped.context.branch_id,
+    }
+    return report_export.export_response(
+        scoped.client, "movimientos", business_id, filtros, formato,
+        desde=filtros["fecha_desde"], hasta=filtros["fecha_hasta"], en_segundo_plano=en_segundo_plano,
+    )
+
+@router.get("/movimientos/export/{task_id}",
+    dependencies=[Depends(PermissionDependency("facturacion", "ver"))]
+)
+def get_export_movimientos(business_id: str, task_id: str) -> Any:
+    """Status of a queued movements export (signed download URL when done)."""
+    estado = report_export.get_export_status(task_id, business_id)
+    if estado is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Exportación no encontrada")
+    return estado
+
 @router.post("/movimientos", response_model=MovimientoFinanciero,
     dependencies=[Depends(PermissionDependency("facturacion", "editar"))]
 )
@@ -39,7 +39,7 @@ async def read_products(
     
     try:
         # Check config modes — use cache to avoid extra DB round-trip on every request
-        config_data = get_negocio_config(business_id, supabase)
+        config_data = get_negocio_config(business_id)
         catalog_mode = config_data.get("catalogo_producto_modo", "compartido")
         inventario_modo = config_data.get("inventario_modo", "centralizado")
 
@@ -205,7 +205,7 @@ async def create_product(
         product_data["negocio_id"] = business_id
 
         # Check config — use cache
-        config_data = get_negocio_config(business_id, supabase)
+        config_data = get_negocio_config(business_id)
         catalog_mode = config_data.get("catalogo_producto_modo", "compartido")
         inventario_modo = config_data.get("inventario_modo", "centralizado")
 
@@ -321,7 +321,7 @@ async def update_product(
         update_data = product_update.model_dump(exclude_unset=True)
 
         # Check config modes — use cache to avoid extra DB round-trip
-        config_data = get_negocio_config(business_id, supabase)
+        config_data = get_negocio_config(business_id)
         catalog_mode = config_data.get("catalogo_producto_modo", "compartido")
         inventario_modo = config_data.get("inventario_modo", "centralizado")
 
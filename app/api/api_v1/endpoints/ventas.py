@@ -5,17 +5,18 @@ from datetime import datetime, date, timedelta, timezone
 import calendar
 from pydantic import BaseModel, Field
 import uuid
-import jwt
 import json
 import time
 import asyncio
 
 from app.db.supabase_client import get_supabase_user_client
-from app.db.scoped_client import get_scoped_supabase_user_client
+from app.db.scoped_client import get_async_scoped_supabase_user_client, get_scoped_supabase_user_client
 from app.dependencies import PermissionDependency
 from app.api.context import BusinessBranchContextDep
 from app.core.permissions import check_subscription_access
-from app.api.api_v1.endpoints.afip_helper import procesar_facturacion_afip
+from app.core.jwt_auth import TokenVerificationError, verify_token
+from app.api.api_v1.endpoints.afip_helper import encolar_facturacion_afip
+from app.services import report_export, ventas_resumen
 
 logger = logging.getLogger(__name__)
 
@@ -24,24 +25,12 @@ branch_router = APIRouter()
 
 def get_user_id_from_token(token: str) -> str:
     """
-    Extrae el user_id del token JWT de Supabase.
+    Extrae el user_id del token JWT de Supabase (firma y expiración verificadas,
+    con caché por token compartida con el middleware de autenticación).
     """
     try:
-        # Remover 'Bearer ' si está presente
-        if token.startswith('Bearer '):
-            token = token[7:]
-        
-        # Decodificar el JWT sin verificar la firma (solo para obtener el payload)
-        # En producción, deberías verificar la firma con la clave pública de Supabase
-        decoded = jwt.decode(token, options={"verify_signature": False})
-        
-        # El user_id está en el campo 'sub' del JWT
-        user_id = decoded.get('sub')
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Token JWT inválido: no contiene user_id")
-        
-        return user_id
-    except Exception as e:
+        return verify_token(token).user_id
+    except TokenVerificationError as e:
         raise HTTPException(status_code=401, detail=f"Error al procesar token: {str(e)}")
 
 # Pydantic models for request/response
@@ -102,6 +91,8 @@ class VentaResponseSimple(BaseModel):
     fecha: str  # Supabase devuelve fecha como string
     mensaje: str
     factura_pdf_url: Optional[str] = None
+    factura_id: Optional[str] = None
+    factura_estado: Optional[str] = None  # pendiente | procesando | emitida | error
 
 class DashboardStatsPeriod(BaseModel):
     total_sales: float
@@ -134,6 +125,57 @@ class DashboardSalesWindowResponse(BaseModel):
     page: int
     page_size: int
 
+async def _fetch_sale_lookups(
+    client: Any,
+    business_id: str,
+    branch_id: str,
+    venta_data: VentaRequest,
+    cliente_id: Optional[str],
+    inventario_modo: str,
+) -> tuple[dict[str, dict], dict[str, dict], dict[str, float], bool]:
+    """
+    Lecturas de validación de una venta en paralelo y con `in_()`:
+    productos, servicios, snapshot de inventario_sucursal y existencia del cliente.
+    """
+    producto_ids = list(dict.fromkeys(i.id for i in venta_data.items if i.tipo == "producto"))
+    servicio_ids = list(dict.fromkeys(i.id for i in venta_data.items if i.tipo == "servicio"))
+
+    async def _rows(query: Any) -> list[dict]:
+        response = await query.execute()
+        return response.data or []
+
+    async def _empty() -> list[dict]:
+        return []
+
+    productos_q = (
+        _rows(client.table("productos").select("id, nombre, precio_venta, stock_actual").eq("negocio_id", business_id).in_("id", producto_ids))
+        if producto_ids else _empty()
+    )
+    servicios_q = (
+        _rows(client.table("servicios").select("id, nombre, precio").eq("negocio_id", business_id).in_("id", servicio_ids))
+        if servicio_ids else _empty()
+    )
+    stock_q = (
+        _rows(client.table("inventario_sucursal").select("producto_id, stock_actual").eq("sucursal_id", branch_id).in_("producto_id", producto_ids))
+        if producto_ids and inventario_modo == "por_sucursal" else _empty()
+    )
+    cliente_q = (
+        _rows(client.table("clientes").select("id").eq("id", cliente_id).eq("negocio_id", business_id))
+        if cliente_id else _empty()
+    )
+
+    productos, servicios, stock_rows, clientes = await asyncio.gather(productos_q, servicios_q, stock_q, cliente_q)
+
+    stock_sucursal: dict[str, float] = {}
+    for row in stock_rows:
+        stock_sucursal[str(row["producto_id"])] = row.get("stock_actual") or 0
+    return (
+        {str(p["id"]): p for p in productos},
+        {str(s["id"]): s for s in servicios},
+        stock_sucursal,
+        bool(clientes),
+    )
+
 @branch_router.post("/record-sale", response_model=VentaResponseSimple)
 async def record_sale_branch(
     business_id: str,
@@ -148,7 +190,8 @@ async def record_sale_branch(
     Valida pertenencia del usuario al negocio (usuarios_negocios) y a la sucursal (usuarios_sucursales).
     """
     try:
-        client = get_scoped_supabase_user_client(authorization, business_id, branch_id)
+        # Awaitable client: PostgREST round-trips no longer block the event loop.
+        client = get_async_scoped_supabase_user_client(authorization, business_id, branch_id)
         user_id = get_user_id_from_token(authorization)
 
         # Validate business and branch via dependency
@@ -159,54 +202,41 @@ async def record_sale_branch(
         cliente_id = venta_data.cliente_id.strip() if isinstance(venta_data.cliente_id, str) else venta_data.cliente_id
         if cliente_id == "":
             cliente_id = None
-        if cliente_id:
-            cliente_response = (
-                client.table("clientes")
-                .select("id")
-                .eq("id", cliente_id)
-                .eq("negocio_id", business_id)
-                .execute()
+
+        settings = context.branch_settings or {}
+        inventario_modo = settings.get("inventario_modo", "centralizado")
+
+        # Validación en lote: una consulta por tabla sin importar el tamaño del carrito
+        productos_por_id, servicios_por_id, stock_sucursal, cliente_ok = await _fetch_sale_lookups(
+            client, business_id, branch_id, venta_data, cliente_id, inventario_modo
+        )
+        if cliente_id and not cliente_ok:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Cliente {cliente_id} no encontrado o no pertenece al negocio {business_id}"
             )
-            if not cliente_response.data:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Cliente {cliente_id} no encontrado o no pertenece al negocio {business_id}"
-                )
 
-        # Calcular total y validar stock de productos
+        # Calcular total y validar stock de productos (cantidades sumadas por producto)
         total = 0.0
         items_validados = []
+        cantidad_por_producto: dict[str, float] = {}
 
         for item in venta_data.items:
             if item.tipo == "producto":
-                producto_response = (
-                    client.table("productos")
-                    .select("id, nombre, precio_venta, stock_actual")
-                    .eq("id", item.id)
-                    .eq("negocio_id", business_id)
-                    .execute()
-                )
-                if not producto_response.data:
+                producto = productos_por_id.get(item.id)
+                if not producto:
                     raise HTTPException(
                         status_code=404,
                         detail=f"Producto {item.id} no encontrado o no pertenece al negocio {business_id}"
                     )
 
-                producto = producto_response.data[0]
-                
-                # Validar stock según modo de inventario
-                settings = context.branch_settings or {}
-                inventario_modo = settings.get("inventario_modo", "centralizado")
-                
-                stock_disponible = producto["stock_actual"]
                 if inventario_modo == "por_sucursal":
-                    inv_resp = client.table("inventario_sucursal").select("stock_actual").eq("producto_id", item.id).eq("sucursal_id", branch_id).execute()
-                    if inv_resp.data:
-                        stock_disponible = inv_resp.data[0].get("stock_actual", 0)
-                    else:
-                        stock_disponible = 0
-                        
-                if stock_disponible < item.cantidad:
+                    stock_disponible = stock_sucursal.get(item.id, 0)
+                else:
+                    stock_disponible = producto["stock_actual"]
+
+                cantidad_por_producto[item.id] = cantidad_por_producto.get(item.id, 0) + item.cantidad
+                if (stock_disponible or 0) < cantidad_por_producto[item.id]:
                     raise HTTPException(
                         status_code=400,
                         detail=f"Stock insuficiente para {producto['nombre']}. Stock disponible: {stock_disponible}"
@@ -226,14 +256,7 @@ async def record_sale_branch(
                 })
 
             elif item.tipo == "servicio":
-                servicio_response = (
-                    client.table("servicios")
-                    .select("id, nombre, precio")
-                    .eq("id", item.id)
-                    .eq("negocio_id", business_id)
-                    .execute()
-                )
-                if not servicio_response.data:
+                if item.id not in servicios_por_id:
                     raise HTTPException(
                         status_code=404,
                         detail=f"Servicio {item.id} no encontrado o no pertenece al negocio {business_id}"
@@ -252,7 +275,9 @@ async def record_sale_branch(
                     "sucursal_id": branch_id
                 })
 
-        # Insertar venta con negocio y sucursal explícitos
+        # Cabecera, detalles y descuento de stock en una sola transacción (RPC record_sale).
+        # El stock se vuelve a validar con las filas bloqueadas: si otra venta lo consumió
+        # entre la validación y el commit, la venta entera se revierte.
         venta_id = str(uuid.uuid4())
         venta_insert_data = {
             "id": venta_id,
@@ -266,80 +291,50 @@ async def record_sale_branch(
             "observaciones": venta_data.observaciones
         }
 
-        venta_response = client.table("ventas").insert(venta_insert_data).execute()
-        if not venta_response.data:
+        logger.info(
+            "[record_sale_branch] Registrando venta_id=%s, items=%s, modo=%s, branch=%s",
+            venta_id, len(items_validados), inventario_modo, branch_id
+        )
+        try:
+            rpc_resp = await client.rpc(
+                "record_sale",
+                {
+                    "p_negocio_id": business_id,
+                    "p_sucursal_id": branch_id,
+                    "p_venta": venta_insert_data,
+                    "p_items": items_validados,
+                    "p_inventario_modo": inventario_modo,
+                }
+            ).execute()
+        except Exception as rpc_err:
+            if "Stock insuficiente" in str(rpc_err):
+                detail = getattr(rpc_err, "message", None) or str(rpc_err)
+                raise HTTPException(status_code=400, detail=detail)
+            raise
+
+        result = rpc_resp.data[0] if isinstance(rpc_resp.data, list) and rpc_resp.data else rpc_resp.data
+        if not isinstance(result, dict) or not result.get("venta"):
             raise HTTPException(status_code=500, detail="Error al crear la venta")
+        for stock_row in result.get("stock") or []:
+            logger.info(
+                "[stock] venta=%s producto=%s: %s → %s",
+                venta_id, stock_row.get("producto_id"), stock_row.get("stock_anterior"), stock_row.get("stock_nuevo")
+            )
 
-        # Insertar detalles de venta
         for item in items_validados:
             item["venta_id"] = venta_id
 
-        detalle_response = client.table("venta_detalle").insert(items_validados).execute()
-        if not detalle_response.data:
-            # Rollback: eliminar la venta creada si fallan los detalles
-            client.table("ventas").delete().eq("id", venta_id).execute()
-            raise HTTPException(status_code=500, detail="Error al crear los detalles de venta")
-
-        # Actualizar stock de productos según configuración
-        # Usa función RPC con SECURITY DEFINER para bypass de RLS atómico en ambos modos.
-        from app.db.supabase_client import get_supabase_service_client
-        svc_client = get_supabase_service_client()
-
-        settings = context.branch_settings or {}
-        inventario_modo = settings.get("inventario_modo", "centralizado")
-        logger.info(
-            "[record_sale_branch] Actualizando stock venta_id=%s, modo=%s, branch=%s",
-            venta_id, inventario_modo, branch_id
-        )
-
-        for item in venta_data.items:
-            if item.tipo == "producto":
-                try:
-                    cantidad_vendida = float(item.cantidad)
-                    # Usar RPC con SECURITY DEFINER: opera atómicamente y bypasa RLS
-                    # para ambos modos de inventario (centralizado y por_sucursal).
-                    rpc_resp = svc_client.rpc(
-                        "deduct_stock_on_sale",
-                        {
-                            "p_producto_id": item.id,
-                            "p_negocio_id": business_id,
-                            "p_cantidad": cantidad_vendida,
-                            "p_inventario_modo": inventario_modo,
-                            "p_sucursal_id": branch_id,
-                        }
-                    ).execute()
-                    if rpc_resp.data:
-                        result = rpc_resp.data[0]
-                        logger.info(
-                            "[stock] RPC deduct_stock_on_sale producto=%s: success=%s, %s",
-                            item.id, result.get("success"), result.get("mensaje")
-                        )
-                        if not result.get("success"):
-                            logger.warning(
-                                "[stock] RPC no pudo descontar stock producto=%s venta=%s: %s",
-                                item.id, venta_id, result.get("mensaje")
-                            )
-                    else:
-                        logger.warning(
-                            "[stock] RPC deduct_stock_on_sale sin datos para producto=%s venta=%s",
-                            item.id, venta_id
-                        )
-                except Exception as stock_err:
-                    # Stock update failure must NOT abort the response — the sale is already
-                    # committed. Log the error for manual review instead of crashing.
-                    logger.error(
-                        "[stock] Error al actualizar stock para producto=%s venta=%s: %s",
-                        item.id, venta_id, str(stock_err), exc_info=True
-                    )
-
-        venta_creada = venta_response.data[0]
+        venta_creada = result["venta"]
         
         mensaje = "Venta registrada exitosamente (branch-scoped)"
-        factura_pdf_url = None
+        factura_id = None
+        factura_estado = None
         if venta_data.facturar:
             try:
-                factura = await procesar_facturacion_afip(
-                    client, 
+                # La emisión ARCA corre en la cola `afip_invoicing`; aquí solo se
+                # registra la factura pendiente. Estado: GET .../facturacion/facturas/{id}
+                factura = encolar_facturacion_afip(
+                    get_scoped_supabase_user_client(authorization, business_id, branch_id), 
                     business_id, 
                     venta_id, 
                     cliente_id, 
@@ -348,19 +343,12 @@ async def record_sale_branch(
                     sucursal_id=branch_id
                 )
                 if factura:
-                    mensaje += " y factura ARCA emitida"
-                    pdf_path = factura.get("pdf_url")
-                    if pdf_path:
-                        try:
-                            from app.db.supabase_client import get_supabase_service_client
-                            supa = get_supabase_service_client()
-                            signed_url_resp = supa.storage.from_("facturas_pdf").create_signed_url(pdf_path, 86400) # 24 horas
-                            if isinstance(signed_url_resp, dict) and "signedURL" in signed_url_resp:
-                                factura_pdf_url = signed_url_resp["signedURL"]
-                            elif isinstance(signed_url_resp, str):
-                                factura_pdf_url = signed_url_resp
-                        except Exception as e:
-                            print(f"Error al generar signed url para PDF: {e}")
+                    factura_id = factura.get("id")
+                    factura_estado = factura.get("estado")
+                    if factura_estado == "error":
+                        mensaje += " pero hubo un error al enviar factura a ARCA"
+                    else:
+                        mensaje += " y factura ARCA en proceso"
                 else:
                     mensaje += " pero hubo un error al enviar factura a ARCA"
             except Exception as afip_err:
@@ -371,7 +359,8 @@ async def record_sale_branch(
             total=venta_creada["total"],
             fecha=venta_creada["fecha"],
             mensaje=mensaje,
-            factura_pdf_url=factura_pdf_url
+            factura_id=factura_id,
+            factura_estado=factura_estado
         )
 
     except HTTPException:
@@ -518,20 +507,19 @@ async def get_estadisticas_ventas(
     supabase = get_scoped_supabase_user_client(token, business_id)
     
     try:
-        # Ventas totales
-        ventas_response = supabase.table("ventas").select("total, fecha").eq("negocio_id", business_id).execute()
-        ventas = ventas_response.data if ventas_response.data else []
+        # Ventas totales (resumen diario, no recorre el historial de ventas)
+        historial = ventas_resumen.get_resumen(supabase, business_id)
         
-        total_ventas = len(ventas)
-        total_ingresos = sum(venta["total"] for venta in ventas)
+        total_ventas = historial["cantidad_ventas"]
+        total_ingresos = historial["total_ingresos"]
         venta_promedio = total_ingresos / total_ventas if total_ventas > 0 else 0
         
         # Ventas de hoy
-        hoy = date.today().isoformat()
-        ventas_hoy = [v for v in ventas if v["fecha"].startswith(hoy)]
+        hoy = date.today()
+        resumen_hoy = ventas_resumen.get_resumen(supabase, business_id, desde=hoy, hasta=hoy)
         
-        ventas_hoy_count = len(ventas_hoy)
-        ingresos_hoy = sum(venta["total"] for venta in ventas_hoy)
+        ventas_hoy_count = resumen_hoy["cantidad_ventas"]
+        ingresos_hoy = resumen_hoy["total_ingresos"]
         
         return VentaEstadisticas(
             total_ventas=total_ventas,
@@ -627,6 +615,50 @@ async def get_reporte_ventas(
             detail=f"Error al obtener reporte: {str(e)}"
         )
 
+@router.get("/reporte/export",
+    dependencies=[Depends(PermissionDependency("puede_ver_ventas"))]
+)
+async def export_reporte_ventas(
+    business_id: str,
+    request: Request,
+    formato: str = Query("csv", regex="^(csv|xlsx)$"),
+    fecha_inicio: Optional[str] = None,
+    fecha_fin: Optional[str] = None,
+    sucursal_id: Optional[str] = None,
+    en_segundo_plano: bool = Query(False, description="Forzar la generación en Celery"),
+) -> Any:
+    """
+    Exportar el reporte de ventas (una fila por línea de venta) a CSV o XLSX.
+    Rangos de hasta EXPORT_SYNC_MAX_DAYS días se descargan en streaming; los
+    mayores (o sin fecha_inicio) se encolan y devuelven 202 con `task_id`.
+    """
+    token = request.headers.get("Authorization", "").replace("Bearer ", "")
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token de autenticación requerido"
+        )
+
+    # La exportación en segundo plano lee con el service client (sin RLS): la
+    # sucursal se valida contra los accesos del usuario y solo se pasa la validada.
+    context = await BusinessBranchContextDep(request, business_id, sucursal_id)
+    supabase = get_scoped_supabase_user_client(token, business_id)
+    filtros = {"fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin, "sucursal_id": context.branch_id}
+    return report_export.export_response(
+        supabase, "ventas", business_id, filtros, formato,
+        desde=fecha_inicio, hasta=fecha_fin, en_segundo_plano=en_segundo_plano,
+    )
+
+@router.get("/reporte/export/{task_id}",
+    dependencies=[Depends(PermissionDependency("puede_ver_ventas"))]
+)
+def get_export_reporte_ventas(business_id: str, task_id: str) -> Any:
+    """Estado de una exportación de ventas encolada (con URL de descarga al terminar)."""
+    estado = report_export.get_export_status(task_id, business_id)
+    if estado is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Exportación no encontrada")
+    return estado
+
 @router.get("/dashboard-stats", response_model=DashboardStats)
 async def get_dashboard_stats(
     authorization: str = Header(..., description="Bearer token")
@@ -656,23 +688,17 @@ async def get_dashboard_stats(
         clientes_response = client.table("clientes").select("id").eq("negocio_id", negocio_id).execute()
         total_customers = len(clientes_response.data) if clientes_response.data else 0
         
-        # Obtener total de ventas
-        ventas_response = client.table("ventas").select("id, total, fecha").eq("negocio_id", negocio_id).execute()
-        total_sales = len(ventas_response.data) if ventas_response.data else 0
+        # Obtener total de ventas (resumen diario)
+        total_sales = ventas_resumen.get_resumen(client, negocio_id)["cantidad_ventas"]
         
         # Calcular ingresos del mes actual
         hoy = date.today()
         primer_dia_mes = date(hoy.year, hoy.month, 1)
         ultimo_dia_mes = date(hoy.year, hoy.month, calendar.monthrange(hoy.year, hoy.month)[1])
         
-        ventas_mes = []
-        if ventas_response.data:
-            for venta in ventas_response.data:
-                fecha_venta = datetime.fromisoformat(venta["fecha"].replace('Z', '+00:00')).date()
-                if primer_dia_mes <= fecha_venta <= ultimo_dia_mes:
-                    ventas_mes.append(venta)
-        
-        monthly_revenue = sum(venta["total"] for venta in ventas_mes)
+        monthly_revenue = ventas_resumen.get_resumen(
+            client, negocio_id, desde=primer_dia_mes, hasta=ultimo_dia_mes
+        )["total_ingresos"]
         
         # Obtener productos con stock bajo (menos de 10 unidades)
         productos_stock_response = client.table("productos").select("id, stock_actual").eq("negocio_id", negocio_id).lt("stock_actual", 10).execute()
@@ -802,32 +828,19 @@ async def get_monthly_sales_chart(
         primer_dia_mes = date(hoy.year, hoy.month, 1)
         ultimo_dia_mes = date(hoy.year, hoy.month, calendar.monthrange(hoy.year, hoy.month)[1])
         
-        # Obtener todas las ventas del negocio y filtrar por fecha
-        ventas_response = client.table("ventas").select("total, fecha").eq("negocio_id", negocio_id).execute()
-        
-        # Agrupar ventas por día (solo del mes actual)
-        ventas_por_dia = {}
-        if ventas_response.data:
-            for venta in ventas_response.data:
-                fecha_venta = datetime.fromisoformat(venta["fecha"].replace('Z', '+00:00')).date()
-                
-                # Filtrar solo ventas del mes actual
-                if primer_dia_mes <= fecha_venta <= ultimo_dia_mes:
-                    dia_str = fecha_venta.strftime("%d")
-                    
-                    if dia_str not in ventas_por_dia:
-                        ventas_por_dia[dia_str] = {
-                            "dia": dia_str,
-                            "fecha": fecha_venta.strftime("%Y-%m-%d"),
-                            "ventas": 0,
-                            "total": 0
-                        }
-                    
-                    ventas_por_dia[dia_str]["ventas"] += 1
-                    ventas_por_dia[dia_str]["total"] += float(venta["total"])
+        # Totales por día del mes actual desde el resumen diario
+        ventas_por_dia = ventas_resumen.get_por_dia(client, negocio_id, desde=primer_dia_mes, hasta=ultimo_dia_mes)
         
         # Convertir a lista ordenada por día
-        datos_grafico = sorted(ventas_por_dia.values(), key=lambda x: x["dia"])
+        datos_grafico = [
+            {
+                "dia": fecha_venta.strftime("%d"),
+                "fecha": fecha_venta.strftime("%Y-%m-%d"),
+                "ventas": int(totales["cantidad_ventas"]),
+                "total": totales["total_ingresos"],
+            }
+            for fecha_venta, totales in sorted(ventas_por_dia.items())
+        ]
         
         return {
             "datos": datos_grafico,
@@ -841,7 +854,11 @@ async def get_monthly_sales_chart(
 
 @router.get("/top-products-chart")
 async def get_top_products_chart(
-    authorization: str = Header(..., description="Bearer token")
+    authorization: str = Header(..., description="Bearer token"),
+    desde: Optional[date] = Query(None, description="Inicio del período (por defecto, hace 30 días)"),
+    hasta: Optional[date] = Query(None, description="Fin del período (por defecto, hoy)"),
+    sucursal_id: Optional[str] = Query(None, description="Filtrar por sucursal"),
+    limit: int = Query(5, ge=1, le=50),
 ):
     """
     Obtener datos para el gráfico de productos más vendidos.
@@ -860,74 +877,36 @@ async def get_top_products_chart(
         
         negocio_id = usuario_negocio_response.data[0]["negocio_id"]
         
-        # Obtener detalles de venta de productos del último mes
+        # Período: últimos 30 días salvo que se indique otro
         hoy = date.today()
-        hace_un_mes = hoy - timedelta(days=30)
-        
-        # Primero obtener todas las ventas del último mes
-        ventas_response = client.table("ventas").select("id, fecha").eq("negocio_id", negocio_id).execute()
+        hasta = hasta or hoy
+        desde = desde or (hasta - timedelta(days=30))
+        if desde > hasta:
+            raise HTTPException(status_code=400, detail="'desde' no puede ser posterior a 'hasta'")
+        periodo = "Últimos 30 días" if hasta == hoy and desde == hoy - timedelta(days=30) else f"{desde.isoformat()} a {hasta.isoformat()}"
+        
+        # Ranking agregado en la base, con nombres, en un solo round-trip
+        items, total_items = ventas_resumen.get_top_items(
+            client, negocio_id, desde=desde, hasta=hasta, sucursal_id=sucursal_id, limit=limit
+        )
         
-        # Filtrar ventas del último mes
-        ventas_recientes = []
-        if ventas_response.data:
-            for venta in ventas_response.data:
-                fecha_venta = datetime.fromisoformat(venta["fecha"].replace('Z', '+00:00')).date()
-                if fecha_venta >= hace_un_mes:
-                    ventas_recientes.append(venta["id"])
-        
-        # Si no hay ventas recientes, retornar datos vacíos
-        if not ventas_recientes:
-            return {
-                "datos": [],
-                "periodo": "Últimos 30 días",
-                "total_items": 0
+        top_items = [
+            {
+                "nombre": item["nombre"],
+                "tipo": item["tipo"],
+                "cantidad_total": int(item["cantidad"]),
             }
-        
-        # Obtener detalles de venta para estas ventas
-        detalles_response = client.table("venta_detalle").select("cantidad, producto_id, servicio_id, tipo, venta_id").in_("venta_id", ventas_recientes).execute()
-        
-        # Agrupar por producto/servicio
-        items_vendidos = {}
-        
-        if detalles_response.data:
-            for detalle in detalles_response.data:
-                if detalle["tipo"] == "producto" and detalle.get("producto_id"):
-                    # Obtener nombre del producto
-                    producto_response = client.table("productos").select("nombre").eq("id", detalle["producto_id"]).execute()
-                    if producto_response.data:
-                        nombre = producto_response.data[0]["nombre"]
-                        item_id = detalle["producto_id"]
-                    else:
-                        continue
-                elif detalle["tipo"] == "servicio" and detalle.get("servicio_id"):
-                    # Obtener nombre del servicio
-                    servicio_response = client.table("servicios").select("nombre").eq("id", detalle["servicio_id"]).execute()
-                    if servicio_response.data:
-                        nombre = servicio_response.data[0]["nombre"]
-                        item_id = detalle["servicio_id"]
-                    else:
-                        continue
-                else:
-                    continue
-                
-                if item_id not in items_vendidos:
-                    items_vendidos[item_id] = {
-                        "nombre": nombre,
-                        "tipo": detalle["tipo"],
-                        "cantidad_total": 0
-                    }
-                
-                items_vendidos[item_id]["cantidad_total"] += int(detalle["cantidad"])
-        
-        # Ordenar por cantidad vendida y tomar los top 5
-        top_items = sorted(items_vendidos.values(), key=lambda x: x["cantidad_total"], reverse=True)[:5]
+            for item in items
+        ]
         
         return {
             "datos": top_items,
-            "periodo": "Últimos 30 días",
-            "total_items": len(items_vendidos)
+            "periodo": periodo,
+            "total_items": total_items
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener datos del gráfico de productos: {str(e)}") 
 
@@ -951,95 +930,33 @@ async def get_dashboard_stats_v2(
 
         # Obtener fechas de inicio para cada período
         now = datetime.now()
+        today = now.date()
         today_start = now.replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
         
         # Inicio de la semana (lunes)
+        week_day = today - timedelta(days=today.weekday())
         week_start = (now - timedelta(days=now.weekday())).replace(
             hour=0, minute=0, second=0, microsecond=0
         ).isoformat()
         
         # Inicio del mes
+        month_day = today.replace(day=1)
         month_start = now.replace(
             day=1, hour=0, minute=0, second=0, microsecond=0
         ).isoformat()
 
-        # OPTIMIZACIÓN: Obtener todas las ventas del mes de una vez (incluye today y week)
-        query_start = time.time()
-        try:
-            ventas_mes = client.table("ventas") \
-                .select("id, total, fecha") \
-                .eq("negocio_id", negocio_id) \
-                .gte("fecha", month_start) \
-                .execute()
-            
-            ventas_data = ventas_mes.data if ventas_mes.data else []
-            print(f"[DASHBOARD] Consulta ventas: {len(ventas_data)} registros en {time.time() - query_start:.2f}s")
-        except Exception as e:
-            print(f"[DASHBOARD] Error obteniendo ventas: {str(e)}")
-            ventas_data = []
-
-        # OPTIMIZACIÓN: Obtener todos los detalles de ventas del mes de una vez
+        # OPTIMIZACIÓN: ventas y ganancias del mes desde el resumen diario
+        # (una fila por día y sucursal, mantenida por triggers al registrar ventas)
         query_start = time.time()
         try:
-            if ventas_data:
-                venta_ids = [v["id"] for v in ventas_data]
-                detalles_mes = client.table("venta_detalle") \
-                    .select("venta_id, producto_id, servicio_id, cantidad, precio_unitario, subtotal") \
-                    .in_("venta_id", venta_ids) \
-                    .execute()
-                
-                detalles_data = detalles_mes.data if detalles_mes.data else []
-                print(f"[DASHBOARD] Consulta detalles: {len(detalles_data)} registros en {time.time() - query_start:.2f}s")
-            else:
-                detalles_data = []
-                print(f"[DASHBOARD] Sin ventas, saltando detalles")
-        except Exception as e:
-            print(f"[DASHBOARD] Error obteniendo detalles: {str(e)}")
-            detalles_data = []
-
-        # OPTIMIZACIÓN: Obtener todos los productos y servicios de una vez
-        try:
-            # Obtener IDs únicos de productos y servicios
-            producto_ids = list(set(d["producto_id"] for d in detalles_data if d.get("producto_id")))
-            servicio_ids = list(set(d["servicio_id"] for d in detalles_data if d.get("servicio_id")))
-            
-            # Obtener productos con nombres y costos
-            productos_info = {}
-            if producto_ids:
-                productos_response = client.table("productos") \
-                    .select("id, nombre, precio_compra") \
-                    .in_("id", producto_ids) \
-                    .execute()
-                
-                if productos_response.data:
-                    productos_info = {
-                        p["id"]: {
-                            "nombre": p.get("nombre", "Producto sin nombre"),
-                            "costo": p.get("precio_compra", 0) or 0
-                        }
-                        for p in productos_response.data
-                    }
-            
-            # Obtener servicios con nombres y costos
-            servicios_info = {}
-            if servicio_ids:
-                servicios_response = client.table("servicios") \
-                    .select("id, nombre, costo") \
-                    .in_("id", servicio_ids) \
-                    .execute()
-                
-                if servicios_response.data:
-                    servicios_info = {
-                        s["id"]: {
-                            "nombre": s.get("nombre", "Servicio sin nombre"),
-                            "costo": s.get("costo", 0) or 0
-                        }
-                        for s in servicios_response.data
-                    }
+            ventas_por_dia = ventas_resumen.get_por_dia(client, negocio_id, desde=month_day)
+            logger.debug(
+                "[DASHBOARD] Consulta resumen diario: %s días en %.2fs",
+                len(ventas_por_dia), time.time() - query_start,
+            )
         except Exception as e:
-            print(f"Error obteniendo productos/servicios: {str(e)}")
-            productos_info = {}
-            servicios_info = {}
+            logger.warning("[DASHBOARD] Error obteniendo resumen de ventas: %s", e)
+            ventas_por_dia = {}
 
         # OPTIMIZACIÓN: Obtener datos de clientes y productos de forma secuencial para evitar problemas
         try:
@@ -1082,41 +999,12 @@ async def get_dashboard_stats_v2(
             low_stock_products = 0
 
         # Función auxiliar optimizada para calcular estadísticas
-        def calculate_period_stats(start_date: str) -> DashboardStatsPeriod:
+        def calculate_period_stats(start_day: date, start_date: str) -> DashboardStatsPeriod:
             try:
-                # Filtrar ventas del período
-                ventas_periodo = [v for v in ventas_data if v.get("fecha", "") >= start_date]
-                
-                if not ventas_periodo:
-                    return DashboardStatsPeriod(
-                        total_sales=0.0,
-                        estimated_profit=0.0,
-                        new_customers=0
-                    )
-                
-                # Calcular total de ventas
-                total_sales = sum(float(v.get("total", 0) or 0) for v in ventas_periodo)
+                dias_periodo = [t for dia, t in ventas_por_dia.items() if dia >= start_day]
                 
-                # Calcular ganancias estimadas
-                venta_ids_periodo = [v["id"] for v in ventas_periodo]
-                detalles_periodo = [d for d in detalles_data if d.get("venta_id") in venta_ids_periodo]
-                
-                ganancia = 0.0
-                for detalle in detalles_periodo:
-                    try:
-                        cantidad = float(detalle.get("cantidad", 0) or 0)
-                        precio_unitario = float(detalle.get("precio_unitario", 0) or 0)
-                        
-                        if detalle.get("producto_id"):
-                            producto_info = productos_info.get(detalle["producto_id"], {})
-                            costo = float(producto_info.get("costo", 0) or 0)
-                            ganancia += (precio_unitario - costo) * cantidad
-                        elif detalle.get("servicio_id"):
-                            servicio_info = servicios_info.get(detalle["servicio_id"], {})
-                            costo = float(servicio_info.get("costo", 0) or 0)
-                            ganancia += (precio_unitario - costo) * cantidad
-                    except (TypeError, ValueError, AttributeError):
-                        continue
+                total_sales = sum(t["total_ingresos"] for t in dias_periodo)
+                ganancia = sum(t["total_ingresos"] - t["costo_estimado"] for t in dias_periodo)
                 
                 # Contar clientes nuevos del período
                 clientes_periodo = [c for c in clientes_data if c.get("creado_en", "") >= start_date]
@@ -1137,67 +1025,22 @@ async def get_dashboard_stats_v2(
                 )
 
         # Calcular estadísticas para cada período
-        today_stats = calculate_period_stats(today_start)
-        week_stats = calculate_period_stats(week_start)
-        month_stats = calculate_period_stats(month_start)
+        today_stats = calculate_period_stats(today, today_start)
+        week_stats = calculate_period_stats(week_day, week_start)
+        month_stats = calculate_period_stats(month_day, month_start)
 
-        # Calcular top items vendidos del mes
+        # Calcular top items vendidos del mes (ranking y nombres en un solo RPC)
         top_items = []
         try:
-            # Procesar productos y servicios vendidos
-            productos_vendidos = {}
-            servicios_vendidos = {}
-            
-            for detalle in detalles_data:
-                try:
-                    cantidad = int(detalle.get("cantidad", 0) or 0)
-                    subtotal = float(detalle.get("subtotal", 0) or 0)
-                    
-                    if detalle.get("producto_id"):
-                        prod_id = detalle["producto_id"]
-                        if prod_id not in productos_vendidos:
-                            productos_vendidos[prod_id] = {
-                                "cantidad_total": 0,
-                                "ingreso_total": 0.0
-                            }
-                        productos_vendidos[prod_id]["cantidad_total"] += cantidad
-                        productos_vendidos[prod_id]["ingreso_total"] += subtotal
-                    
-                    elif detalle.get("servicio_id"):
-                        serv_id = detalle["servicio_id"]
-                        if serv_id not in servicios_vendidos:
-                            servicios_vendidos[serv_id] = {
-                                "cantidad_total": 0,
-                                "ingreso_total": 0.0
-                            }
-                        servicios_vendidos[serv_id]["cantidad_total"] += cantidad
-                        servicios_vendidos[serv_id]["ingreso_total"] += subtotal
-                except (TypeError, ValueError, AttributeError):
-                    continue
+            items_mes, _ = ventas_resumen.get_top_items(client, negocio_id, desde=month_day, hasta=today)
             
-            # Agregar productos a top_items
-            for prod_id, data in productos_vendidos.items():
-                producto_info = productos_info.get(prod_id, {})
+            for item in items_mes:
                 top_items.append({
-                    "nombre": str(producto_info.get("nombre", "Producto sin nombre")),
-                    "tipo": "Producto",
-                    "cantidad_total": int(data.get("cantidad_total", 0)),
-                    "ingreso_total": round(float(data.get("ingreso_total", 0)), 2)
+                    "nombre": str(item["nombre"]),
+                    "tipo": "Producto" if item["tipo"] == "producto" else "Servicio",
+                    "cantidad_total": int(item["cantidad"]),
+                    "ingreso_total": round(item["ingresos"], 2)
                 })
-            
-            # Agregar servicios a top_items
-            for serv_id, data in servicios_vendidos.items():
-                servicio_info = servicios_info.get(serv_id, {})
-                top_items.append({
-                    "nombre": str(servicio_info.get("nombre", "Servicio sin nombre")),
-                    "tipo": "Servicio",
-                    "cantidad_total": int(data.get("cantidad_total", 0)),
-                    "ingreso_total": round(float(data.get("ingreso_total", 0)), 2)
-                })
-            
-            # Ordenar por cantidad vendida y tomar los primeros 5
-            top_items.sort(key=lambda x: x.get("cantidad_total", 0), reverse=True)
-            top_items = top_items[:5]
         
         except Exception as e:
             print(f"Error procesando top items: {str(e)}")
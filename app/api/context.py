@@ -1,11 +1,21 @@
+import logging
 from typing import Any, NamedTuple, Optional
 
-import jwt
 from fastapi import HTTPException, Request, status
 from pydantic import BaseModel
 
-from app.db.scoped_client import ScopedSupabaseClient, get_scoped_supabase_user_client
+from app.core.jwt_auth import TokenVerificationError, identity_from_request, verify_token
+from app.db.scoped_client import (
+    AsyncScopedSupabaseClient,
+    ScopedSupabaseClient,
+    get_async_scoped_supabase_user_client,
+    get_scoped_supabase_user_client,
+)
 from app.db.supabase_client import get_supabase_user_client
+from app.services.access_cache import get_resolved_access
+from app.services.config_cache import get_negocio_settings
+
+logger = logging.getLogger(__name__)
 
 
 class BusinessBranchContext(BaseModel):
@@ -18,15 +28,10 @@ class BusinessBranchContext(BaseModel):
 
 
 def get_user_id_from_token(token: str) -> str:
+    """Return the `sub` of a verified token (signature + exp checked, cached per token)."""
     try:
-        if token.startswith("Bearer "):
-            token = token[7:]
-        decoded = jwt.decode(token, options={"verify_signature": False})
-        user_id = decoded.get("sub")
-        if not user_id:
-            raise ValueError("sub not present")
-        return user_id
-    except Exception as e:
+        return verify_token(token).user_id
+    except TokenVerificationError as e:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid token: {e}")
 
 
@@ -35,7 +40,10 @@ async def BusinessBranchContextDep(request: Request, business_id: str, branch_id
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization header missing")
     client = get_supabase_user_client(token)
-    user_id = get_user_id_from_token(token)
+    try:
+        user_id = identity_from_request(request, token).user_id
+    except TokenVerificationError as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid token: {e}")
 
     from_header = False
     # Allow branch to be provided via header when not in path/query.
@@ -45,17 +53,9 @@ async def BusinessBranchContextDep(request: Request, business_id: str, branch_id
             branch_id = header_branch
             from_header = True
 
-    # Verify business membership
+    # Membership, role and branch assignments (cached per business/user, see access_cache)
     try:
-        user_business = (
-            client.table("usuarios_negocios")
-            .select("id, negocio_id, estado, rol")
-            .eq("usuario_id", user_id)
-            .eq("negocio_id", business_id)
-            .eq("estado", "aceptado")
-            .limit(1)
-            .execute()
-        )
+        access = get_resolved_access(request, client, user_id, business_id)
     except Exception as e:
         # If Supabase rejects the token (e.g. expired), it raises an APIError
         raise HTTPException(
@@ -63,61 +63,29 @@ async def BusinessBranchContextDep(request: Request, business_id: str, branch_id
             detail=f"Error validating token with Supabase: {str(e)}"
         )
         
-    if not user_business.data:
+    if access is None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User not a member of this business")
-    business_record = user_business.data[0]
-    usuario_negocio_id = business_record["id"]
-    user_role = business_record.get("rol") or "empleado"
-
-    # If branch specified, verify assignment
-    if branch_id:
-        if user_role in ("admin", "owner"):
-            # Admins and owners inherently have access to all branches within the business
-            pass
+    usuario_negocio_id = access.usuario_negocio_id
+    user_role = access.role
+
+    # If branch specified, verify assignment.
+    # Admins and owners inherently have access to all branches within the business.
+    if branch_id and not access.can_access_branch(branch_id):
+        # If the branch came from the header and is invalid, we ignore it
+        # instead of raising 403. This prevents stale headers from breaking
+        # business-level endpoints.
+        if from_header:
+            logger.warning("User %s sent invalid branch header %s. Ignoring.", user_id, branch_id)
+            branch_id = None
         else:
-            user_branch = (
-                client.table("usuarios_sucursales")
-                .select("id")
-                .eq("usuario_id", user_id)
-                .eq("negocio_id", business_id)
-                .eq("sucursal_id", branch_id)
-                .eq("activo", True)
-                .limit(1)
-                .execute()
-            )
-            if not user_branch.data:
-                # If the branch came from the header and is invalid, we ignore it
-                # instead of raising 403. This prevents stale headers from breaking
-                # business-level endpoints.
-                if from_header:
-                    print(f"⚠️ Warning: User {user_id} sent invalid branch header {branch_id}. Ignoring.")
-                    branch_id = None
-                else:
-                    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User not assigned to this branch")
-
-    # Retrieve branch settings (negocio_configuracion) using service client to bypass RLS.
-    # The user-scoped token may not have SELECT permission on this table due to RLS policies,
-    # which causes a 401 from Supabase that incorrectly triggers auth error handling upstream.
-    try:
-        from app.db.supabase_client import get_supabase_service_client
-        svc = get_supabase_service_client()
-        settings_response = (
-            svc.table("negocio_configuracion")
-            .select(
-                "negocio_id, inventario_modo, servicios_modo, catalogo_producto_modo, permite_transferencias, transferencia_auto_confirma, default_branch_id, metadata, created_at, updated_at"
-            )
-            .eq("negocio_id", business_id)
-            .limit(1)
-            .execute()
-        )
-        branch_settings = settings_response.data[0] if settings_response.data else None
-    except Exception as cfg_err:
-        # Non-fatal: if settings can't be loaded, use None and log the issue
-        import logging
-        logging.getLogger(__name__).warning(
-            "Could not load negocio_configuracion for business %s: %s", business_id, cfg_err
-        )
-        branch_settings = None
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User not assigned to this branch")
+
+    # Branch settings (negocio_configuracion) come from the shared provider, which reads with
+    # the service client to bypass RLS. The user-scoped token may not have SELECT permission on
+    # this table due to RLS policies, which causes a 401 from Supabase that incorrectly triggers
+    # auth error handling upstream.
+    # Non-fatal: if settings can't be loaded, None is used.
+    branch_settings = get_negocio_settings(business_id)
 
     # Set context into request.state for downstream usage
     setattr(request.state, "company_id", business_id)
@@ -179,6 +147,39 @@ async def BranchScopedClientDep(
     return ScopedClientContext(client=client, context=context)
 
 
+class AsyncScopedClientContext(NamedTuple):
+    client: AsyncScopedSupabaseClient
+    context: BusinessBranchContext
+
+
+async def AsyncBusinessScopedClientDep(
+    request: Request,
+    business_id: str,
+) -> AsyncScopedClientContext:
+    """
+    Same as BusinessScopedClientDep, but returns an awaitable scoped client
+    (`await client.table(...).execute()`) backed by the shared async pool.
+    """
+    token = _extract_authorization_token(request)
+    context = await BusinessBranchContextDep(request, business_id)
+    client = get_async_scoped_supabase_user_client(token, context.business_id)
+    return AsyncScopedClientContext(client=client, context=context)
+
+
+async def AsyncBranchScopedClientDep(
+    request: Request,
+    business_id: str,
+    branch_id: str,
+) -> AsyncScopedClientContext:
+    """
+    Same as BranchScopedClientDep, but returns an awaitable scoped client.
+    """
+    token = _extract_authorization_token(request)
+    context = await BusinessBranchContextDep(request, business_id, branch_id)
+    client = get_async_scoped_supabase_user_client(token, context.business_id, context.branch_id)
+    return AsyncScopedClientContext(client=client, context=context)
+
+
 def scoped_client_from_request(request: Request) -> ScopedSupabaseClient:
     """
     Helper to reuse the scoped client set by BusinessScopedClientDep/BranchScopedClientDep.
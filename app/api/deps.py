@@ -8,6 +8,7 @@ from app.db.session import get_db
 from app.db.supabase_client import get_supabase_client, get_supabase_user_client
 from app.types.auth import User
 from app.core.config import settings
+from app.core.jwt_auth import TokenVerificationError, identity_from_request
 
 print("--- DEPS.PY RECREADO DESDE CERO ---")
 
@@ -25,24 +26,24 @@ class UserData(TypedDict):
 # Esquema OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserData:
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)) -> UserData:
     """
     Obtiene el usuario actual usando SU PROPIO token para respetar RLS.
     """
     try:
-        # 1. Validar token (Cliente Anónimo)
-        supabase_anon = get_supabase_client()
-        auth_response = supabase_anon.auth.get_user(token)
-        
-        if not auth_response.user:
+        # 1. Validar token: reutiliza la identidad verificada por el middleware
+        #    (o la verifica localmente vía caché) sin llamar a Supabase Auth.
+        try:
+            identity = identity_from_request(request, token)
+        except TokenVerificationError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Token inválido",
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        user_id = auth_response.user.id
-        user_email = auth_response.user.email
+        user_id = identity.user_id
+        user_email = identity.email
 
         # 2. Obtener Perfil (Cliente de Usuario - RLS Safe)
         # Usamos el token del usuario para que Postgres sepa quién hace la consulta
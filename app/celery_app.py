@@ -7,7 +7,7 @@ celery_app = Celery(
     "micropymes",
     broker=settings.CELERY_BROKER_URL,
     backend=settings.CELERY_RESULT_BACKEND,
-    include=["app.workers.notification_worker", "app.workers.ml_worker", "app.workers.maintenance_worker", "app.workers.embedding_worker", "app.workers.monitoring_worker"]
+    include=["app.workers.notification_worker", "app.workers.ml_worker", "app.workers.maintenance_worker", "app.workers.embedding_worker", "app.workers.monitoring_worker", "app.workers.afip_worker", "app.workers.export_worker"]
 )
 
 # Configuración de Celery
@@ -21,6 +21,10 @@ celery_app.conf.update(
         "app.workers.notification_worker.*": {"queue": "notifications"},
         "app.workers.ml_worker.*": {"queue": "ml_processing"},
         "app.workers.monitoring_worker.*": {"queue": "monitoring"},
+        # Facturación ARCA: cola dedicada para no competir con ML/notificaciones
+        "app.workers.afip_worker.*": {"queue": "afip_invoicing"},
+        # Exportaciones CSV/XLSX grandes: no bloquean las colas interactivas
+        "app.workers.export_worker.*": {"queue": "exports"},
     },
     beat_schedule={
         # Notificaciones diarias a las 8 AM
@@ -17,6 +17,13 @@ class MLSettings(BaseSettings):
     # Cross-validation and horizon
     ML_HORIZON_DAYS: int = Field(default=int(os.getenv("ML_HORIZON_DAYS", "14")))
     ML_CV_FOLDS: int = Field(default=int(os.getenv("ML_CV_FOLDS", "3")))
+    # Fold executor (app/services/ml/fold_executor.py): candidate x fold fits in a process pool.
+    # 1 = serial in-process; -1 = all cores. MAX_NBYTES: memmap threshold for arrays sent to workers;
+    # PRE_DISPATCH bounds how many fits are queued (and held in memory) ahead of the workers.
+    ML_CV_N_JOBS: int = Field(default=int(os.getenv("ML_CV_N_JOBS", "1")))
+    ML_CV_BACKEND: str = Field(default=os.getenv("ML_CV_BACKEND", "loky"))
+    ML_CV_MAX_NBYTES: str = Field(default=os.getenv("ML_CV_MAX_NBYTES", "1M"))
+    ML_CV_PRE_DISPATCH: str = Field(default=os.getenv("ML_CV_PRE_DISPATCH", "2*n_jobs"))
 
     # Prophet/SARIMAX and anomalies
     ML_SEASONALITY_MODE: str = Field(default=os.getenv("ML_SEASONALITY_MODE", "additive"))
@@ -27,10 +34,32 @@ class MLSettings(BaseSettings):
     ML_ANOMALY_METHOD: str = Field(default=os.getenv("ML_ANOMALY_METHOD", "iforest"))
     ML_STL_PERIOD: int = Field(default=int(os.getenv("ML_STL_PERIOD", "7")))
     ML_STL_ZTHRESH: float = Field(default=float(os.getenv("ML_STL_ZTHRESH", "3.0")))
+    # Feriados propios del negocio (tenant_holidays) cacheados por proceso para las time features
+    ML_HOLIDAYS_CACHE_TTL: int = Field(default=int(os.getenv("ML_HOLIDAYS_CACHE_TTL", "3600")))
 
     # Windows and re-train
     ML_MAX_TRAIN_WINDOW_DAYS: int = Field(default=int(os.getenv("ML_MAX_TRAIN_WINDOW_DAYS", "730")))
     ML_RETRAIN_CRON: str = Field(default=os.getenv("ML_RETRAIN_CRON", "@weekly"))
+    # Retrain semanal repartido en shards de negocios (chord de Celery); cada shard
+    # tiene su propio time limit para que un negocio lento no corte a todos
+    ML_RETRAIN_SHARD_SIZE: int = Field(default=int(os.getenv("ML_RETRAIN_SHARD_SIZE", "10")))
+    ML_RETRAIN_SHARD_SOFT_LIMIT: int = Field(default=int(os.getenv("ML_RETRAIN_SHARD_SOFT_LIMIT", "1500")))
+    ML_RETRAIN_SHARD_TIME_LIMIT: int = Field(default=int(os.getenv("ML_RETRAIN_SHARD_TIME_LIMIT", "1800")))
+
+    # Store incremental de la serie diaria de ventas (app/services/ml/sales_store.py).
+    # Disabled = old path reading raw ventas rows. DAYS: history kept per tenant;
+    # OVERLAP_SECONDS: re-read margin behind the actualizado_en watermark.
+    ML_SALES_STORE_ENABLED: bool = Field(default=os.getenv("ML_SALES_STORE_ENABLED", "true").lower() == "true")
+    ML_SALES_STORE_DAYS: int = Field(default=int(os.getenv("ML_SALES_STORE_DAYS", "730")))
+    ML_SALES_STORE_MAX_TENANTS: int = Field(default=int(os.getenv("ML_SALES_STORE_MAX_TENANTS", "500")))
+    ML_SALES_STORE_OVERLAP_SECONDS: int = Field(default=int(os.getenv("ML_SALES_STORE_OVERLAP_SECONDS", "300")))
+
+    # update_business_features por lotes: una RPC (get_ml_features_batch) por cada
+    # BATCH_TENANTS negocios y upserts de ml_features de UPSERT_CHUNK filas.
+    # Disabled = per-tenant reads/upserts.
+    ML_FEATURES_BATCH_ENABLED: bool = Field(default=os.getenv("ML_FEATURES_BATCH_ENABLED", "true").lower() == "true")
+    ML_FEATURES_BATCH_TENANTS: int = Field(default=int(os.getenv("ML_FEATURES_BATCH_TENANTS", "500")))
+    ML_FEATURES_UPSERT_CHUNK: int = Field(default=int(os.getenv("ML_FEATURES_UPSERT_CHUNK", "500")))
 
     # Multi-tenant control
     # "*" = all tenants; otherwise comma-separated list of tenant_ids
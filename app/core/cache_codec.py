@@ -0,0 +1,231 @@
+"""
+Codec binario para el cache L2 (Redis) de app/core/cache_manager.py
+
+Formato: MAGIC (3 bytes) + codec (1 byte) + compresión (1 byte) + payload.
+  - codec 1: msgpack con tipos extendidos (datetime, date, Decimal, UUID, numpy)
+  - codec 2: JSON con marcadores de tipo (fallback si msgpack no está instalado)
+  - compresión 0: ninguna, 1: zlib, 2: zstd (solo por encima de CACHE_COMPRESS_MIN_BYTES)
+
+Los valores sin cabecera son el formato anterior (texto JSON) y se siguen
+leyendo, así que el cambio de codec se puede desplegar sin vaciar Redis.
+"""
+from __future__ import annotations
+
+import base64
+import datetime
+import json
+import logging
+import uuid
+import zlib
+from decimal import Decimal
+from typing import cast
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depende del entorno
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depende del entorno
+    zstandard = None
+
+MAGIC = b"\x00CC"
+
+CODEC_MSGPACK = 1
+CODEC_JSON = 2
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+
+_EXT_DATETIME = 1
+_EXT_DATE = 2
+_EXT_DECIMAL = 3
+_EXT_NDARRAY = 4
+_EXT_UUID = 5
+
+
+class CodecError(ValueError):
+    """Payload de cache ilegible (codec o compresión no disponibles, datos corruptos)."""
+
+
+def _is_numpy(obj: object) -> bool:
+    return type(obj).__module__ == "numpy"
+
+
+def _ndarray_parts(arr: object) -> tuple[str, list[int], bytes] | None:
+    dtype = getattr(arr, "dtype", None)
+    if dtype is None or getattr(dtype, "hasobject", True):
+        return None
+    contiguous = cast(object, getattr(arr, "copy")(order="C"))
+    return str(getattr(dtype, "str")), list(getattr(arr, "shape")), cast(bytes, getattr(contiguous, "tobytes")())
+
+
+def _ndarray_from_parts(dtype: str, shape: list[int], data: bytes) -> object:
+    import numpy as np
+
+    return np.frombuffer(data, dtype=np.dtype(dtype)).reshape(shape).copy()
+
+
+# ==================== MSGPACK ====================
+
+def _msgpack_default(obj: object) -> object:
+    if isinstance(obj, datetime.datetime):
+        return msgpack.ExtType(_EXT_DATETIME, obj.isoformat().encode())
+    if isinstance(obj, datetime.date):
+        return msgpack.ExtType(_EXT_DATE, obj.isoformat().encode())
+    if isinstance(obj, Decimal):
+        return msgpack.ExtType(_EXT_DECIMAL, str(obj).encode())
+    if isinstance(obj, uuid.UUID):
+        return msgpack.ExtType(_EXT_UUID, obj.bytes)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if _is_numpy(obj):
+        if hasattr(obj, "shape") and hasattr(obj, "tobytes") and getattr(obj, "ndim", 0) > 0:
+            parts = _ndarray_parts(obj)
+            if parts is not None:
+                return msgpack.ExtType(_EXT_NDARRAY, msgpack.packb(list(parts), use_bin_type=True))
+            return cast(object, getattr(obj, "tolist")())
+        if hasattr(obj, "item"):
+            return cast(object, getattr(obj, "item")())
+    # Mismo criterio que el json.dumps(default=str) anterior
+    return str(obj)
+
+
+def _msgpack_ext_hook(code: int, data: bytes) -> object:
+    if code == _EXT_DATETIME:
+        return datetime.datetime.fromisoformat(data.decode())
+    if code == _EXT_DATE:
+        return datetime.date.fromisoformat(data.decode())
+    if code == _EXT_DECIMAL:
+        return Decimal(data.decode())
+    if code == _EXT_UUID:
+        return uuid.UUID(bytes=data)
+    if code == _EXT_NDARRAY:
+        dtype, shape, raw = msgpack.unpackb(data, raw=False)
+        return _ndarray_from_parts(dtype, shape, raw)
+    return msgpack.ExtType(code, data)
+
+
+# ==================== JSON (FALLBACK) ====================
+
+def _json_default(obj: object) -> object:
+    if isinstance(obj, datetime.datetime):
+        return {"__t": "dt", "v": obj.isoformat()}
+    if isinstance(obj, datetime.date):
+        return {"__t": "d", "v": obj.isoformat()}
+    if isinstance(obj, Decimal):
+        return {"__t": "dec", "v": str(obj)}
+    if isinstance(obj, uuid.UUID):
+        return {"__t": "uuid", "v": str(obj)}
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if _is_numpy(obj):
+        if hasattr(obj, "shape") and hasattr(obj, "tobytes") and getattr(obj, "ndim", 0) > 0:
+            parts = _ndarray_parts(obj)
+            if parts is not None:
+                dtype, shape, raw = parts
+                return {"__t": "nd", "dtype": dtype, "shape": shape, "v": base64.b64encode(raw).decode()}
+            return cast(object, getattr(obj, "tolist")())
+        if hasattr(obj, "item"):
+            return cast(object, getattr(obj, "item")())
+    return str(obj)
+
+
+def _json_object_hook(obj: dict[str, object]) -> object:
+    kind = obj.get("__t")
+    if not isinstance(kind, str) or "v" not in obj:
+        return obj
+    value = str(obj["v"])
+    if kind == "dt":
+        return datetime.datetime.fromisoformat(value)
+    if kind == "d":
+        return datetime.date.fromisoformat(value)
+    if kind == "dec":
+        return Decimal(value)
+    if kind == "uuid":
+        return uuid.UUID(value)
+    if kind == "nd":
+        return _ndarray_from_parts(str(obj["dtype"]), cast(list[int], obj["shape"]), base64.b64decode(value))
+    return obj
+
+
+# ==================== API ====================
+
+def _preferred_codec() -> int:
+    if settings.CACHE_CODEC == "msgpack" and msgpack is not None:
+        return CODEC_MSGPACK
+    return CODEC_JSON
+
+
+def _preferred_compression() -> int:
+    if settings.CACHE_COMPRESSION == "zstd" and zstandard is not None:
+        return COMPRESSION_ZSTD
+    if settings.CACHE_COMPRESSION in ("zstd", "zlib"):
+        return COMPRESSION_ZLIB
+    return COMPRESSION_NONE
+
+
+def encode(value: object, codec: int | None = None, compression: int | None = None) -> bytes:
+    """Serializar un valor para Redis con la cabecera de versión."""
+    codec = _preferred_codec() if codec is None else codec
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise CodecError("msgpack no está instalado")
+        payload = cast(bytes, msgpack.packb(value, default=_msgpack_default, use_bin_type=True, datetime=False))
+    else:
+        payload = json.dumps(value, default=_json_default, separators=(",", ":")).encode()
+
+    compression = _preferred_compression() if compression is None else compression
+    if compression == COMPRESSION_NONE or len(payload) < settings.CACHE_COMPRESS_MIN_BYTES:
+        compression = COMPRESSION_NONE
+    elif compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise CodecError("zstandard no está instalado")
+        payload = zstandard.ZstdCompressor(level=3).compress(payload)
+    else:
+        payload = zlib.compress(payload, 6)
+    return MAGIC + bytes((codec, compression)) + payload
+
+
+def decode(data: bytes | str) -> object:
+    """Deserializar un valor de Redis (formato con cabecera o JSON previo)."""
+    if isinstance(data, str):
+        data = data.encode()
+    if not data.startswith(MAGIC):
+        # Formato anterior: json.dumps(value, default=str)
+        try:
+            return cast(object, json.loads(data))
+        except ValueError as e:
+            raise CodecError(f"Valor de cache ilegible: {e}") from e
+
+    if len(data) < len(MAGIC) + 2:
+        raise CodecError("Cabecera de cache incompleta")
+    codec, compression = data[len(MAGIC)], data[len(MAGIC) + 1]
+    payload = data[len(MAGIC) + 2:]
+    try:
+        if compression == COMPRESSION_ZSTD:
+            if zstandard is None:
+                raise CodecError("zstandard no está instalado")
+            payload = zstandard.ZstdDecompressor().decompress(payload)
+        elif compression == COMPRESSION_ZLIB:
+            payload = zlib.decompress(payload)
+        elif compression != COMPRESSION_NONE:
+            raise CodecError(f"Compresión desconocida: {compression}")
+
+        if codec == CODEC_MSGPACK:
+            if msgpack is None:
+                raise CodecError("msgpack no está instalado")
+            return cast(object, msgpack.unpackb(payload, raw=False, ext_hook=_msgpack_ext_hook, strict_map_key=False))
+        if codec == CODEC_JSON:
+            return cast(object, json.loads(payload, object_hook=_json_object_hook))
+    except CodecError:
+        raise
+    except Exception as e:
+        raise CodecError(f"Valor de cache corrupto: {e}") from e
+    raise CodecError(f"Codec desconocido: {codec}")
@@ -1,12 +1,19 @@
 """
 Decoradores para cachear funciones automáticamente
 """
+import asyncio
+import concurrent.futures
 import functools
 import hashlib
 import inspect
 import json
-from typing import Callable, Protocol, ParamSpec, TypeVar, cast
+import math
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Protocol, ParamSpec, TypeVar, cast
 from app.core.cache_manager import cache_manager
+from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
@@ -38,100 +45,327 @@ def _extract_param(
             return args[index]
     return "unknown"
 
+def business_scope(*args: object, **kwargs: object) -> str:
+    """Scope de invalidación por negocio (business_id como primer parámetro)."""
+    return str(_extract_param(args, kwargs, 'business_id', 0, 1))
+
 class CacheableFunction(Protocol[P, R]):
     """Protocol para funciones con soporte de caché e invalidación"""
     def __call__(self, *args: P.args, **kwargs: P.kwargs) -> R: ...
     def invalidate_cache(self, *args: P.args, **kwargs: P.kwargs) -> None: ...
 
+# ==================== SINGLE-FLIGHT / STALE-WHILE-REVALIDATE ====================
+
+_ENVELOPE = "__cached__"
+_LEASE_POLL_SECONDS = 0.1
+
+# Cálculos en curso por clave (un solo cálculo por proceso)
+_inflight_lock = threading.Lock()
+_inflight: dict[str, concurrent.futures.Future[object]] = {}
+_inflight_async: dict[tuple[int, str], asyncio.Future[object]] = {}
+_background_tasks: set[asyncio.Task[None]] = set()
+# Refrescos en segundo plano lanzados por este proceso (uno por clave)
+_refreshing: set[str] = set()
+
+def _flight_key(namespace: str, scope: str | None, cache_key: str) -> str:
+    """Clave de coalescencia: con key_func el cache_key solo no distingue funciones."""
+    return f"{namespace}:{scope or ''}:{cache_key}"
+
+def _claim_refresh(flight_key: str) -> bool:
+    """Reserva el refresco de una clave en el proceso (False si ya hay uno en curso)."""
+    with _inflight_lock:
+        if flight_key in _refreshing:
+            return False
+        _refreshing.add(flight_key)
+        return True
+
+def _finish_refresh(flight_key: str) -> None:
+    with _inflight_lock:
+        _refreshing.discard(flight_key)
+
+def _wrap(value: object, ttl: int, delta: float) -> dict[str, object]:
+    """Valor + vencimiento lógico + costo de cálculo (para refresco anticipado)."""
+    return {_ENVELOPE: 1, "value": value, "expires_at": time.time() + ttl, "delta": delta}
+
+def _unwrap(entry: object) -> tuple[object, float, float]:
+    """(valor, expires_at, delta). Entradas previas sin envoltorio se consideran vigentes."""
+    if isinstance(entry, dict) and entry.get(_ENVELOPE) == 1:
+        env = cast(dict[str, object], entry)
+        expires_at = env.get("expires_at")
+        delta = env.get("delta")
+        return (
+            env.get("value"),
+            float(expires_at) if isinstance(expires_at, (int, float)) else 0.0,
+            float(delta) if isinstance(delta, (int, float)) else 0.0,
+        )
+    return entry, float("inf"), 0.0
+
+def _should_refresh(expires_at: float, delta: float, beta: float) -> bool:
+    """
+    Refresco anticipado probabilístico (XFetch): cuanto más cerca del vencimiento
+    y más caro el cálculo, más probable que un llamador lo recalcule antes.
+    """
+    now = time.time()
+    if now >= expires_at:
+        return True
+    if beta <= 0 or delta <= 0:
+        return False
+    return now - delta * beta * math.log(1.0 - random.random()) >= expires_at
+
+def _join_sync(flight_key: str, compute: Callable[[], object]) -> object:
+    """Un solo `compute` por clave en el proceso; el resto espera su resultado."""
+    with _inflight_lock:
+        future = _inflight.get(flight_key)
+        leader = future is None
+        if future is None:
+            future = concurrent.futures.Future()
+            _inflight[flight_key] = future
+    if not leader:
+        return future.result()
+    try:
+        result = compute()
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _ = _inflight.pop(flight_key, None)
+
+async def _join_async(flight_key: str, compute: Callable[[], Awaitable[object]]) -> object:
+    """Versión asyncio de _join_sync (futuros por event loop)."""
+    loop = asyncio.get_running_loop()
+    key = (id(loop), flight_key)
+    future = _inflight_async.get(key)
+    if future is not None:
+        return await asyncio.shield(future)
+    future = loop.create_future()
+    _inflight_async[key] = future
+    try:
+        result = await compute()
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        _ = future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        _ = future.exception()  # evitar "exception was never retrieved" si nadie esperaba
+        raise
+    finally:
+        _ = _inflight_async.pop(key, None)
+
 def cached(
     namespace: str,
     ttl: int | None = None,
     key_func: Callable[..., str] | None = None,
+    scope_func: Callable[..., str] | None = None,
+    stale_ttl: int = 0,
+    early_refresh: bool = False,
+    early_refresh_beta: float | None = None,
 ) -> Callable[[Callable[P, R]], Callable[P, R]]:
     """
     Decorador para cachear resultados de funciones
     
+    Los llamadores concurrentes de una misma clave comparten un único cálculo
+    (futuro por proceso + lease en Redis entre procesos). Con `stale_ttl` el
+    valor vencido se sigue sirviendo ese tiempo mientras un solo worker lo
+    recalcula en segundo plano.
+    
     Args:
         namespace: Categoría del cache (ml_features, notification_rules, etc.)
         ttl: Time to live en segundos
         key_func: Función personalizada para generar la clave de cache
+        scope_func: Grupo de invalidación de la clave (ver CacheManager.invalidate_scope)
+        stale_ttl: Segundos que se sirve el valor vencido mientras se refresca
+        early_refresh: Activa el refresco anticipado (requiere lease en Redis)
+        early_refresh_beta: Agresividad del refresco anticipado; un valor explícito
+            lo activa (default CACHE_EARLY_REFRESH_BETA, 0 lo desactiva)
     """
+    fresh_ttl = ttl or cache_manager.default_ttl
+    stored_ttl = fresh_ttl + max(0, stale_ttl)
+    if early_refresh_beta is not None:
+        beta = early_refresh_beta
+    else:
+        beta = settings.CACHE_EARLY_REFRESH_BETA if early_refresh else 0.0
+    lease_seconds = settings.CACHE_LEASE_SECONDS
+
     def decorator(func: Callable[P, R]) -> CacheableFunction[P, R]:
+        def _make_key(args: tuple[object, ...], kwargs: dict[str, object]) -> str:
+            if key_func:
+                return key_func(*args, **kwargs)
+            # Generar clave automática basada en argumentos (tipado explícito)
+            key_data: dict[str, object] = {
+                'func': func.__name__,
+                'args': args,
+                'kwargs': dict(kwargs),
+            }
+            key_str = json.dumps(key_data, sort_keys=True, default=str)
+            return hashlib.md5(key_str.encode()).hexdigest()
+
+        def _store(cache_key: str, scope: str | None, result: object, delta: float) -> None:
+            if result is not None:
+                cache_manager.set(namespace, cache_key, _wrap(result, fresh_ttl, delta), stored_ttl, scope=scope)
+                logger.debug(f"Cache set para {func.__name__}: {cache_key}")
+
+        def _lookup(cache_key: str, scope: str | None) -> tuple[object, float, float] | None:
+            entry = cache_manager.get(namespace, cache_key, stored_ttl, scope=scope)
+            if entry is None:
+                return None
+            value, expires_at, delta = _unwrap(entry)
+            return (value, expires_at, delta) if value is not None else None
+
+        def _start_refresh(cache_key: str, scope: str | None, expires_at: float) -> bool:
+            """
+            Decide si este llamador lanza el refresco: uno por clave en el proceso y,
+            entre procesos, quien tome el lease. El anticipado (valor aún vigente)
+            solo corre con un lease real de Redis.
+            """
+            flight_key = _flight_key(namespace, scope, cache_key)
+            if not _claim_refresh(flight_key):
+                return False
+            early = time.time() < expires_at
+            if cache_manager.acquire_lease(namespace, cache_key, lease_seconds, scope=scope, shared_only=early):
+                return True
+            _finish_refresh(flight_key)
+            return False
+
         if inspect.iscoroutinefunction(func):
+            async def _compute_async(
+                cache_key: str, scope: str | None, args: tuple[object, ...], kwargs: dict[str, object]
+            ) -> object:
+                started = time.perf_counter()
+                result = await func(*args, **kwargs)
+                _store(cache_key, scope, result, time.perf_counter() - started)
+                return result
+
+            async def _load_async(
+                cache_key: str, scope: str | None, args: tuple[object, ...], kwargs: dict[str, object]
+            ) -> object:
+                # Otro proceso recalculando: esperar su resultado hasta que venza el lease
+                if not cache_manager.acquire_lease(namespace, cache_key, lease_seconds, scope=scope):
+                    deadline = time.monotonic() + lease_seconds
+                    while time.monotonic() < deadline:
+                        await asyncio.sleep(_LEASE_POLL_SECONDS)
+                        found = _lookup(cache_key, scope)
+                        if found is not None:
+                            return found[0]
+                    return await _compute_async(cache_key, scope, args, kwargs)
+                try:
+                    return await _compute_async(cache_key, scope, args, kwargs)
+                finally:
+                    cache_manager.release_lease(namespace, cache_key, scope=scope)
+
+            async def _refresh_async(
+                cache_key: str, scope: str | None, args: tuple[object, ...], kwargs: dict[str, object]
+            ) -> None:
+                flight_key = _flight_key(namespace, scope, cache_key)
+                try:
+                    _ = await _join_async(flight_key, lambda: _compute_async(cache_key, scope, args, kwargs))
+                except Exception as e:
+                    logger.warning(f"Refresh en segundo plano falló para {func.__name__}: {e}")
+                finally:
+                    cache_manager.release_lease(namespace, cache_key, scope=scope)
+                    _finish_refresh(flight_key)
+
             @functools.wraps(func)
             async def async_wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
-                # Generar clave de cache
-                if key_func:
-                    cache_key = key_func(*args, **kwargs)
-                else:
-                    # Generar clave automática basada en argumentos (tipado explícito)
-                    key_data: dict[str, object] = {
-                        'func': func.__name__,
-                        'args': cast(tuple[object, ...], args),
-                        'kwargs': cast(dict[str, object], dict(kwargs)),
-                    }
-                    key_str = json.dumps(key_data, sort_keys=True, default=str)
-                    cache_key = hashlib.md5(key_str.encode()).hexdigest()
-
-                # Intentar obtener del cache
-                cached_result = cache_manager.get(namespace, cache_key, ttl)
-                if cached_result is not None:
-                    logger.debug(f"Cache hit para {func.__name__}: {cache_key}")
-                    return cast(R, cached_result)
-
-                # Ejecutar función y cachear resultado
-                result: R = await func(*args, **kwargs)
-                if result is not None:
-                    cache_manager.set(namespace, cache_key, result, ttl)
-                    logger.debug(f"Cache set para {func.__name__}: {cache_key}")
+                a = cast(tuple[object, ...], args)
+                kw = cast(dict[str, object], dict(kwargs))
+                cache_key = _make_key(a, kw)
+                scope = scope_func(*args, **kwargs) if scope_func else None
 
-                return result
+                found = _lookup(cache_key, scope)
+                if found is not None:
+                    value, expires_at, delta = found
+                    if not _should_refresh(expires_at, delta, beta):
+                        logger.debug(f"Cache hit para {func.__name__}: {cache_key}")
+                        return cast(R, value)
+                    # Vencido (dentro de stale_ttl) o refresco anticipado: un solo worker recalcula
+                    if _start_refresh(cache_key, scope, expires_at):
+                        task = asyncio.create_task(_refresh_async(cache_key, scope, a, kw))
+                        _background_tasks.add(task)
+                        task.add_done_callback(_background_tasks.discard)
+                    return cast(R, value)
+
+                result = await _join_async(
+                    _flight_key(namespace, scope, cache_key), lambda: _load_async(cache_key, scope, a, kw)
+                )
+                return cast(R, result)
             wrapper = async_wrapper
         else:
+            def _compute_sync(
+                cache_key: str, scope: str | None, args: tuple[object, ...], kwargs: dict[str, object]
+            ) -> object:
+                started = time.perf_counter()
+                result = func(*args, **kwargs)
+                _store(cache_key, scope, result, time.perf_counter() - started)
+                return result
+
+            def _load_sync(
+                cache_key: str, scope: str | None, args: tuple[object, ...], kwargs: dict[str, object]
+            ) -> object:
+                # Otro proceso recalculando: esperar su resultado hasta que venza el lease
+                if not cache_manager.acquire_lease(namespace, cache_key, lease_seconds, scope=scope):
+                    deadline = time.monotonic() + lease_seconds
+                    while time.monotonic() < deadline:
+                        time.sleep(_LEASE_POLL_SECONDS)
+                        found = _lookup(cache_key, scope)
+                        if found is not None:
+                            return found[0]
+                    return _compute_sync(cache_key, scope, args, kwargs)
+                try:
+                    return _compute_sync(cache_key, scope, args, kwargs)
+                finally:
+                    cache_manager.release_lease(namespace, cache_key, scope=scope)
+
+            def _refresh_sync(
+                cache_key: str, scope: str | None, args: tuple[object, ...], kwargs: dict[str, object]
+            ) -> None:
+                flight_key = _flight_key(namespace, scope, cache_key)
+                try:
+                    _ = _join_sync(flight_key, lambda: _compute_sync(cache_key, scope, args, kwargs))
+                except Exception as e:
+                    logger.warning(f"Refresh en segundo plano falló para {func.__name__}: {e}")
+                finally:
+                    cache_manager.release_lease(namespace, cache_key, scope=scope)
+                    _finish_refresh(flight_key)
+
             @functools.wraps(func)
             def sync_wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
-                # Generar clave de cache
-                if key_func:
-                    cache_key = key_func(*args, **kwargs)
-                else:
-                    # Generar clave automática basada en argumentos (tipado explícito)
-                    key_data: dict[str, object] = {
-                        'func': func.__name__,
-                        'args': cast(tuple[object, ...], args),
-                        'kwargs': cast(dict[str, object], dict(kwargs)),
-                    }
-                    key_str = json.dumps(key_data, sort_keys=True, default=str)
-                    cache_key = hashlib.md5(key_str.encode()).hexdigest()
-
-                # Intentar obtener del cache
-                cached_result = cache_manager.get(namespace, cache_key, ttl)
-                if cached_result is not None:
-                    logger.debug(f"Cache hit para {func.__name__}: {cache_key}")
-                    return cast(R, cached_result)
-
-                # Ejecutar función y cachear resultado
-                result: R = func(*args, **kwargs)
-                if result is not None:
-                    cache_manager.set(namespace, cache_key, result, ttl)
-                    logger.debug(f"Cache set para {func.__name__}: {cache_key}")
+                a = cast(tuple[object, ...], args)
+                kw = cast(dict[str, object], dict(kwargs))
+                cache_key = _make_key(a, kw)
+                scope = scope_func(*args, **kwargs) if scope_func else None
 
-                return result
+                found = _lookup(cache_key, scope)
+                if found is not None:
+                    value, expires_at, delta = found
+                    if not _should_refresh(expires_at, delta, beta):
+                        logger.debug(f"Cache hit para {func.__name__}: {cache_key}")
+                        return cast(R, value)
+                    # Vencido (dentro de stale_ttl) o refresco anticipado: un solo worker recalcula
+                    if _start_refresh(cache_key, scope, expires_at):
+                        threading.Thread(
+                            target=_refresh_sync,
+                            args=(cache_key, scope, a, kw),
+                            name=f"cache-refresh-{func.__name__}",
+                            daemon=True,
+                        ).start()
+                    return cast(R, value)
+
+                result = _join_sync(
+                    _flight_key(namespace, scope, cache_key), lambda: _load_sync(cache_key, scope, a, kw)
+                )
+                return cast(R, result)
             wrapper = sync_wrapper
         
         # Agregar método para invalidar cache
         def invalidate_cache(*args: P.args, **kwargs: P.kwargs) -> None:
-            if key_func:
-                cache_key = key_func(*args, **kwargs)
-            else:
-                key_data: dict[str, object] = {
-                    'func': func.__name__,
-                    'args': cast(tuple[object, ...], args),
-                    'kwargs': cast(dict[str, object], dict(kwargs)),
-                }
-                key_str = json.dumps(key_data, sort_keys=True, default=str)
-                cache_key = hashlib.md5(key_str.encode()).hexdigest()
-            
-            cache_manager.delete(namespace, cache_key)
+            cache_key = _make_key(cast(tuple[object, ...], args), cast(dict[str, object], dict(kwargs)))
+            scope = scope_func(*args, **kwargs) if scope_func else None
+            cache_manager.delete(namespace, cache_key, scope=scope)
             logger.info(f"Cache invalidated para {func.__name__}: {cache_key}")
         
         # Adjuntar atributo con cast doble para el type checker (func -> object -> Protocol)
@@ -147,7 +381,7 @@ def cache_ml_features(ttl: int = 3600) -> Callable[[Callable[P, R]], Callable[P,
         business_id = _extract_param(args, kwargs, 'business_id', 0, 1)
         return f"features_{business_id}"
     
-    return cached('ml_features', ttl, key_func)
+    return cached('ml_features', ttl, key_func, scope_func=business_scope)
 
 def cache_ml_predictions(ttl: int = 1800) -> Callable[[Callable[P, R]], Callable[P, R]]:  # 30 minutos
     """Decorador específico para predicciones ML"""
@@ -156,7 +390,7 @@ def cache_ml_predictions(ttl: int = 1800) -> Callable[[Callable[P, R]], Callable
         prediction_type = _extract_param(args, kwargs, 'prediction_type', 1, 2) or 'default'
         return f"prediction_{business_id}_{prediction_type}"
     
-    return cached('ml_predictions', ttl, key_func)
+    return cached('ml_predictions', ttl, key_func, scope_func=business_scope)
 
 def cache_notification_rules(ttl: int = 600) -> Callable[[Callable[P, R]], Callable[P, R]]:  # 10 minutos
     """Decorador específico para reglas de notificación"""
@@ -203,19 +437,19 @@ def invalidate_on_update(
                 if business_id and business_id != "unknown":
                     bid = str(business_id)
                     if cache_namespace == 'ml_features':
-                        # Invalidate all feature keys for this tenant (prefix-based)
-                        cache_manager.invalidate_pattern(f"{cache_namespace}:features_{bid}")
-                        logger.info(f"Cache invalidated after update (pattern): {cache_namespace}:features_{bid}*")
+                        # Invalidate all feature keys for this tenant (generation bump)
+                        cache_manager.invalidate_scope(cache_namespace, bid)
+                        logger.info(f"Cache invalidated after update (scope): {cache_namespace}:{bid}")
                     elif cache_namespace == 'ml_predictions':
                         prediction_type = _extract_param(args, kwargs, 'prediction_type', 1, 2)
                         if prediction_type and prediction_type != "unknown":
                             cache_key = f"prediction_{bid}_{prediction_type}"
-                            cache_manager.delete(cache_namespace, cache_key)
+                            cache_manager.delete(cache_namespace, cache_key, scope=bid)
                             logger.info(f"Cache invalidated after update: {cache_namespace}:{cache_key}")
                         else:
                             # Invalidar todas las predicciones para el negocio si no se especifica tipo
-                            cache_manager.invalidate_pattern(f"{cache_namespace}:prediction_{bid}_")
-                            logger.info(f"Cache invalidated after update (pattern): {cache_namespace}:prediction_{bid}_*")
+                            cache_manager.invalidate_scope(cache_namespace, bid)
+                            logger.info(f"Cache invalidated after update (scope): {cache_namespace}:{bid}")
                     elif cache_namespace == 'notification_rules':
                         cache_key = f"rules_{bid}"
                         cache_manager.delete(cache_namespace, cache_key)
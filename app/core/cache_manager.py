@@ -1,59 +1,147 @@
 """
 Sistema de caché multi-nivel para features ML y reglas de notificación
-L1: Memoria local (LRU)
-L2: Redis 
-L3: Fallback a base de datos
+L1: Memoria local (LRU acotado, TTL por entrada)
+L2: Redis (codec binario comprimido, ver app/core/cache_codec.py)
+
+Sin fallback a base de datos: ante un miss, el dato lo calcula quien lo pide
+(@cached) o el loader registrado para el namespace (get_or_load).
 """
-import json
+import threading
 import time
-from typing import cast, Protocol, runtime_checkable
-from collections.abc import Mapping, Sequence
+from collections import OrderedDict
+from typing import Callable, TypeVar, cast, Protocol, runtime_checkable
+from collections.abc import Iterable, Mapping, Sequence
 # datetime y timedelta no se usan actualmente, comentadas para evitar warnings
 # from datetime import datetime, timedelta
 import redis
 import logging
+from app.core import cache_codec
 from app.core.config import settings
-from supabase.client import create_client
 
 logger = logging.getLogger(__name__)
 
-@runtime_checkable
-class SupabaseQuery(Protocol):
-    def select(self, columns: str) -> "SupabaseQuery": ...
-    def eq(self, column: str, value: object) -> "SupabaseQuery": ...
-    def order(self, column: str, desc: bool = False) -> "SupabaseQuery": ...
-    def limit(self, count: int) -> "SupabaseQuery": ...
-    def execute(self) -> object: ...
+T = TypeVar("T")
+
+# Loader de un namespace: identificador -> valor (None = no existe, no se cachea)
+CacheLoader = Callable[[str], object | None]
 
 @runtime_checkable
-class SupabaseClientLike(Protocol):
-    def table(self, name: str) -> SupabaseQuery: ...
+class RedisPipelineLike(Protocol):
+    def setex(self, key: str, time: int, value: bytes) -> object: ...
+    def execute(self) -> object: ...
 
 @runtime_checkable
 class RedisClientLike(Protocol):
     def get(self, key: str) -> object: ...
-    def setex(self, key: str, time: int, value: str) -> object: ...
-    def delete(self, *keys: str) -> object: ...
-    def keys(self, pattern: str) -> Sequence[str]: ...
+    def setex(self, key: str, time: int, value: bytes) -> object: ...
+    def set(self, name: str, value: str, ex: int | None = None, nx: bool = False) -> object: ...
+    def delete(self, *keys: str | bytes) -> object: ...
+    def incr(self, name: str) -> object: ...
+    def scan_iter(self, match: str, count: int) -> Iterable[str | bytes]: ...
+    def mget(self, keys: Sequence[str]) -> Sequence[object]: ...
+    def pipeline(self, transaction: bool = True) -> RedisPipelineLike: ...
     def ping(self) -> object: ...
     def info(self) -> Mapping[str, object]: ...
 
+class _MemoryLRU:
+    """
+    Cache L1 acotado: LRU por cantidad de entradas, cada una con su propio
+    vencimiento (el TTL con que se guardó). Seguro entre threads.
+    """
+
+    def __init__(self, max_entries: int):
+        self._max_entries: int = max(1, max_entries)
+        self._entries: OrderedDict[str, tuple[object, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.expirations: int = 0
+
+    def get(self, key: str) -> object | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: object, ttl: int):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                _ = self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            _ = self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self._lock:
+            keys = [k for k in self._entries if k.startswith(prefix)]
+            for k in keys:
+                del self._entries[k]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "memory_entries": len(self._entries),
+                "memory_max_entries": self._max_entries,
+                "l1_hits": self.hits,
+                "l1_misses": self.misses,
+                "l1_evictions": self.evictions,
+                "l1_expirations": self.expirations,
+                "l1_hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Generaciones conocidas por proceso: se conservan un día para no volver atrás
+_GENERATION_MEMORY_TTL = 86400
+_GENERATION_PREFIX = "cache:gen:"
+_SCAN_BATCH = 500
+
+
 class CacheManager:
     """
     Gestor de caché multi-nivel con TTL configurable
+
+    Las claves con `scope` (p. ej. el tenant) incluyen la generación actual de
+    (namespace, scope); `invalidate_scope` incrementa ese contador en Redis
+    (O(1)) y las entradas anteriores quedan inalcanzables hasta vencer por TTL.
     """
     
-    def __init__(self, default_ttl: int = 3600):  # 1 hora por defecto
+    def __init__(self, default_ttl: int = 3600, max_memory_entries: int | None = None):  # 1 hora por defecto
         super().__init__()
         self.default_ttl: int = default_ttl
         self.redis_client: RedisClientLike | None = None
-        self.supabase: SupabaseClientLike | None = None
-        self._memory_cache: dict[str, object] = {}  # Cache L1 en memoria
-        self._memory_timestamps: dict[str, float] = {}
+        self._loaders: dict[str, tuple[CacheLoader, int | None]] = {}
+        # Cache L1 en memoria, acotado para que los workers no crezcan sin límite
+        self._memory = _MemoryLRU(max_memory_entries or settings.CACHE_L1_MAX_ENTRIES)
+        # "cache:gen:{ns}:{scope}" -> (generación, momento en que se leyó de Redis)
+        self._generations = _MemoryLRU(max_memory_entries or settings.CACHE_L1_MAX_ENTRIES)
+        self.generation_refresh: float = settings.CACHE_GENERATION_REFRESH_SECONDS
         
         # Inicializar conexiones
         self._init_redis()
-        self._init_supabase()
     
     def _init_redis(self):
         """Inicializar conexión Redis"""
@@ -64,7 +152,8 @@ class CacheManager:
                     object,
                     redis.from_url(
                         settings.CELERY_BROKER_URL,
-                        decode_responses=True,
+                        # Los valores son binarios (cache_codec): sin decodificar a str
+                        decode_responses=False,
                         socket_connect_timeout=5,
                         socket_timeout=5,
                     ),
@@ -77,60 +166,60 @@ class CacheManager:
             logger.warning(f"Redis no disponible, usando solo memoria: {e}")
             self.redis_client = None
     
-    def _init_supabase(self):
-        """Inicializar cliente Supabase"""
-        try:
-            # Casting intermedio vía object para satisfacer a Pyright con Protocols
-            self.supabase = cast(
-                SupabaseClientLike,
-                cast(
-                    object,
-                    create_client(
-                        settings.SUPABASE_URL,
-                        settings.SUPABASE_SERVICE_ROLE_KEY,
-                    ),
-                ),
-            )
-            logger.info("Supabase cache conectado correctamente")
-        except Exception as e:
-            logger.error(f"Error conectando Supabase: {e}")
-            self.supabase = None
-    
     def _generate_key(self, namespace: str, identifier: str) -> str:
         """Generar clave de caché consistente"""
         return f"cache:{namespace}:{identifier}"
     
-    def _is_expired(self, timestamp: float, ttl: int) -> bool:
-        """Verificar si un elemento ha expirado"""
-        return time.time() - timestamp > ttl
-    
+    # ==================== GENERACIONES POR SCOPE ====================
+
+    def _generation_key(self, namespace: str, scope: str) -> str:
+        return f"{_GENERATION_PREFIX}{namespace}:{scope}"
+
+    def _generation(self, namespace: str, scope: str) -> int:
+        """
+        Generación vigente de (namespace, scope). Se relee de Redis como mucho
+        cada `generation_refresh` segundos; nunca retrocede dentro del proceso.
+        """
+        gkey = self._generation_key(namespace, scope)
+        known = cast(tuple[int, float] | None, self._generations.get(gkey))
+        now = time.monotonic()
+        if known is not None and now - known[1] < self.generation_refresh:
+            return known[0]
+
+        generation = known[0] if known is not None else 0
+        if self.redis_client:
+            try:
+                raw = self.redis_client.get(gkey)
+                if isinstance(raw, (str, bytes, int)):
+                    generation = max(generation, int(raw))
+            except Exception as e:
+                logger.warning(f"Error leyendo generación de caché {gkey}: {e}")
+        self._generations.put(gkey, (generation, now), _GENERATION_MEMORY_TTL)
+        return generation
+
+    def _resolve_key(self, namespace: str, identifier: str, scope: str | None) -> str:
+        if scope is None:
+            return self._generate_key(namespace, identifier)
+        generation = self._generation(namespace, scope)
+        return f"cache:{namespace}:{scope}:g{generation}:{identifier}"
+
     # ==================== CACHE L1 (MEMORIA) ====================
     
-    def _get_from_memory(self, key: str, ttl: int) -> object | None:
-        """Obtener valor del cache L1 (memoria)"""
-        if key not in self._memory_cache:
-            return None
-        
-        timestamp = self._memory_timestamps.get(key, 0)
-        if self._is_expired(timestamp, ttl):
-            # Limpiar entrada expirada
-            _ = self._memory_cache.pop(key, None)
-            _ = self._memory_timestamps.pop(key, None)
-            return None
-        
-        logger.debug(f"Cache L1 HIT: {key}")
-        return self._memory_cache[key]
+    def _get_from_memory(self, key: str) -> object | None:
+        """Obtener valor del cache L1 (memoria); vence según el TTL con que se guardó"""
+        value = self._memory.get(key)
+        if value is not None:
+            logger.debug(f"Cache L1 HIT: {key}")
+        return value
     
-    def _set_to_memory(self, key: str, value: object):
+    def _set_to_memory(self, key: str, value: object, ttl: int):
         """Guardar valor en cache L1 (memoria)"""
-        self._memory_cache[key] = value
-        self._memory_timestamps[key] = time.time()
+        self._memory.put(key, value, ttl)
         logger.debug(f"Cache L1 SET: {key}")
     
     def _delete_from_memory(self, key: str):
         """Eliminar valor del cache L1"""
-        _ = self._memory_cache.pop(key, None)
-        _ = self._memory_timestamps.pop(key, None)
+        self._memory.delete(key)
     
     # ==================== CACHE L2 (REDIS) ====================
     
@@ -143,7 +232,10 @@ class CacheManager:
             value = self.redis_client.get(key)
             if value and isinstance(value, (str, bytes)):
                 logger.debug(f"Cache L2 HIT: {key}")
-                return cast(object, json.loads(value))
+                return cache_codec.decode(value)
+            return None
+        except cache_codec.CodecError as e:
+            logger.warning(f"Valor ilegible en Redis ({key}), se ignora: {e}")
             return None
         except Exception as e:
             logger.warning(f"Error leyendo Redis: {e}")
@@ -155,7 +247,7 @@ class CacheManager:
             return
         
         try:
-            serialized = json.dumps(value, default=str)
+            serialized = cache_codec.encode(value)
             _ = self.redis_client.setex(key, ttl, serialized)
             logger.debug(f"Cache L2 SET: {key} (TTL: {ttl}s)")
         except Exception as e:
@@ -172,116 +264,15 @@ class CacheManager:
         except Exception as e:
             logger.warning(f"Error eliminando de Redis: {e}")
   
-    # ==================== CACHE L3 (DATABASE FALLBACK) ====================
-
-    def _extract_from_identifier(self, namespace: str, identifier: str) -> dict[str, str]:
-        """Extrae tenant_id y/o tipos desde el identificador de caché específico por namespace.
-        Espera formatos:
-          - ml_features: "features_<tenant_id>[_...]"  (acepta sufijos como sales_timeseries_...)
-          - ml_predictions: "prediction_<tenant_id>_<prediction_type>"
-          - notification_rules: "rules_<tenant_id>"
-          - business_config: "config_<tenant_id>"
-        Si no coincide, retorna vacío.
-        """
-        try:
-            if namespace == "ml_features" and identifier.startswith("features_"):
-                # Acepta formas 'features_<tenant_id>' o con sufijos adicionales
-                rest = identifier.split("features_", 1)[1]
-                tenant_id = rest.split("_", 1)[0]
-                return {"tenant_id": tenant_id}
-            if namespace == "ml_predictions" and identifier.startswith("prediction_"):
-                _, rest = identifier.split("prediction_", 1)
-                parts = rest.split("_", 1)
-                if len(parts) == 2:
-                    return {"tenant_id": parts[0], "prediction_type": parts[1]}
-                else:
-                    return {"tenant_id": parts[0]}
-            if namespace == "notification_rules" and identifier.startswith("rules_"):
-                return {"tenant_id": identifier.split("rules_", 1)[1]}
-            if namespace == "business_config" and identifier.startswith("config_"):
-                return {"tenant_id": identifier.split("config_", 1)[1]}
-        except Exception:
-            pass
-        return {}
-
-    def _get_from_database(self, namespace: str, identifier: str) -> object | None:
-        """Fallback a base de datos según el namespace"""
-        if not self.supabase:
-            return None
-        
-        try:
-            params = self._extract_from_identifier(namespace, identifier)
-            tenant_id = params.get("tenant_id")
-            # Cliente Supabase ya no nulo (narrowing por el guard anterior)
-            sb: SupabaseClientLike = self.supabase
-            if namespace == "ml_features" and tenant_id:
-                # Obtener última fila de features por fecha
-                result = (
-                    sb
-                    .table("ml_features")
-                    .select("*")
-                    .eq("tenant_id", tenant_id)
-                    .order("feature_date", desc=True)
-                    .limit(1)
-                    .execute()
-                )
-                data_list = cast(list[object] | None, getattr(result, "data", None))
-                if data_list:
-                    return data_list[0]
-                return None
-            
-            elif namespace == "ml_predictions" and tenant_id:
-                query = (
-                    sb
-                    .table("ml_predictions")
-                    .select("*")
-                    .eq("tenant_id", tenant_id)
-                )
-                if "prediction_type" in params:
-                    query = query.eq("prediction_type", params["prediction_type"])
-                result = query.order("prediction_date", desc=True).limit(1).execute()
-                data_list = cast(list[object] | None, getattr(result, "data", None))
-                if data_list:
-                    return data_list[0]
-                return None
-            
-            elif namespace == "notification_rules" and tenant_id:
-                # Reglas activas por tenant
-                result = (
-                    sb
-                    .table("notification_rules")
-                    .select("*")
-                    .eq("tenant_id", tenant_id)
-                    .eq("active", True)
-                    .execute()
-                )
-                data_list = cast(list[object] | None, getattr(result, "data", None))
-                return data_list if isinstance(data_list, list) else None
-            
-            elif namespace == "business_config" and tenant_id:
-                result = (
-                    sb
-                    .table("tenant_settings")
-                    .select("*")
-                    .eq("tenant_id", tenant_id)
-                    .limit(1)
-                    .execute()
-                )
-                data_list = cast(list[object] | None, getattr(result, "data", None))
-                if data_list:
-                    return data_list[0]
-                return None
-            
-            # No fallback posible si el identificador no es parseable
-            return None
-        
-        except Exception as e:
-            logger.error(f"Error en fallback DB: {e}")
-            return None
-    
     # ==================== API PÚBLICA ====================
     
-    def get(self, namespace: str, identifier: str, ttl: int | None = None) -> object | None:
+    def get(
+        self,
+        namespace: str,
+        identifier: str,
+        ttl: int | None = None,
+        scope: str | None = None,
+    ) -> object | None:
         """
         Obtener valor del caché multi-nivel
         
@@ -289,12 +280,13 @@ class CacheManager:
             namespace: Categoría del dato (ml_features, notification_rules, etc.)
             identifier: ID único (business_id, user_id, etc.)
             ttl: Time to live en segundos (default: 1 hora)
+            scope: Grupo de invalidación (p. ej. tenant_id), ver invalidate_scope
         """
         ttl = ttl or self.default_ttl
-        key = self._generate_key(namespace, identifier)
+        key = self._resolve_key(namespace, identifier, scope)
         
         # L1: Intentar memoria
-        value = self._get_from_memory(key, ttl)
+        value = self._get_from_memory(key)
         if value is not None:
             return value
         
@@ -302,66 +294,243 @@ class CacheManager:
         value = self._get_from_redis(key)
         if value is not None:
             # Guardar en L1 para próximas consultas
-            self._set_to_memory(key, value)
+            self._set_to_memory(key, value, ttl)
             return value
         
-        # L3: Fallback a base de datos
-        value = self._get_from_database(namespace, identifier)
+        logger.debug(f"Cache MISS: {key}")
+        return None
+    
+    def register_loader(self, namespace: str, loader: CacheLoader, ttl: int | None = None):
+        """Registrar el loader de un namespace para get_or_load"""
+        self._loaders[namespace] = (loader, ttl)
+    
+    def get_or_load(
+        self,
+        namespace: str,
+        identifier: str,
+        ttl: int | None = None,
+        scope: str | None = None,
+        loader: Callable[[str], T | None] | None = None,
+    ) -> T | None:
+        """
+        Lectura a través del caché: ante un miss llama una sola vez al loader
+        (el explícito o el registrado para el namespace) y guarda el resultado.
+        """
+        value = self.get(namespace, identifier, ttl, scope=scope)
         if value is not None:
-            # Guardar en ambos niveles
-            self._set_to_memory(key, value)
-            self._set_to_redis(key, value, ttl)
-            logger.info(f"Cache MISS -> DB fallback: {key}")
-            return value
+            return cast(T, value)
         
-        logger.debug(f"Cache MISS completo: {key}")
-        return None
+        registered = self._loaders.get(namespace)
+        load = cast(Callable[[str], T | None] | None, loader or (registered[0] if registered else None))
+        if load is None:
+            raise LookupError(f"No hay loader registrado para el namespace '{namespace}'")
+        
+        loaded = load(identifier)
+        if loaded is not None:
+            self.set(namespace, identifier, loaded, ttl or (registered[1] if registered else None), scope=scope)
+        return loaded
+    
+    def get_many(
+        self,
+        namespace: str,
+        identifiers: Sequence[str],
+        ttl: int | None = None,
+        scope: str | None = None,
+    ) -> dict[str, object]:
+        """
+        Obtener varias claves: L1 primero y el resto en un solo MGET.
+        Devuelve solo los identificadores encontrados.
+        """
+        ttl = ttl or self.default_ttl
+        found: dict[str, object] = {}
+        missing: list[tuple[str, str]] = []
+        for identifier in identifiers:
+            key = self._resolve_key(namespace, identifier, scope)
+            value = self._get_from_memory(key)
+            if value is not None:
+                found[identifier] = value
+            else:
+                missing.append((identifier, key))
+        
+        if not missing or not self.redis_client:
+            return found
+        
+        try:
+            raw_values = self.redis_client.mget([key for _, key in missing])
+        except Exception as e:
+            logger.warning(f"Error leyendo Redis (MGET): {e}")
+            return found
+        
+        for (identifier, key), raw in zip(missing, raw_values):
+            if not raw or not isinstance(raw, (str, bytes)):
+                continue
+            try:
+                value = cache_codec.decode(raw)
+            except cache_codec.CodecError as e:
+                logger.warning(f"Valor ilegible en Redis ({key}), se ignora: {e}")
+                continue
+            self._set_to_memory(key, value, ttl)
+            found[identifier] = value
+        logger.debug(f"Cache MGET {namespace}: {len(found)}/{len(identifiers)} hits")
+        return found
+    
+    def set_many(
+        self,
+        namespace: str,
+        items: Mapping[str, object],
+        ttl: int | None = None,
+        scope: str | None = None,
+    ):
+        """Guardar varias claves en L1 y en Redis con un solo pipeline"""
+        ttl = ttl or self.default_ttl
+        keyed = [(self._resolve_key(namespace, identifier, scope), value) for identifier, value in items.items()]
+        for key, value in keyed:
+            self._set_to_memory(key, value, ttl)
+        
+        if not keyed or not self.redis_client:
+            return
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, value in keyed:
+                _ = pipe.setex(key, ttl, cache_codec.encode(value))
+            _ = pipe.execute()
+            logger.debug(f"Cache SET (pipeline) {namespace}: {len(keyed)} keys")
+        except Exception as e:
+            logger.warning(f"Error escribiendo Redis (pipeline): {e}")
     
-    def set(self, namespace: str, identifier: str, value: object, ttl: int | None = None):
+    def set(
+        self,
+        namespace: str,
+        identifier: str,
+        value: object,
+        ttl: int | None = None,
+        scope: str | None = None,
+    ):
         """
         Guardar valor en todos los niveles de caché
         """
         ttl = ttl or self.default_ttl
-        key = self._generate_key(namespace, identifier)
+        key = self._resolve_key(namespace, identifier, scope)
         
         # Guardar en ambos niveles
-        self._set_to_memory(key, value)
+        self._set_to_memory(key, value, ttl)
         self._set_to_redis(key, value, ttl)
         
         logger.info(f"Cache SET: {key}")
     
-    def delete(self, namespace: str, identifier: str):
+    def delete(self, namespace: str, identifier: str, scope: str | None = None):
         """
         Invalidar caché en todos los niveles
         """
-        key = self._generate_key(namespace, identifier)
+        key = self._resolve_key(namespace, identifier, scope)
         
         self._delete_from_memory(key)
         self._delete_from_redis(key)
         
         logger.info(f"Cache INVALIDATED: {key}")
     
+    def evict_local(self, namespace: str, identifier: str, scope: str | None = None):
+        """
+        Eliminar solo la copia L1 de este proceso (p. ej. al recibir una
+        invalidación por pub/sub de otro proceso que ya borró Redis)
+        """
+        self._delete_from_memory(self._resolve_key(namespace, identifier, scope))
+
+    def evict_local_namespace(self, namespace: str) -> int:
+        """
+        Eliminar todas las copias L1 sin scope de un namespace en este proceso
+        (p. ej. cuando se pudieron perder invalidaciones por pub/sub)
+        """
+        return self._memory.delete_prefix(self._generate_key(namespace, ""))
+
+    def invalidate_scope(self, namespace: str, scope: str):
+        """
+        Invalidar todas las claves de (namespace, scope) con un INCR en Redis.
+        Otros procesos lo ven al releer la generación (CACHE_GENERATION_REFRESH_SECONDS).
+        """
+        gkey = self._generation_key(namespace, scope)
+        known = cast(tuple[int, float] | None, self._generations.get(gkey))
+        generation = (known[0] if known is not None else 0) + 1
+        if self.redis_client:
+            try:
+                raw = self.redis_client.incr(gkey)
+                if isinstance(raw, (str, bytes, int)):
+                    generation = max(generation, int(raw))
+            except Exception as e:
+                logger.warning(f"Error incrementando generación {gkey}: {e}")
+        self._generations.put(gkey, (generation, time.monotonic()), _GENERATION_MEMORY_TTL)
+        logger.info(f"Cache scope invalidated: {namespace}:{scope} (gen {generation})")
+
+    def acquire_lease(
+        self, namespace: str, identifier: str, seconds: int, scope: str | None = None, shared_only: bool = False
+    ) -> bool:
+        """
+        Lease entre procesos para recalcular una clave (SET NX EX).
+        Sin Redis siempre se concede: la coalescencia queda solo dentro del proceso.
+        Con shared_only=True solo se concede si Redis lo otorgó.
+        """
+        if not self.redis_client:
+            return not shared_only
+        lease_key = f"{self._resolve_key(namespace, identifier, scope)}:lease"
+        try:
+            return bool(self.redis_client.set(lease_key, "1", ex=max(1, int(seconds)), nx=True))
+        except Exception as e:
+            logger.warning(f"Error tomando lease {lease_key}: {e}")
+            return not shared_only
+
+    def release_lease(self, namespace: str, identifier: str, scope: str | None = None):
+        """Liberar el lease tomado con acquire_lease"""
+        if not self.redis_client:
+            return
+        lease_key = f"{self._resolve_key(namespace, identifier, scope)}:lease"
+        try:
+            _ = self.redis_client.delete(lease_key)
+        except Exception as e:
+            logger.warning(f"Error liberando lease {lease_key}: {e}")
+
+    def _delete_matching(self, match: str, exclude_prefix: str | None = None) -> int:
+        """
+        Borrar claves de Redis por patrón con SCAN incremental (no bloquea como KEYS).
+        Las claves que empiezan con exclude_prefix se conservan.
+        """
+        if not self.redis_client:
+            return 0
+        excluded = exclude_prefix.encode() if exclude_prefix else None
+        deleted = 0
+        batch: list[str | bytes] = []
+        for key in self.redis_client.scan_iter(match=match, count=_SCAN_BATCH):
+            if excluded is not None:
+                raw = key.encode() if isinstance(key, str) else key
+                if raw.startswith(excluded):
+                    continue
+            batch.append(key)
+            if len(batch) >= _SCAN_BATCH:
+                _ = self.redis_client.delete(*batch)
+                deleted += len(batch)
+                batch = []
+        if batch:
+            _ = self.redis_client.delete(*batch)
+            deleted += len(batch)
+        return deleted
+
     def invalidate_pattern(self, pattern: str):
         """
-        Invalidar múltiples claves por patrón (solo Redis)
+        Invalidar múltiples claves sin scope por prefijo.
+        Recorre el keyspace con SCAN: para invalidar por tenant usar invalidate_scope.
         """
         # Limpiar L1 (memoria)
         mem_prefix = f"cache:{pattern}"
         try:
-            mem_keys = [k for k in list(self._memory_cache.keys()) if k.startswith(mem_prefix)]
-            for k in mem_keys:
-                _ = self._memory_cache.pop(k, None)
-                _ = self._memory_timestamps.pop(k, None)
+            _ = self._memory.delete_prefix(mem_prefix)
         except Exception as e:
             logger.warning(f"Error invalidando patrón en memoria: {e}")
 
         # Limpiar L2 (Redis)
         if self.redis_client:
             try:
-                keys = list(self.redis_client.keys(f"cache:{pattern}*"))
-                if keys:
-                    _ = self.redis_client.delete(*keys)
-                logger.info(f"Cache pattern invalidated: {pattern} ({len(keys)} keys)")
+                deleted = self._delete_matching(f"cache:{pattern}*")
+                logger.info(f"Cache pattern invalidated: {pattern} ({deleted} keys)")
             except Exception as e:
                 logger.warning(f"Error invalidando patrón en Redis: {e}")
     
@@ -369,16 +538,15 @@ class CacheManager:
         """
         Limpiar todo el caché
         """
-        # Limpiar memoria
-        self._memory_cache.clear()
-        self._memory_timestamps.clear()
+        # Limpiar memoria (las generaciones conocidas se conservan: no deben retroceder)
+        self._memory.clear()
         
-        # Limpiar Redis
+        # Limpiar Redis sin tocar los contadores cache:gen:*: si se borraran, el próximo
+        # INCR empezaría por debajo de la generación que otros procesos recuerdan
+        # (se quedan con max(conocida, redis)) y esa invalidación se ignoraría.
         if self.redis_client:
             try:
-                keys = list(self.redis_client.keys("cache:*"))
-                if keys:
-                    _ = self.redis_client.delete(*keys)
+                _ = self._delete_matching("cache:*", exclude_prefix=_GENERATION_PREFIX)
                 logger.info("Cache completamente limpiado")
             except Exception as e:
                 logger.warning(f"Error limpiando Redis: {e}")
@@ -388,9 +556,10 @@ class CacheManager:
         Obtener estadísticas del caché
         """
         stats: dict[str, object] = {
-            "memory_entries": len(self._memory_cache),
+            **self._memory.stats(),
+            "generation_scopes": len(self._generations),
             "redis_available": self.redis_client is not None,
-            "supabase_available": self.supabase is not None,
+            "loaders": sorted(self._loaders),
             "default_ttl": self.default_ttl
         }
         
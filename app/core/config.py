@@ -1,5 +1,6 @@
 import os
 import json
+import tempfile
 from typing import ClassVar, cast
 from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -81,6 +82,39 @@ class Settings(BaseSettings):
     SUPABASE_KEY: str = os.getenv("SUPABASE_KEY", "")
     SUPABASE_ANON_KEY: str = os.getenv("SUPABASE_ANON_KEY", "")
     SUPABASE_SERVICE_ROLE_KEY: str = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
+    # Shared PostgREST connection pool (one per worker process, see app/db/client_pool.py)
+    SUPABASE_HTTP2: bool = os.getenv("SUPABASE_HTTP2", "true").lower() == "true"
+    SUPABASE_HTTP_TIMEOUT: float = float(os.getenv("SUPABASE_HTTP_TIMEOUT", "30"))
+    SUPABASE_POOL_MAX_CONNECTIONS: int = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "50"))
+    SUPABASE_POOL_MAX_KEEPALIVE: int = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "20"))
+    SUPABASE_POOL_KEEPALIVE_EXPIRY: float = float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "60"))
+    # Per-read timeout for concurrent fan-out of independent reads (app/db/concurrent_reads.py)
+    DB_FANOUT_TIMEOUT: float = float(os.getenv("DB_FANOUT_TIMEOUT", "5"))
+    # Local verification of Supabase access tokens (see app/core/jwt_auth.py).
+    # Without SUPABASE_JWT_SECRET, HS256 tokens fall back to one GoTrue call per token.
+    SUPABASE_JWT_SECRET: str = os.getenv("SUPABASE_JWT_SECRET", "")
+    SUPABASE_JWT_AUDIENCE: str = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+    SUPABASE_JWKS_URL: str = os.getenv("SUPABASE_JWKS_URL", "")
+    AUTH_IDENTITY_CACHE_MAX_ENTRIES: int = int(os.getenv("AUTH_IDENTITY_CACHE_MAX_ENTRIES", "10000"))
+    # Resolved membership/role/permissions per (business, user); see app/services/access_cache.py
+    ACCESS_CACHE_TTL: int = int(os.getenv("ACCESS_CACHE_TTL", "60"))
+    # negocio_configuracion compartida en Redis con invalidación pub/sub (app/services/config_cache.py)
+    NEGOCIO_CONFIG_CACHE_TTL: int = int(os.getenv("NEGOCIO_CONFIG_CACHE_TTL", "3600"))
+    NEGOCIO_CONFIG_FALLBACK_TTL: int = int(os.getenv("NEGOCIO_CONFIG_FALLBACK_TTL", "60"))
+    NEGOCIO_CONFIG_MISS_TTL: int = int(os.getenv("NEGOCIO_CONFIG_MISS_TTL", "30"))
+
+    # Cache L1 en memoria de app/core/cache_manager.py (entradas por proceso)
+    CACHE_L1_MAX_ENTRIES: int = int(os.getenv("CACHE_L1_MAX_ENTRIES", "5000"))
+    # Cada cuánto un proceso relee las generaciones de invalidación por scope
+    CACHE_GENERATION_REFRESH_SECONDS: float = float(os.getenv("CACHE_GENERATION_REFRESH_SECONDS", "1"))
+    # @cached: lease entre procesos para recalcular y beta del refresco anticipado
+    # probabilístico (solo en decoradores con early_refresh=True)
+    CACHE_LEASE_SECONDS: int = int(os.getenv("CACHE_LEASE_SECONDS", "30"))
+    CACHE_EARLY_REFRESH_BETA: float = float(os.getenv("CACHE_EARLY_REFRESH_BETA", "1.0"))
+    # Codec del cache L2 (app/core/cache_codec.py): msgpack|json, zstd|zlib|none
+    CACHE_CODEC: str = os.getenv("CACHE_CODEC", "msgpack")
+    CACHE_COMPRESSION: str = os.getenv("CACHE_COMPRESSION", "zstd")
+    CACHE_COMPRESS_MIN_BYTES: int = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024"))
 
     # Redis Configuration
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
@@ -88,6 +122,23 @@ class Settings(BaseSettings):
     # Celery Configuration
     CELERY_BROKER_URL: str = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
     CELERY_RESULT_BACKEND: str = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+    # Lock de numeración de comprobantes por CUIT/punto de venta (app/workers/afip_worker.py)
+    AFIP_INVOICE_LOCK_TIMEOUT: int = int(os.getenv("AFIP_INVOICE_LOCK_TIMEOUT", "120"))
+    # Clientes SOAP de ARCA cacheados por proceso (app/services/afip/client_registry.py)
+    AFIP_HTTP_POOL_MAXSIZE: int = int(os.getenv("AFIP_HTTP_POOL_MAXSIZE", "10"))
+    AFIP_WSDL_CACHE_PATH: str = os.getenv("AFIP_WSDL_CACHE_PATH", os.path.join(tempfile.gettempdir(), "afip_wsdl_cache.db"))
+    AFIP_WSDL_CACHE_TTL: int = int(os.getenv("AFIP_WSDL_CACHE_TTL", "86400"))
+    # Tickets WSAA compartidos en Redis (app/services/afip/ticket_store.py)
+    AFIP_TICKET_RENEW_MARGIN: int = int(os.getenv("AFIP_TICKET_RENEW_MARGIN", "600"))
+    AFIP_TICKET_LOCK_TIMEOUT: int = int(os.getenv("AFIP_TICKET_LOCK_TIMEOUT", "60"))
+    AFIP_TICKET_LOCK_WAIT: int = int(os.getenv("AFIP_TICKET_LOCK_WAIT", "30"))
+    AFIP_TICKET_RENEW_BACKOFF: int = int(os.getenv("AFIP_TICKET_RENEW_BACKOFF", "120"))
+
+    # Exportación de reportes CSV/XLSX (app/services/report_export.py, app/workers/export_worker.py)
+    EXPORT_PAGE_SIZE: int = int(os.getenv("EXPORT_PAGE_SIZE", "500"))
+    EXPORT_SYNC_MAX_DAYS: int = int(os.getenv("EXPORT_SYNC_MAX_DAYS", "92"))
+    EXPORT_STORAGE_BUCKET: str = os.getenv("EXPORT_STORAGE_BUCKET", "reportes")
+    EXPORT_URL_TTL: int = int(os.getenv("EXPORT_URL_TTL", "86400"))
 
     # JWT Configuration
     JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "your_jwt_secret_key_here")
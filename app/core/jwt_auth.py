@@ -0,0 +1,245 @@
+"""
+Local verification of Supabase access tokens with a bounded identity cache.
+
+Replaces the per-request `supabase.auth.get_user(token)` GoTrue round-trip:
+tokens are verified locally (HS256 with the project's JWT secret, or
+RS256/ES256 against the project's JWKS) and the resulting `VerifiedIdentity`
+is cached by token hash until the token's own `exp`.
+
+The auth middleware verifies once and stores the identity in
+`request.state.identity`; `deps.get_current_user` and
+`BusinessBranchContextDep` reuse it through `identity_from_request`.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import jwt
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_HMAC_ALGORITHMS = ("HS256", "HS384", "HS512")
+_ASYMMETRIC_ALGORITHMS = ("RS256", "ES256", "EdDSA")
+
+
+class TokenVerificationError(Exception):
+    """Raised when a bearer token cannot be verified."""
+
+
+@dataclass(frozen=True)
+class VerifiedIdentity:
+    user_id: str
+    email: str
+    role: str
+    expires_at: float
+    claims: dict[str, Any] = field(default_factory=dict, compare=False, repr=False)
+
+    # `request.state.user` historically exposed `.id`/`.email`; keep that shape.
+    @property
+    def id(self) -> str:
+        return self.user_id
+
+
+class _IdentityLRU:
+    """Thread-safe LRU keyed by token hash; entries expire at the token's `exp`."""
+
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max(1, max_entries)
+        self._entries: OrderedDict[str, VerifiedIdentity] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[VerifiedIdentity]:
+        with self._lock:
+            identity = self._entries.get(key)
+            if identity is None:
+                return None
+            if identity.expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return identity
+
+    def put(self, key: str, identity: VerifiedIdentity) -> None:
+        with self._lock:
+            self._entries[key] = identity
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_identity_cache = _IdentityLRU(settings.AUTH_IDENTITY_CACHE_MAX_ENTRIES)
+_jwks_client: Optional[jwt.PyJWKClient] = None
+_jwks_lock = threading.Lock()
+
+
+def _strip_bearer(token: str) -> str:
+    token = (token or "").strip()
+    if token.startswith("Bearer "):
+        token = token[7:].strip()
+    return token
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _get_jwks_client() -> jwt.PyJWKClient:
+    global _jwks_client
+    if _jwks_client is None:
+        with _jwks_lock:
+            if _jwks_client is None:
+                url = settings.SUPABASE_JWKS_URL or f"{settings.SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json"
+                _jwks_client = jwt.PyJWKClient(url, cache_keys=True, lifespan=3600)
+    return _jwks_client
+
+
+def _decode_locally(token: str) -> Optional[dict[str, Any]]:
+    """
+    Verify signature, `exp` and audience locally.
+    Returns None when no local key material is available for the token's algorithm.
+    """
+    try:
+        header = jwt.get_unverified_header(token)
+    except jwt.PyJWTError as exc:
+        raise TokenVerificationError(f"Malformed token: {exc}") from exc
+
+    alg = header.get("alg", "")
+    decode_options = {"require": ["exp", "sub"]}
+    audience = settings.SUPABASE_JWT_AUDIENCE or None
+
+    try:
+        if alg in _HMAC_ALGORITHMS:
+            if not settings.SUPABASE_JWT_SECRET:
+                return None
+            return jwt.decode(
+                token,
+                settings.SUPABASE_JWT_SECRET,
+                algorithms=[alg],
+                audience=audience,
+                options=decode_options,
+            )
+        if alg in _ASYMMETRIC_ALGORITHMS:
+            signing_key = _get_jwks_client().get_signing_key_from_jwt(token)
+            return jwt.decode(
+                token,
+                signing_key.key,
+                algorithms=[alg],
+                audience=audience,
+                options=decode_options,
+            )
+    except jwt.PyJWTError as exc:
+        raise TokenVerificationError(str(exc)) from exc
+
+    raise TokenVerificationError(f"Unsupported token algorithm: {alg or 'none'}")
+
+
+def _verify_remotely(token: str) -> dict[str, Any]:
+    """
+    Fallback for deployments without SUPABASE_JWT_SECRET: ask GoTrue once and
+    cache the answer until the token's `exp`.
+    """
+    from app.db.supabase_client import get_supabase_client
+
+    try:
+        auth_response = get_supabase_client().auth.get_user(token)
+    except Exception as exc:
+        raise TokenVerificationError(str(exc)) from exc
+    if not auth_response or not auth_response.user:
+        raise TokenVerificationError("Token rejected by Supabase Auth")
+
+    claims: dict[str, Any] = jwt.decode(token, options={"verify_signature": False})
+    claims["sub"] = auth_response.user.id
+    claims.setdefault("email", auth_response.user.email or "")
+    return claims
+
+
+def _identity_from_claims(claims: dict[str, Any]) -> VerifiedIdentity:
+    user_id = claims.get("sub")
+    if not user_id:
+        raise TokenVerificationError("sub not present")
+    exp = float(claims.get("exp") or 0)
+    if exp <= time.time():
+        raise TokenVerificationError("Signature has expired")
+    return VerifiedIdentity(
+        user_id=str(user_id),
+        email=str(claims.get("email") or ""),
+        role=str(claims.get("role") or "authenticated"),
+        expires_at=exp,
+        claims=claims,
+    )
+
+
+def _cached_identity(token: str) -> tuple[str, str, Optional[VerifiedIdentity]]:
+    clean = _strip_bearer(token)
+    if not clean:
+        raise TokenVerificationError("Empty token")
+    key = _token_key(clean)
+    return clean, key, _identity_cache.get(key)
+
+
+def verify_token(token: str) -> VerifiedIdentity:
+    """Return the verified identity for a bearer token, using the LRU cache when possible."""
+    clean, key, identity = _cached_identity(token)
+    if identity is not None:
+        return identity
+
+    claims = _decode_locally(clean)
+    if claims is None:
+        claims = _verify_remotely(clean)
+    identity = _identity_from_claims(claims)
+    _identity_cache.put(key, identity)
+    return identity
+
+
+async def averify_token(token: str) -> VerifiedIdentity:
+    """
+    Async variant for the middleware: cache hits and local verification run
+    inline; only the (rare) network paths are pushed to a worker thread.
+    """
+    clean, key, identity = _cached_identity(token)
+    if identity is not None:
+        return identity
+
+    header_alg = ""
+    try:
+        header_alg = jwt.get_unverified_header(clean).get("alg", "")
+    except jwt.PyJWTError as exc:
+        raise TokenVerificationError(f"Malformed token: {exc}") from exc
+
+    needs_network = header_alg in _ASYMMETRIC_ALGORITHMS or not settings.SUPABASE_JWT_SECRET
+    if needs_network:
+        return await asyncio.to_thread(verify_token, clean)
+    return verify_token(clean)
+
+
+def identity_from_request(request: Any, token: Optional[str] = None) -> VerifiedIdentity:
+    """
+    Return the identity verified by the auth middleware, or verify `token`
+    (defaulting to the request's Authorization header) through the shared cache.
+    """
+    identity = getattr(getattr(request, "state", None), "identity", None)
+    if isinstance(identity, VerifiedIdentity):
+        return identity
+    if token is None:
+        token = request.headers.get("Authorization", "")
+    return verify_token(token)
+
+
+def clear_identity_cache() -> None:
+    _identity_cache.clear()
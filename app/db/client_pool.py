@@ -0,0 +1,342 @@
+"""
+Shared PostgREST connection pool for user-scoped Supabase access.
+
+`create_client()` builds a brand new httpx client (TLS handshake + connection
+pool) every time it is called. Instead, each worker process keeps ONE
+keep-alive httpx client pointed at `<SUPABASE_URL>/rest/v1` and every request
+gets a `UserScopedClient`: a cheap wrapper that only swaps the
+`Authorization` header on the outgoing PostgREST calls.
+
+`AsyncUserScopedClient` is the awaitable twin backed by a shared
+`httpx.AsyncClient`, so `async def` handlers can `await ....execute()` without
+blocking the event loop during PostgREST round-trips.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import weakref
+from typing import Any, AsyncGenerator, Mapping, Optional
+
+import asyncio
+import httpx
+from postgrest import (  # type: ignore
+    AsyncFilterRequestBuilder,
+    AsyncRequestBuilder,
+    SyncFilterRequestBuilder,
+    SyncRequestBuilder,
+)
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# pid -> shared httpx client. Keyed by pid so a forked worker never reuses the
+# sockets opened by its parent process.
+_sync_sessions: dict[int, httpx.Client] = {}
+# pid -> {event loop: (shared async client, shutdown hook)}. An AsyncClient is
+# bound to the loop that created it, so every running loop (the app loop, an
+# asyncio.run in a Celery task, another thread) gets its own client, which is
+# closed only when that same loop shuts down.
+_async_sessions: dict[
+    int,
+    weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple[httpx.AsyncClient, AsyncGenerator[None, None]]],
+] = {}
+
+
+def _anon_key() -> str:
+    return settings.SUPABASE_ANON_KEY or settings.SUPABASE_KEY
+
+
+def _http2_enabled() -> bool:
+    if not settings.SUPABASE_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401  # type: ignore
+    except ImportError:
+        logger.debug("[client_pool] h2 no instalado, usando HTTP/1.1 keep-alive")
+        return False
+    return True
+
+
+def _base_headers(api_key: str) -> dict[str, str]:
+    return {
+        "apikey": api_key,
+        "Authorization": f"Bearer {api_key}",
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+        "Accept-Profile": "public",
+        "Content-Profile": "public",
+    }
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.SUPABASE_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.SUPABASE_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=settings.SUPABASE_POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_shared_rest_session() -> httpx.Client:
+    """Return the per-process keep-alive httpx client for PostgREST."""
+    pid = os.getpid()
+    session = _sync_sessions.get(pid)
+    if session is not None and not session.is_closed:
+        return session
+
+    with _lock:
+        session = _sync_sessions.get(pid)
+        if session is not None and not session.is_closed:
+            return session
+
+        url = settings.SUPABASE_URL
+        api_key = _anon_key()
+        if not url or not api_key:
+            raise ValueError("SUPABASE_URL o SUPABASE_ANON_KEY no están configurados")
+
+        http2 = _http2_enabled()
+        session = httpx.Client(
+            base_url=f"{url.rstrip('/')}/rest/v1",
+            headers=_base_headers(api_key),
+            http2=http2,
+            limits=_pool_limits(),
+            timeout=settings.SUPABASE_HTTP_TIMEOUT,
+        )
+        _sync_sessions[pid] = session
+        logger.info("[client_pool] Pool PostgREST creado (pid=%s, http2=%s)", pid, http2)
+        return session
+
+
+async def _aclose_quietly(session: httpx.AsyncClient) -> None:
+    try:
+        await session.aclose()
+    except Exception as exc:
+        logger.debug("[client_pool] Error cerrando pool PostgREST async: %s", exc)
+
+
+def _forget_async_session(pid: int, loop: asyncio.AbstractEventLoop, session: httpx.AsyncClient) -> None:
+    with _lock:
+        sessions = _async_sessions.get(pid)
+        if sessions is not None:
+            entry = sessions.get(loop)
+            if entry is not None and entry[0] is session:
+                del sessions[loop]
+
+
+async def _close_on_loop_shutdown(
+    pid: int, loop: asyncio.AbstractEventLoop, session: httpx.AsyncClient
+) -> AsyncGenerator[None, None]:
+    """
+    Suspended async generator registered on the client's loop.
+
+    `asyncio.run()` (and uvicorn) call `loop.shutdown_asyncgens()` before closing
+    the loop, which resumes the `finally` below on that same loop.
+    """
+    try:
+        yield
+    finally:
+        _forget_async_session(pid, loop, session)
+        await _aclose_quietly(session)
+
+
+def _register_shutdown_hook(
+    pid: int, loop: asyncio.AbstractEventLoop, session: httpx.AsyncClient
+) -> AsyncGenerator[None, None]:
+    hook = _close_on_loop_shutdown(pid, loop, session)
+    # The first step runs synchronously up to the `yield` and registers the
+    # generator with the running loop's asyncgen hooks.
+    try:
+        hook.asend(None).send(None)
+    except StopIteration:
+        pass
+    return hook
+
+
+def get_shared_async_rest_session() -> httpx.AsyncClient:
+    """Return the keep-alive httpx.AsyncClient for PostgREST of the running event loop."""
+    pid = os.getpid()
+    loop = asyncio.get_running_loop()
+    sessions = _async_sessions.get(pid)
+    entry = sessions.get(loop) if sessions is not None else None
+    if entry is not None and not entry[0].is_closed:
+        return entry[0]
+
+    with _lock:
+        sessions = _async_sessions.setdefault(pid, weakref.WeakKeyDictionary())
+        entry = sessions.get(loop)
+        if entry is not None and not entry[0].is_closed:
+            return entry[0]
+        # Loops closed without shutdown_asyncgens() can no longer close their client
+        for stale in [other for other in sessions.keys() if other.is_closed()]:
+            del sessions[stale]
+
+        url = settings.SUPABASE_URL
+        api_key = _anon_key()
+        if not url or not api_key:
+            raise ValueError("SUPABASE_URL o SUPABASE_ANON_KEY no están configurados")
+
+        http2 = _http2_enabled()
+        session = httpx.AsyncClient(
+            base_url=f"{url.rstrip('/')}/rest/v1",
+            headers=_base_headers(api_key),
+            http2=http2,
+            limits=_pool_limits(),
+            timeout=settings.SUPABASE_HTTP_TIMEOUT,
+        )
+        sessions[loop] = (session, _register_shutdown_hook(pid, loop, session))
+        logger.info("[client_pool] Pool PostgREST async creado (pid=%s, http2=%s)", pid, http2)
+    return session
+
+
+def close_shared_sessions() -> None:
+    """Close the pooled sync connections owned by this process (called on shutdown)."""
+    pid = os.getpid()
+    with _lock:
+        session = _sync_sessions.pop(pid, None)
+    if session is not None:
+        try:
+            session.close()
+        except Exception as exc:
+            logger.debug("[client_pool] Error cerrando pool PostgREST: %s", exc)
+
+
+async def aclose_shared_sessions() -> None:
+    """Close the sync pool and the running loop's async pool from within that loop."""
+    close_shared_sessions()
+    pid = os.getpid()
+    loop = asyncio.get_running_loop()
+    with _lock:
+        sessions = _async_sessions.get(pid)
+        entry = sessions.pop(loop, None) if sessions is not None else None
+    if entry is not None:
+        await entry[1].aclose()
+
+
+def normalize_token(user_token: Optional[str]) -> str:
+    """Strip the optional 'Bearer ' prefix; empty/'undefined' tokens become ''."""
+    clean_token = user_token.strip() if user_token else ""
+    if clean_token.startswith("Bearer "):
+        clean_token = clean_token[7:].strip()
+    if clean_token == "undefined":
+        return ""
+    return clean_token
+
+
+class _AuthorizedSession:
+    """
+    Proxy over the shared httpx client that injects a per-user Authorization header.
+
+    The postgrest request builders only call `session.request(...)`, so this is
+    all that is needed to run RLS-protected queries on the shared pool.
+    """
+
+    def __init__(self, session: httpx.Client, token: str) -> None:
+        self._session = session
+        self._auth_headers = {"Authorization": f"Bearer {token}"} if token else {}
+
+    def request(self, method: str, url: str, *, headers: Optional[Mapping[str, str]] = None, **kwargs: Any) -> httpx.Response:
+        merged = httpx.Headers(headers)
+        merged.update(self._auth_headers)
+        return self._session.request(method, url, headers=merged, **kwargs)
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._session, item)
+
+
+class _AsyncAuthorizedSession:
+    """Async counterpart of `_AuthorizedSession` over the shared httpx.AsyncClient."""
+
+    def __init__(self, session: httpx.AsyncClient, token: str) -> None:
+        self._session = session
+        self._auth_headers = {"Authorization": f"Bearer {token}"} if token else {}
+
+    async def request(self, method: str, url: str, *, headers: Optional[Mapping[str, str]] = None, **kwargs: Any) -> httpx.Response:
+        merged = httpx.Headers(headers)
+        merged.update(self._auth_headers)
+        return await self._session.request(method, url, headers=merged, **kwargs)
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._session, item)
+
+
+class UserScopedClient:
+    """
+    Lightweight stand-in for `supabase.Client` bound to a user's JWT.
+
+    Exposes the PostgREST surface used by the endpoints (`table`, `from_`, `rpc`)
+    on top of the shared pool. `storage` is created lazily with the user's
+    headers since it is only used by the invoicing flow.
+    """
+
+    def __init__(self, token: str) -> None:
+        self._token = token
+        self._session = _AuthorizedSession(get_shared_rest_session(), token)
+        self._storage: Any = None
+
+    def table(self, table_name: str) -> SyncRequestBuilder:
+        return SyncRequestBuilder(self._session, f"/{table_name}")  # type: ignore[arg-type]
+
+    def from_(self, table_name: str) -> SyncRequestBuilder:
+        return self.table(table_name)
+
+    def rpc(self, func: str, params: Optional[Mapping[str, Any]] = None) -> SyncFilterRequestBuilder:
+        return SyncFilterRequestBuilder(  # type: ignore[call-arg]
+            self._session,  # type: ignore[arg-type]
+            f"/rpc/{func}",
+            "POST",
+            httpx.Headers(),
+            httpx.QueryParams(),
+            json=dict(params or {}),
+        )
+
+    @property
+    def storage(self) -> Any:
+        if self._storage is None:
+            from supabase.lib.storage_client import SupabaseStorageClient  # type: ignore
+
+            api_key = _anon_key()
+            headers = {
+                "apikey": api_key,
+                "Authorization": f"Bearer {self._token or api_key}",
+            }
+            self._storage = SupabaseStorageClient(f"{settings.SUPABASE_URL.rstrip('/')}/storage/v1", headers)
+        return self._storage
+
+    @property
+    def auth(self) -> Any:
+        # Auth operations never depend on the caller's JWT; reuse the base client.
+        from app.db.supabase_client import get_supabase_client
+
+        return get_supabase_client().auth
+
+
+class AsyncUserScopedClient:
+    """
+    Awaitable PostgREST client bound to a user's JWT (or the service key).
+
+    Same builder surface as `UserScopedClient` (`table`, `from_`, `rpc`) but
+    `execute()` returns a coroutine. Must be created inside a running event loop.
+    """
+
+    def __init__(self, token: str) -> None:
+        self._token = token
+        self._session = _AsyncAuthorizedSession(get_shared_async_rest_session(), token)
+
+    def table(self, table_name: str) -> AsyncRequestBuilder:
+        return AsyncRequestBuilder(self._session, f"/{table_name}")  # type: ignore[arg-type]
+
+    def from_(self, table_name: str) -> AsyncRequestBuilder:
+        return self.table(table_name)
+
+    def rpc(self, func: str, params: Optional[Mapping[str, Any]] = None) -> AsyncFilterRequestBuilder:
+        return AsyncFilterRequestBuilder(  # type: ignore[call-arg]
+            self._session,  # type: ignore[arg-type]
+            f"/rpc/{func}",
+            "POST",
+            httpx.Headers(),
+            httpx.QueryParams(),
+            json=dict(params or {}),
+        )
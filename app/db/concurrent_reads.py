@@ -0,0 +1,108 @@
+"""
+Concurrent fan-out of independent reads with per-call timeouts.
+
+Endpoints such as the dashboard summary issue several queries/RPCs that do
+not depend on each other. `run_reads` starts all of them at once and waits
+for the slowest one (bounded by a timeout) instead of adding their latencies:
+
+    results = await run_reads({
+        "trend": client.rpc("get_dashboard_sales_trend", params).execute(),   # awaitable
+        "tareas": client.table("tareas").select("id").execute(),
+        "config": partial(get_negocio_config, business_id),                  # sync callable
+    })
+    trend_rows = results["trend"].data
+
+Partial results: a failing or timed-out read does not cancel the others; its
+`ReadResult` carries the error and `.data` falls back to `[]`, so callers
+decide per section whether to degrade or fail.
+
+Awaitables (async PostgREST builders from the shared pool) run on the event
+loop. Plain callables run in a worker thread (`asyncio.to_thread`); a timed-out
+thread cannot be interrupted and finishes in the background.
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Union
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Read = Union[Awaitable[Any], Callable[[], Any]]
+
+
+@dataclass
+class ReadResult:
+    name: str
+    value: Any = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def timed_out(self) -> bool:
+        return isinstance(self.error, asyncio.TimeoutError)
+
+    @property
+    def data(self) -> Any:
+        """`.data` of a PostgREST response (or the raw value); `[]` on failure."""
+        if self.error is not None:
+            return []
+        data = getattr(self.value, "data", self.value)
+        return data if data is not None else []
+
+
+async def _run_one(name: str, read: Read, timeout: float) -> ReadResult:
+    started = time.perf_counter()
+    try:
+        if inspect.isawaitable(read):
+            awaitable = read
+        else:
+            awaitable = asyncio.to_thread(read)
+        value = await asyncio.wait_for(awaitable, timeout=timeout)
+        return ReadResult(name, value=value, elapsed=time.perf_counter() - started)
+    except Exception as exc:
+        elapsed = time.perf_counter() - started
+        if isinstance(exc, asyncio.TimeoutError):
+            logger.warning("[concurrent_reads] %s timed out after %.2fs", name, elapsed)
+        else:
+            logger.warning("[concurrent_reads] %s failed after %.2fs: %s", name, elapsed, exc)
+        return ReadResult(name, error=exc, elapsed=elapsed)
+
+
+async def run_reads(
+    reads: Mapping[str, Read],
+    timeout: Optional[float] = None,
+    timeouts: Optional[Mapping[str, float]] = None,
+) -> Dict[str, ReadResult]:
+    """
+    Run independent reads concurrently and return one `ReadResult` per name.
+
+    Args:
+        reads: name -> awaitable or zero-argument callable.
+        timeout: default per-read timeout (settings.DB_FANOUT_TIMEOUT).
+        timeouts: per-name overrides.
+    """
+    default_timeout = settings.DB_FANOUT_TIMEOUT if timeout is None else timeout
+    overrides = timeouts or {}
+    started = time.perf_counter()
+
+    results = await asyncio.gather(
+        *(_run_one(name, read, overrides.get(name, default_timeout)) for name, read in reads.items())
+    )
+
+    logger.debug(
+        "[concurrent_reads] %d reads in %.3fs (%s)",
+        len(results),
+        time.perf_counter() - started,
+        ", ".join(f"{r.name}={r.elapsed:.3f}s" for r in results),
+    )
+    return {r.name: r for r in results}
@@ -5,7 +5,13 @@ from typing import Any, Callable, Optional
 
 from supabase.client import Client  # type: ignore
 
-from app.db.supabase_client import TableQueryProto, get_supabase_user_client
+from app.db.supabase_client import (
+    AsyncClientProto,
+    AsyncTableQueryProto,
+    TableQueryProto,
+    get_async_supabase_user_client,
+    get_supabase_user_client,
+)
 
 # Tables that must always be filtered by negocio_id and/or sucursal_id.
 # The tuple indicates which contextual columns must be enforced.
@@ -45,10 +51,10 @@ class _ScopeContext:
     branch_id: Optional[str] = None
 
 
-class ScopedTable:
-    """Wrapper around Supabase table query builder that enforces negocio/sucursal scope on execute."""
+class _ScopedTableBase:
+    """Shared scope bookkeeping for the sync and async scoped table wrappers."""
 
-    def __init__(self, builder: TableQueryProto, table_name: str, context: _ScopeContext) -> None:
+    def __init__(self, builder: Any, table_name: str, context: _ScopeContext) -> None:
         self._builder = builder
         self._table_name = table_name
         self._context = context
@@ -84,15 +90,14 @@ class ScopedTable:
             return self
         return result
 
-    # -- public API -----------------------------------------------------------------------------
-    def execute(self, *args: Any, **kwargs: Any) -> Any:
+    def _prepare_execute(self) -> None:
         if not self._skip_filters:
             self._apply_scope()
-        result = self._builder.execute(*args, **kwargs)
+
+    def _reset_after_execute(self) -> None:
         # Reset flags for potential re-use.
         self._filters_applied = False
         self._skip_filters = False
-        return result
 
     def __getattr__(self, item: str) -> Any:
         attr = getattr(self._builder, item)
@@ -104,6 +109,34 @@ class ScopedTable:
         return attr
 
 
+class ScopedTable(_ScopedTableBase):
+    """Wrapper around Supabase table query builder that enforces negocio/sucursal scope on execute."""
+
+    def __init__(self, builder: TableQueryProto, table_name: str, context: _ScopeContext) -> None:
+        super().__init__(builder, table_name, context)
+
+    # -- public API -----------------------------------------------------------------------------
+    def execute(self, *args: Any, **kwargs: Any) -> Any:
+        self._prepare_execute()
+        result = self._builder.execute(*args, **kwargs)
+        self._reset_after_execute()
+        return result
+
+
+class AsyncScopedTable(_ScopedTableBase):
+    """Async twin of ScopedTable: same builder surface, but `execute()` must be awaited."""
+
+    def __init__(self, builder: AsyncTableQueryProto, table_name: str, context: _ScopeContext) -> None:
+        super().__init__(builder, table_name, context)
+
+    # -- public API -----------------------------------------------------------------------------
+    async def execute(self, *args: Any, **kwargs: Any) -> Any:
+        self._prepare_execute()
+        result = await self._builder.execute(*args, **kwargs)
+        self._reset_after_execute()
+        return result
+
+
 class ScopedSupabaseClient:
     """Client proxy adding automatic negocio/sucursal filters to table queries."""
 
@@ -122,6 +155,23 @@ class ScopedSupabaseClient:
         return getattr(self._client, item)
 
 
+class AsyncScopedSupabaseClient:
+    """Async client proxy adding automatic negocio/sucursal filters to table queries."""
+
+    def __init__(self, client: AsyncClientProto, business_id: str, branch_id: Optional[str] = None) -> None:
+        if not business_id:
+            raise ValueError("business_id is required for scoped Supabase access")
+        self._client = client
+        self._context = _ScopeContext(business_id=business_id, branch_id=branch_id)
+
+    def table(self, table_name: str) -> AsyncScopedTable:
+        builder = self._client.table(table_name)
+        return AsyncScopedTable(builder, table_name, self._context)
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._client, item)
+
+
 def get_scoped_supabase_user_client(
     user_token: str,
     business_id: str,
@@ -132,3 +182,15 @@ def get_scoped_supabase_user_client(
     """
     base_client = get_supabase_user_client(user_token)
     return ScopedSupabaseClient(base_client, business_id, branch_id)
+
+
+def get_async_scoped_supabase_user_client(
+    user_token: str,
+    business_id: str,
+    branch_id: Optional[str] = None,
+) -> AsyncScopedSupabaseClient:
+    """
+    Awaitable variant of get_scoped_supabase_user_client for `async def` handlers.
+    """
+    base_client = get_async_supabase_user_client(user_token)
+    return AsyncScopedSupabaseClient(base_client, business_id, branch_id)
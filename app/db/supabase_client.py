@@ -1,11 +1,14 @@
 from supabase.client import create_client, Client
 from functools import lru_cache
+import logging
 import os
 
 from app.core.config import settings
 from collections.abc import Mapping, Sequence
 from typing import Protocol, Callable, cast
 
+logger = logging.getLogger(__name__)
+
 @lru_cache()
 def get_supabase_client() -> Client:
     """
@@ -68,14 +71,36 @@ class TableQueryProto(Protocol):
     def delete(self) -> "TableQueryProto": ...
     def execute(self) -> APIResponseProto: ...
 
-class HasAuth(Protocol):
-    def auth(self, token: str) -> object: ...
-
-class HasSetAuth(Protocol):
-    def set_auth(self, token: str) -> object: ...
+class AsyncTableQueryProto(Protocol):
+    """Same builder surface as TableQueryProto, but `execute()` must be awaited."""
+    def select(self, columns: str) -> "AsyncTableQueryProto": ...
+    def eq(self, column: str, value: object) -> "AsyncTableQueryProto": ...
+    def gte(self, column: str, value: object) -> "AsyncTableQueryProto": ...
+    def lte(self, column: str, value: object) -> "AsyncTableQueryProto": ...
+    def order(self, column: str, desc: bool = False) -> "AsyncTableQueryProto": ...
+    def limit(self, n: int) -> "AsyncTableQueryProto": ...
+    def insert(
+        self,
+        data: Mapping[str, object] | Sequence[Mapping[str, object]],
+        *,
+        count: object | None = None,
+        returning: object | None = None,
+        upsert: bool = False,
+    ) -> "AsyncTableQueryProto": ...
+    def upsert(
+        self,
+        data: Mapping[str, object] | Sequence[Mapping[str, object]],
+        *,
+        on_conflict: str | None = None,
+        returning: object | None = None,
+    ) -> "AsyncTableQueryProto": ...
+    def update(self, data: Mapping[str, object]) -> "AsyncTableQueryProto": ...
+    def delete(self) -> "AsyncTableQueryProto": ...
+    async def execute(self) -> APIResponseProto: ...
 
-class HasSetAuthHeaders(Protocol):
-    def _set_auth_headers(self, headers: Mapping[str, str]) -> object: ...
+class AsyncClientProto(Protocol):
+    def table(self, table_name: str) -> AsyncTableQueryProto: ...
+    def rpc(self, func: str, params: Mapping[str, object] | None = None) -> AsyncTableQueryProto: ...
 
 @lru_cache()
 def get_supabase_service_client() -> Client:
@@ -133,89 +158,39 @@ def get_supabase_anon_client() -> Client:
 
 def get_supabase_user_client(user_token: str) -> Client:
     """
-    Create and return a Supabase client with user authentication.
-    This client will use the user's token for RLS-protected operations.
+    Return a Supabase client bound to the user's token for RLS-protected operations.
+
+    The client is a thin `UserScopedClient` over the per-process PostgREST pool
+    (see app/db/client_pool.py): building it only swaps the Authorization header,
+    so it is cheap enough to call on every request.
     """
-    url = settings.SUPABASE_URL
-    # Use anon key for user client - this is the correct approach
-    anon_key = settings.SUPABASE_ANON_KEY or settings.SUPABASE_KEY
-    
-    print("=== Creando cliente Supabase con token de usuario ===")
-    print(f"URL: {url}")
-    print(f"ANON_KEY: {'*'*(len(anon_key)//4) if anon_key else 'No configurada'}")
-    
-    if not url or not anon_key:
-         raise ValueError("SUPABASE_URL o SUPABASE_ANON_KEY no están configurados")
-    
-    # Asegurar que el token esté limpio (sin 'Bearer ' al inicio)
-    clean_token = user_token.strip() if user_token else ""
-    if clean_token.startswith('Bearer '):
-        clean_token = clean_token[7:].strip()
-    
-    print(f"Token procesado (primeros 10 chars): {clean_token[:10] if clean_token else 'None'}...")
-    
-    if not clean_token or clean_token == "undefined":
-        print("[AVISO] Token de usuario vacío o 'undefined', omitiendo configuración de autenticación.")
-        try:
-            client = create_client(url, anon_key)
-            return client
-        except Exception as e:
-            print(f"[ERROR] Error al crear cliente Supabase Base sin token: {str(e)}")
-            raise
-            
-    try:
-        # Create client with anon key
-        client = create_client(url, anon_key)
-        
-        # Set authorization header on the client based on version
-        # Different versions of supabase-py have different structures
-        try:
-            # postgrest.auth(token)
-            postgrest_obj = cast(object, getattr(client, 'postgrest', None))
-            if postgrest_obj is not None:
-                _ = cast(HasAuth, postgrest_obj).auth(clean_token)
-                print("[OK] Token establecido en cliente postgrest")
-        except Exception as e:
-            print(f"[ERROR] No se pudo establecer token en cliente postgrest: {e}")
-        
-        # Establecer el token también en el cliente auth si está disponible
-        auth_obj = cast(object, getattr(client, 'auth', None))
-        if auth_obj is not None:
-            token_configured = False
-            if hasattr(auth_obj, 'set_auth'):
-                try:
-                    _ = cast(HasSetAuth, auth_obj).set_auth(clean_token)
-                    print("[OK] Token establecido en cliente auth mediante set_auth")
-                    token_configured = True
-                except Exception as auth_error:
-                    print(f"[AVISO] No se pudo usar set_auth en cliente auth: {auth_error}")
-            if not token_configured and hasattr(auth_obj, '_set_auth_headers'):
-                try:
-                    _ = cast(HasSetAuthHeaders, auth_obj)._set_auth_headers({  # pyright: ignore[reportPrivateUsage]
-                        "Authorization": f"Bearer {clean_token}"
-                    })
-                    print("[OK] Token establecido en cliente auth mediante _set_auth_headers")
-                    token_configured = True
-                except Exception as auth_error:
-                    print(f"[AVISO] No se pudo usar _set_auth_headers en cliente auth: {auth_error}")
-            if not token_configured:
-                print("[AVISO] Cliente auth no soporta métodos set_auth ni _set_auth_headers; se omite configuración adicional.")
-        
-        # Enfoque adicional para versiones más recientes de supabase-py
-        try:
-            rest_obj = cast(object, getattr(client, 'rest', None))
-            if rest_obj is not None:
-                _ = cast(HasAuth, rest_obj).auth(clean_token)
-                print("[OK] Token establecido en cliente rest")
-        except Exception as e:
-            print(f"[AVISO] No se pudo establecer token en cliente rest: {e}")
-                
-        print("[OK] Cliente Supabase con token de usuario creado exitosamente")
-        return client
-    except Exception as e:
-        print(f"[ERROR] Error al crear cliente Supabase con token: {str(e)}")
-        print(f"Tipo de error: {type(e)}")
-        raise
+    from app.db.client_pool import UserScopedClient, normalize_token
+
+    clean_token = normalize_token(user_token)
+    if not clean_token:
+        logger.debug("Token de usuario vacío o 'undefined'; usando cliente con anon key")
+    return cast(Client, cast(object, UserScopedClient(clean_token)))
+
+def get_async_supabase_user_client(user_token: str) -> AsyncClientProto:
+    """
+    Awaitable variant of get_supabase_user_client for `async def` handlers.
+    Must be called from inside the running event loop.
+    """
+    from app.db.client_pool import AsyncUserScopedClient, normalize_token
+
+    return cast(AsyncClientProto, cast(object, AsyncUserScopedClient(normalize_token(user_token))))
+
+def get_async_supabase_service_client() -> AsyncClientProto:
+    """
+    Awaitable PostgREST client authenticated with the Service Role key (bypasses RLS).
+    Shares the same per-process pool as the user-scoped async clients.
+    """
+    from app.db.client_pool import AsyncUserScopedClient
+
+    service_key = settings.SUPABASE_SERVICE_ROLE_KEY or settings.SUPABASE_KEY
+    if not service_key:
+        raise ValueError("SUPABASE_SERVICE_ROLE_KEY o SUPABASE_KEY no están configurados")
+    return cast(AsyncClientProto, cast(object, AsyncUserScopedClient(service_key)))
 
 # Convenience function to get a table (consider if this should use user client or base client)
 # Current implementation uses the base client - modify if RLS applies to basic table access
@@ -1,6 +1,7 @@
 from fastapi import Depends, HTTPException, status, Request
 from app.db.supabase_client import get_supabase_client, get_supabase_user_client
 from typing import Optional, List
+from app.services.access_cache import get_resolved_access
 
 def is_public_products_services_request(request: Request) -> bool:
     """Detecta si la request corresponde a rutas públicas temporales de productos/servicios.
@@ -36,45 +37,26 @@ async def verify_permission_logic(request: Request, business_id: str, required_p
         
         supabase = get_supabase_user_client(authorization)
 
-        # Verificar acceso al negocio
-        user_business_response = supabase.table("usuarios_negocios") \
-            .select("id, rol") \
-            .eq("usuario_id", user_id) \
-            .eq("negocio_id", business_id) \
-            .eq("estado", "aceptado") \
-            .execute()
-        
-        if not user_business_response.data:
+        # Verificar acceso al negocio (membresía, rol, dueño y permisos cacheados por usuario/negocio)
+        access = get_resolved_access(request, supabase, str(user_id), business_id)
+        if access is None:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="No tienes acceso a este negocio o tu acceso está pendiente de aprobación.",
             )
 
-        user_business_info = user_business_response.data[0]
-        usuario_negocio_id = user_business_info.get("id")
-
-        # Verificar si es el creador del negocio
-        business_response = supabase.table("negocios").select("creada_por").eq("id", business_id).execute()
-        if business_response.data and business_response.data[0].get("creada_por") == user_id:
-            return True
-
-        # Los admins tienen todos los permisos
-        if user_business_info.get("rol") == "admin":
+        # El creador del negocio y los admins tienen todos los permisos
+        if access.has_all_permissions:
             return True
 
         # Verificar permisos específicos
-        permissions_response = supabase.table("permisos_usuario_negocio") \
-            .select("acceso_total, " + required_permission) \
-            .eq("usuario_negocio_id", usuario_negocio_id) \
-            .execute()
-
-        if not permissions_response.data:
+        if not access.permissions:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="No tienes permisos configurados para este negocio. Contacta al administrador.",
             )
 
-        permisos = permissions_response.data[0]
+        permisos = access.permissions
         
         # Verificar acceso total
         if permisos.get("acceso_total", False):
@@ -48,3 +48,15 @@ class CsrRequest(BaseModel):
 class CsrResponse(BaseModel):
     csr_content: str
     message: str
+
+class FacturaEstadoResponse(BaseModel):
+    id: str
+    venta_id: Optional[str] = None
+    estado: str  # pendiente | procesando | emitida | error
+    tipo_comprobante: Optional[int] = None
+    punto_venta: Optional[int] = None
+    numero: Optional[int] = None
+    cae: Optional[str] = None
+    cae_vencimiento: Optional[str] = None
+    error_detalle: Optional[str] = None
+    pdf_url: Optional[str] = None  # URL firmada (24 h) cuando el PDF ya fue generado
@@ -0,0 +1,177 @@
+"""
+app/services/access_cache.py
+
+Resolved membership / role / permissions per (business, user).
+
+`BusinessBranchContextDep` and `verify_permission_logic` used to query
+`usuarios_negocios`, `usuarios_sucursales`, `negocios.creada_por`,
+`permisos_usuario_negocio` and `negocio_configuracion` on every request.
+This module resolves all of that once into a `ResolvedAccess` and keeps it:
+
+  - on `request.state` (several permission dependencies in one request),
+  - in `cache_manager` L1/L2 (process memory + Redis) for ACCESS_CACHE_TTL seconds.
+
+Branch assignments are stored as the full list of active branches of the
+user, so any branch of the business is answered from the same entry.
+Branch settings (negocio_configuracion) are served by `config_cache`.
+
+Non-members are never cached: a freshly approved user gets access on the
+next request. Endpoints that change memberships, permissions or settings
+call the `invalidate_*` helpers below.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.core.cache_manager import cache_manager
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "access"
+
+# Roles with implicit access to every branch of the business.
+_ALL_BRANCH_ROLES = ("admin", "owner")
+
+
+@dataclass
+class ResolvedAccess:
+    user_id: str
+    business_id: str
+    usuario_negocio_id: str
+    role: str
+    is_owner: bool = False
+    # Row of permisos_usuario_negocio (None for admins/owners or when not configured)
+    permissions: Optional[Dict[str, Any]] = None
+    branch_ids: List[str] = field(default_factory=list)
+
+    @property
+    def has_all_permissions(self) -> bool:
+        return self.is_owner or self.role == "admin"
+
+    def can_access_branch(self, branch_id: str) -> bool:
+        return self.role in _ALL_BRANCH_ROLES or branch_id in self.branch_ids
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ResolvedAccess":
+        return cls(
+            user_id=data["user_id"],
+            business_id=data["business_id"],
+            usuario_negocio_id=data["usuario_negocio_id"],
+            role=data.get("role") or "empleado",
+            is_owner=bool(data.get("is_owner")),
+            permissions=data.get("permissions"),
+            branch_ids=list(data.get("branch_ids") or []),
+        )
+
+
+def _access_identifier(business_id: str, user_id: str) -> str:
+    return f"{business_id}_{user_id}"
+
+
+def _request_memo(request: Any) -> Optional[Dict[str, ResolvedAccess]]:
+    state = getattr(request, "state", None)
+    if state is None:
+        return None
+    memo = getattr(state, "resolved_access", None)
+    if not isinstance(memo, dict):
+        memo = {}
+        setattr(state, "resolved_access", memo)
+    return memo
+
+
+def _resolve_from_db(client: Any, user_id: str, business_id: str) -> Optional[ResolvedAccess]:
+    membership = (
+        client.table("usuarios_negocios")
+        .select("id, rol")
+        .eq("usuario_id", user_id)
+        .eq("negocio_id", business_id)
+        .eq("estado", "aceptado")
+        .limit(1)
+        .execute()
+    )
+    if not membership.data:
+        return None
+
+    record = membership.data[0]
+    access = ResolvedAccess(
+        user_id=user_id,
+        business_id=business_id,
+        usuario_negocio_id=record["id"],
+        role=record.get("rol") or "empleado",
+    )
+
+    business = client.table("negocios").select("creada_por").eq("id", business_id).limit(1).execute()
+    access.is_owner = bool(business.data) and business.data[0].get("creada_por") == user_id
+
+    if access.has_all_permissions and access.role in _ALL_BRANCH_ROLES:
+        # Nothing else is consulted for admins: all permissions, all branches.
+        return access
+
+    if not access.has_all_permissions:
+        permisos = (
+            client.table("permisos_usuario_negocio")
+            .select("*")
+            .eq("usuario_negocio_id", access.usuario_negocio_id)
+            .limit(1)
+            .execute()
+        )
+        access.permissions = permisos.data[0] if permisos.data else None
+
+    if access.role not in _ALL_BRANCH_ROLES:
+        branches = (
+            client.table("usuarios_sucursales")
+            .select("sucursal_id")
+            .eq("usuario_id", user_id)
+            .eq("negocio_id", business_id)
+            .eq("activo", True)
+            .execute()
+        )
+        access.branch_ids = [str(row["sucursal_id"]) for row in (branches.data or []) if row.get("sucursal_id")]
+
+    return access
+
+
+def get_resolved_access(request: Any, client: Any, user_id: str, business_id: str) -> Optional[ResolvedAccess]:
+    """
+    Return the user's access to *business_id*, or None if they are not an
+    accepted member. Errors from the Supabase client propagate to the caller.
+    """
+    memo = _request_memo(request)
+    if memo is not None and business_id in memo and memo[business_id].user_id == user_id:
+        return memo[business_id]
+
+    identifier = _access_identifier(business_id, user_id)
+    cached = cache_manager.get(NAMESPACE, identifier, ttl=settings.ACCESS_CACHE_TTL, scope=business_id)
+    access: Optional[ResolvedAccess] = None
+    if isinstance(cached, dict):
+        try:
+            access = ResolvedAccess.from_dict(cached)
+        except (KeyError, TypeError) as exc:
+            logger.debug("access_cache: entrada inválida para %s: %s", identifier, exc)
+
+    if access is None:
+        access = _resolve_from_db(client, user_id, business_id)
+        if access is None:
+            return None
+        cache_manager.set(NAMESPACE, identifier, access.to_dict(), ttl=settings.ACCESS_CACHE_TTL, scope=business_id)
+
+    if memo is not None:
+        memo[business_id] = access
+    return access
+
+
+def invalidate_user_access(business_id: str, user_id: str) -> None:
+    cache_manager.delete(NAMESPACE, _access_identifier(business_id, user_id), scope=business_id)
+
+
+def invalidate_business_access(business_id: str) -> None:
+    """Drop the resolved access of every user of the business (membership/permission changes)."""
+    cache_manager.invalidate_scope(NAMESPACE, business_id)
+
@@ -1,41 +1,27 @@
 """
 Client service for interacting with ARCA Web Services.
 """
+import contextlib
 from datetime import datetime, timedelta
 import os
-from pathlib import Path
 import xml.etree.ElementTree as ET
 from zeep import Client
-from zeep.transports import Transport
 from zeep.exceptions import Fault
 from typing import Dict, Optional, Tuple, Any, List
 import requests
-from requests.adapters import HTTPAdapter
 import urllib3
-import ssl
 import json
 import random
 import asyncio
 
 from app.core.config import settings
+from app.services.afip.client_registry import get_afip_session, get_soap_client
+from app.services.afip.credentials import PemSource
 from app.services.afip.ticket_access import get_access_ticket
 
 # Desactivar advertencias de SSL inseguro (solo en desarrollo)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-class CustomSSLAdapter(HTTPAdapter):
-    def __init__(self, ssl_context=None, **kwargs):
-        self.ssl_context = ssl_context
-        super().__init__(**kwargs)
-
-    def init_poolmanager(self, *args, **kwargs):
-        kwargs['ssl_context'] = self.ssl_context
-        return super().init_poolmanager(*args, **kwargs)
-        
-    def proxy_manager_for(self, *args, **kwargs):
-        kwargs['ssl_context'] = self.ssl_context
-        return super().proxy_manager_for(*args, **kwargs)
-
 def generate_afip_soap_xml(operation: str, params: Dict[str, Any]) -> str:
     """
     Generate a properly formatted SOAP XML request for ARCA web services.
@@ -180,22 +166,8 @@ async def send_raw_soap_request(wsdl_url: str, operation: str, params: Dict[str,
         # Generate the SOAP XML request
         xml_request = generate_afip_soap_xml(operation, params)
         
-        # Create a session with custom SSL settings
-        session = requests.Session()
-        
-        # Configure SSL
-        context = ssl.create_default_context()
-        context.set_ciphers('DEFAULT@SECLEVEL=0')
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-        
-        # Create custom session with SSL configuration
-        adapter = CustomSSLAdapter(ssl_context=context, max_retries=3)
-        session.mount('https://', adapter)
-        session.mount('http://', adapter)
-        
-        # Apply context to HTTPS requests
-        session.verify = False
+        # Shared keep-alive session with ARCA's SSL settings
+        session = get_afip_session()
         
         # Service URL from WSDL
         service_url = wsdl_url.replace('?WSDL', '')
@@ -322,7 +294,7 @@ class AfipError(Exception):
         self.code = code
         super().__init__(self.message)
 
-async def get_client(service: str, cert_path: Path, key_path: Path, wsaa_wsdl: str, wsfe_wsdl: str, cuit: str, supabase_client: Any = None, negocio_id: Optional[str] = None) -> Tuple[Client, Dict[str, str]]:
+async def get_client(service: str, cert_path: PemSource, key_path: PemSource, wsaa_wsdl: str, wsfe_wsdl: str, cuit: str, supabase_client: Any = None, negocio_id: Optional[str] = None) -> Tuple[Client, Dict[str, str]]:
     """
     Get a configured SOAP client for the specified ARCA service.
     
@@ -348,51 +320,9 @@ async def get_client(service: str, cert_path: Path, key_path: Path, wsaa_wsdl: s
     else:
         raise AfipError(f"Unsupported service: {service}")
     
-    # Create client with custom transport configuration
+    # Cached client (WSDL parsed once per process) on the shared keep-alive session
     try:
-        # Create custom SSL context
-        context = ssl.create_default_context()
-        context.set_ciphers('DEFAULT@SECLEVEL=0')
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-        
-        # Create custom session with SSL configuration
-        session = requests.Session()
-        
-        # Configure custom SSL adapter
-        adapter = CustomSSLAdapter(ssl_context=context, max_retries=3)
-        session.mount('https://', adapter)
-        session.mount('http://', adapter)
-        
-        # Apply context to HTTPS requests
-        session.verify = False
-        
-        # Set specific headers required by ARCA
-        headers = {
-            'Cache-Control': 'no-cache',
-            'Content-Type': 'text/xml; charset=utf-8',
-            'SOAPAction': f'http://ar.gov.afip.dif.FEV1/{service}',
-            'Accept': '*/*',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive'
-        }
-        
-        # Update session headers
-        session.headers.update(headers)
-        
-        # Create Zeep transport with custom session
-        transport = Transport(session=session)
-        
-        # Create client with custom transport
-        client = Client(wsdl_url, transport=transport)
-        
-        # Set proper SOAPAction header based on operation
-        if hasattr(client.service, '_binding'):
-            operations = getattr(client.service._binding, '_operations', {})
-            for name, operation in operations.items():
-                # Dynamically set SOAPAction for each operation
-                if hasattr(operation, 'soap_action'):
-                    operation.soap_action = f'http://ar.gov.afip.dif.FEV1/{name}'
+        client = get_soap_client(service, wsdl_url)
         
         auth = {
             "Token": ticket_data["token"],
@@ -458,7 +388,7 @@ async def get_client(service: str, cert_path: Path, key_path: Path, wsaa_wsdl: s
             
         raise AfipError(f"Failed to create SOAP client: {str(e)}")
 
-async def get_server_status(cert_path: Path, key_path: Path, wsaa_wsdl: str, wsfe_wsdl: str, cuit: str, service: str = "wsfe", supabase_client: Any = None, negocio_id: Optional[str] = None) -> Dict[str, str]:
+async def get_server_status(cert_path: PemSource, key_path: PemSource, wsaa_wsdl: str, wsfe_wsdl: str, cuit: str, service: str = "wsfe", supabase_client: Any = None, negocio_id: Optional[str] = None) -> Dict[str, str]:
     """
     Check the status of the ARCA service.
     
@@ -482,8 +412,8 @@ async def get_server_status(cert_path: Path, key_path: Path, wsaa_wsdl: str, wsf
 async def get_last_voucher_number(
     punto_venta: int, 
     tipo_comprobante: int,
-    cert_path: Path,
-    key_path: Path,
+    cert_path: PemSource,
+    key_path: PemSource,
     wsaa_wsdl: str,
     wsfe_wsdl: str,
     cuit: str,
@@ -520,7 +450,7 @@ async def get_last_voucher_number(
     except Exception as e:
         raise AfipError(f"Failed to get last voucher number: {str(e)}")
 
-async def get_invoice_types(cert_path: Path, key_path: Path, wsaa_wsdl: str, wsfe_wsdl: str, cuit: str, service: str = "wsfe") -> Dict[str, Any]:
+async def get_invoice_types(cert_path: PemSource, key_path: PemSource, wsaa_wsdl: str, wsfe_wsdl: str, cuit: str, service: str = "wsfe") -> Dict[str, Any]:
     """
     Get available invoice types from ARCA.
     
@@ -542,7 +472,7 @@ async def get_invoice_types(cert_path: Path, key_path: Path, wsaa_wsdl: str, wsf
     except Exception as e:
         raise AfipError(f"Failed to get invoice types: {str(e)}")
 
-async def get_concept_types(cert_path: Path, key_path: Path, wsaa_wsdl: str, wsfe_wsdl: str, cuit: str, service: str = "wsfe") -> Dict[str, Any]:
+async def get_concept_types(cert_path: PemSource, key_path: PemSource, wsaa_wsdl: str, wsfe_wsdl: str, cuit: str, service: str = "wsfe") -> Dict[str, Any]:
     """
     Get available concept types from ARCA.
     
@@ -564,7 +494,7 @@ async def get_concept_types(cert_path: Path, key_path: Path, wsaa_wsdl: str, wsf
     except Exception as e:
         raise AfipError(f"Failed to get concept types: {str(e)}")
 
-async def get_document_types(cert_path: Path, key_path: Path, wsaa_wsdl: str, wsfe_wsdl: str, cuit: str, service: str = "wsfe") -> Dict[str, Any]:
+async def get_document_types(cert_path: PemSource, key_path: PemSource, wsaa_wsdl: str, wsfe_wsdl: str, cuit: str, service: str = "wsfe") -> Dict[str, Any]:
     """
     Get available document types from ARCA.
     
@@ -586,7 +516,7 @@ async def get_document_types(cert_path: Path, key_path: Path, wsaa_wsdl: str, ws
     except Exception as e:
         raise AfipError(f"Failed to get document types: {str(e)}")
 
-async def get_tax_types(cert_path: Path, key_path: Path, wsaa_wsdl: str, wsfe_wsdl: str, cuit: str, service: str = "wsfe") -> Dict[str, Any]:
+async def get_tax_types(cert_path: PemSource, key_path: PemSource, wsaa_wsdl: str, wsfe_wsdl: str, cuit: str, service: str = "wsfe") -> Dict[str, Any]:
     """
     Get available tax types from ARCA.
     
@@ -608,7 +538,7 @@ async def get_tax_types(cert_path: Path, key_path: Path, wsaa_wsdl: str, wsfe_ws
     except Exception as e:
         raise AfipError(f"Failed to get tax types: {str(e)}")
 
-async def get_currency_types(cert_path: Path, key_path: Path, wsaa_wsdl: str, wsfe_wsdl: str, cuit: str, service: str = "wsfe") -> Dict[str, Any]:
+async def get_currency_types(cert_path: PemSource, key_path: PemSource, wsaa_wsdl: str, wsfe_wsdl: str, cuit: str, service: str = "wsfe") -> Dict[str, Any]:
     """
     Get available currency types from ARCA.
     
@@ -630,7 +560,7 @@ async def get_currency_types(cert_path: Path, key_path: Path, wsaa_wsdl: str, ws
     except Exception as e:
         raise AfipError(f"Failed to get currency types: {str(e)}")
 
-async def get_optional_types(cert_path: Path, key_path: Path, wsaa_wsdl: str, wsfe_wsdl: str, cuit: str, service: str = "wsfe") -> Dict[str, Any]:
+async def get_optional_types(cert_path: PemSource, key_path: PemSource, wsaa_wsdl: str, wsfe_wsdl: str, cuit: str, service: str = "wsfe") -> Dict[str, Any]:
     """
     Get available optional data types from ARCA.
     
@@ -654,8 +584,8 @@ async def get_optional_types(cert_path: Path, key_path: Path, wsaa_wsdl: str, ws
 
 async def create_invoice(
     invoice_data: Dict[str, Any],
-    cert_path: Path,
-    key_path: Path,
+    cert_path: PemSource,
+    key_path: PemSource,
     wsaa_wsdl: str,
     wsfe_wsdl: str,
     cuit: str,
@@ -876,11 +806,8 @@ async def create_invoice(
                 # Try with the Zeep client first
                 client, auth = await get_client(service, cert_path, key_path, wsaa_wsdl, wsfe_wsdl, cuit, supabase_client, negocio_id)
                 
-                # Update SOAPAction header specifically for this operation
-                if hasattr(client.transport, 'session'):
-                    client.transport.session.headers.update({
-                        'SOAPAction': 'http://ar.gov.afip.dif.FEV1/FECAESolicitar'
-                    })
+                # SOAPAction is set per operation when the shared client is created
+                # (client_registry); the shared session must not be mutated here.
                 
                 # Estructura exacta según documentación de ARCA
                 req = {
@@ -975,25 +902,12 @@ async def create_invoice(
                     
                 print(f"Enviando solicitud de factura a ARCA: {req}")
                 
-                # Log request XML for debugging
-                if hasattr(client.transport, 'session'):
-                    client.settings.strict = False  # type: ignore
-                    _original_post = client.transport.session.post
-                    
-                    def _capturing_post(*args, **kwargs):
-                        print(f"SOAP Request URL: {args[0]}")
-                        if 'data' in kwargs:
-                            print(f"SOAP Request XML: {kwargs['data']}")
-                        return _original_post(*args, **kwargs)
-                    
-                    client.transport.session.post = _capturing_post  # type: ignore[assignment]
-                    
-                # Llamar al servicio web de ARCA
-                result = client.service.FECAESolicitar(**req)
-                
-                # Restore original post method
-                if hasattr(client.transport, 'session') and '_original_post' in locals():
-                    client.transport.session.post = _original_post  # type: ignore[assignment]
+                # Llamar al servicio web de ARCA. El cliente zeep es compartido:
+                # strict=False se aplica solo a esta llamada (override por hilo).
+                # (el cliente simulado de dev no tiene settings)
+                strict_off = client.settings(strict=False) if hasattr(client, 'settings') else contextlib.nullcontext()
+                with strict_off:
+                    result = client.service.FECAESolicitar(**req)
                 
                 if hasattr(result, "Errors") and result.Errors:
                     error_msg = ", ".join(f"{error.Code}: {error.Msg}" for error in result.Errors)
@@ -1042,8 +956,8 @@ async def get_invoice_info(
     punto_venta: int,
     tipo_comprobante: int,
     nro_comprobante: int,
-    cert_path: Path,
-    key_path: Path,
+    cert_path: PemSource,
+    key_path: PemSource,
     wsaa_wsdl: str,
     wsfe_wsdl: str,
     cuit: str,
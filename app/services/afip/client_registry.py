@@ -0,0 +1,136 @@
+"""
+Process-wide registry of ARCA SOAP clients and HTTP session.
+
+Building a zeep `Client(wsdl_url)` downloads and parses the WSDL (plus its
+imported XSDs) — seconds per call against the government endpoints. Clients
+are therefore created once per process and per (service, wsdl_url), which
+encodes the environment (homologación / producción), on top of a single
+keep-alive `requests.Session`. WSDL documents are also kept in a persistent
+zeep SqliteCache so a fresh worker does not hit ARCA to parse them again.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import ssl
+import threading
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from zeep import Client
+from zeep.cache import InMemoryCache, SqliteCache
+from zeep.transports import Transport
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_sessions: Dict[int, requests.Session] = {}
+_clients: Dict[Tuple[int, str, str], Client] = {}
+_wsdl_cache = None
+
+
+class CustomSSLAdapter(HTTPAdapter):
+    def __init__(self, ssl_context=None, **kwargs):
+        self.ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self.ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, *args, **kwargs):
+        kwargs['ssl_context'] = self.ssl_context
+        return super().proxy_manager_for(*args, **kwargs)
+
+
+def _build_ssl_context() -> ssl.SSLContext:
+    # ARCA todavía negocia con cifrados/DH legacy
+    context = ssl.create_default_context()
+    context.set_ciphers('DEFAULT@SECLEVEL=0')
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def get_afip_session() -> requests.Session:
+    """Keep-alive session (per process) with the SSL settings ARCA requires."""
+    pid = os.getpid()
+    session = _sessions.get(pid)
+    if session is not None:
+        return session
+    with _lock:
+        session = _sessions.get(pid)
+        if session is None:
+            session = requests.Session()
+            adapter = CustomSSLAdapter(
+                ssl_context=_build_ssl_context(),
+                max_retries=3,
+                pool_connections=4,
+                pool_maxsize=settings.AFIP_HTTP_POOL_MAXSIZE,
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.verify = False
+            session.headers.update({
+                'Cache-Control': 'no-cache',
+                'Accept': '*/*',
+                'Accept-Encoding': 'gzip, deflate, br',
+                'Connection': 'keep-alive'
+            })
+            _sessions[pid] = session
+    return session
+
+
+def _get_wsdl_cache():
+    global _wsdl_cache
+    if _wsdl_cache is None:
+        try:
+            _wsdl_cache = SqliteCache(path=settings.AFIP_WSDL_CACHE_PATH, timeout=settings.AFIP_WSDL_CACHE_TTL)
+        except Exception as e:
+            logger.warning("No se pudo abrir cache WSDL persistente (%s), usando memoria", e)
+            _wsdl_cache = InMemoryCache(timeout=settings.AFIP_WSDL_CACHE_TTL)
+    return _wsdl_cache
+
+
+def _fix_soap_actions(client: Client, namespace: str) -> None:
+    # Set proper SOAPAction header based on operation
+    if hasattr(client.service, '_binding'):
+        operations = getattr(client.service._binding, '_operations', {})
+        for name, operation in operations.items():
+            if hasattr(operation, 'soap_action'):
+                operation.soap_action = f'{namespace}{name}'
+
+
+def get_soap_client(service: str, wsdl_url: str) -> Client:
+    """
+    Cached zeep client for `service` ('wsaa', 'wsfe', ...) at `wsdl_url`.
+    The returned client is shared: do not mutate its transport per call.
+    """
+    key = (os.getpid(), service, wsdl_url)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is not None:
+            return client
+    # Fuera del lock: la carga del WSDL es lenta y no debe bloquear otros servicios
+    transport = Transport(session=get_afip_session(), cache=_get_wsdl_cache(), timeout=30, operation_timeout=60)
+    client = Client(wsdl_url, transport=transport)
+    if service != "wsaa":
+        _fix_soap_actions(client, 'http://ar.gov.afip.dif.FEV1/')
+    with _lock:
+        client = _clients.setdefault(key, client)
+    logger.info("[afip] Cliente SOAP %s creado para %s", service, wsdl_url)
+    return client
+
+
+def clear_soap_clients(wsdl_url: Optional[str] = None) -> None:
+    """Drop cached clients (all, or those for one WSDL), e.g. after a WSDL change."""
+    with _lock:
+        for key in list(_clients):
+            if wsdl_url is None or key[2] == wsdl_url:
+                del _clients[key]
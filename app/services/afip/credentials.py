@@ -0,0 +1,113 @@
+"""
+In-memory ARCA certificate / private key material per negocio.
+
+The CRT and KEY live in the `certificados_afip` storage bucket. They used to be
+downloaded and written to a temp dir for every invoice; now they are loaded
+once per process and kept in memory (PEM bytes plus the parsed objects used
+to sign the WSAA login ticket).
+
+Entries are keyed by negocio and validated against the storage paths stored in
+`configuracion_fiscal`: uploads always use a new timestamped path, so other
+processes pick up new material on their next read even without an explicit
+`invalidate_afip_credentials` call.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+from cryptography.x509 import load_pem_x509_certificate
+
+logger = logging.getLogger(__name__)
+
+CERT_BUCKET = "certificados_afip"
+
+# Certificate/key source accepted by the AFIP services: a file path or PEM bytes.
+PemSource = Union[Path, bytes]
+
+
+@dataclass(frozen=True)
+class AfipCredentials:
+    cert_path: str
+    key_path: str
+    cert_pem: bytes = field(repr=False)
+    key_pem: bytes = field(repr=False)
+
+
+_lock = threading.Lock()
+_credentials: Dict[str, AfipCredentials] = {}
+# sha256(cert_pem + key_pem) -> (certificate, private_key)
+_parsed: Dict[str, Tuple[Any, Any]] = {}
+
+
+def get_afip_credentials(storage_client: Any, negocio_id: str, config: Dict[str, Any]) -> AfipCredentials:
+    """Return the negocio's cert/key, downloading them only when the stored paths change."""
+    cert_path = config.get("cert_path") or ""
+    key_path = config.get("key_path") or ""
+    cached = _credentials.get(negocio_id)
+    if cached is not None and cached.cert_path == cert_path and cached.key_path == key_path:
+        return cached
+
+    bucket = storage_client.storage.from_(CERT_BUCKET)
+    credentials = AfipCredentials(
+        cert_path=cert_path,
+        key_path=key_path,
+        cert_pem=bucket.download(cert_path),
+        key_pem=bucket.download(key_path),
+    )
+    with _lock:
+        previous = _credentials.get(negocio_id)
+        _credentials[negocio_id] = credentials
+        if previous is not None:
+            _parsed.pop(_material_key(previous.cert_pem, previous.key_pem), None)
+    logger.info("[afip] Certificados cargados en memoria para negocio %s", negocio_id)
+    return credentials
+
+
+def invalidate_afip_credentials(negocio_id: str) -> None:
+    """Forget the negocio's material (called when configuracion_fiscal changes)."""
+    with _lock:
+        previous = _credentials.pop(negocio_id, None)
+        if previous is not None:
+            _parsed.pop(_material_key(previous.cert_pem, previous.key_pem), None)
+
+
+def _material_key(cert_pem: bytes, key_pem: bytes) -> str:
+    return hashlib.sha256(cert_pem + b"\0" + key_pem).hexdigest()
+
+
+def _read(source: PemSource) -> Optional[bytes]:
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    path = Path(source)
+    if not path.exists():
+        return None
+    return path.read_bytes()
+
+
+def load_signing_material(cert_source: PemSource, key_source: PemSource) -> Optional[Tuple[Any, Any]]:
+    """
+    Parsed (certificate, private_key) for signing the TRA.
+    Returns None when a file source does not exist. Parsed objects are reused
+    while the PEM content is unchanged.
+    """
+    cert_pem = _read(cert_source)
+    key_pem = _read(key_source)
+    if cert_pem is None or key_pem is None:
+        return None
+
+    material_key = _material_key(cert_pem, key_pem)
+    parsed = _parsed.get(material_key)
+    if parsed is None:
+        private_key = load_pem_private_key(key_pem, password=None, backend=default_backend())
+        certificate = load_pem_x509_certificate(cert_pem, default_backend())
+        parsed = (certificate, private_key)
+        with _lock:
+            _parsed[material_key] = parsed
+    return parsed
@@ -1,87 +1,60 @@
 """
 Service for handling ARCA authentication tickets (TA).
 """
+import asyncio
 import base64
 import datetime
 import os
-import ssl
-from pathlib import Path
 from typing import Dict, Optional, Any
 from lxml import etree
-from zeep import Client
-from zeep.transports import Transport
-import requests
 import urllib3
-from requests.adapters import HTTPAdapter
-from cryptography.hazmat.primitives.serialization import load_pem_private_key
-import urllib3
-import ssl
-
-class CustomSSLAdapter(HTTPAdapter):
-    def __init__(self, ssl_context=None, **kwargs):
-        self.ssl_context = ssl_context
-        super().__init__(**kwargs)
-
-    def init_poolmanager(self, *args, **kwargs):
-        kwargs['ssl_context'] = self.ssl_context
-        return super().init_poolmanager(*args, **kwargs)
-        
-    def proxy_manager_for(self, *args, **kwargs):
-        kwargs['ssl_context'] = self.ssl_context
-        return super().proxy_manager_for(*args, **kwargs)
 
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.serialization import Encoding
-from cryptography.x509 import load_pem_x509_certificate
-from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.serialization import pkcs7
 
 from app.core.config import settings
+from app.services.afip.client_registry import get_soap_client
+from app.services.afip.credentials import PemSource, load_signing_material
+from app.services.afip import ticket_store
 
 # Desactivar advertencias de SSL inseguro (solo en desarrollo)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# Cache for tickets to avoid unnecessary WSAA calls
-ticket_cache: Dict[str, Dict[str, Any]] = {}
-
-async def sign_tra(tra: str, cert_path: Path, key_path: Path) -> Optional[str]:
+async def sign_tra(tra: str, cert_path: PemSource, key_path: PemSource) -> Optional[str]:
     """
     Sign a TRA with PKCS7 and return it in Base64 format.
     
     Args:
         tra: The XML TRA to sign
-        cert_path: Path to the certificate file
-        key_path: Path to the private key file
+        cert_path: PemSource to the certificate file, or its PEM bytes
+        key_path: PemSource to the private key file, or its PEM bytes
         
     Returns:
         Base64 encoded signed data or None if there was an error
     """
     try:
-        # Verificar si los archivos existen
-        if not cert_path.exists() or not key_path.exists():
-            print(f"Certificate ({cert_path.exists()}) or key ({key_path.exists()}) file not found")
+        # Cargar certificado y clave (ruta o PEM en memoria; objetos parseados cacheados)
+        try:
+            material = load_signing_material(cert_path, key_path)
+        except Exception as cert_error:
+            print(f"Error loading certificate or key: {cert_error}")
             # En entorno de desarrollo, generar firma ficticia para pruebas
             if settings.ENVIRONMENT == "dev":
                 print("DEV MODE: Generating mock signature for testing")
                 mock_data = "MOCKSIGNATURE_FOR_TESTING_ONLY_NOT_VALID"
                 return base64.b64encode(mock_data.encode()).decode()
             return None
-            
-        # Cargar y verificar el certificado y la clave
-        try:
-            with open(key_path, "rb") as key_file:
-                private_key = load_pem_private_key(key_file.read(), password=None, backend=default_backend())
-            
-            with open(cert_path, "rb") as cert_file:
-                certificate = load_pem_x509_certificate(cert_file.read(), default_backend())
-        except Exception as cert_error:
-            print(f"Error loading certificate or key: {cert_error}")
+
+        if material is None:
+            print("Certificate or key file not found")
             # En entorno de desarrollo, generar firma ficticia para pruebas
             if settings.ENVIRONMENT == "dev":
                 print("DEV MODE: Generating mock signature for testing")
                 mock_data = "MOCKSIGNATURE_FOR_TESTING_ONLY_NOT_VALID"
                 return base64.b64encode(mock_data.encode()).decode()
             return None
+        certificate, private_key = material
 
         # Sign the XML with PKCS#7 and DER encoding
         signer = pkcs7.PKCS7SignatureBuilder().set_data(tra.encode()).add_signer(
@@ -166,52 +139,13 @@ async def send_ticket_request(signed_data: str, wsaa_wsdl: str) -> Optional[str]
     </credentials>
 </loginTicketResponse>"""
             
-            # Guardar en un archivo para simular el comportamiento normal
-            os.makedirs("app/services/tickets", exist_ok=True)
-            
-            response_filename = f"app/services/tickets/{now.strftime('%y%m%d%H%M')}-loginTicketResponse.xml"
-            
-            with open(response_filename, "w", encoding="utf-8") as f:
-                f.write(mock_response)
-            
             return mock_response
     
-        # Crear un contexto SSL personalizado
-        context = ssl.create_default_context()
-        context.set_ciphers('DEFAULT@SECLEVEL=0')  # Permitir cifrados menos seguros
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-        
-        # Crear una sesión personalizada con configuración SSL ajustada
-        session = requests.Session()
-        
-        # Configurar la sesión con el adaptador personalizado
-        adapter = CustomSSLAdapter(ssl_context=context, max_retries=3)
-        session.mount('https://', adapter)
-        session.mount('http://', adapter)
-        
-        # Aplicar el contexto a las peticiones HTTPS
-        session.verify = False
-        
-        # Crear el transporte para Zeep con la sesión personalizada
-        transport = Transport(session=session)
-        
-        # Crear el cliente con el transporte personalizado
-        client = Client(wsaa_wsdl, transport=transport)
+        # Cliente WSAA compartido por proceso (WSDL parseado una sola vez)
+        client = get_soap_client("wsaa", wsaa_wsdl)
         
         response = client.service.loginCms(signed_data)
         
-        # Create directory if it doesn't exist
-        os.makedirs("app/services/tickets", exist_ok=True)
-        
-        # Save response to file
-        now = datetime.datetime.now()
-        unique_id = now.strftime("%y%m%d%H%M")
-        response_filename = f"app/services/tickets/{unique_id}-loginTicketResponse.xml"
-        
-        with open(response_filename, "w", encoding="utf-8") as f:
-            f.write(response)
-        
         return response
     except Exception as e:
         print(f"Error in WSAA call: {e}")
@@ -237,14 +171,6 @@ async def send_ticket_request(signed_data: str, wsaa_wsdl: str) -> Optional[str]
     </credentials>
 </loginTicketResponse>"""
             
-            # Guardar en un archivo para simular el comportamiento normal
-            os.makedirs("app/services/tickets", exist_ok=True)
-            
-            response_filename = f"app/services/tickets/{now.strftime('%y%m%d%H%M')}-loginTicketResponse.xml"
-            
-            with open(response_filename, "w", encoding="utf-8") as f:
-                f.write(mock_response)
-            
             return mock_response
             
         raise Exception(f"WSAA Error: {e}")
@@ -278,27 +204,24 @@ async def parse_ticket_response(response: str) -> Dict[str, str]:
         print(f"Error parsing ticket response: {e}")
         return {}
 
-async def check_ticket_validity(service: str, cuit: str, client: Any = None, negocio_id: Optional[str] = None) -> Optional[Dict[str, str]]:
+async def check_ticket_validity(service: str, cuit: str, ambiente: str, client: Any = None, negocio_id: Optional[str] = None) -> Optional[Dict[str, str]]:
     """
     Check if a valid ticket exists for the specified service.
     
     Args:
         service: Service ID (e.g., 'wsfe')
         cuit: CUIT number
+        ambiente: 'homologacion' or 'produccion'
         client: Supabase client (optional)
         negocio_id: Business ID (optional)
         
     Returns:
         Dictionary with token and sign or None if no valid ticket exists
     """
-    # Check in-memory cache first
-    if f"{service}_{cuit}" in ticket_cache:
-        ticket = ticket_cache[f"{service}_{cuit}"]
-        expiration = datetime.datetime.fromisoformat(ticket["expiration"])
-        now = datetime.datetime.now(expiration.tzinfo if expiration.tzinfo else None)
-        
-        if expiration > now:
-            return ticket
+    # Ticket compartido entre procesos (Redis + copia local)
+    ticket = ticket_store.get_ticket(service, cuit, ambiente)
+    if ticket:
+        return ticket
             
     # Check in database if client is provided
     if client and negocio_id:
@@ -306,64 +229,83 @@ async def check_ticket_validity(service: str, cuit: str, client: Any = None, neg
             config_resp = client.table("configuracion_fiscal").select("wsaa_token, wsaa_sign, wsaa_expiration, wsaa_generation").eq("negocio_id", negocio_id).execute()
             if config_resp.data and config_resp.data[0].get("wsaa_token") and config_resp.data[0].get("wsaa_expiration"):
                 config = config_resp.data[0]
-                expiration_str = config["wsaa_expiration"]
-                # Postgres timestamp with time zone is returned as string
-                expiration = datetime.datetime.fromisoformat(expiration_str.replace("Z", "+00:00"))
-                now = datetime.datetime.now(datetime.timezone.utc)
-                
-                if expiration > now:
-                    ticket_data = {
-                        "token": config["wsaa_token"],
-                        "sign": config["wsaa_sign"],
-                        "expiration": expiration_str,
-                        "generation": config.get("wsaa_generation", "")
-                    }
-                    ticket_cache[f"{service}_{cuit}"] = ticket_data
+                ticket_data = {
+                    "token": config["wsaa_token"],
+                    "sign": config["wsaa_sign"],
+                    "expiration": config["wsaa_expiration"],
+                    "generation": config.get("wsaa_generation", "")
+                }
+                if ticket_store.is_valid(ticket_data):
+                    # Publicarlo para que el resto de los procesos no vuelva a leer la base
+                    ticket_store.save_ticket(service, cuit, ambiente, ticket_data)
                     return ticket_data
         except Exception as e:
             print(f"Error checking ticket in database: {e}")
     
-    # Check for saved ticket files (Fallback)
+    return None
+
+def _with_cuit(ticket: Dict[str, str], cuit: str) -> Dict[str, str]:
+    # Add CUIT to ticket data
+    if cuit:
+        ticket["cuit"] = cuit
+    elif "ARCA_CUIT" in os.environ:
+        ticket["cuit"] = os.environ["ARCA_CUIT"]
+    return ticket
+
+async def _acquire_renewal_lock(service: str, cuit: str, ambiente: str, wait: bool) -> tuple:
+    """
+    Try to take the renewal lock for (ambiente, service, cuit).
+    Returns (lock, acquired); lock is None when Redis is unavailable.
+    With wait=False a busy lock returns immediately (someone else is renewing).
+    """
+    lock = ticket_store.renewal_lock(service, cuit, ambiente)
+    if lock is None:
+        return None, False
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (settings.AFIP_TICKET_LOCK_WAIT if wait else 0)
     try:
-        ticket_dir = Path("app/services/tickets")
-        if not ticket_dir.exists():
-            return None
-            
-        response_files = list(ticket_dir.glob("*-loginTicketResponse.xml"))
-        if not response_files:
-            return None
-            
-        # Find the most recent file
-        latest_file = max(response_files, key=os.path.getctime)
-        
-        # Parse the XML
-        with open(latest_file, "r", encoding="utf-8") as f:
-            response = f.read()
-            
-        # Parse the ticket
-        ticket_data = await parse_ticket_response(response)
-        
-        # Check expiration
-        if not ticket_data or "expiration" not in ticket_data:
-            return None
-            
-        expiration = datetime.datetime.fromisoformat(ticket_data["expiration"])
-        now = datetime.datetime.now(expiration.tzinfo if expiration.tzinfo else None)
-        
-        if expiration > now:
-            # Add to cache
-            ticket_cache[f"{service}_{cuit}"] = ticket_data
-            return ticket_data
-            
-        return None
+        while True:
+            if lock.acquire(blocking=False):
+                return lock, True
+            if loop.time() >= deadline:
+                return lock, False
+            # Otro proceso está llamando a LoginCms; esperar su ticket
+            await asyncio.sleep(0.25)
+    except Exception as e:
+        print(f"Ticket renewal lock unavailable, renewing without coordination: {e}")
+        return None, False
+
+def _release(lock: Any) -> None:
+    try:
+        lock.release()
     except Exception as e:
-        print(f"Error checking ticket validity fallback: {e}")
+        # El lock pudo expirar si LoginCms tardó más que AFIP_TICKET_LOCK_TIMEOUT
+        print(f"Error releasing ticket renewal lock: {e}")
+
+async def _request_new_ticket(service: str, cert_path: PemSource, key_path: PemSource, wsaa_wsdl: str) -> Optional[Dict[str, str]]:
+    # Create login ticket request
+    tra = await create_login_ticket(service)
+    
+    # Sign the request
+    signed_data = await sign_tra(tra, cert_path, key_path)
+    if not signed_data:
+        raise Exception("Failed to sign TRA. Certificate or private key might be invalid or mismatched.")
+    
+    # Send to WSAA
+    response = await send_ticket_request(signed_data, wsaa_wsdl)
+    if not response:
         return None
+    
+    # Parse response
+    ticket_data = await parse_ticket_response(response)
+    return ticket_data if ticket_data.get("token") else None
 
-async def get_access_ticket(service: str, cert_path: Path, key_path: Path, wsaa_wsdl: str, cuit: str, client: Any = None, negocio_id: Optional[str] = None) -> Optional[Dict[str, str]]:
+async def get_access_ticket(service: str, cert_path: PemSource, key_path: PemSource, wsaa_wsdl: str, cuit: str, client: Any = None, negocio_id: Optional[str] = None) -> Optional[Dict[str, str]]:
     """
     Get a valid access ticket for the specified ARCA service.
-    If no valid ticket exists, create a new one.
+    If no valid ticket exists (or it is about to expire), create a new one.
+    Only one process renews a given (service, cuit) at a time; the others
+    wait for the renewed ticket or keep using the current one.
     
     Args:
         service: Service ID (e.g., 'wsfe')
@@ -374,40 +316,52 @@ async def get_access_ticket(service: str, cert_path: Path, key_path: Path, wsaa_
     Returns:
         Dictionary with token, sign and cuit or None if there was an error
     """
+    # Los tickets de homologación y producción no son intercambiables
+    ambiente = ticket_store.ambiente_de(wsaa_wsdl)
+    
     # Check if a valid ticket exists
-    ticket = await check_ticket_validity(service, cuit, client, negocio_id)
-    if ticket:
-        # Add CUIT to ticket data
-        if cuit:
-            ticket["cuit"] = cuit
-        elif "ARCA_CUIT" in os.environ:
-            ticket["cuit"] = os.environ["ARCA_CUIT"]
-        
-        return ticket
+    ticket = await check_ticket_validity(service, cuit, ambiente, client, negocio_id)
+    if ticket and not ticket_store.needs_renewal(ticket):
+        return _with_cuit(ticket, cuit)
+    if ticket_store.is_valid(ticket) and ticket_store.in_renewal_backoff(service, cuit, ambiente):
+        # Una renovación anticipada falló hace poco: seguir con el TA vigente
+        return _with_cuit(ticket, cuit)
+    
+    # Sin ticket hay que esperar al que esté renovando; con uno vigente no
+    lock, acquired = await _acquire_renewal_lock(service, cuit, ambiente, wait=ticket is None)
+    if lock is not None and not acquired:
+        renewed = ticket_store.get_ticket(service, cuit, ambiente) or ticket
+        if renewed:
+            return _with_cuit(renewed, cuit)
+        print(f"Timed out waiting for {service} ticket renewal, requesting a new one")
     
-    # Create a new ticket
     try:
-        # Create login ticket request
-        tra = await create_login_ticket(service)
-        
-        # Sign the request
-        signed_data = await sign_tra(tra, cert_path, key_path)
-        if not signed_data:
-            raise Exception("Failed to sign TRA. Certificate or private key might be invalid or mismatched.")
+        if acquired:
+            # Otro proceso pudo haberlo renovado mientras esperábamos el lock
+            fresh = ticket_store.get_ticket(service, cuit, ambiente)
+            if fresh and not ticket_store.needs_renewal(fresh):
+                return _with_cuit(fresh, cuit)
         
-        # Send to WSAA
-        response = await send_ticket_request(signed_data, wsaa_wsdl)
-        if not response:
+        try:
+            ticket_data = await _request_new_ticket(service, cert_path, key_path, wsaa_wsdl)
+        except Exception as e:
+            if ticket_store.is_valid(ticket):
+                # WSAA puede rechazar la renovación anticipada (TA vigente); seguir con el actual
+                print(f"Early ticket renewal failed, keeping current ticket: {e}")
+                ticket_store.start_renewal_backoff(service, cuit, ambiente)
+                return _with_cuit(ticket, cuit)
+            raise
+        if not ticket_data:
+            if ticket_store.is_valid(ticket):
+                ticket_store.start_renewal_backoff(service, cuit, ambiente)
+                return _with_cuit(ticket, cuit)
             return None
         
-        # Parse response
-        ticket_data = await parse_ticket_response(response)
-        
-        # Add to cache
-        ticket_cache[f"{service}_{cuit}"] = ticket_data
+        # Compartir con el resto de los procesos
+        ticket_store.save_ticket(service, cuit, ambiente, ticket_data)
         
         # Save to database if client is provided
-        if client and negocio_id and "token" in ticket_data and "expiration" in ticket_data:
+        if client and negocio_id and "expiration" in ticket_data:
             try:
                 client.table("configuracion_fiscal").update({
                     "wsaa_token": ticket_data["token"],
@@ -417,14 +371,11 @@ async def get_access_ticket(service: str, cert_path: Path, key_path: Path, wsaa_
                 }).eq("negocio_id", negocio_id).execute()
             except Exception as db_err:
                 print(f"Error saving ticket to database: {db_err}")
-        
-        # Add CUIT to ticket data
-        if cuit:
-            ticket_data["cuit"] = cuit
-        elif "ARCA_CUIT" in os.environ:
-            ticket_data["cuit"] = os.environ["ARCA_CUIT"]
             
-        return ticket_data
+        return _with_cuit(ticket_data, cuit)
     except Exception as e:
         print(f"Error getting access ticket: {e}")
-        raise e 
\ No newline at end of file
+        raise e
+    finally:
+        if acquired:
+            _release(lock)
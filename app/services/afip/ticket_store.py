@@ -0,0 +1,167 @@
+"""
+Shared store for ARCA WSAA access tickets (TA).
+
+A TA is valid for ~12h and WSAA rejects a new LoginCms for the same
+(service, CUIT) while one is still valid, so every process must reuse the same
+ticket. Tickets live in Redis under `afip:ta:{ambiente}:{service}:{cuit}` (a
+homologación ticket is useless in producción) with a TTL that
+matches their expiration, so a cold worker reads the current ticket instead of
+calling LoginCms. A small per-process copy avoids a Redis round-trip per
+invoice; renewals are serialized with a Redis lock per (ambiente, service, cuit).
+When an early renewal fails (WSAA rejects LoginCms while the TA is still valid)
+a short backoff key stops every process from retrying on each invoice.
+
+When Redis is unavailable the store degrades to the per-process copy (plus the
+`configuracion_fiscal` columns handled in ticket_access).
+"""
+from __future__ import annotations
+
+import datetime
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_redis_client: Optional[redis.Redis] = None
+_lock = threading.Lock()
+# "{ambiente}:{service}:{cuit}" -> ticket dict (token, sign, expiration, generation)
+_local: Dict[str, Dict[str, Any]] = {}
+# "{ambiente}:{service}:{cuit}" -> monotonic deadline of the renewal backoff (copy of the Redis key)
+_backoff_until: Dict[str, float] = {}
+
+
+def _get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.from_url(settings.REDIS_URL, socket_connect_timeout=2, socket_timeout=2)
+    return _redis_client
+
+
+def ambiente_de(wsaa_wsdl: str) -> str:
+    """'homologacion' or 'produccion' according to the WSAA endpoint in use."""
+    return "homologacion" if "homo" in (wsaa_wsdl or "").lower() else "produccion"
+
+
+def _key(service: str, cuit: Any, ambiente: str) -> str:
+    return f"{ambiente}:{service}:{cuit}"
+
+
+def ticket_key(service: str, cuit: Any, ambiente: str) -> str:
+    return f"afip:ta:{ambiente}:{service}:{cuit}"
+
+
+def lock_name(service: str, cuit: Any, ambiente: str) -> str:
+    return f"afip:ta_lock:{ambiente}:{service}:{cuit}"
+
+
+def backoff_key(service: str, cuit: Any, ambiente: str) -> str:
+    return f"afip:ta_backoff:{ambiente}:{service}:{cuit}"
+
+
+def seconds_left(ticket: Optional[Dict[str, Any]]) -> float:
+    """Seconds until the ticket expires (<= 0 when expired or unparseable)."""
+    if not ticket or not ticket.get("expiration"):
+        return 0.0
+    try:
+        expiration = datetime.datetime.fromisoformat(str(ticket["expiration"]).replace("Z", "+00:00"))
+    except ValueError:
+        return 0.0
+    now = datetime.datetime.now(expiration.tzinfo if expiration.tzinfo else None)
+    return (expiration - now).total_seconds()
+
+
+def is_valid(ticket: Optional[Dict[str, Any]]) -> bool:
+    return seconds_left(ticket) > 0
+
+
+def needs_renewal(ticket: Optional[Dict[str, Any]], margin: Optional[int] = None) -> bool:
+    """True when the ticket is missing, expired or within the renewal margin."""
+    margin = settings.AFIP_TICKET_RENEW_MARGIN if margin is None else margin
+    return seconds_left(ticket) <= margin
+
+
+def get_ticket(service: str, cuit: Any, ambiente: str) -> Optional[Dict[str, Any]]:
+    """Current ticket for (ambiente, service, cuit), or None if there is no valid one."""
+    local = _local.get(_key(service, cuit, ambiente))
+    if is_valid(local) and not needs_renewal(local):
+        return dict(local)
+
+    try:
+        raw = _get_redis().get(ticket_key(service, cuit, ambiente))
+    except Exception as e:
+        logger.warning("[afip] Ticket store no disponible (%s), usando copia local", e)
+        return dict(local) if is_valid(local) else None
+
+    if raw:
+        try:
+            ticket = json.loads(raw)
+        except (TypeError, ValueError):
+            ticket = None
+        if is_valid(ticket):
+            with _lock:
+                _local[_key(service, cuit, ambiente)] = ticket
+            return dict(ticket)
+    return dict(local) if is_valid(local) else None
+
+
+def save_ticket(service: str, cuit: Any, ambiente: str, ticket: Dict[str, Any]) -> None:
+    """Publish a ticket to every process until it expires."""
+    data = {k: ticket.get(k) for k in ("token", "sign", "expiration", "generation")}
+    ttl = int(seconds_left(data))
+    if ttl <= 0:
+        return
+    with _lock:
+        _local[_key(service, cuit, ambiente)] = data
+    try:
+        _get_redis().set(ticket_key(service, cuit, ambiente), json.dumps(data), ex=ttl)
+    except Exception as e:
+        logger.warning("[afip] No se pudo guardar el ticket %s/%s/%s en Redis: %s", ambiente, service, cuit, e)
+
+
+def forget_ticket(service: str, cuit: Any, ambiente: str) -> None:
+    """Drop the ticket (e.g. when ARCA rejects it as invalid)."""
+    with _lock:
+        _local.pop(_key(service, cuit, ambiente), None)
+    try:
+        _get_redis().delete(ticket_key(service, cuit, ambiente))
+    except Exception as e:
+        logger.warning("[afip] No se pudo eliminar el ticket %s/%s/%s de Redis: %s", ambiente, service, cuit, e)
+
+
+def renewal_lock(service: str, cuit: Any, ambiente: str) -> Optional[Any]:
+    """Redis lock for renewing (ambiente, service, cuit); None when Redis is unavailable."""
+    try:
+        return _get_redis().lock(lock_name(service, cuit, ambiente), timeout=settings.AFIP_TICKET_LOCK_TIMEOUT)
+    except Exception as e:
+        logger.warning("[afip] Lock de ticket no disponible (%s), renovando sin coordinación", e)
+        return None
+
+
+def start_renewal_backoff(service: str, cuit: Any, ambiente: str, seconds: Optional[int] = None) -> None:
+    """Stop early renewals of (service, cuit) for a while after one failed."""
+    seconds = settings.AFIP_TICKET_RENEW_BACKOFF if seconds is None else seconds
+    if seconds <= 0:
+        return
+    with _lock:
+        _backoff_until[_key(service, cuit, ambiente)] = time.monotonic() + seconds
+    try:
+        _get_redis().set(backoff_key(service, cuit, ambiente), "1", ex=seconds)
+    except Exception as e:
+        logger.warning("[afip] No se pudo guardar el backoff de %s/%s/%s en Redis: %s", ambiente, service, cuit, e)
+
+
+def in_renewal_backoff(service: str, cuit: Any, ambiente: str) -> bool:
+    """True while a recent early renewal of (service, cuit) failed in any process."""
+    if _backoff_until.get(_key(service, cuit, ambiente), 0.0) > time.monotonic():
+        return True
+    try:
+        return bool(_get_redis().get(backoff_key(service, cuit, ambiente)))
+    except Exception:
+        return False
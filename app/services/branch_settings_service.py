@@ -7,7 +7,7 @@ from typing import Any, Dict, Optional
 from app.db.scoped_client import ScopedSupabaseClient
 from app.db.supabase_client import get_supabase_service_client
 from app.schemas.branch_settings import BranchSettings, BranchSettingsUpdate
-from app.services.config_cache import invalidate_negocio_config
+from app.services.config_cache import get_negocio_settings, invalidate_negocio_config
 
 logger = logging.getLogger(__name__)
 
@@ -19,22 +19,10 @@ class BranchSettingsService:
 
     Writes always use the service-role client (bypasses RLS) so updates are
     never silently dropped due to missing RLS UPDATE/INSERT policies.
-    Reads use the user-scoped client so RLS still gates visibility.
+    Reads go through the shared negocio_configuracion cache (config_cache);
+    every write invalidates it in all processes.
     """
 
-    _SELECT_COLUMNS = (
-        "negocio_id,"
-        "inventario_modo,"
-        "servicios_modo,"
-        "catalogo_producto_modo,"
-        "permite_transferencias,"
-        "transferencia_auto_confirma,"
-        "default_branch_id,"
-        "metadata,"
-        "created_at,"
-        "updated_at"
-    )
-
     def __init__(self, client: ScopedSupabaseClient, business_id: str) -> None:
         self._client = client
         self._business_id = business_id
@@ -44,15 +32,6 @@ class BranchSettingsService:
     # --------------------------------------------------------------------- #
     # Internal helpers
     # --------------------------------------------------------------------- #
-    def _select_query(self):
-        """Use service client for reads too, to avoid RLS SELECT issues."""
-        return (
-            self._svc.table("negocio_configuracion")
-            .select(self._SELECT_COLUMNS)
-            .eq("negocio_id", self._business_id)
-            .limit(1)
-        )
-
     def _ensure_default_record(self) -> None:
         """
         Inserts a default configuration row if none exists for the negocio.
@@ -88,13 +67,13 @@ class BranchSettingsService:
     # --------------------------------------------------------------------- #
     def fetch(self, ensure_exists: bool = True) -> Optional[BranchSettings]:
         try:
-            response = self._select_query().execute()
-            data = response.data[0] if response.data else None
+            data = get_negocio_settings(self._business_id)
 
             if data is None and ensure_exists:
                 self._ensure_default_record()
-                response = self._select_query().execute()
-                data = response.data[0] if response.data else None
+                # The missing row is cached briefly too; drop it before re-reading
+                invalidate_negocio_config(self._business_id)
+                data = get_negocio_settings(self._business_id)
 
             return self._hydrate(data)
         except Exception as e:
@@ -190,6 +169,9 @@ class BranchSettingsService:
                 list(update_data.keys()),
             )
 
+        # Every process must stop serving the previous row before the reload
+        invalidate_negocio_config(self._business_id)
+
         # ------------------------------------------------------------------ #
         # Reload to return the definitive persisted state
         # ------------------------------------------------------------------ #
@@ -254,9 +236,7 @@ class BranchSettingsService:
                         self._svc.table("negocio_configuracion").update(rollback_data).eq("negocio_id", self._business_id).execute()
                     except Exception as rollback_err:
                         logger.critical("CRITICAL: Failed to rollback branch settings for %s: %s", self._business_id, rollback_err)
-                        
-                    raise RuntimeError("Sincronización fallida. Se han revertido los cambios para mantener la consistencia.") from e
-        # Invalidate the cache for this business
-        invalidate_negocio_config(self._business_id)
+                    invalidate_negocio_config(self._business_id)
 
+                    raise RuntimeError("Sincronización fallida. Se han revertido los cambios para mantener la consistencia.") from e
         return updated
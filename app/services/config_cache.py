@@ -1,107 +1,218 @@
 """
 app/services/config_cache.py
 
-TTL-based in-memory cache for negocio_configuracion.
-Reduces repeated DB round-trips for config reads on every product operation.
-
-Thread-safety note: The GIL protects simple dict reads/writes in CPython.
-For multi-process deployments (e.g. Gunicorn workers) each process has its own
-cache — this is acceptable because the TTL is short (60 s).
+Shared provider for negocio_configuracion (branch / inventory settings).
+
+`BusinessBranchContextDep`, `BranchSettingsService` and the product and
+dashboard endpoints all read the row through `get_negocio_settings`:
+
+  - rows live in `cache_manager` (process L1 + Redis L2), so every worker
+    shares one copy and a cold process does not hit the table;
+  - `invalidate_negocio_config` deletes the entry and publishes the business
+    id on a Redis channel; every process runs a small subscriber thread that
+    evicts its L1 copy, so a mode switch reaches all workers immediately.
+
+If the subscriber cannot run (Redis down), entries fall back to a short TTL
+(NEGOCIO_CONFIG_FALLBACK_TTL) like the previous per-process cache. Invalidations
+published while the subscriber is down are lost, so the local copies are
+flushed when it stops and again when it comes back. A business
+without a configuration row is remembered only for NEGOCIO_CONFIG_MISS_TTL, so
+a row created by any path shows up quickly even without an invalidation.
 """
 
 from __future__ import annotations
 
+import copy
 import logging
+import os
+import threading
 import time
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, Optional
+
+import redis
+
+from app.core.cache_manager import cache_manager
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+NAMESPACE = "negocio_config"
+INVALIDATION_CHANNEL = "negocio_config:invalidate"
+
+# Columns we always fetch — keep in sync with BranchSettings schema
+SETTINGS_COLUMNS = (
+    "negocio_id, inventario_modo, servicios_modo, catalogo_producto_modo, permite_transferencias, "
+    "transferencia_auto_confirma, default_branch_id, metadata, created_at, updated_at"
+)
+
+# Marker stored for a business without configuration row: {_MISSING_UNTIL: epoch}
+_MISSING_UNTIL = "__missing_until__"
+
+# Seconds to wait before retrying the subscriber after a Redis failure
+_LISTENER_RETRY_SECONDS = 30.0
+
+_redis_client: Optional[redis.Redis] = None
+_listener_lock = threading.Lock()
+_listener: Optional[Any] = None
+_listener_pid: Optional[int] = None
+_listener_retry_at = 0.0
+_listener_failed = False
+
+
+def _get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.from_url(settings.REDIS_URL, socket_connect_timeout=2, socket_timeout=5)
+    return _redis_client
+
+
 # ---------------------------------------------------------------------------
-# Internal cache store
+# Pub/sub invalidation
 # ---------------------------------------------------------------------------
-# Maps business_id → (config_dict, timestamp_when_cached)
-_cache: Dict[str, Tuple[Dict[str, Any], float]] = {}
 
-# Cache time-to-live in seconds.  60 s is a good balance:
-# config changes are rare, so staleness is acceptable for 1 minute.
-TTL: float = 60.0
+def _on_invalidation(message: Dict[str, Any]) -> None:
+    data = message.get("data")
+    business_id = data.decode() if isinstance(data, bytes) else str(data)
+    cache_manager.evict_local(NAMESPACE, business_id)
+    logger.debug("config_cache: evicted local copy for business_id=%s", business_id)
 
-# Columns we always fetch — keep in sync with BranchSettings schema
-_SELECT_COLS = "catalogo_producto_modo, inventario_modo"
+
+def _flush_local() -> None:
+    try:
+        evicted = cache_manager.evict_local_namespace(NAMESPACE)
+        logger.debug("config_cache: flushed %s local copies", evicted)
+    except Exception as exc:
+        logger.warning("config_cache: could not flush local copies: %s", exc)
+
+
+def _on_listener_error(exc: BaseException, pubsub: Any, thread: Any) -> None:
+    global _listener_retry_at, _listener_failed
+    logger.warning("config_cache: invalidation subscriber stopped: %s", exc)
+    _listener_retry_at = time.monotonic() + _LISTENER_RETRY_SECONDS
+    _listener_failed = True
+    # Entries cached with the long TTL would miss any invalidation from now on
+    _flush_local()
+    thread.stop()
+    try:
+        pubsub.close()
+    except Exception:
+        pass
+
+
+def _ensure_listener() -> bool:
+    """Start (once per process) the subscriber thread. Returns whether it is running."""
+    global _listener, _listener_pid, _listener_retry_at, _listener_failed
+    if _listener is not None and _listener_pid == os.getpid() and _listener.is_alive():
+        return True
+    if time.monotonic() < _listener_retry_at:
+        return False
+
+    with _listener_lock:
+        if _listener is not None and _listener_pid == os.getpid() and _listener.is_alive():
+            return True
+        try:
+            pubsub = _get_redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: _on_invalidation})
+            _listener = pubsub.run_in_thread(
+                sleep_time=1.0,
+                daemon=True,
+                exception_handler=_on_listener_error,
+            )
+            _listener_pid = os.getpid()
+        except Exception as exc:
+            logger.warning("config_cache: could not subscribe to %s: %s", INVALIDATION_CHANNEL, exc)
+            _listener = None
+            _listener_retry_at = time.monotonic() + _LISTENER_RETRY_SECONDS
+            _listener_failed = True
+            return False
+
+        if _listener_failed:
+            # Invalidations published while the subscriber was down were lost
+            _listener_failed = False
+            _flush_local()
+        return True
+
+
+def _ttl() -> int:
+    if _ensure_listener():
+        return settings.NEGOCIO_CONFIG_CACHE_TTL
+    return settings.NEGOCIO_CONFIG_FALLBACK_TTL
 
 
 # ---------------------------------------------------------------------------
 # Public API
 # ---------------------------------------------------------------------------
 
-def get_negocio_config(business_id: str, supabase) -> Dict[str, Any]:
+def get_negocio_settings(business_id: str) -> Optional[Dict[str, Any]]:
     """
-    Return the negocio_configuracion row for *business_id*, using the in-memory
-    cache when the entry is still fresh.
-
-    Falls back gracefully to safe defaults if the row doesn't exist yet.
-
-    Args:
-        business_id: UUID of the negocio.
-        supabase:    Any Supabase client with .table() access
-                     (anon, user-scoped, or service-role all work).
+    Return the negocio_configuracion row for *business_id* (None if it does
+    not exist or cannot be read). Read with the service client: the user token
+    may not pass RLS on this table, and the cached row is shared by everyone.
 
-    Returns:
-        dict with at least:
-            catalogo_producto_modo: "compartido" | "por_sucursal"
-            inventario_modo:        "centralizado" | "por_sucursal"
+    The returned dict is a copy; callers may modify it.
     """
-    now = time.monotonic()
-
-    # Cache hit?
-    cached = _cache.get(business_id)
-    if cached is not None:
-        data, ts = cached
-        if now - ts < TTL:
+    ttl = _ttl()
+    cached = cache_manager.get(NAMESPACE, business_id, ttl=ttl)
+    if isinstance(cached, dict) and cached:
+        if _MISSING_UNTIL not in cached:
             logger.debug("config_cache HIT for business_id=%s", business_id)
-            return data
+            return copy.deepcopy(cached)
+        # The marker carries its own deadline: L1 may have kept it with the longer ttl
+        if float(cached[_MISSING_UNTIL]) > time.time():
+            logger.debug("config_cache HIT (no row) for business_id=%s", business_id)
+            return None
 
-    # Cache miss or expired — fetch from DB
     logger.debug("config_cache MISS for business_id=%s — fetching from DB", business_id)
     try:
+        from app.db.supabase_client import get_supabase_service_client
+
         resp = (
-            supabase
+            get_supabase_service_client()
             .table("negocio_configuracion")
-            .select(_SELECT_COLS)
+            .select(SETTINGS_COLUMNS)
             .eq("negocio_id", business_id)
             .limit(1)
             .execute()
         )
-        config: Dict[str, Any] = resp.data[0] if resp.data else {}
     except Exception as exc:
-        logger.warning(
-            "config_cache: failed to fetch config for %s — using defaults. Error: %s",
-            business_id,
-            exc,
-        )
-        config = {}
+        logger.warning("config_cache: failed to fetch config for %s: %s", business_id, exc)
+        return None
+
+    row: Optional[Dict[str, Any]] = resp.data[0] if resp.data else None
+    if row:
+        cache_manager.set(NAMESPACE, business_id, row, ttl=ttl)
+        return copy.deepcopy(row)
+    miss_ttl = min(ttl, settings.NEGOCIO_CONFIG_MISS_TTL)
+    if miss_ttl > 0:
+        cache_manager.set(NAMESPACE, business_id, {_MISSING_UNTIL: time.time() + miss_ttl}, ttl=miss_ttl)
+    return None
+
+
+def get_negocio_config(business_id: str) -> Dict[str, Any]:
+    """
+    Settings for *business_id* with safe defaults for missing rows/keys.
 
-    # Apply defaults for any missing keys
+    Returns:
+        dict with at least:
+            catalogo_producto_modo: "compartido" | "por_sucursal"
+            inventario_modo:        "centralizado" | "por_sucursal"
+    """
+    config: Dict[str, Any] = get_negocio_settings(business_id) or {}
     config.setdefault("catalogo_producto_modo", "compartido")
     config.setdefault("inventario_modo", "centralizado")
-
-    _cache[business_id] = (config, now)
     return config
 
 
 def invalidate_negocio_config(business_id: str) -> None:
     """
-    Evict the cached configuration for *business_id*.
+    Drop the cached configuration for *business_id* everywhere.
 
-    Should be called after updating negocio_configuracion so that the next
-    request picks up the fresh values from the DB.
+    Must be called after writing negocio_configuracion: deletes the shared
+    entry and notifies every process to evict its local copy.
     """
-    removed = _cache.pop(business_id, None)
-    if removed is not None:
-        logger.info("config_cache: invalidated cache for business_id=%s", business_id)
-
-
-def get_cached_business_ids() -> list:
-    """Return all business_ids currently held in the cache (useful for debugging)."""
-    return list(_cache.keys())
+    cache_manager.delete(NAMESPACE, business_id)
+    try:
+        _get_redis().publish(INVALIDATION_CHANNEL, business_id)
+    except Exception as exc:
+        logger.warning("config_cache: could not publish invalidation for %s: %s", business_id, exc)
+    logger.info("config_cache: invalidated cache for business_id=%s", business_id)
@@ -11,12 +11,14 @@ import pandas as pd
 import numpy as np
 from numpy.typing import NDArray
 
-from app.core.cache_decorators import cached
+from app.config.ml_settings import ml_settings
+from app.core.cache_decorators import business_scope, cached
 from app.db.supabase_client import (
     TableQueryProto,
     APIResponseProto,
     get_supabase_service_client,
 )
+from .sales_store import sales_store
 
 _logger = logging.getLogger(__name__)
 
@@ -223,10 +225,31 @@ class FeatureEngineer:
     ) -> pd.DataFrame:
         """
         Returns a daily time series with columns [ds (date), y (float)] summing totals per day.
+        Served from the incremental daily store (ventas_diarias + per-tenant watermark);
+        falls back to regrouping raw `ventas` rows if the store is disabled or unavailable.
         """
         # Guard against invalid day ranges
         if days < 1:
             days = 1
+        if ml_settings.ML_SALES_STORE_ENABLED:
+            try:
+                first_day, totals = sales_store.daily_totals(self.client, business_id, days)
+            except Exception as e:
+                _log_ml(logging.WARNING, "fe_sales_store_fallback", tenant_id=business_id, error=str(e))
+            else:
+                if first_day is None:
+                    return pd.DataFrame({"ds": pd.Series(dtype="object"), "y": pd.Series(dtype="float")})
+                ds_days = [first_day + timedelta(days=i) for i in range(len(totals))]
+                grp = pd.DataFrame({"ds": ds_days, "y": totals})
+                _log_ml(
+                    logging.INFO,
+                    "fe_sales_timeseries_built",
+                    tenant_id=business_id,
+                    days=int(days),
+                    rows=int(len(grp)),
+                    source="sales_store",
+                )
+                return grp  # columns: ds (date), y (float)
         timerange = TimeRange.last_days(days)
         rows = self.get_sales_rows(business_id, timerange)
         if not rows:
@@ -423,6 +446,154 @@ class FeatureEngineer:
             feature_date=today,
         )
 
+    # -----------------------------
+    # Batched (multi-tenant) features
+    # -----------------------------
+    def feature_aggregates_batch(
+        self, business_ids: list[str], days: int = 90
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        One RPC (get_ml_features_batch, migrations/22) for many tenants.
+        Returns (daily, inventory):
+          daily:     [tenant_id, ds (datetime64), y (float)], only days with sales
+          inventory: [tenant_id, total_items, active_items, total_stock_units], tenants with products
+        """
+        if days < 1:
+            days = 1
+        timerange = TimeRange.last_days(days)
+        rpc_fn: Callable[[str, dict[str, object]], object] = cast(
+            Callable[[str, dict[str, object]], object], getattr(self.client, "rpc")
+        )
+        query = rpc_fn(
+            "get_ml_features_batch",
+            {"p_negocio_ids": list(business_ids), "p_desde": timerange.start.isoformat()},
+        )
+        resp = cast(APIResponseProto, cast(Callable[[], object], getattr(query, "execute"))())
+        data = cast(Mapping[str, object] | None, getattr(resp, "data", None)) or {}
+        ventas = cast(list[dict[str, object]], data.get("ventas") or [])
+        inventario = cast(list[dict[str, object]], data.get("inventario") or [])
+
+        daily = pd.DataFrame(ventas, columns=["negocio_id", "dia", "total_ingresos"])
+        daily = daily.rename(columns={"negocio_id": "tenant_id", "dia": "ds", "total_ingresos": "y"})
+        daily.loc[:, "tenant_id"] = daily["tenant_id"].astype(str)
+        daily["ds"] = pd.to_datetime(daily["ds"], errors="coerce")
+        daily["y"] = _series_fillna(_to_numeric_series(daily["y"], errors="coerce"), 0.0).astype(float)
+        daily = daily.dropna(subset=["ds"])
+
+        inventory = pd.DataFrame(
+            inventario, columns=["negocio_id", "total_items", "active_items", "total_stock_units"]
+        ).rename(columns={"negocio_id": "tenant_id"})
+        inventory.loc[:, "tenant_id"] = inventory["tenant_id"].astype(str)
+        _log_ml(
+            logging.INFO,
+            "fe_feature_aggregates_batch",
+            tenants=len(business_ids),
+            sales_days=int(len(daily)),
+            inventory_tenants=int(len(inventory)),
+        )
+        return daily, inventory
+
+    @staticmethod
+    def sales_metrics_batch(daily: pd.DataFrame, tail_days: int = 30) -> pd.DataFrame:
+        """
+        Vectorised equivalent of sales_timeseries_daily + persist_sales_features for
+        many tenants: each tenant's series is zero-filled between its first and last
+        day with sales, cut to the last `tail_days` days, then ma7/ma28 are rolled
+        per tenant. Returns [tenant_id, ds, y, ma7, ma28].
+        """
+        out_cols = ["tenant_id", "ds", "y", "ma7", "ma28"]
+        if daily.empty:
+            return pd.DataFrame(columns=out_cols)
+        bounds = daily.groupby("tenant_id", sort=True)["ds"].agg(["min", "max"])
+        spans = ((bounds["max"] - bounds["min"]).dt.days + 1).to_numpy(dtype=np.int64)
+        total = int(spans.sum())
+        # Offset of each row inside its tenant's range, without a per-tenant loop
+        starts = np.repeat(np.cumsum(spans) - spans, spans)
+        offsets = np.arange(total, dtype=np.int64) - starts
+        full = pd.DataFrame(
+            {
+                "tenant_id": np.repeat(bounds.index.to_numpy(), spans),
+                "ds": np.repeat(bounds["min"].to_numpy(), spans) + offsets.astype("timedelta64[D]"),
+            }
+        )
+        full = full.merge(daily[["tenant_id", "ds", "y"]], on=["tenant_id", "ds"], how="left")
+        full["y"] = full["y"].fillna(0.0).astype(float)
+        full = full.groupby("tenant_id", sort=False).tail(int(tail_days)).reset_index(drop=True)
+        grouped_y = full.groupby("tenant_id", sort=False)["y"]
+        full["ma7"] = grouped_y.rolling(window=7, min_periods=1).mean().reset_index(level=0, drop=True)
+        full["ma28"] = grouped_y.rolling(window=28, min_periods=1).mean().reset_index(level=0, drop=True)
+        return full[out_cols]
+
+    def persist_features_batch(
+        self,
+        sales: pd.DataFrame,
+        inventory: pd.DataFrame,
+        business_ids: list[str],
+        chunk: int = 500,
+    ) -> int:
+        """
+        Upsert sales_metrics (one row per tenant/day) and today's inventory_metrics
+        (one row per tenant; zeros for tenants without products, as inventory_snapshot
+        does) into `ml_features` with multi-tenant chunks. Returns rows upserted.
+        """
+        payloads: list[dict[str, object]] = []
+        if not sales.empty:
+            for tenant_id, ds, y, ma7, ma28 in sales[["tenant_id", "ds", "y", "ma7", "ma28"]].itertuples(index=False):
+                payloads.append(
+                    {
+                        "tenant_id": str(tenant_id),
+                        "feature_date": _to_iso_date_str(ds),
+                        "feature_type": "sales_metrics",
+                        "features": {
+                            "daily_total": _as_float(y),
+                            "ma7": _as_float(ma7),
+                            "ma28": _as_float(ma28),
+                        },
+                        "metadata": {"source": "feature_engineer"},
+                    }
+                )
+
+        today = datetime.now(timezone.utc).date().isoformat()
+        inv = pd.DataFrame({"tenant_id": [str(b) for b in business_ids]}).merge(inventory, on="tenant_id", how="left")
+        for col in ("total_items", "active_items", "total_stock_units"):
+            inv[col] = _series_fillna(_to_numeric_series(inv[col], errors="coerce"), 0.0).astype(int)
+        inv["avg_stock_per_item"] = np.where(
+            inv["total_items"] > 0, inv["total_stock_units"] / inv["total_items"].clip(lower=1), 0.0
+        )
+        for tenant_id, total_items, active_items, total_stock_units, avg_stock in inv[
+            ["tenant_id", "total_items", "active_items", "total_stock_units", "avg_stock_per_item"]
+        ].itertuples(index=False):
+            payloads.append(
+                {
+                    "tenant_id": str(tenant_id),
+                    "feature_date": today,
+                    "feature_type": "inventory_metrics",
+                    "features": {
+                        "total_items": int(total_items),
+                        "active_items": int(active_items),
+                        "total_stock_units": int(total_stock_units),
+                        "avg_stock_per_item": float(avg_stock),
+                    },
+                    "metadata": {"source": "feature_engineer"},
+                }
+            )
+
+        if not payloads:
+            return 0
+        chunk = max(1, int(chunk))
+        for i in range(0, len(payloads), chunk):
+            _ = self._table("ml_features").upsert(
+                payloads[i : i + chunk], on_conflict="tenant_id,feature_date,feature_type"
+            ).execute()
+        _log_ml(
+            logging.INFO,
+            "fe_features_batch_upsert",
+            tenants=len(business_ids),
+            rows=len(payloads),
+            chunks=(len(payloads) + chunk - 1) // chunk,
+        )
+        return len(payloads)
+
 
 # Lightweight cached accessor for sales time series
 def _sales_ts_key(*args: object, **kwargs: object) -> str:
@@ -431,10 +602,10 @@ def _sales_ts_key(*args: object, **kwargs: object) -> str:
     raw_days_obj: object = args[1] if len(args) > 1 else kwargs.get("days", 365)
     d_raw = _as_int(raw_days_obj, 365)
     d = d_raw if d_raw >= 1 else 1
-    # Use features_{bid}_... so pattern invalidation on features_{bid} works
+    # Scoped by business (business_scope): invalidate_scope("ml_features", bid) drops it
     return f"features_{bid}_sales_timeseries_{d}"
 
-@cached("ml_features", ttl=1800, key_func=_sales_ts_key)
+@cached("ml_features", ttl=1800, key_func=_sales_ts_key, scope_func=business_scope, stale_ttl=600)
 def get_sales_timeseries_cached(business_id: str, days: int = 365) -> list[dict[str, object]]:
     fe = FeatureEngineer()
     d = days if days >= 1 else 1
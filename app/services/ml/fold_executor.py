@@ -0,0 +1,101 @@
+"""
+Fold execution engine for rolling cross-validation.
+
+`train_and_predict_sales` evaluates every (candidate model x CV fold) pair.
+The fits are CPU-bound (Prophet/cmdstan, SARIMAX, XGBoost) and independent of
+each other, so they can run in a process pool:
+
+    specs = plan_folds(candidates, n_rows, possible_folds, horizon_days)
+    results = run_folds(_fit_cv_fold, specs, ts, business_id=..., ...)
+
+Results always come back in `specs` order (candidate order, then oldest to
+newest fold), whatever the pool finishes first, so model selection and
+`metrics_by_model` are deterministic.
+
+Configuration (app/config/ml_settings.py):
+- ML_CV_N_JOBS: worker processes; 1 = serial in-process (default), -1 = all cores.
+- ML_CV_BACKEND: joblib backend, "loky" by default.
+- ML_CV_MAX_NBYTES: arrays larger than this are memory-mapped to workers instead of copied.
+- ML_CV_PRE_DISPATCH: how many fits are queued ahead of the workers (bounds memory).
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Callable, cast
+
+from app.config.ml_settings import ml_settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class FoldSpec:
+    model_name: str
+    fold: int  # 0 = oldest cutoff
+    cutoff: int  # rows of the series used for training
+
+
+def plan_folds(
+    candidates: list[str],
+    n_rows: int,
+    possible_folds: int,
+    horizon_days: int,
+    min_train: int = 7,
+) -> list[FoldSpec]:
+    """Forward-chaining cutoffs for every candidate, in evaluation order."""
+    cutoffs = [
+        n_rows - i * int(horizon_days)
+        for i in range(possible_folds, 0, -1)
+        if n_rows - i * int(horizon_days) > min_train
+    ]
+    return [
+        FoldSpec(model_name=model_name, fold=idx, cutoff=cutoff)
+        for model_name in candidates
+        for idx, cutoff in enumerate(cutoffs)
+    ]
+
+
+def _resolve_n_jobs(n_jobs: int | None, tasks: int) -> int:
+    value = int(ml_settings.ML_CV_N_JOBS if n_jobs is None else n_jobs)
+    if value == 0:
+        value = 1
+    if value > 0:
+        value = min(value, tasks)
+    return value
+
+
+def run_folds(
+    fit_fn: Callable[..., dict[str, object]],
+    specs: list[FoldSpec],
+    *args: object,
+    n_jobs: int | None = None,
+    **kwargs: object,
+) -> list[dict[str, object]]:
+    """
+    Run `fit_fn(spec, *args, **kwargs)` for every spec, serially or in a joblib
+    process pool, and return the results in `specs` order.
+
+    Arguments must be picklable when running in parallel. If the pool cannot
+    start (e.g. joblib missing), the folds run serially in-process.
+    """
+    if not specs:
+        return []
+    jobs = _resolve_n_jobs(n_jobs, len(specs))
+    if jobs == 1:
+        return [fit_fn(spec, *args, **kwargs) for spec in specs]
+
+    try:
+        from joblib import Parallel, delayed  # type: ignore[import-untyped]
+    except ImportError:
+        logger.warning("[fold_executor] joblib not available; running %d folds serially", len(specs))
+        return [fit_fn(spec, *args, **kwargs) for spec in specs]
+
+    parallel = Parallel(
+        n_jobs=jobs,
+        backend=ml_settings.ML_CV_BACKEND,
+        max_nbytes=ml_settings.ML_CV_MAX_NBYTES,
+        pre_dispatch=ml_settings.ML_CV_PRE_DISPATCH,
+    )
+    results = parallel(delayed(fit_fn)(spec, *args, **kwargs) for spec in specs)
+    return cast(list[dict[str, object]], list(results))
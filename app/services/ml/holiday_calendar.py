@@ -0,0 +1,137 @@
+"""
+Holiday calendar for ML time features.
+
+`BusinessMLEngine._make_time_features` runs for every SARIMAX/XGBoost CV fold
+and again for the future exogenous frame. It used to rebuild `holidays.AR`
+and query `tenant_holidays` on each call. This module caches both per process:
+
+- National calendar: one entry per (country, year), never expires (it only
+  depends on the `holidays` package version).
+- Tenant custom holidays (`tenant_holidays`): one query per tenant, kept for
+  ML_HOLIDAYS_CACHE_TTL seconds or until `invalidate(tenant_id)`.
+  `train_and_predict_sales` invalidates its tenant on entry, so a retrain
+  reads the table exactly once and always sees current overrides.
+
+CV folds may run in loky worker processes (ML_CV_N_JOBS > 1), each with its
+own calendar that the parent's `invalidate` never reaches. The pipeline reads
+`tenant_dates` once in the parent and every fold `prime`s its process with
+that exact array, so workers never query the table nor keep stale overrides.
+
+`holiday_mask` returns a vectorised boolean array for a date index
+(np.isin over datetime64[D]).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import date
+from typing import Callable, cast
+
+import numpy as np
+import pandas as pd
+from numpy.typing import NDArray
+
+from app.config.ml_settings import ml_settings
+
+try:
+    import holidays
+except ImportError:
+    holidays = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+class HolidayCalendar:
+    """Per-process cache of national and tenant-specific holiday dates."""
+
+    def __init__(self, country: str = "AR") -> None:
+        self.country = country
+        self._national: dict[int, NDArray[np.datetime64]] = {}
+        self._tenant: dict[str, tuple[float, NDArray[np.datetime64]]] = {}
+        self._lock = threading.Lock()
+
+    def _national_year(self, year: int) -> NDArray[np.datetime64]:
+        cached = self._national.get(year)
+        if cached is not None:
+            return cached
+        days: list[date] = []
+        if holidays is not None:
+            ctor = cast(Callable[..., object], getattr(holidays, self.country))
+            days = list(cast(dict[date, str], ctor(years=[year])).keys())
+        arr = np.unique(np.array(days, dtype="datetime64[D]"))
+        self._national[year] = arr
+        return arr
+
+    def _fetch_tenant(self, tenant_id: str) -> NDArray[np.datetime64]:
+        days: list[date] = []
+        try:
+            from app.db.supabase_client import get_supabase_service_client
+            svc = get_supabase_service_client()
+            table_fn: Callable[[str], object] = cast(Callable[[str], object], getattr(svc, "table"))
+            tbl: object = table_fn("tenant_holidays")
+            select_fn: Callable[..., object] = cast(Callable[..., object], getattr(tbl, "select"))
+            eq_fn: Callable[..., object] = cast(Callable[..., object], getattr(select_fn("holiday_date"), "eq"))
+            execute_fn: Callable[..., object] = cast(Callable[..., object], getattr(eq_fn("tenant_id", tenant_id), "execute"))
+            res: object = execute_fn()
+            data: list[dict[str, object]] = cast(list[dict[str, object]], getattr(res, "data", []) or [])
+            for row in data:
+                try:
+                    days.append(date.fromisoformat(str(row.get("holiday_date", ""))[:10]))
+                except ValueError:
+                    pass
+        except Exception as e:
+            # Sin feriados propios si falla la consulta; se reintenta al vencer el TTL
+            logger.debug("[holiday_calendar] tenant_holidays fetch failed tenant=%s: %s", tenant_id, e)
+        return np.unique(np.array(days, dtype="datetime64[D]"))
+
+    def _tenant_days(self, tenant_id: str) -> NDArray[np.datetime64]:
+        if not tenant_id:
+            return np.array([], dtype="datetime64[D]")
+        ttl = float(ml_settings.ML_HOLIDAYS_CACHE_TTL)
+        cached = self._tenant.get(tenant_id)
+        if cached is not None and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        arr = self._fetch_tenant(tenant_id)
+        self._tenant[tenant_id] = (time.monotonic(), arr)
+        return arr
+
+    def tenant_dates(self, tenant_id: str) -> NDArray[np.datetime64]:
+        """Custom holiday days of a tenant (cached like the rest of the calendar)."""
+        with self._lock:
+            return self._tenant_days(tenant_id)
+
+    def prime(self, tenant_id: str, days: NDArray[np.datetime64]) -> None:
+        """Use `days` as the tenant's custom holidays, e.g. as read by another process."""
+        if not tenant_id:
+            return
+        arr = np.unique(np.asarray(days, dtype="datetime64[D]"))
+        with self._lock:
+            self._tenant[tenant_id] = (time.monotonic(), arr)
+
+    def dates(self, tenant_id: str, years: list[int]) -> NDArray[np.datetime64]:
+        """Sorted unique holiday days (datetime64[D]) for the given years, custom ones included."""
+        with self._lock:
+            parts = [self._national_year(int(y)) for y in sorted(set(years))]
+            parts.append(self._tenant_days(tenant_id))
+        return np.unique(np.concatenate(parts)) if parts else np.array([], dtype="datetime64[D]")
+
+    def holiday_mask(self, ds: object, tenant_id: str = "") -> NDArray[np.bool_]:
+        """Boolean array, True where the day in `ds` is a national or tenant holiday."""
+        days = pd.to_datetime(pd.Series(ds), errors="coerce").to_numpy(dtype="datetime64[D]")
+        valid = ~np.isnat(days)
+        if not valid.any():
+            return np.zeros(len(days), dtype=bool)
+        years = np.unique(days[valid].astype("datetime64[Y]").astype(int) + 1970).tolist()
+        return np.isin(days, self.dates(tenant_id, [int(y) for y in years])) & valid
+
+    def invalidate(self, tenant_id: str | None = None) -> None:
+        """Forget one tenant's custom holidays (or all of them); the national calendar stays."""
+        with self._lock:
+            if tenant_id is None:
+                self._tenant.clear()
+            else:
+                _ = self._tenant.pop(tenant_id, None)
+
+
+holiday_calendar = HolidayCalendar()
@@ -4,7 +4,7 @@ import logging
 import json
 from typing import cast, Callable, Protocol, SupportsFloat
 from collections.abc import Sequence
-from datetime import date, datetime
+from datetime import date
 
 import numpy as np
 from numpy.typing import NDArray
@@ -18,6 +18,7 @@ class _SARIMAXModelProto(Protocol):
 SARIMAXCtor = Callable[..., _SARIMAXModelProto]
 SARIMAX: SARIMAXCtor = cast(SARIMAXCtor, _SARIMAX)
 import statsmodels.tsa.seasonal as sm_seasonal  # type: ignore
+from .holiday_calendar import holiday_calendar
 import importlib
 import math as _math
 import sys as _sys
@@ -412,37 +413,11 @@ class BusinessMLEngine:
     # Optional XGBoost regressor
     # -----------------------------
     def _get_holidays_for_tenant(self, tenant_id: str, years: list[int]) -> set[date]:
-        """Get all holidays for a tenant including custom ones."""
+        """Get all holidays for a tenant including custom ones (cached, see holiday_calendar)."""
         if holidays is None:
             return set()
-
-        # Base holidays for Argentina
-        ar_holidays_ctor = cast(Callable[..., object], getattr(holidays, "AR"))
-        ar_holidays = cast(dict[date, str], ar_holidays_ctor(years=years))
-
-        # Add custom tenant holidays
-        try:
-            from app.db.supabase_client import get_supabase_service_client
-            svc = get_supabase_service_client()
-            table_fn: Callable[[str], object] = cast(Callable[[str], object], getattr(svc, "table"))
-            tbl: object = table_fn("tenant_holidays")
-            select_fn: Callable[..., object] = cast(Callable[..., object], getattr(tbl, "select"))
-            eq_fn: Callable[..., object] = cast(Callable[..., object], getattr(select_fn("holiday_date"), "eq"))
-            execute_fn: Callable[..., object] = cast(Callable[..., object], getattr(eq_fn("tenant_id", tenant_id), "execute"))
-            res: object = execute_fn()
-            data: list[dict[str, object]] = cast(list[dict[str, object]], getattr(res, "data", []))
-            for row in data:
-                dt_str = cast(str, row.get("holiday_date", ""))
-                try:
-                    h_date = date.fromisoformat(dt_str)
-                    ar_holidays[h_date] = "Custom Holiday"
-                except ValueError:
-                    pass
-        except Exception:
-            # Ignore errors fetching custom holidays
-            pass
-
-        return set(ar_holidays.keys())
+        days = holiday_calendar.dates(tenant_id, years)
+        return {cast(date, d) for d in days.astype(object).tolist()}
 
     def _get_special_dates(self, ds: pd.Series) -> pd.Series:
         """Get special commercial dates as boolean series."""
@@ -516,14 +491,8 @@ class BusinessMLEngine:
         astype_dom: Callable[..., object] = cast(Callable[..., object], getattr(dom_series, "astype"))
         astype_month: Callable[..., object] = cast(Callable[..., object], getattr(month_series, "astype"))
 
-        # Get years for holidays
-        years = sorted(set(dt.dt.year.dropna().astype(int).tolist()))
-        if not years:
-            years = [datetime.now().year]
-
-        # Holidays
-        holiday_dates = self._get_holidays_for_tenant(tenant_id, years)
-        is_holiday = ds.isin([pd.Timestamp(d).date() for d in holiday_dates]).astype(int)
+        # Holidays: cached national calendar + tenant overrides, one vectorised lookup
+        is_holiday = pd.Series(holiday_calendar.holiday_mask(dt, tenant_id).astype(int), index=dt.index)
 
         # Special dates
         is_special_date = self._get_special_dates(ds)
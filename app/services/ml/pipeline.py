@@ -13,12 +13,15 @@ import numbers
 import pandas as pd
 import importlib
 from prophet import Prophet
+from billiard.exceptions import SoftTimeLimitExceeded
 from numpy.typing import NDArray
 from supabase.client import Client
 
 from app.db.supabase_client import get_supabase_service_client, TableQueryProto
 from .feature_engineer import FeatureEngineer
 from .ml_engine import BusinessMLEngine
+from .fold_executor import FoldSpec, plan_folds, run_folds
+from .holiday_calendar import holiday_calendar
 from .model_version_manager import ModelVersionManager
 from .recommendation_engine import check_stock_recommendations, check_sales_review_recommendations
 from app.config.ml_settings import ml_settings
@@ -173,6 +176,8 @@ def _compute_shap_attributions(
                     "base_value": base_value_float,
                     "feature_names": data.columns.tolist(),
                 }
+            except SoftTimeLimitExceeded:
+                raise
             except Exception as e:
                 errors.append(f"SHAP computation failed for index {idx}: {str(e)}")
                 # Fallback: simple feature importance
@@ -209,6 +214,8 @@ def _compute_shap_attributions(
                     "seasonal_component": float(seasonal),
                     "residual": float(resid),
                 }
+            except SoftTimeLimitExceeded:
+                raise
             except Exception as e:
                 errors.append(f"STL explanation failed for index {idx}: {str(e)}")
 
@@ -261,6 +268,151 @@ def _to_iso_date_str(x: object) -> str:
     return s
 
 
+def _fit_cv_fold(
+    spec: FoldSpec,
+    ts: pd.DataFrame,
+    *,
+    engine: BusinessMLEngine,
+    business_id: str,
+    horizon_days: int,
+    log_transform: bool,
+    seasonality_mode: str,
+    holidays_country: str,
+    sarimax_order: tuple[int, int, int],
+    sarimax_seasonal: tuple[int, int, int, int] | None,
+    stl_period: int,
+    tenant_holidays: NDArray[np.datetime64],
+) -> dict[str, object]:
+    """
+    Fit one candidate on one forward-chaining fold and score it on the next
+    `horizon_days` rows. Runs in the fold executor (possibly in a worker
+    process), so it only depends on its arguments: `tenant_holidays` are the
+    tenant's custom holidays as read by the parent for this run.
+    Returns {"model", "fold", "skip_reason", "metrics", "train_time", "infer_time"};
+    `skip_reason` is set when the model cannot be trained (no metrics then).
+    """
+    # A loky worker has its own calendar: use the parent's tenant holidays
+    holiday_calendar.prime(business_id, tenant_holidays)
+    model_name = spec.model_name
+    cutoff = spec.cutoff
+    head_fn: Callable[[int], pd.DataFrame] = cast(Callable[[int], pd.DataFrame], getattr(ts, "head"))
+    train_df: pd.DataFrame = head_fn(cutoff)
+    test_df: pd.DataFrame = cast(pd.DataFrame, ts.iloc[cutoff : cutoff + int(horizon_days)])
+    # Optional log transform on training target
+    if log_transform:
+        train_df_t = train_df.copy()
+        train_df_t.loc[:, "y"] = np.log1p(np.asarray(train_df_t["y"], dtype=float))
+    else:
+        train_df_t = train_df
+    t_fold_train = time.perf_counter()
+    if model_name == "sarimax":
+        exog_train = engine._make_time_features(cast(pd.Series, train_df_t["ds"]), business_id)[["is_holiday", "is_special_date"]]
+        m = engine.train_sarimax(train_df_t, order=sarimax_order, seasonal_order=sarimax_seasonal, exog=exog_train)
+    elif model_name == "prophet":
+        m = engine.train_sales_forecasting_prophet(
+            train_df_t,
+            seasonality_mode=seasonality_mode,
+            holidays_country=holidays_country,
+        )
+    elif model_name == "xgboost":
+        try:
+            m = engine.train_xgboost(train_df_t, business_id)
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception as ex:
+            return {"model": model_name, "fold": spec.fold, "skip_reason": str(ex)}
+    else:
+        # Baseline models do not require training time
+        m = None
+    train_time = time.perf_counter() - t_fold_train
+    t_fold_fc = time.perf_counter()
+    if model_name == "sarimax":
+        # Create future exog
+        future_dates = pd.date_range(start=train_df_t["ds"].max() + pd.Timedelta(days=1), periods=int(horizon_days), freq="D")
+        exog_future = engine._make_time_features(pd.Series(future_dates), business_id)[["is_holiday", "is_special_date"]]
+        fcst = engine.forecast_sales_sarimax(m, horizon_days=int(horizon_days), exog=exog_future)
+        yhat = np.asarray(fcst["yhat"], dtype=float)
+    elif model_name == "prophet":
+        fcst = engine.forecast_sales_prophet(cast(Prophet, m), horizon_days=int(horizon_days))
+        # Align by date for Prophet
+        fcst = pd.DataFrame(fcst)
+        fcst["ds"] = [
+            _to_iso_date_str(x) for x in cast(list[object], cast(pd.Series, fcst["ds"]).tolist())
+        ]
+        test_df_iso: pd.DataFrame = pd.DataFrame(test_df)
+        test_df_iso["ds"] = [
+            _to_iso_date_str(x) for x in cast(list[object], cast(pd.Series, test_df_iso["ds"]).tolist())
+        ]
+        merged = cast(Callable[..., pd.DataFrame], getattr(test_df_iso, "merge"))(fcst, on="ds", how="inner")
+        yhat = np.asarray(merged["yhat"], dtype=float)
+        test_df = merged  # For Prophet alignment below
+    elif model_name == "xgboost":
+        fcst = engine.forecast_sales_xgboost(m, train_df_t, horizon_days=int(horizon_days), tenant_id=business_id)
+        fcst = pd.DataFrame(fcst)
+        fcst["ds"] = [
+            _to_iso_date_str(x) for x in cast(list[object], cast(pd.Series, fcst["ds"]).tolist())
+        ]
+        test_df_iso2: pd.DataFrame = pd.DataFrame(test_df)
+        test_df_iso2["ds"] = [
+            _to_iso_date_str(x) for x in cast(list[object], cast(pd.Series, test_df_iso2["ds"]).tolist())
+        ]
+        merged2 = cast(Callable[..., pd.DataFrame], getattr(test_df_iso2, "merge"))(fcst, on="ds", how="inner")
+        yhat = np.asarray(merged2["yhat"], dtype=float)
+        test_df = merged2
+    else:
+        # Baselines: naive/snaive
+        train_y_arr: NDArray[np.float64] = np.asarray(cast(pd.Series, train_df["y"]), dtype=float)
+        if model_name == "snaive":
+            season: int = int(max(2, stl_period))
+            # use last season values repeated
+            last_season = train_y_arr[-season:] if len(train_df) >= season else train_y_arr[-1:]
+            num: float = float(int(horizon_days))
+            den: float = float(max(1, season))
+            ratio: float = num / den
+            ceil_val: float = float(math.ceil(ratio))
+            reps: int = int(ceil_val)
+            yhat = np.tile(last_season, reps)[: int(horizon_days)]
+        else:
+            # naive
+            last_val = float(cast(SupportsFloat, train_y_arr[-1]))
+            yhat = np.repeat(last_val, int(horizon_days))
+    infer_time = time.perf_counter() - t_fold_fc
+    # Invert transform if needed
+    if log_transform:
+        yhat = np.expm1(yhat)
+    # Evaluate against test
+    y_true = np.asarray(test_df["y"], dtype=float)
+    min_len = int(min(len(y_true), len(yhat)))
+    y_true_np: NDArray[np.float64] = cast(NDArray[np.float64], y_true[:min_len])
+    y_pred_np: NDArray[np.float64] = cast(NDArray[np.float64], yhat[:min_len])
+    if min_len == 0:
+        fold_mape = 0.5
+        fold_smape = 1.0
+        fold_mae = float(np.nan)
+        fold_rmse = float(np.nan)
+    else:
+        fold_mape = _mape(y_true_np, y_pred_np)
+        fold_smape = _smape(y_true_np, y_pred_np)
+        fold_mae = _mae(y_true_np, y_pred_np)
+        fold_rmse = _rmse(y_true_np, y_pred_np)
+    metrics = {
+        "mape": float(fold_mape),
+        "smape": float(fold_smape),
+        "mae": float(fold_mae),
+        "rmse": float(fold_rmse),
+        "train_rows": float(len(train_df)),
+        "test_rows": float(len(test_df)),
+    }
+    return {
+        "model": model_name,
+        "fold": spec.fold,
+        "skip_reason": None,
+        "metrics": metrics,
+        "train_time": float(train_time),
+        "infer_time": float(infer_time),
+    }
+
+
 def train_and_predict_sales(
     business_id: str,
     horizon_days: int = 14,
@@ -302,6 +454,8 @@ def train_and_predict_sales(
     table_fn: Callable[[str], object] = cast(Callable[[str], object], getattr(svc, "table"))
 
     t0 = time.perf_counter()
+    # Feriados propios frescos en cada entrenamiento: tenant_holidays se lee una sola vez por run
+    holiday_calendar.invalidate(business_id)
     _log_ml(
         logging.INFO,
         "ml_pipeline_start",
@@ -418,127 +572,38 @@ def train_and_predict_sales(
         possible_folds = max(0, min(int(cv_folds_used), (n - min_train) // max(1, int(horizon_days))))
         metrics_by_model: dict[str, dict[str, object]] = {}
         if possible_folds >= 1:
+            # Every (candidate x fold) fit is independent: the fold executor runs
+            # them serially or in a process pool (ML_CV_N_JOBS) and returns them in order
+            fold_specs = plan_folds(candidates, n, possible_folds, int(horizon_days), min_train=min_train)
+            fold_results = run_folds(
+                _fit_cv_fold,
+                fold_specs,
+                ts,
+                engine=engine,
+                business_id=business_id,
+                horizon_days=int(horizon_days),
+                log_transform=log_transform_used,
+                seasonality_mode=seasonality_mode_used,
+                holidays_country=holidays_country_used,
+                sarimax_order=sarimax_order_used,
+                sarimax_seasonal=sarimax_seasonal_used,
+                stl_period=stl_period_used,
+                tenant_holidays=holiday_calendar.tenant_dates(business_id),
+            )
             for model_name in candidates:
                 per_fold: list[dict[str, float]] = []
                 total_train_time = 0.0
                 total_infer_time = 0.0
-                xgb_failed = False
-                for i in range(possible_folds, 0, -1):
-                    cutoff = n - i * int(horizon_days)
-                    if cutoff <= min_train:
+                for fold_result in fold_results:
+                    if fold_result["model"] != model_name:
                         continue
-                    head_fn: Callable[[int], pd.DataFrame] = cast(Callable[[int], pd.DataFrame], getattr(ts, "head"))
-                    train_df: pd.DataFrame = head_fn(cutoff)
-                    test_df: pd.DataFrame = cast(pd.DataFrame, ts.iloc[cutoff : cutoff + int(horizon_days)])
-                    # Optional log transform on training target
-                    if log_transform_used:
-                        train_df_t = train_df.copy()
-                        train_df_t.loc[:, "y"] = np.log1p(np.asarray(train_df_t["y"], dtype=float))
-                    else:
-                        train_df_t = train_df
-                    t_fold_train = time.perf_counter()
-                    if model_name == "sarimax":
-                        exog_train = engine._make_time_features(cast(pd.Series, train_df_t["ds"]), business_id)[["is_holiday", "is_special_date"]]
-                        m = engine.train_sarimax(train_df_t, order=sarimax_order_used, seasonal_order=sarimax_seasonal_used, exog=exog_train)
-                    elif model_name == "prophet":
-                        m = engine.train_sales_forecasting_prophet(
-                            train_df_t,
-                            seasonality_mode=seasonality_mode_used,
-                            holidays_country=holidays_country_used,
-                        )
-                    elif model_name == "xgboost":
-                        try:
-                            m = engine.train_xgboost(train_df_t, business_id)
-                        except Exception as ex:
-                            _log_ml(logging.WARNING, "ml_cv_skip_model", tenant_id=business_id, model=model_name, reason=str(ex))
-                            xgb_failed = True
-                            break
-                    else:
-                        # Baseline models do not require training time
-                        m = None
-                    total_train_time += time.perf_counter() - t_fold_train
-                    t_fold_fc = time.perf_counter()
-                    if model_name == "sarimax":
-                        # Create future exog
-                        future_dates = pd.date_range(start=train_df_t["ds"].max() + pd.Timedelta(days=1), periods=int(horizon_days), freq="D")
-                        exog_future = engine._make_time_features(pd.Series(future_dates), business_id)[["is_holiday", "is_special_date"]]
-                        fcst = engine.forecast_sales_sarimax(m, horizon_days=int(horizon_days), exog=exog_future)
-                        yhat = np.asarray(fcst["yhat"], dtype=float)
-                    elif model_name == "prophet":
-                        fcst = engine.forecast_sales_prophet(cast(Prophet, m), horizon_days=int(horizon_days))
-                        # Align by date for Prophet
-                        fcst = pd.DataFrame(fcst)
-                        fcst["ds"] = [
-                            _to_iso_date_str(x) for x in cast(list[object], cast(pd.Series, fcst["ds"]).tolist())
-                        ]
-                        test_df_iso: pd.DataFrame = pd.DataFrame(test_df)
-                        test_df_iso["ds"] = [
-                            _to_iso_date_str(x) for x in cast(list[object], cast(pd.Series, test_df_iso["ds"]).tolist())
-                        ]
-                        merged = cast(Callable[..., pd.DataFrame], getattr(test_df_iso, "merge"))(fcst, on="ds", how="inner")
-                        yhat = np.asarray(merged["yhat"], dtype=float)
-                        test_df = merged  # For Prophet alignment below
-                    elif model_name == "xgboost":
-                        if xgb_failed:
-                            break
-                        fcst = engine.forecast_sales_xgboost(m, train_df_t, horizon_days=int(horizon_days), tenant_id=business_id)
-                        fcst = pd.DataFrame(fcst)
-                        fcst["ds"] = [
-                            _to_iso_date_str(x) for x in cast(list[object], cast(pd.Series, fcst["ds"]).tolist())
-                        ]
-                        test_df_iso2: pd.DataFrame = pd.DataFrame(test_df)
-                        test_df_iso2["ds"] = [
-                            _to_iso_date_str(x) for x in cast(list[object], cast(pd.Series, test_df_iso2["ds"]).tolist())
-                        ]
-                        merged2 = cast(Callable[..., pd.DataFrame], getattr(test_df_iso2, "merge"))(fcst, on="ds", how="inner")
-                        yhat = np.asarray(merged2["yhat"], dtype=float)
-                        test_df = merged2
-                    else:
-                        # Baselines: naive/snaive
-                        train_y_arr: NDArray[np.float64] = np.asarray(cast(pd.Series, train_df["y"]), dtype=float)
-                        if model_name == "snaive":
-                            season: int = int(max(2, stl_period_used))
-                            # use last season values repeated
-                            last_season = train_y_arr[-season:] if len(train_df) >= season else train_y_arr[-1:]
-                            num: float = float(int(horizon_days))
-                            den: float = float(max(1, season))
-                            ratio: float = num / den
-                            ceil_val: float = float(math.ceil(ratio))
-                            reps: int = int(ceil_val)
-                            yhat = np.tile(last_season, reps)[: int(horizon_days)]
-                        else:
-                            # naive
-                            last_val = float(cast(SupportsFloat, train_y_arr[-1]))
-                            yhat = np.repeat(last_val, int(horizon_days))
-                    total_infer_time += time.perf_counter() - t_fold_fc
-                    # Invert transform if needed
-                    if log_transform_used:
-                        yhat = np.expm1(yhat)
-                    # Evaluate against test
-                    y_true = np.asarray(test_df["y"], dtype=float)
-                    min_len = int(min(len(y_true), len(yhat)))
-                    y_true_np: NDArray[np.float64] = cast(NDArray[np.float64], y_true[:min_len])
-                    y_pred_np: NDArray[np.float64] = cast(NDArray[np.float64], yhat[:min_len])
-                    if min_len == 0:
-                        fold_mape = 0.5
-                        fold_smape = 1.0
-                        fold_mae = float(np.nan)
-                        fold_rmse = float(np.nan)
-                    else:
-                        fold_mape = _mape(y_true_np, y_pred_np)
-                        fold_smape = _smape(y_true_np, y_pred_np)
-                        fold_mae = _mae(y_true_np, y_pred_np)
-                        fold_rmse = _rmse(y_true_np, y_pred_np)
-                    per_fold.append(
-                        {
-                            "mape": float(fold_mape),
-                            "smape": float(fold_smape),
-                            "mae": float(fold_mae),
-                            "rmse": float(fold_rmse),
-                            "train_rows": float(len(train_df)),
-                            "test_rows": float(len(test_df)),
-                        }
-                    )
+                    if fold_result.get("skip_reason") is not None:
+                        # Model cannot be trained for this tenant (e.g. xgboost): stop at the first failing fold
+                        _log_ml(logging.WARNING, "ml_cv_skip_model", tenant_id=business_id, model=model_name, reason=fold_result["skip_reason"])
+                        break
+                    per_fold.append(cast(dict[str, float], fold_result["metrics"]))
+                    total_train_time += float(cast(float, fold_result["train_time"]))
+                    total_infer_time += float(cast(float, fold_result["infer_time"]))
                 # Aggregate per model
                 def _mean(values: list[float]) -> float:
                     arr = np.asarray(values, dtype=float)
@@ -632,8 +697,12 @@ def train_and_predict_sales(
                 }
                 _ = _notify.delay(business_id, "ml_drift_alert", msg)
                 _log_ml(logging.WARNING, "ml_drift_alert_queued", tenant_id=business_id, mape=float(mape), threshold=float(drift_thresh))
+            except SoftTimeLimitExceeded:
+                raise
             except Exception as _e:
                 _log_ml(logging.WARNING, "ml_drift_alert_error", tenant_id=business_id, error=str(_e))
+    except SoftTimeLimitExceeded:
+        raise
     except Exception as e:
         logger.warning("Validation error for tenant=%s: %s", business_id, e)
         accuracy = 0.5
@@ -669,6 +738,8 @@ def train_and_predict_sales(
     elif selected_model == "xgboost":
         try:
             model = engine.train_xgboost(ts_train, business_id)
+        except SoftTimeLimitExceeded:
+            raise
         except Exception as ex:
             _log_ml(logging.WARNING, "ml_train_xgb_failed_fallback", tenant_id=business_id, reason=str(ex))
             # Prefer baseline fallback if available among candidates to avoid heavy training
@@ -1002,11 +1073,15 @@ def train_and_predict_sales(
                         model_type=model_type,
                     )
 
+                except SoftTimeLimitExceeded:
+                    raise
                 except Exception as e:
                     logger.warning("Failed to queue attribution task for tenant=%s: %s", business_id, e)
                     attribution_summary = {"error": str(e), "task_triggered": False}
 
             anomalies_summary = {"inserted": a_inserted, "attributions": attribution_summary}
+        except SoftTimeLimitExceeded:
+            raise
         except Exception as e:
             logger.warning("Anomaly pipeline failed for tenant=%s: %s", business_id, e)
             anomalies_summary = {"inserted": 0, "error": str(e)}
@@ -1024,6 +1099,8 @@ def train_and_predict_sales(
             stock_recs=stock_recs,
             sales_recs=sales_recs,
         )
+    except SoftTimeLimitExceeded:
+        raise
     except Exception as e:
         logger.warning("Recommendations failed for tenant=%s: %s", business_id, e)
         recommendations_summary = {"error": str(e)}
@@ -0,0 +1,185 @@
+"""
+Incremental daily sales store for ML feature extraction.
+
+`FeatureEngineer.sales_timeseries_daily` used to read every `ventas` row of
+the window (a year for training) and regroup it by day on each call. The
+store keeps, per tenant and per process, two compact numpy arrays indexed by
+day (revenue and number of sales) built from the `ventas_diarias` rollup
+(migrations/16 + 21), plus a watermark: the latest `actualizado_en` seen.
+
+- First read of a tenant: one RPC returning one row per day of the window.
+- Later reads: the RPC only returns days whose rollup rows changed since the
+  watermark (new sales, but also deletions or back-dated edits), so a refresh
+  costs O(changed days) regardless of how many sales the tenant has.
+
+The watermark is re-read with a small overlap (ML_SALES_STORE_OVERLAP_SECONDS)
+because `actualizado_en` is the writer's transaction start time; re-applying a
+day is idempotent since rows carry the full day total.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, cast
+
+import numpy as np
+from numpy.typing import NDArray
+
+from app.config.ml_settings import ml_settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _TenantDays:
+    origin: date  # day of index 0
+    totals: NDArray[np.float64]
+    counts: NDArray[np.int64]
+    watermark: datetime
+
+
+def _parse_ts(value: object) -> datetime | None:
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        ts = value
+    else:
+        try:
+            ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def _parse_day(value: object) -> date | None:
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+class DailySalesStore:
+    """Per-process, LRU-bounded store of daily sales series keyed by tenant."""
+
+    def __init__(self, max_tenants: int | None = None) -> None:
+        self._max_tenants = max_tenants
+        self._tenants: OrderedDict[str, _TenantDays] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fetch(
+        self, client: object, business_id: str, desde: date, actualizado_desde: datetime | None
+    ) -> list[dict[str, object]]:
+        rpc_fn: Callable[[str, dict[str, object]], object] = cast(
+            Callable[[str, dict[str, object]], object], getattr(client, "rpc")
+        )
+        query = rpc_fn(
+            "get_ventas_diarias_serie",
+            {
+                "p_negocio_id": business_id,
+                "p_desde": desde.isoformat(),
+                "p_actualizado_desde": actualizado_desde.isoformat() if actualizado_desde else None,
+            },
+        )
+        resp = cast(Callable[[], object], getattr(query, "execute"))()
+        data = cast(list[dict[str, object]] | None, getattr(resp, "data", None))
+        return data or []
+
+    @staticmethod
+    def _apply(entry: _TenantDays, rows: list[dict[str, object]]) -> int:
+        """Overwrite the full total of each returned day. Returns days applied."""
+        applied = 0
+        for row in rows:
+            dia = _parse_day(row.get("dia"))
+            if dia is None or dia < entry.origin:
+                continue
+            idx = (dia - entry.origin).days
+            if idx >= len(entry.totals):
+                grow = idx + 1 - len(entry.totals)
+                entry.totals = np.concatenate([entry.totals, np.zeros(grow, dtype=np.float64)])
+                entry.counts = np.concatenate([entry.counts, np.zeros(grow, dtype=np.int64)])
+            try:
+                entry.totals[idx] = float(cast(float, row.get("total_ingresos") or 0.0))
+            except (TypeError, ValueError):
+                entry.totals[idx] = 0.0
+            try:
+                entry.counts[idx] = int(cast(int, row.get("cantidad_ventas") or 0))
+            except (TypeError, ValueError):
+                entry.counts[idx] = 0
+            seen = _parse_ts(row.get("actualizado_en"))
+            if seen is not None and seen > entry.watermark:
+                entry.watermark = seen
+            applied += 1
+        return applied
+
+    def _load(self, client: object, business_id: str, origin: date) -> _TenantDays:
+        loaded_at = datetime.now(timezone.utc)
+        entry = _TenantDays(
+            origin=origin,
+            totals=np.zeros(0, dtype=np.float64),
+            counts=np.zeros(0, dtype=np.int64),
+            watermark=datetime.min.replace(tzinfo=timezone.utc),
+        )
+        rows = self._fetch(client, business_id, origin, None)
+        self._apply(entry, rows)
+        if not rows:
+            # Sin filas todavía: el watermark arranca en el momento de la carga
+            entry.watermark = loaded_at
+        logger.info("[sales_store] cold load tenant=%s days=%s origin=%s", business_id, len(rows), origin)
+        return entry
+
+    def _refresh(self, client: object, business_id: str, entry: _TenantDays) -> None:
+        overlap = timedelta(seconds=int(ml_settings.ML_SALES_STORE_OVERLAP_SECONDS))
+        rows = self._fetch(client, business_id, entry.origin, entry.watermark - overlap)
+        if rows:
+            self._apply(entry, rows)
+            logger.debug("[sales_store] refresh tenant=%s changed_days=%s", business_id, len(rows))
+
+    def daily_totals(
+        self, client: object, business_id: str, days: int
+    ) -> tuple[date | None, NDArray[np.float64]]:
+        """
+        Daily revenue for the last `days` days (today included, UTC), trimmed to
+        the first and last day with sales; days in between without sales are 0.
+        Returns (first_day, totals); (None, empty) when there are no sales.
+        """
+        days = max(1, int(days))
+        today = datetime.now(timezone.utc).date()
+        start = today - timedelta(days=days - 1)
+        with self._lock:
+            entry = self._tenants.get(business_id)
+            if entry is None or start < entry.origin:
+                keep = max(days, int(ml_settings.ML_SALES_STORE_DAYS))
+                entry = self._load(client, business_id, today - timedelta(days=keep - 1))
+                self._tenants[business_id] = entry
+            else:
+                self._refresh(client, business_id, entry)
+            self._tenants.move_to_end(business_id)
+            max_tenants = self._max_tenants or int(ml_settings.ML_SALES_STORE_MAX_TENANTS)
+            while len(self._tenants) > max(1, max_tenants):
+                _ = self._tenants.popitem(last=False)
+
+            lo = (start - entry.origin).days
+            hi = (today - entry.origin).days + 1
+            counts = entry.counts[lo:hi]
+            with_sales = np.flatnonzero(counts > 0)
+            if with_sales.size == 0:
+                return None, np.zeros(0, dtype=np.float64)
+            first, last = int(with_sales[0]), int(with_sales[-1])
+            totals = entry.totals[lo + first : lo + last + 1].copy()
+            return start + timedelta(days=first), totals
+
+    def invalidate(self, business_id: str | None = None) -> None:
+        """Drop one tenant (next read reloads it) or the whole store."""
+        with self._lock:
+            if business_id is None:
+                self._tenants.clear()
+            else:
+                _ = self._tenants.pop(business_id, None)
+
+
+sales_store = DailySalesStore()
@@ -0,0 +1,379 @@
+"""
+app/services/report_export.py
+
+Exportación de reportes grandes (ventas, movimientos financieros) a CSV/XLSX
+con memoria constante.
+
+Los datos se leen por páginas con cursor (keyset), nunca el rango completo:
+- ventas: una fila por línea de venta, ordenadas por (fecha, id).
+- movimientos: el feed `get_movimientos_feed` (migrations/18_movimientos_feed.sql).
+
+Los writers consumen esos iteradores fila a fila:
+- CSV se emite en chunks (`iter_csv`) y sirve directo para `StreamingResponse`.
+- XLSX usa el modo write-only de openpyxl; como es un zip, se arma en un
+  archivo temporal y recién después se transmite (`iter_xlsx`).
+
+Los rangos grandes se delegan a Celery (app/workers/export_worker.py), que
+escribe el archivo con `write_export` y lo sube a Storage.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import logging
+import os
+import tempfile
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+Column = Tuple[str, str]  # (clave en la fila, encabezado)
+
+EXPORT_FORMATS: Dict[str, str] = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+_CHUNK_BYTES = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+_redis_client: Optional[Any] = None
+
+VENTAS_COLUMNS: List[Column] = [
+    ("venta_id", "Venta"),
+    ("fecha", "Fecha"),
+    ("sucursal_id", "Sucursal"),
+    ("metodo_pago", "Método de pago"),
+    ("total_venta", "Total venta"),
+    ("tipo", "Tipo"),
+    ("item", "Ítem"),
+    ("cantidad", "Cantidad"),
+    ("precio_unitario", "Precio unitario"),
+    ("subtotal", "Subtotal"),
+    ("observaciones", "Observaciones"),
+]
+
+MOVIMIENTOS_COLUMNS: List[Column] = [
+    ("fecha", "Fecha"),
+    ("tipo", "Tipo"),
+    ("categoria_nombre", "Categoría"),
+    ("descripcion", "Descripción"),
+    ("monto", "Monto"),
+    ("metodo_pago", "Método de pago"),
+    ("cliente_nombre", "Cliente"),
+    ("observaciones", "Observaciones"),
+    ("id", "ID"),
+]
+
+_VENTAS_SELECT = (
+    "id, fecha, sucursal_id, medio_pago, total, observaciones, "
+    "venta_detalle(tipo, cantidad, precio_unitario, subtotal, productos(nombre), servicios(nombre))"
+)
+
+
+# ---------------------------------------------------------------------------
+# Lectura paginada
+# ---------------------------------------------------------------------------
+
+def _venta_lines(venta: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    base = {
+        "venta_id": venta.get("id"),
+        "fecha": venta.get("fecha"),
+        "sucursal_id": venta.get("sucursal_id"),
+        "metodo_pago": venta.get("medio_pago"),
+        "total_venta": venta.get("total"),
+        "observaciones": venta.get("observaciones"),
+    }
+    detalles = venta.get("venta_detalle") or []
+    if not detalles:
+        yield base
+        return
+    for d in detalles:
+        relacion = d.get("productos") if d.get("tipo") == "producto" else d.get("servicios")
+        yield {
+            **base,
+            "tipo": d.get("tipo"),
+            "item": relacion.get("nombre") if isinstance(relacion, dict) else None,
+            "cantidad": d.get("cantidad"),
+            "precio_unitario": d.get("precio_unitario"),
+            "subtotal": d.get("subtotal"),
+        }
+
+
+def iter_ventas(
+    client: Any,
+    negocio_id: str,
+    fecha_inicio: Optional[str] = None,
+    fecha_fin: Optional[str] = None,
+    sucursal_id: Optional[str] = None,
+    page_size: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Líneas de venta del rango, leídas de a *page_size* ventas por cursor (fecha, id)."""
+    page_size = page_size or settings.EXPORT_PAGE_SIZE
+    cursor: Optional[Tuple[str, str]] = None
+    while True:
+        query = client.table("ventas").select(_VENTAS_SELECT).eq("negocio_id", negocio_id)
+        if sucursal_id:
+            query = query.eq("sucursal_id", sucursal_id)
+        if fecha_inicio:
+            query = query.gte("fecha", fecha_inicio)
+        if fecha_fin:
+            query = query.lte("fecha", fecha_fin)
+        if cursor:
+            fecha, venta_id = cursor
+            query = query.or_(f'fecha.gt."{fecha}",and(fecha.eq."{fecha}",id.gt.{venta_id})')
+        ventas = query.order("fecha").order("id").limit(page_size).execute().data or []
+
+        for venta in ventas:
+            yield from _venta_lines(venta)
+        if len(ventas) < page_size:
+            return
+        cursor = (ventas[-1]["fecha"], ventas[-1]["id"])
+
+
+def iter_movimientos(
+    client: Any,
+    negocio_id: str,
+    tipo: Optional[str] = None,
+    categoria_id: Optional[str] = None,
+    fecha_desde: Optional[str] = None,
+    fecha_hasta: Optional[str] = None,
+    sucursal_id: Optional[str] = None,
+    page_size: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Movimientos manuales + ventas, página a página con el cursor del feed."""
+    page_size = page_size or settings.EXPORT_PAGE_SIZE
+    cursor_fecha: Optional[str] = None
+    cursor_id: Optional[str] = None
+    while True:
+        rows = client.rpc(
+            "get_movimientos_feed",
+            {
+                "p_negocio_id": negocio_id,
+                "p_sucursal_id": sucursal_id,
+                "p_tipo": tipo,
+                "p_categoria_id": categoria_id,
+                "p_desde": fecha_desde,
+                "p_hasta": fecha_hasta,
+                "p_cursor_fecha": cursor_fecha,
+                "p_cursor_id": cursor_id,
+                "p_limit": page_size,
+            },
+        ).execute().data or []
+
+        yield from rows
+        if len(rows) < page_size:
+            return
+        cursor_fecha, cursor_id = str(rows[-1]["fecha"])[:10], rows[-1]["id"]
+
+
+REPORTES: Dict[str, Tuple[List[Column], Callable[..., Iterator[Dict[str, Any]]]]] = {
+    "ventas": (VENTAS_COLUMNS, iter_ventas),
+    "movimientos": (MOVIMIENTOS_COLUMNS, iter_movimientos),
+}
+
+
+def iter_report(client: Any, reporte: str, negocio_id: str, filtros: Dict[str, Any]) -> Tuple[List[Column], Iterator[Dict[str, Any]]]:
+    """Columnas y filas de *reporte* ('ventas' | 'movimientos') con sus filtros."""
+    columns, reader = REPORTES[reporte]
+    return columns, reader(client, negocio_id, **filtros)
+
+
+def should_offload(desde: Optional[str], hasta: Optional[str], en_segundo_plano: bool = False) -> bool:
+    """True si el rango es abierto o supera EXPORT_SYNC_MAX_DAYS: conviene Celery."""
+    if en_segundo_plano:
+        return True
+    if not desde:
+        return True
+    try:
+        inicio = date.fromisoformat(str(desde)[:10])
+        fin = date.fromisoformat(str(hasta)[:10]) if hasta else date.today()
+    except ValueError:
+        return True
+    return (fin - inicio).days > settings.EXPORT_SYNC_MAX_DAYS
+
+
+# ---------------------------------------------------------------------------
+# Writers
+# ---------------------------------------------------------------------------
+
+def _cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]], columns: Sequence[Column]) -> Iterator[bytes]:
+    """CSV en chunks de ~64 KB (con BOM para que Excel respete UTF-8)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow([header for _, header in columns])
+    for row in rows:
+        writer.writerow([_cell(row.get(key)) for key, _ in columns])
+        if buffer.tell() >= _CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def write_xlsx(rows: Iterable[Dict[str, Any]], columns: Sequence[Column], path: str, sheet_title: str = "Reporte") -> None:
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title)
+    sheet.append([header for _, header in columns])
+    for row in rows:
+        sheet.append([_cell(row.get(key)) for key, _ in columns])
+    workbook.save(path)
+
+
+def write_export(rows: Iterable[Dict[str, Any]], columns: Sequence[Column], formato: str, path: str) -> None:
+    """Escribe el reporte completo en *path* (usado por el worker)."""
+    if formato == "xlsx":
+        write_xlsx(rows, columns, path)
+        return
+    with open(path, "wb") as fh:
+        for chunk in iter_csv(rows, columns):
+            fh.write(chunk)
+
+
+def iter_xlsx(rows: Iterable[Dict[str, Any]], columns: Sequence[Column]) -> Iterator[bytes]:
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        write_xlsx(rows, columns, path)
+        with open(path, "rb") as fh:
+            while True:
+                chunk = fh.read(_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.unlink(path)
+
+
+def iter_export(rows: Iterable[Dict[str, Any]], columns: Sequence[Column], formato: str) -> Iterator[bytes]:
+    """Cuerpo para `StreamingResponse` en el formato pedido."""
+    if formato == "xlsx":
+        return iter_xlsx(rows, columns)
+    return iter_csv(rows, columns)
+
+
+def export_filename(reporte: str, formato: str) -> str:
+    return f"{reporte}_{date.today().isoformat()}.{formato}"
+
+
+# ---------------------------------------------------------------------------
+# Exportaciones en segundo plano
+# ---------------------------------------------------------------------------
+
+def export_response(
+    client: Any,
+    reporte: str,
+    negocio_id: str,
+    filtros: Dict[str, Any],
+    formato: str,
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    en_segundo_plano: bool = False,
+) -> Any:
+    """
+    Respuesta de un endpoint de exportación: descarga en streaming para rangos
+    acotados, o 202 con el id de la tarea de Celery para rangos grandes.
+    """
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    if should_offload(desde, hasta, en_segundo_plano):
+        from app.workers.export_worker import generar_exportacion
+
+        task_id = str(uuid.uuid4())
+        _register_export_owner(task_id, negocio_id)
+        generar_exportacion.apply_async(  # type: ignore[attr-defined]
+            args=(negocio_id, reporte, formato, filtros), task_id=task_id
+        )
+        return JSONResponse(status_code=202, content={"task_id": task_id, "estado": "pendiente"})
+
+    columns, rows = iter_report(client, reporte, negocio_id, filtros)
+    return StreamingResponse(
+        iter_export(rows, columns, formato),
+        media_type=EXPORT_FORMATS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(reporte, formato)}"'},
+    )
+
+
+def _export_owner_key(task_id: str) -> str:
+    return f"export:owner:{task_id}"
+
+
+def _get_redis() -> Any:
+    global _redis_client
+    if _redis_client is None:
+        import redis
+
+        _redis_client = redis.from_url(settings.REDIS_URL, socket_connect_timeout=2, socket_timeout=5)
+    return _redis_client
+
+
+def _register_export_owner(task_id: str, negocio_id: str) -> None:
+    """Registra el negocio dueño de la tarea antes de encolarla."""
+    _get_redis().setex(_export_owner_key(task_id), settings.EXPORT_URL_TTL, negocio_id)
+
+
+def _export_owner(task_id: str) -> Optional[str]:
+    try:
+        owner = _get_redis().get(_export_owner_key(task_id))
+    except Exception as exc:
+        logger.warning("No se pudo leer el dueño de la exportación %s: %s", task_id, exc)
+        return None
+    if isinstance(owner, bytes):
+        owner = owner.decode()
+    return owner
+
+
+def get_export_status(task_id: str, negocio_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Estado de una exportación encolada. Devuelve None si la tarea no existe o
+    es de otro negocio (en cualquier estado: Celery informa PENDING para ids
+    desconocidos); cuando terminó incluye una URL firmada al archivo en Storage.
+    """
+    from celery.result import AsyncResult
+
+    from app.celery_app import celery_app
+    from app.db.supabase_client import get_supabase_service_client
+
+    if _export_owner(task_id) != negocio_id:
+        return None
+
+    result = AsyncResult(task_id, app=celery_app)
+    if result.state == "SUCCESS":
+        info = result.result or {}
+        if info.get("negocio_id") != negocio_id:
+            return None
+        signed = get_supabase_service_client().storage.from_(settings.EXPORT_STORAGE_BUCKET).create_signed_url(
+            info["path"], settings.EXPORT_URL_TTL
+        )
+        if isinstance(signed, dict):
+            signed = signed.get("signedURL") or signed.get("signedUrl")
+        return {
+            "task_id": task_id,
+            "estado": "completado",
+            "reporte": info.get("reporte"),
+            "formato": info.get("formato"),
+            "filas": info.get("filas"),
+            "url": signed,
+        }
+    if result.state == "FAILURE":
+        return {"task_id": task_id, "estado": "error"}
+    return {"task_id": task_id, "estado": "pendiente" if result.state == "PENDING" else "procesando"}
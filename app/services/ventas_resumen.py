@@ -0,0 +1,128 @@
+"""
+app/services/ventas_resumen.py
+
+Reads of the daily sales rollup (migrations/16_ventas_diarias_rollup.sql).
+
+`ventas_diarias` and `ventas_diarias_items` are maintained by triggers on
+`ventas` / `venta_detalle`, so dashboards read one row per branch and day
+(or one row for a whole range via `get_ventas_resumen`) instead of every
+sale of the business. All helpers take the caller's Supabase client, so RLS
+on the rollup tables applies as it did on `ventas`.
+"""
+
+from __future__ import annotations
+
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _to_date(value: Any) -> date:
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def get_resumen(
+    client: Any,
+    negocio_id: str,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    sucursal_id: Optional[str] = None,
+) -> Dict[str, float]:
+    """
+    Sales count, revenue and estimated cost between two days (inclusive).
+    Without bounds the whole history is summed — still one round-trip and a
+    scan of at most one row per branch and day.
+    """
+    resp = client.rpc(
+        "get_ventas_resumen",
+        {
+            "p_negocio_id": negocio_id,
+            "p_sucursal_id": sucursal_id,
+            "p_desde": desde.isoformat() if desde else None,
+            "p_hasta": hasta.isoformat() if hasta else None,
+        },
+    ).execute()
+    row = (resp.data or [{}])[0] or {}
+    return {
+        "cantidad_ventas": int(row.get("cantidad_ventas") or 0),
+        "total_ingresos": float(row.get("total_ingresos") or 0),
+        "costo_estimado": float(row.get("costo_estimado") or 0),
+    }
+
+
+def get_por_dia(
+    client: Any,
+    negocio_id: str,
+    desde: date,
+    hasta: Optional[date] = None,
+    sucursal_id: Optional[str] = None,
+) -> Dict[date, Dict[str, float]]:
+    """
+    Per-day totals between *desde* and *hasta* (inclusive), branches merged
+    unless *sucursal_id* is given. Days without sales are omitted.
+    """
+    query = (
+        client.table("ventas_diarias")
+        .select("dia, cantidad_ventas, total_ingresos, costo_estimado")
+        .eq("negocio_id", negocio_id)
+        .gte("dia", desde.isoformat())
+    )
+    if hasta:
+        query = query.lte("dia", hasta.isoformat())
+    if sucursal_id:
+        query = query.eq("sucursal_id", sucursal_id)
+    resp = query.execute()
+
+    dias: Dict[date, Dict[str, float]] = {}
+    for row in resp.data or []:
+        if not row.get("cantidad_ventas"):
+            continue
+        dia = dias.setdefault(
+            _to_date(row["dia"]),
+            {"cantidad_ventas": 0, "total_ingresos": 0.0, "costo_estimado": 0.0},
+        )
+        dia["cantidad_ventas"] += int(row.get("cantidad_ventas") or 0)
+        dia["total_ingresos"] += float(row.get("total_ingresos") or 0)
+        dia["costo_estimado"] += float(row.get("costo_estimado") or 0)
+    return dias
+
+
+def get_top_items(
+    client: Any,
+    negocio_id: str,
+    desde: date,
+    hasta: Optional[date] = None,
+    sucursal_id: Optional[str] = None,
+    limit: int = 5,
+    tipo: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Top *limit* products/services by quantity sold in the range, with names,
+    in one RPC (`get_top_items_ventas`). Returns the ranked rows and the number
+    of distinct items sold in the range.
+    """
+    resp = client.rpc(
+        "get_top_items_ventas",
+        {
+            "p_negocio_id": negocio_id,
+            "p_sucursal_id": sucursal_id,
+            "p_desde": desde.isoformat(),
+            "p_hasta": (hasta or date.today()).isoformat(),
+            "p_limit": limit,
+            "p_tipo": tipo,
+        },
+    ).execute()
+    rows = resp.data or []
+    items = [
+        {
+            "tipo": row["tipo"],
+            "item_id": row["item_id"],
+            "nombre": row.get("nombre"),
+            "cantidad": float(row.get("cantidad_total") or 0),
+            "ingresos": float(row.get("ingreso_total") or 0),
+        }
+        for row in rows
+    ]
+    total_items = int(rows[0].get("total_items") or 0) if rows else 0
+    return items, total_items
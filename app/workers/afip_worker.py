@@ -0,0 +1,142 @@
+"""
+Worker para emisión de facturas ARCA/AFIP fuera del request de venta.
+
+Las ventas con `facturar=True` dejan una fila en `facturas` con estado
+'pendiente' y encolan `emitir_factura_afip` en la cola `afip_invoicing`.
+La numeración (FECompUltimoAutorizado + 1 → FECAESolicitar) se serializa con
+un lock de Redis por (CUIT, punto de venta), así los comprobantes quedan
+correlativos aunque haya varios workers consumiendo la cola. El PDF se genera
+después de liberar el lock, para no frenar la numeración del punto de venta.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import redis
+from celery.exceptions import MaxRetriesExceededError
+
+from app.celery_app import celery_app
+from app.core.config import settings
+from app.db.supabase_client import get_supabase_service_client
+
+logger = logging.getLogger(__name__)
+
+_redis_client: Optional[redis.Redis] = None
+
+
+def _get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.from_url(settings.REDIS_URL, socket_connect_timeout=5, socket_timeout=5)
+    return _redis_client
+
+
+def _lock_name(cuit: Any, punto_venta: Any) -> str:
+    return f"afip:cbte_lock:{cuit}:{punto_venta}"
+
+
+def _marcar_factura(supabase: Any, factura_id: str, **campos: Any) -> None:
+    try:
+        supabase.table("facturas").update(campos).eq("id", factura_id).execute()
+    except Exception as e:
+        logger.error("No se pudo actualizar la factura %s: %s", factura_id, e)
+
+
+@celery_app.task(bind=True, max_retries=120)
+def emitir_factura_afip(
+    self,
+    factura_id: str,
+    negocio_id: str,
+    venta_id: str,
+    cliente_id: Optional[str],
+    total: float,
+    items: list,
+    sucursal_id: Optional[str] = None,
+) -> dict[str, object]:
+    """
+    Emite la factura pendiente `factura_id` contra ARCA.
+    Si otro worker está numerando para el mismo CUIT/punto de venta, reintenta en unos segundos.
+    """
+    from app.api.api_v1.endpoints.afip_helper import (
+        adjuntar_pdf_factura,
+        obtener_config_facturable,
+        procesar_facturacion_afip,
+    )
+
+    supabase = get_supabase_service_client()
+
+    actual = supabase.table("facturas").select("id, estado").eq("id", factura_id).limit(1).execute()
+    if not actual.data:
+        logger.warning("Factura %s no existe, se descarta la tarea", factura_id)
+        return {"factura_id": factura_id, "estado": "descartada"}
+    estado_actual = actual.data[0].get("estado")
+    if estado_actual == "emitida":
+        return {"factura_id": factura_id, "estado": "emitida"}
+    if estado_actual == "procesando":
+        # Otra ejecución quedó a mitad de la emisión: ARCA pudo haber autorizado el comprobante.
+        _marcar_factura(supabase, factura_id, estado="error",
+                        error_detalle="Emisión interrumpida; verificar último comprobante en ARCA antes de reintentar")
+        return {"factura_id": factura_id, "estado": "error"}
+
+    config = obtener_config_facturable(supabase, negocio_id)
+    if not config:
+        _marcar_factura(supabase, factura_id, estado="error",
+                        error_detalle="Configuración fiscal no habilitada o sin certificados")
+        return {"factura_id": factura_id, "estado": "error"}
+
+    lock = _get_redis().lock(
+        _lock_name(config.get("cuit"), config.get("punto_venta", 1)),
+        timeout=settings.AFIP_INVOICE_LOCK_TIMEOUT,
+        blocking_timeout=5,
+    )
+    if not lock.acquire():
+        try:
+            raise self.retry(countdown=2)
+        except MaxRetriesExceededError:
+            detalle = "No se obtuvo el lock de numeración ARCA tras agotar los reintentos"
+            logger.error("Factura %s: %s", factura_id, detalle)
+            _marcar_factura(supabase, factura_id, estado="error", error_detalle=detalle)
+            return {"factura_id": factura_id, "estado": "error", "error": detalle}
+
+    try:
+        _marcar_factura(supabase, factura_id, estado="procesando")
+        factura = asyncio.run(
+            procesar_facturacion_afip(
+                supabase, negocio_id, venta_id, cliente_id, total, items,
+                sucursal_id=sucursal_id, factura_id=factura_id, generar_pdf=False,
+            )
+        )
+        if factura is None:
+            # Sin config fiscal al emitir (p. ej. deshabilitada mientras estaba en cola)
+            detalle = "Configuración fiscal no habilitada o sin certificados"
+            _marcar_factura(supabase, factura_id, estado="error", error_detalle=detalle)
+            return {"factura_id": factura_id, "estado": "error", "error": detalle}
+        estado = factura.get("estado", "error")
+        logger.info("Factura %s (venta %s) procesada: %s", factura_id, venta_id, estado)
+    except Exception as e:
+        logger.error("Error emitiendo factura %s: %s", factura_id, e)
+        # Si el CAE ya quedó registrado no se pisa el estado.
+        actual = supabase.table("facturas").select("estado").eq("id", factura_id).limit(1).execute()
+        if not actual.data or actual.data[0].get("estado") != "emitida":
+            _marcar_factura(supabase, factura_id, estado="error", error_detalle=str(e)[:1000])
+            return {"factura_id": factura_id, "estado": "error", "error": str(e)}
+        return {"factura_id": factura_id, "estado": "emitida", "error": str(e)}
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            logger.warning("Lock de numeración AFIP expirado antes de liberar (factura %s)", factura_id)
+
+    # Fuera del lock: el PDF no bloquea la numeración de otras facturas
+    if estado == "emitida" and factura.get("id"):
+        try:
+            adjuntar_pdf_factura(supabase, factura, config)
+        except Exception as e:
+            logger.error("Factura %s emitida pero falló el PDF: %s", factura_id, e)
+
+    return {
+        "factura_id": factura_id,
+        "estado": estado,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
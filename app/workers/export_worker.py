@@ -0,0 +1,70 @@
+"""
+Worker de exportaciones CSV/XLSX para rangos grandes.
+
+Los endpoints de exportación encolan `generar_exportacion` cuando el rango
+supera EXPORT_SYNC_MAX_DAYS (o si se pide en segundo plano). La tarea recorre
+el reporte por páginas con cursor, escribe el archivo en disco con memoria
+constante y lo sube al bucket privado EXPORT_STORAGE_BUCKET; el cliente
+consulta el estado y obtiene una URL firmada (report_export.get_export_status).
+"""
+import logging
+import os
+import tempfile
+from typing import Any, Dict, Optional
+
+from app.celery_app import celery_app
+from app.core.config import settings
+from app.db.supabase_client import get_supabase_service_client
+from app.services import report_export
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(bind=True, max_retries=2, default_retry_delay=30)
+def generar_exportacion(
+    self,
+    negocio_id: str,
+    reporte: str,
+    formato: str,
+    filtros: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Genera el reporte `reporte` ('ventas' | 'movimientos') de `negocio_id` y lo
+    sube a Storage. El permiso ya se verificó en el endpoint que encoló la tarea.
+    """
+    supabase = get_supabase_service_client()
+    storage_path = f"{negocio_id}/{self.request.id}.{formato}"
+    filas = 0
+
+    fd, tmp_path = tempfile.mkstemp(suffix=f".{formato}")
+    os.close(fd)
+    try:
+        columns, rows = report_export.iter_report(supabase, reporte, negocio_id, filtros or {})
+
+        def _contar(it):
+            nonlocal filas
+            for row in it:
+                filas += 1
+                yield row
+
+        report_export.write_export(_contar(rows), columns, formato, tmp_path)
+
+        supabase.storage.from_(settings.EXPORT_STORAGE_BUCKET).upload(
+            path=storage_path,
+            file=tmp_path,
+            file_options={"content-type": report_export.EXPORT_FORMATS[formato], "upsert": "true"},  # type: ignore[arg-type]
+        )
+    except Exception as exc:
+        logger.error("Exportación %s de %s falló: %s", reporte, negocio_id, exc)
+        raise self.retry(exc=exc)
+    finally:
+        os.unlink(tmp_path)
+
+    logger.info("Exportación %s (%s) de %s: %d filas en %s", reporte, formato, negocio_id, filas, storage_path)
+    return {
+        "negocio_id": negocio_id,
+        "reporte": reporte,
+        "formato": formato,
+        "filas": filas,
+        "path": storage_path,
+    }
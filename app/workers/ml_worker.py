@@ -7,6 +7,7 @@ from supabase.client import Client
 import json
 import time
 import math
+import uuid
 import numpy as np
 import numbers
 from typing import TYPE_CHECKING, cast, Callable, TypeVar, Protocol
@@ -178,137 +179,273 @@ def _to_iso_date(x: object) -> str:
     except Exception:
         return str(cast(object, x))
 
+def _retrain_tenant(bid: str, nombre: object) -> dict[str, object]:
+    """Entrena y predice un negocio; devuelve los contadores para el resumen del retrain."""
+    # Local import to avoid circular dependency with pipeline importing ml_worker
+    from app.services.ml.pipeline import train_and_predict_sales  # type: ignore
+
+    tb = time.perf_counter()
+    result = train_and_predict_sales(
+        bid,
+        horizon_days=ml_settings.ML_HORIZON_DAYS,
+        history_days=ml_settings.ML_MAX_TRAIN_WINDOW_DAYS,
+        cv_folds=ml_settings.ML_CV_FOLDS,
+        # Prophet params
+        seasonality_mode=ml_settings.ML_SEASONALITY_MODE,
+        holidays_country=ml_settings.ML_HOLIDAYS_COUNTRY,
+        log_transform=ml_settings.ML_LOG_TRANSFORM,
+        # Model selection
+        model_candidates=ml_settings.ML_MODEL_CANDIDATES,
+        select_best=ml_settings.ML_SELECT_BEST,
+        cv_primary_metric=ml_settings.ML_CV_PRIMARY_METRIC,
+        # SARIMAX
+        sarimax_order=ml_settings.ML_SARIMAX_ORDER,
+        sarimax_seasonal=ml_settings.ML_SARIMAX_SEASONAL,
+        # Anomalies
+        anomaly_method=ml_settings.ML_ANOMALY_METHOD,
+        stl_period=ml_settings.ML_STL_PERIOD,
+    )
+    an_raw = result.get("anomalies")
+    inserted_anoms = 0
+    if isinstance(an_raw, dict):
+        an_dict = cast(dict[str, object], an_raw)
+        inserted_anoms = _as_int(an_dict.get("inserted", 0), 0)
+    # Log CV summary metrics if available
+    ms = cast(dict[str, object] | None, result.get("metrics_summary"))
+    if isinstance(ms, dict):
+        sel = cast(str, ms.get("selected_model", "unknown"))
+        cv = cast(dict[str, object], ms.get("cv", {}))
+        timing = cast(dict[str, object], ms.get("timing", {}))
+        _log_ml(
+            logging.INFO,
+            "ml_cv_summary",
+            tenant_id=bid,
+            model=sel,
+            folds=_as_int(cv.get("folds"), 0),
+            mape=_as_float(ms.get("mape"), float('nan')),
+            smape=_as_float(ms.get("smape"), float('nan')),
+            mae=_as_float(ms.get("mae"), float('nan')),
+            rmse=_as_float(ms.get("rmse"), float('nan')),
+            train_time=_as_float(timing.get("train_time"), float('nan')),
+            infer_time=_as_float(timing.get("infer_time"), float('nan')),
+        )
+        _log_ml(
+            logging.INFO,
+            "ml_retrain_tenant_done",
+            tenant_id=bid,
+            business_name=nombre,
+            forecasts=result.get('forecasts_inserted'),
+            accuracy=result.get('accuracy'),
+            took_seconds=round(time.perf_counter()-tb, 3),
+        )
+    logger.info(
+        f"ML retrain completed for negocio={nombre} (forecasts={result.get('forecasts_inserted')}, accuracy={result.get('accuracy')}, took={time.perf_counter()-tb:.2f}s)"
+    )
+    return {
+        "trained": bool(result.get("trained")),
+        "forecasts": _as_int(result.get("forecasts_inserted", 0), 0),
+        "anomalies": inserted_anoms,
+    }
+
+
+def _retrain_shard(tenants: list[dict[str, object]]) -> dict[str, object]:
+    """
+    Re-entrena un shard de negocios en serie. Si el shard agota su soft time
+    limit, los negocios pendientes quedan en `timed_out` y el resultado parcial
+    se devuelve igual, para que el chord pueda agregarlo.
+    """
+    shard: dict[str, object] = {
+        "tenants": len(tenants),
+        "models_retrained": 0,
+        "forecasts_inserted": 0,
+        "anomalies_inserted": 0,
+        "failed": [],
+        "timed_out": [],
+    }
+    failed = cast(list[str], shard["failed"])
+    for i, business in enumerate(tenants):
+        bid = cast(str, business["id"])  # id siempre es str en nuestra tabla
+        try:
+            r = _retrain_tenant(bid, business.get("nombre"))
+        except SoftTimeLimitExceeded:
+            shard["timed_out"] = [cast(str, b["id"]) for b in tenants[i:]]
+            _log_ml(logging.WARNING, "ml_retrain_shard_timeout", pending=shard["timed_out"])
+            break
+        except Exception as ie:
+            logger.error(f"Error retraining tenant={bid}: {ie}")
+            failed.append(bid)
+            continue
+        if r["trained"]:
+            shard["models_retrained"] = _as_int(shard["models_retrained"]) + 1
+        shard["forecasts_inserted"] = _as_int(shard["forecasts_inserted"]) + _as_int(r["forecasts"])
+        shard["anomalies_inserted"] = _as_int(shard["anomalies_inserted"]) + _as_int(r["anomalies"])
+    return shard
+
+
+def _retrain_summary(
+    shards: Iterable[Mapping[str, object]],
+    businesses: int,
+    started_at: float,
+    failed_shards: int = 0,
+) -> dict[str, object]:
+    """Agrega los resultados de los shards en el resumen de retrain_all_models."""
+    shard_list = list(shards)
+    models_retrained = sum(_as_int(sh.get("models_retrained")) for sh in shard_list)
+    forecasts_total = sum(_as_int(sh.get("forecasts_inserted")) for sh in shard_list)
+    anomalies_total = sum(_as_int(sh.get("anomalies_inserted")) for sh in shard_list)
+    failed = [t for sh in shard_list for t in cast(list[str], sh.get("failed") or [])]
+    timed_out = [t for sh in shard_list for t in cast(list[str], sh.get("timed_out") or [])]
+    elapsed = time.time() - started_at
+    _log_ml(
+        logging.INFO,
+        "ml_retrain_end",
+        businesses=businesses,
+        shards=len(shard_list),
+        models=models_retrained,
+        forecasts=forecasts_total,
+        anomalies=anomalies_total,
+        failed=len(failed),
+        timed_out=len(timed_out),
+        failed_shards=failed_shards,
+        took_seconds=round(elapsed, 3),
+    )
+    return {
+        "task": "retrain_all_models",
+        "businesses_processed": businesses,
+        "models_retrained": models_retrained,
+        "forecasts_inserted": forecasts_total,
+        "anomalies_inserted": anomalies_total,
+        "shards": len(shard_list),
+        "failed_shards": failed_shards,
+        "failed_tenants": failed,
+        "timed_out_tenants": timed_out,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+@task_typed(
+    bind=True,
+    soft_time_limit=ml_settings.ML_RETRAIN_SHARD_SOFT_LIMIT,
+    time_limit=ml_settings.ML_RETRAIN_SHARD_TIME_LIMIT,
+)
+def retrain_tenant_shard(self: "Task", tenants: list[dict[str, object]]) -> dict[str, object]:
+    """Re-entrena un shard de negocios (header del chord de retrain_all_models)."""
+    return _retrain_shard(tenants)
+
+
+@task_typed(bind=True)
+def aggregate_retrain_results(
+    self: "Task", shard_results: list[dict[str, object]], businesses: int, started_at: float
+) -> dict[str, object]:
+    """Callback del chord: mismo resumen que devolvía retrain_all_models en serie."""
+    return _retrain_summary(shard_results, businesses, started_at)
+
+
+@task_typed()
+def aggregate_retrain_errors(
+    request: object,
+    exc: object,
+    traceback: object,
+    shard_task_ids: list[str],
+    shard_tenants: list[list[str]],
+    businesses: int,
+    started_at: float,
+) -> dict[str, object]:
+    """
+    Error callback (link_error) del chord: si un shard murió (p.ej. al llegar a su
+    hard time limit) el callback normal no corre. Junta los shards que terminaron
+    y cuenta los negocios de los shards caídos como fallidos.
+    """
+    from celery.result import AsyncResult
+
+    shard_results: list[Mapping[str, object]] = []
+    failed_shards = 0
+    for task_id, tenant_ids in zip(shard_task_ids, shard_tenants):
+        res = AsyncResult(task_id, app=celery_app)
+        if res.successful() and isinstance(res.result, dict):
+            shard_results.append(cast(Mapping[str, object], res.result))
+            continue
+        failed_shards += 1
+        shard_results.append({"tenants": len(tenant_ids), "failed": list(tenant_ids), "timed_out": []})
+    _log_ml(logging.ERROR, "ml_retrain_chord_error", error=str(exc), failed_shards=failed_shards)
+    return _retrain_summary(shard_results, businesses, started_at, failed_shards=failed_shards)
+
+
 @task_typed(bind=True, soft_time_limit=900, time_limit=1200)
 def retrain_all_models(self: "Task") -> dict[str, object]:
     """
-    Re-entrena todos los modelos ML (lunes 2 AM)
+    Re-entrena todos los modelos ML (lunes 2 AM).
+
+    Los negocios se reparten en shards de ML_RETRAIN_SHARD_SIZE y cada shard
+    corre como su propia tarea (`retrain_tenant_shard`, con su propio time
+    limit) en paralelo en los workers de `ml_processing`; un chord junta los
+    resultados en `aggregate_retrain_results`. Aun con un único shard se pasa
+    por `retrain_tenant_shard`, para que corra con los límites del shard y no
+    con los de esta tarea. Si un shard falla, `aggregate_retrain_errors`
+    (link_error del callback) arma el resumen con los resultados parciales.
     """
     try:
         from app.db.supabase_client import get_supabase_service_client
-        logger.info("Successfully imported get_supabase_service_client in generate_predictions")
+        logger.info("Successfully imported get_supabase_service_client in retrain_all_models")
     except ImportError as e:
-        logger.error(f"Failed to import get_supabase_service_client in generate_predictions: {e}")
+        logger.error(f"Failed to import get_supabase_service_client in retrain_all_models: {e}")
         raise
 
     try:
         supabase: Client = get_supabase_service_client()
-        t0 = time.perf_counter()
+        started_at = time.time()
         _log_ml(logging.INFO, "ml_retrain_start")
-        # Local import to avoid circular dependency with pipeline importing ml_worker
-        try:
-            from app.services.ml.pipeline import train_and_predict_sales  # type: ignore
-            logger.info("Successfully imported train_and_predict_sales in generate_predictions")
-        except ImportError as e:
-            logger.error(f"Failed to import train_and_predict_sales in generate_predictions: {e}")
-            raise
         # Obtener negocios activos (usando getattr+cast para evitar Unknowns)
         sb_table = cast(Callable[[str], object], getattr(supabase, "table"))
         req = sb_table("negocios")
         req = cast(object, getattr(req, "select")("id, nombre"))
         businesses = cast(object, getattr(req, "execute")())
         biz_rows = cast(list[dict[str, object]], getattr(businesses, "data", []) or [])
-        
-        models_retrained = 0
-        forecasts_total = 0
-        anomalies_total = 0
+
         # Optional filtering by ML_TENANT_IDS
         allowed = ml_settings.allowed_tenants()
-        for business in biz_rows:
-            bid = cast(str, business["id"])  # id siempre es str en nuestra tabla
-            if allowed and bid not in allowed:
-                continue
-            try:
-                tb = time.perf_counter()
-                result = train_and_predict_sales(
-                    bid,
-                    horizon_days=ml_settings.ML_HORIZON_DAYS,
-                    history_days=ml_settings.ML_MAX_TRAIN_WINDOW_DAYS,
-                    cv_folds=ml_settings.ML_CV_FOLDS,
-                    # Prophet params
-                    seasonality_mode=ml_settings.ML_SEASONALITY_MODE,
-                    holidays_country=ml_settings.ML_HOLIDAYS_COUNTRY,
-                    log_transform=ml_settings.ML_LOG_TRANSFORM,
-                    # Model selection
-                    model_candidates=ml_settings.ML_MODEL_CANDIDATES,
-                    select_best=ml_settings.ML_SELECT_BEST,
-                    cv_primary_metric=ml_settings.ML_CV_PRIMARY_METRIC,
-                    # SARIMAX
-                    sarimax_order=ml_settings.ML_SARIMAX_ORDER,
-                    sarimax_seasonal=ml_settings.ML_SARIMAX_SEASONAL,
-                    # Anomalies
-                    anomaly_method=ml_settings.ML_ANOMALY_METHOD,
-                    stl_period=ml_settings.ML_STL_PERIOD,
-                )
-                if result.get("trained"):
-                    models_retrained += 1
-                forecasts_total += _as_int(result.get("forecasts_inserted", 0), 0)
-                an_raw = result.get("anomalies")
-                inserted_anoms = 0
-                if isinstance(an_raw, dict):
-                    an_dict = cast(dict[str, object], an_raw)
-                    inserted_anoms = _as_int(an_dict.get("inserted", 0), 0)
-                anomalies_total += inserted_anoms
-                # Log CV summary metrics if available
-                ms = cast(dict[str, object] | None, result.get("metrics_summary"))
-                if isinstance(ms, dict):
-                    sel = cast(str, ms.get("selected_model", "unknown"))
-                    mape = ms.get("mape")
-                    smape = ms.get("smape")
-                    mae = ms.get("mae")
-                    rmse = ms.get("rmse")
-                    cv = cast(dict[str, object], ms.get("cv", {}))
-                    folds = cv.get("folds")
-                    timing = cast(dict[str, object], ms.get("timing", {}))
-                    ttrain = timing.get("train_time")
-                    tinfer = timing.get("infer_time")
-                    _log_ml(
-                        logging.INFO,
-                        "ml_cv_summary",
-                        tenant_id=bid,
-                        model=sel,
-                        folds=_as_int(folds, 0),
-                        mape=_as_float(mape, float('nan')),
-                        smape=_as_float(smape, float('nan')),
-                        mae=_as_float(mae, float('nan')),
-                        rmse=_as_float(rmse, float('nan')),
-                        train_time=_as_float(ttrain, float('nan')),
-                        infer_time=_as_float(tinfer, float('nan')),
-                    )
-                    _log_ml(
-                        logging.INFO,
-                        "ml_retrain_tenant_done",
-                        tenant_id=bid,
-                        business_name=business['nombre'],
-                        forecasts=result.get('forecasts_inserted'),
-                        accuracy=result.get('accuracy'),
-                        took_seconds=round(time.perf_counter()-tb, 3),
-                    )
-                logger.info(
-                    f"ML retrain completed for negocio={business['nombre']} (forecasts={result.get('forecasts_inserted')}, accuracy={result.get('accuracy')}, took={time.perf_counter()-tb:.2f}s)"
-                )
-            except Exception as ie:
-                logger.error(f"Error retraining tenant={bid}: {ie}")
-                continue
-
-        elapsed = time.perf_counter() - t0
+        tenants = [
+            {"id": b["id"], "nombre": b.get("nombre")}
+            for b in biz_rows
+            if not allowed or b["id"] in allowed
+        ]
+        shard_size = max(1, ml_settings.ML_RETRAIN_SHARD_SIZE)
+        shards = [tenants[i:i + shard_size] for i in range(0, len(tenants), shard_size)]
+
+        if not shards:
+            return _retrain_summary([], len(biz_rows), started_at)
+
+        from celery import chord
+
+        shard_task_ids = [str(uuid.uuid4()) for _ in shards]
+        shard_tenants = [[cast(str, b["id"]) for b in shard] for shard in shards]
+        header = [
+            getattr(cast(Callable[..., object], getattr(retrain_tenant_shard, "s"))(shard), "set")(task_id=task_id)
+            for shard, task_id in zip(shards, shard_task_ids)
+        ]
+        callback = cast(Callable[..., object], getattr(aggregate_retrain_results, "s"))(len(biz_rows), started_at)
+        errback = cast(Callable[..., object], getattr(aggregate_retrain_errors, "s"))(
+            shard_task_ids, shard_tenants, len(biz_rows), started_at
+        )
+        _ = getattr(callback, "link_error")(errback)
+        async_result = cast(Callable[..., object], chord(header))(callback)
         _log_ml(
             logging.INFO,
-            "ml_retrain_end",
+            "ml_retrain_dispatched",
             businesses=len(biz_rows),
-            models=models_retrained,
-            forecasts=forecasts_total,
-            anomalies=anomalies_total,
-            took_seconds=round(elapsed, 3),
+            tenants=len(tenants),
+            shards=len(shards),
+            shard_size=shard_size,
         )
         return {
             "task": "retrain_all_models",
             "businesses_processed": len(biz_rows),
-            "models_retrained": models_retrained,
-            "forecasts_inserted": forecasts_total,
-            "anomalies_inserted": anomalies_total,
+            "tenants_scheduled": len(tenants),
+            "shards": len(shards),
+            "chord_id": getattr(async_result, "id", None),
             "timestamp": datetime.now(timezone.utc).isoformat(),
         }
-        
+
     except SoftTimeLimitExceeded as e:
         logger.error(f"Soft time limit exceeded in retrain_all_models: {e}")
         raise
@@ -316,6 +453,64 @@ def retrain_all_models(self: "Task") -> dict[str, object]:
         logger.error(f"Error en re-entrenamiento: {str(e)}")
         raise cast(_RetryingTask, self).retry(exc=e, countdown=300, max_retries=2)
 
+def _update_features_per_tenant(fe: FeatureEngineer, tenants: list[dict[str, object]]) -> int:
+    """Per-tenant path: one ventas read, one productos read and separate upserts per business."""
+    features_updated = 0
+    for business in tenants:
+        bid = cast(str, business["id"])  # id es str
+        try:
+            # Sales metrics (last 30 days)
+            t_bus = time.perf_counter()
+            ts = fe.sales_timeseries_daily(bid, days=90)
+            if not ts.empty:
+                upserted = fe.persist_sales_features(bid, ts.tail(30))
+                features_updated += int(upserted)
+            # Inventory metrics snapshot (today)
+            inv = fe.inventory_snapshot(bid)
+            fe.persist_inventory_features(bid, inv)
+            features_updated += 1
+            # Invalidate cached feature keys for this tenant (O(1) generation bump)
+            cache_manager.invalidate_scope("ml_features", bid)
+            _log_ml(
+                logging.INFO,
+                "ml_features_updated_tenant",
+                tenant_id=bid,
+                business_name=business.get('nombre'),
+                took_seconds=round(time.perf_counter()-t_bus, 3),
+            )
+        except Exception as ie:
+            logger.error(f"Error updating features for tenant={bid}: {ie}")
+            continue
+    return features_updated
+
+
+def _update_features_batch(fe: FeatureEngineer, tenants: list[dict[str, object]]) -> int:
+    """
+    Batched path: per group of ML_FEATURES_BATCH_TENANTS businesses, one RPC with
+    sales/inventory aggregates, vectorised metrics and chunked multi-tenant upserts.
+    """
+    features_updated = 0
+    group_size = max(1, int(ml_settings.ML_FEATURES_BATCH_TENANTS))
+    tenant_ids = [cast(str, b["id"]) for b in tenants]
+    for i in range(0, len(tenant_ids), group_size):
+        group = tenant_ids[i : i + group_size]
+        t_group = time.perf_counter()
+        daily, inventory = fe.feature_aggregates_batch(group, days=90)
+        sales = fe.sales_metrics_batch(daily, tail_days=30)
+        features_updated += fe.persist_features_batch(
+            sales, inventory, group, chunk=int(ml_settings.ML_FEATURES_UPSERT_CHUNK)
+        )
+        for bid in group:
+            cache_manager.invalidate_scope("ml_features", bid)
+        _log_ml(
+            logging.INFO,
+            "ml_features_updated_batch",
+            tenants=len(group),
+            took_seconds=round(time.perf_counter()-t_group, 3),
+        )
+    return features_updated
+
+
 @task_typed(bind=True, soft_time_limit=600, time_limit=900)
 @invalidate_on_update('ml_features')
 def update_business_features(self: "Task") -> dict[str, object]:
@@ -340,35 +535,20 @@ def update_business_features(self: "Task") -> dict[str, object]:
         biz_rows = cast(list[dict[str, object]], getattr(businesses, "data", []) or [])
 
         fe = FeatureEngineer()
-        features_updated = 0
         allowed = ml_settings.allowed_tenants()
-        for business in biz_rows:
-            bid = cast(str, business["id"])  # id es str
-            if allowed and bid not in allowed:
-                continue
+        tenants = [b for b in biz_rows if not allowed or cast(str, b["id"]) in allowed]
+        features_updated = 0
+        if ml_settings.ML_FEATURES_BATCH_ENABLED:
             try:
-                # Sales metrics (last 30 days)
-                t_bus = time.perf_counter()
-                ts = fe.sales_timeseries_daily(bid, days=90)
-                if not ts.empty:
-                    upserted = fe.persist_sales_features(bid, ts.tail(30))
-                    features_updated += int(upserted)
-                # Inventory metrics snapshot (today)
-                inv = fe.inventory_snapshot(bid)
-                fe.persist_inventory_features(bid, inv)
-                features_updated += 1
-                # Invalidate cached feature keys for this tenant (pattern)
-                cache_manager.invalidate_pattern(f"ml_features:features_{bid}")
-                _log_ml(
-                    logging.INFO,
-                    "ml_features_updated_tenant",
-                    tenant_id=bid,
-                    business_name=business['nombre'],
-                    took_seconds=round(time.perf_counter()-t_bus, 3),
-                )
-            except Exception as ie:
-                logger.error(f"Error updating features for tenant={bid}: {ie}")
-                continue
+                features_updated = _update_features_batch(fe, tenants)
+            except SoftTimeLimitExceeded:
+                raise
+            except Exception as be:
+                # p.ej. migración 22 sin aplicar: seguir con el camino por negocio
+                logger.error(f"Batched feature update failed, falling back to per-tenant: {be}")
+                features_updated = _update_features_per_tenant(fe, tenants)
+        else:
+            features_updated = _update_features_per_tenant(fe, tenants)
 
         _log_ml(
             logging.INFO,
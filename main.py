@@ -13,6 +13,8 @@ from app.api.api_v1.api import api_router
 from app.core.config import settings
 from app.core.logging_config import configure_logging
 from app.db.supabase_client import get_supabase_client, check_supabase_connection
+from app.db.client_pool import aclose_shared_sessions
+from app.core.jwt_auth import TokenVerificationError, averify_token
 from app.middleware.error_handlers import JSONErrorMiddleware
 
 # CONFIGURACIÓN DE LOGS
@@ -50,6 +52,7 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down MicroPymes API")
+    await aclose_shared_sessions()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -84,6 +87,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"], # Permitir todos los métodos para evitar bloqueos de preflight
     allow_headers=["*"], # Permitir todos los headers
+    expose_headers=["X-Next-Cursor"], # Cursor de paginación de /finanzas/movimientos
 )
 
 # 4. CUARTO: Auth Middleware (Lógica de negocio)
@@ -134,28 +138,17 @@ async def auth_middleware(request: Request, call_next):
         token = authorization.replace("Bearer ", "")
         # logger.info(f"[MIDDLEWARE] Token extraído (primeros 10 chars): {token[:10]}...") # Security: Don't log tokens
         try:
-            # Validar token y obtener usuario
-            supabase = get_supabase_client()
-            auth_response = supabase.auth.get_user(token)
-            
-            if auth_response and auth_response.user:
-                # Crear objeto user simple para request.state
-                class SimpleUser:
-                    def __init__(self, user_id: str, email: str):
-                        self.id = user_id
-                        self.email = email
-                
-                request.state.user = SimpleUser(
-                    user_id=auth_response.user.id,
-                    email=auth_response.user.email or ""
-                )
-                logger.info(f"[MIDDLEWARE] ✅ Usuario autenticado: {auth_response.user.id}")
-            else:
-                logger.warning(f"[MIDDLEWARE] ❌ Token inválido - no se pudo obtener usuario")
+            # Verificación local de la firma (con caché por token) en lugar de
+            # un round-trip a Supabase Auth en cada petición.
+            identity = await averify_token(token)
+            request.state.identity = identity
+            request.state.user = identity
+            logger.debug(f"[MIDDLEWARE] ✅ Usuario autenticado: {identity.user_id}")
+        except TokenVerificationError as e:
+            logger.warning(f"[MIDDLEWARE] ❌ Token inválido: {str(e)}")
+            # No bloqueamos aquí, dejamos que los endpoints manejen la autenticación
         except Exception as e:
             logger.warning(f"[MIDDLEWARE] ❌ Error validando token: {str(e)}")
-            # No bloqueamos aquí, dejamos que los endpoints manejen la autenticación
-            pass
     else:
         logger.warning(f"[MIDDLEWARE] ❌ No hay token de autorización en la petición")
     
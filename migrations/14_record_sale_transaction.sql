@@ -0,0 +1,155 @@
+-- Registro de venta en una sola transacción (POS).
+-- Inserta cabecera (ventas), detalles (venta_detalle) y descuenta el stock de
+-- todos los productos del carrito en un único round-trip, reemplazando
+-- ventas.insert + venta_detalle.insert + N llamadas a deduct_stock_on_sale.
+--
+-- p_venta: objeto con las columnas de ventas
+--   (id, negocio_id, sucursal_id, cliente_id, usuario_negocio_id, total, medio_pago, fecha, observaciones)
+-- p_items: array con las columnas de venta_detalle
+--   (producto_id, servicio_id, tipo, cantidad, precio_unitario, subtotal, sucursal_id)
+--
+-- Se invoca con el token del usuario: SECURITY DEFINER para actualizar stock sin
+-- depender de RLS, pero exige que auth.uid() sea miembro aceptado del negocio,
+-- que p_venta.usuario_negocio_id sea su propia membresía y que p_sucursal_id
+-- pertenezca a p_negocio_id.
+-- Si el stock (bloqueado con FOR NO KEY UPDATE) no alcanza, toda la venta se
+-- revierte. FOR NO KEY UPDATE no choca con el FOR KEY SHARE que toma la FK de
+-- venta_detalle → productos, así dos ventas concurrentes del mismo producto
+-- se encolan en vez de terminar en deadlock (40P01).
+
+CREATE OR REPLACE FUNCTION public.record_sale(
+    p_negocio_id uuid,
+    p_sucursal_id uuid,
+    p_venta jsonb,
+    p_items jsonb,
+    p_inventario_modo text DEFAULT 'centralizado'::text
+)
+ RETURNS jsonb
+ LANGUAGE plpgsql
+ SECURITY DEFINER
+ SET search_path = public
+AS $function$
+DECLARE
+    v_venta ventas%ROWTYPE;
+    v_line RECORD;
+    v_usuario_negocio_id UUID;
+    v_venta_usuario_negocio_id UUID;
+    v_inv_id UUID;
+    v_stock_actual NUMERIC;
+    v_nuevo_stock NUMERIC;
+    v_stock jsonb := '[]'::jsonb;
+    v_por_sucursal BOOLEAN := p_inventario_modo = 'por_sucursal' AND p_sucursal_id IS NOT NULL;
+BEGIN
+    SELECT id INTO v_usuario_negocio_id
+    FROM usuarios_negocios
+    WHERE usuario_id = auth.uid()
+      AND negocio_id = p_negocio_id
+      AND estado = 'aceptado'
+    LIMIT 1;
+
+    IF v_usuario_negocio_id IS NULL THEN
+        RAISE EXCEPTION 'Usuario no pertenece al negocio %', p_negocio_id USING ERRCODE = '42501';
+    END IF;
+
+    -- SECURITY DEFINER: no confiar en los ids que manda el cliente
+    v_venta_usuario_negocio_id := NULLIF(p_venta->>'usuario_negocio_id', '')::uuid;
+    IF v_venta_usuario_negocio_id IS NOT NULL AND v_venta_usuario_negocio_id <> v_usuario_negocio_id THEN
+        RAISE EXCEPTION 'usuario_negocio_id % no corresponde al usuario actual', v_venta_usuario_negocio_id
+            USING ERRCODE = '42501';
+    END IF;
+
+    IF p_sucursal_id IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM sucursales
+        WHERE id = p_sucursal_id
+          AND negocio_id = p_negocio_id
+    ) THEN
+        RAISE EXCEPTION 'Sucursal % no pertenece al negocio %', p_sucursal_id, p_negocio_id
+            USING ERRCODE = '42501';
+    END IF;
+
+    IF p_items IS NULL OR jsonb_array_length(p_items) = 0 THEN
+        RAISE EXCEPTION 'La venta no tiene items' USING ERRCODE = '22023';
+    END IF;
+
+    -- 1. Cabecera
+    INSERT INTO ventas (id, negocio_id, sucursal_id, cliente_id, usuario_negocio_id, total, medio_pago, fecha, observaciones)
+    SELECT COALESCE(r.id, gen_random_uuid()), p_negocio_id, p_sucursal_id, r.cliente_id, v_usuario_negocio_id,
+           r.total, r.medio_pago, COALESCE(r.fecha, NOW()), r.observaciones
+    FROM jsonb_populate_record(NULL::ventas, p_venta) r
+    RETURNING * INTO v_venta;
+
+    -- 2. Detalles
+    INSERT INTO venta_detalle (venta_id, producto_id, servicio_id, tipo, cantidad, precio_unitario, subtotal, sucursal_id)
+    SELECT v_venta.id, d.producto_id, d.servicio_id, COALESCE(d.tipo, 'producto'), d.cantidad,
+           d.precio_unitario, d.subtotal, COALESCE(d.sucursal_id, p_sucursal_id)
+    FROM jsonb_populate_recordset(NULL::venta_detalle, p_items) d;
+
+    -- 3. Stock: una fila por producto (líneas repetidas se suman), en orden de id
+    --    para que ventas concurrentes bloqueen filas siempre en el mismo orden.
+    FOR v_line IN
+        SELECT d.producto_id, SUM(d.cantidad)::NUMERIC AS cantidad
+        FROM jsonb_populate_recordset(NULL::venta_detalle, p_items) d
+        WHERE d.producto_id IS NOT NULL
+        GROUP BY d.producto_id
+        ORDER BY d.producto_id
+    LOOP
+        v_inv_id := NULL;
+        v_stock_actual := NULL;
+
+        IF v_por_sucursal THEN
+            SELECT id, COALESCE(stock_actual, 0)
+            INTO v_inv_id, v_stock_actual
+            FROM inventario_sucursal
+            WHERE producto_id = v_line.producto_id
+              AND sucursal_id = p_sucursal_id
+              AND negocio_id = p_negocio_id
+            LIMIT 1
+            FOR NO KEY UPDATE;
+        ELSE
+            SELECT COALESCE(stock_actual, 0)
+            INTO v_stock_actual
+            FROM productos
+            WHERE id = v_line.producto_id
+              AND negocio_id = p_negocio_id
+            FOR NO KEY UPDATE;
+        END IF;
+
+        IF COALESCE(v_stock_actual, 0) < v_line.cantidad THEN
+            RAISE EXCEPTION 'Stock insuficiente para %. Stock disponible: %',
+                COALESCE((SELECT nombre FROM productos WHERE id = v_line.producto_id), v_line.producto_id::TEXT),
+                COALESCE(v_stock_actual, 0)
+                USING ERRCODE = 'P0001', HINT = 'insufficient_stock';
+        END IF;
+
+        v_nuevo_stock := GREATEST(0.0, v_stock_actual - v_line.cantidad);
+
+        IF v_por_sucursal THEN
+            UPDATE inventario_sucursal
+            SET stock_actual = v_nuevo_stock
+            WHERE id = v_inv_id;
+        ELSE
+            UPDATE productos
+            SET stock_actual = v_nuevo_stock
+            WHERE id = v_line.producto_id
+              AND negocio_id = p_negocio_id;
+
+            -- Sincronizar inventario_negocio si existe
+            UPDATE inventario_negocio
+            SET stock_total = v_nuevo_stock
+            WHERE producto_id = v_line.producto_id
+              AND negocio_id = p_negocio_id;
+        END IF;
+
+        v_stock := v_stock || jsonb_build_object(
+            'producto_id', v_line.producto_id,
+            'stock_anterior', v_stock_actual,
+            'stock_nuevo', v_nuevo_stock
+        );
+    END LOOP;
+
+    RETURN jsonb_build_object('venta', to_jsonb(v_venta), 'stock', v_stock);
+END;
+$function$;
+
+REVOKE ALL ON FUNCTION public.record_sale(uuid, uuid, jsonb, jsonb, text) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.record_sale(uuid, uuid, jsonb, jsonb, text) TO authenticated;
@@ -0,0 +1,44 @@
+-- Facturación ARCA asíncrona (app/workers/afip_worker.py).
+-- La venta registra la factura en estado 'pendiente' antes de conocer
+-- tipo de comprobante, número y CAE; el worker completa esos datos.
+
+DO $$
+DECLARE
+    v_col TEXT;
+BEGIN
+    FOREACH v_col IN ARRAY ARRAY['tipo_comprobante', 'numero', 'cae', 'cae_vencimiento', 'imp_neto', 'imp_iva']
+    LOOP
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = 'facturas'
+              AND column_name = v_col AND is_nullable = 'NO'
+        ) THEN
+            EXECUTE format('ALTER TABLE public.facturas ALTER COLUMN %I DROP NOT NULL', v_col);
+        END IF;
+    END LOOP;
+END $$;
+
+-- Si existe un CHECK sobre estado, ampliarlo con los estados de la cola.
+DO $$
+DECLARE
+    v_constraint TEXT;
+BEGIN
+    FOR v_constraint IN
+        SELECT con.conname
+        FROM pg_constraint con
+        JOIN pg_class rel ON rel.oid = con.conrelid
+        WHERE rel.relname = 'facturas'
+          AND con.contype = 'c'
+          AND pg_get_constraintdef(con.oid) ILIKE '%estado%'
+    LOOP
+        EXECUTE format('ALTER TABLE public.facturas DROP CONSTRAINT %I', v_constraint);
+    END LOOP;
+END $$;
+
+ALTER TABLE public.facturas
+    ADD CONSTRAINT facturas_estado_check
+    CHECK (estado IN ('pendiente', 'procesando', 'emitida', 'error', 'anulada'));
+
+-- Consultas de estado y reprocesos de pendientes por negocio
+CREATE INDEX IF NOT EXISTS idx_facturas_negocio_estado ON public.facturas(negocio_id, estado);
+CREATE INDEX IF NOT EXISTS idx_facturas_venta_id ON public.facturas(venta_id);
@@ -0,0 +1,397 @@
+-- Resumen diario de ventas mantenido en la misma transacción que la venta.
+--
+-- ventas_diarias:        una fila por (negocio, sucursal, día) con cantidad de
+--                        ventas, ingresos (SUM ventas.total) y costo estimado.
+-- ventas_diarias_items:  una fila por (negocio, sucursal, día, producto/servicio)
+--                        con cantidad, ingresos y costo.
+--
+-- Los triggers sobre ventas y venta_detalle suman/restan cada alta, baja o
+-- modificación, así que los dashboards leen unas pocas filas por día en vez
+-- de todo el historial de ventas del negocio.
+--
+-- El día se toma en UTC ((fecha AT TIME ZONE 'UTC')::date), igual que los
+-- informes, para que no dependa de la zona horaria de la sesión.
+--
+-- El costo de cada línea se congela al insertarla (venta_detalle.costo_unitario);
+-- así una baja posterior resta exactamente lo que se sumó aunque cambie
+-- el precio de compra del producto.
+
+BEGIN;
+
+-- Sin ventas nuevas mientras se reconstruye el resumen y se crean los triggers
+LOCK TABLE public.ventas, public.venta_detalle IN SHARE ROW EXCLUSIVE MODE;
+
+ALTER TABLE public.venta_detalle ADD COLUMN IF NOT EXISTS costo_unitario NUMERIC;
+
+CREATE TABLE IF NOT EXISTS public.ventas_diarias (
+    negocio_id uuid NOT NULL,
+    sucursal_id uuid,
+    -- sucursal_id puede ser NULL; la clave usa un uuid nulo en su lugar
+    sucursal_key uuid GENERATED ALWAYS AS (
+        COALESCE(sucursal_id, '00000000-0000-0000-0000-000000000000'::uuid)
+    ) STORED,
+    dia date NOT NULL,
+    cantidad_ventas integer NOT NULL DEFAULT 0,
+    total_ingresos numeric NOT NULL DEFAULT 0,
+    costo_estimado numeric NOT NULL DEFAULT 0,
+    actualizado_en timestamp with time zone NOT NULL DEFAULT now(),
+    PRIMARY KEY (negocio_id, sucursal_key, dia)
+);
+
+CREATE TABLE IF NOT EXISTS public.ventas_diarias_items (
+    negocio_id uuid NOT NULL,
+    sucursal_id uuid,
+    sucursal_key uuid GENERATED ALWAYS AS (
+        COALESCE(sucursal_id, '00000000-0000-0000-0000-000000000000'::uuid)
+    ) STORED,
+    dia date NOT NULL,
+    tipo text NOT NULL CHECK (tipo IN ('producto', 'servicio')),
+    item_id uuid NOT NULL,
+    cantidad numeric NOT NULL DEFAULT 0,
+    ingresos numeric NOT NULL DEFAULT 0,
+    costo numeric NOT NULL DEFAULT 0,
+    PRIMARY KEY (negocio_id, sucursal_key, dia, tipo, item_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_ventas_diarias_negocio_dia ON public.ventas_diarias(negocio_id, dia);
+CREATE INDEX IF NOT EXISTS idx_ventas_diarias_items_negocio_dia ON public.ventas_diarias_items(negocio_id, dia);
+
+-- Solo lectura para miembros; las escrituras las hacen los triggers (SECURITY DEFINER)
+ALTER TABLE public.ventas_diarias ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.ventas_diarias_items ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Los usuarios pueden ver el resumen de ventas de su negocio" ON public.ventas_diarias;
+CREATE POLICY "Los usuarios pueden ver el resumen de ventas de su negocio" ON public.ventas_diarias
+    FOR SELECT
+    USING (
+        negocio_id IN (
+            SELECT negocio_id
+            FROM public.usuarios_negocios
+            WHERE usuario_id = auth.uid()
+            AND estado = 'aceptado'
+        )
+    );
+
+DROP POLICY IF EXISTS "Los usuarios pueden ver el resumen de items de su negocio" ON public.ventas_diarias_items;
+CREATE POLICY "Los usuarios pueden ver el resumen de items de su negocio" ON public.ventas_diarias_items
+    FOR SELECT
+    USING (
+        negocio_id IN (
+            SELECT negocio_id
+            FROM public.usuarios_negocios
+            WHERE usuario_id = auth.uid()
+            AND estado = 'aceptado'
+        )
+    );
+
+-- ---------------------------------------------------------------------------
+-- Helpers
+-- ---------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION public._ventas_diarias_aplicar(
+    p_negocio_id uuid,
+    p_sucursal_id uuid,
+    p_dia date,
+    p_ventas integer,
+    p_ingresos numeric,
+    p_costo numeric
+)
+ RETURNS void
+ LANGUAGE sql
+AS $function$
+    INSERT INTO public.ventas_diarias AS vd
+        (negocio_id, sucursal_id, dia, cantidad_ventas, total_ingresos, costo_estimado)
+    VALUES (p_negocio_id, p_sucursal_id, p_dia, p_ventas, p_ingresos, p_costo)
+    ON CONFLICT (negocio_id, sucursal_key, dia) DO UPDATE
+    SET cantidad_ventas = vd.cantidad_ventas + EXCLUDED.cantidad_ventas,
+        total_ingresos = vd.total_ingresos + EXCLUDED.total_ingresos,
+        costo_estimado = vd.costo_estimado + EXCLUDED.costo_estimado,
+        actualizado_en = now();
+$function$;
+
+-- Suma (p_signo = 1) o resta (p_signo = -1) una línea de venta en el día indicado
+CREATE OR REPLACE FUNCTION public._ventas_diarias_linea(
+    p_negocio_id uuid,
+    p_sucursal_id uuid,
+    p_dia date,
+    p_linea public.venta_detalle,
+    p_signo integer
+)
+ RETURNS void
+ LANGUAGE plpgsql
+AS $function$
+DECLARE
+    v_cantidad NUMERIC := COALESCE(p_linea.cantidad, 0);
+    v_ingresos NUMERIC := COALESCE(NULLIF(p_linea.subtotal, 0), p_linea.precio_unitario * p_linea.cantidad, 0);
+    v_costo NUMERIC := COALESCE(p_linea.costo_unitario, 0) * COALESCE(p_linea.cantidad, 0);
+    v_tipo TEXT;
+    v_item UUID;
+BEGIN
+    PERFORM public._ventas_diarias_aplicar(p_negocio_id, p_sucursal_id, p_dia, 0, 0, p_signo * v_costo);
+
+    IF p_linea.producto_id IS NOT NULL THEN
+        v_tipo := 'producto';
+        v_item := p_linea.producto_id;
+    ELSIF p_linea.servicio_id IS NOT NULL THEN
+        v_tipo := 'servicio';
+        v_item := p_linea.servicio_id;
+    ELSE
+        RETURN;
+    END IF;
+
+    INSERT INTO public.ventas_diarias_items AS vi
+        (negocio_id, sucursal_id, dia, tipo, item_id, cantidad, ingresos, costo)
+    VALUES (p_negocio_id, p_sucursal_id, p_dia, v_tipo, v_item,
+            p_signo * v_cantidad, p_signo * v_ingresos, p_signo * v_costo)
+    ON CONFLICT (negocio_id, sucursal_key, dia, tipo, item_id) DO UPDATE
+    SET cantidad = vi.cantidad + EXCLUDED.cantidad,
+        ingresos = vi.ingresos + EXCLUDED.ingresos,
+        costo = vi.costo + EXCLUDED.costo;
+END;
+$function$;
+
+-- ---------------------------------------------------------------------------
+-- Reconstrucción inicial
+-- ---------------------------------------------------------------------------
+
+UPDATE public.venta_detalle vd
+SET costo_unitario = COALESCE(p.precio_compra, 0)
+FROM public.productos p
+WHERE vd.costo_unitario IS NULL
+  AND vd.producto_id = p.id;
+
+UPDATE public.venta_detalle vd
+SET costo_unitario = COALESCE(s.costo, 0)
+FROM public.servicios s
+WHERE vd.costo_unitario IS NULL
+  AND vd.producto_id IS NULL
+  AND vd.servicio_id = s.id;
+
+TRUNCATE public.ventas_diarias, public.ventas_diarias_items;
+
+INSERT INTO public.ventas_diarias (negocio_id, sucursal_id, dia, cantidad_ventas, total_ingresos, costo_estimado)
+SELECT v.negocio_id,
+       v.sucursal_id,
+       (v.fecha AT TIME ZONE 'UTC')::date,
+       COUNT(*),
+       COALESCE(SUM(v.total), 0),
+       COALESCE(SUM(c.costo), 0)
+FROM public.ventas v
+LEFT JOIN (
+    SELECT venta_id, SUM(COALESCE(costo_unitario, 0) * COALESCE(cantidad, 0)) AS costo
+    FROM public.venta_detalle
+    GROUP BY venta_id
+) c ON c.venta_id = v.id
+GROUP BY v.negocio_id, v.sucursal_id, (v.fecha AT TIME ZONE 'UTC')::date;
+
+INSERT INTO public.ventas_diarias_items (negocio_id, sucursal_id, dia, tipo, item_id, cantidad, ingresos, costo)
+SELECT v.negocio_id,
+       v.sucursal_id,
+       (v.fecha AT TIME ZONE 'UTC')::date,
+       CASE WHEN d.producto_id IS NOT NULL THEN 'producto' ELSE 'servicio' END,
+       COALESCE(d.producto_id, d.servicio_id),
+       SUM(COALESCE(d.cantidad, 0)),
+       SUM(COALESCE(NULLIF(d.subtotal, 0), d.precio_unitario * d.cantidad, 0)),
+       SUM(COALESCE(d.costo_unitario, 0) * COALESCE(d.cantidad, 0))
+FROM public.venta_detalle d
+JOIN public.ventas v ON v.id = d.venta_id
+WHERE COALESCE(d.producto_id, d.servicio_id) IS NOT NULL
+GROUP BY 1, 2, 3, 4, 5;
+
+-- ---------------------------------------------------------------------------
+-- Triggers
+-- ---------------------------------------------------------------------------
+
+-- Congela el costo de la línea al momento de la venta
+CREATE OR REPLACE FUNCTION public.trg_venta_detalle_costo()
+ RETURNS trigger
+ LANGUAGE plpgsql
+ SECURITY DEFINER
+ SET search_path = public
+AS $function$
+BEGIN
+    IF NEW.costo_unitario IS NULL THEN
+        IF NEW.producto_id IS NOT NULL THEN
+            SELECT COALESCE(precio_compra, 0) INTO NEW.costo_unitario FROM productos WHERE id = NEW.producto_id;
+        ELSIF NEW.servicio_id IS NOT NULL THEN
+            SELECT COALESCE(costo, 0) INTO NEW.costo_unitario FROM servicios WHERE id = NEW.servicio_id;
+        END IF;
+    END IF;
+    RETURN NEW;
+END;
+$function$;
+
+CREATE OR REPLACE FUNCTION public.trg_ventas_diarias_venta()
+ RETURNS trigger
+ LANGUAGE plpgsql
+ SECURITY DEFINER
+ SET search_path = public
+AS $function$
+DECLARE
+    v_linea venta_detalle%ROWTYPE;
+    v_mueve_lineas BOOLEAN := FALSE;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        v_mueve_lineas := TRUE;
+    ELSIF TG_OP = 'UPDATE' THEN
+        v_mueve_lineas := (OLD.negocio_id, OLD.sucursal_id, (OLD.fecha AT TIME ZONE 'UTC')::date)
+            IS DISTINCT FROM (NEW.negocio_id, NEW.sucursal_id, (NEW.fecha AT TIME ZONE 'UTC')::date);
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM _ventas_diarias_aplicar(OLD.negocio_id, OLD.sucursal_id, (OLD.fecha AT TIME ZONE 'UTC')::date, -1, -COALESCE(OLD.total, 0), 0);
+
+        -- Baja (BEFORE DELETE: las líneas todavía existen) o cambio de día/sucursal
+        IF v_mueve_lineas THEN
+            FOR v_linea IN SELECT * FROM venta_detalle WHERE venta_id = OLD.id LOOP
+                PERFORM _ventas_diarias_linea(OLD.negocio_id, OLD.sucursal_id, (OLD.fecha AT TIME ZONE 'UTC')::date, v_linea, -1);
+                IF TG_OP = 'UPDATE' THEN
+                    PERFORM _ventas_diarias_linea(NEW.negocio_id, NEW.sucursal_id, (NEW.fecha AT TIME ZONE 'UTC')::date, v_linea, 1);
+                END IF;
+            END LOOP;
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM _ventas_diarias_aplicar(NEW.negocio_id, NEW.sucursal_id, (NEW.fecha AT TIME ZONE 'UTC')::date, 1, COALESCE(NEW.total, 0), 0);
+        RETURN NEW;
+    END IF;
+    RETURN OLD;
+END;
+$function$;
+
+CREATE OR REPLACE FUNCTION public.trg_ventas_diarias_detalle()
+ RETURNS trigger
+ LANGUAGE plpgsql
+ SECURITY DEFINER
+ SET search_path = public
+AS $function$
+DECLARE
+    v_venta RECORD;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT negocio_id, sucursal_id, (fecha AT TIME ZONE 'UTC')::date AS dia INTO v_venta FROM ventas WHERE id = OLD.venta_id;
+        -- Sin encabezado = borrado en cascada desde ventas, que ya restó la línea
+        IF FOUND THEN
+            PERFORM _ventas_diarias_linea(v_venta.negocio_id, v_venta.sucursal_id, v_venta.dia, OLD, -1);
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT negocio_id, sucursal_id, (fecha AT TIME ZONE 'UTC')::date AS dia INTO v_venta FROM ventas WHERE id = NEW.venta_id;
+        IF FOUND THEN
+            PERFORM _ventas_diarias_linea(v_venta.negocio_id, v_venta.sucursal_id, v_venta.dia, NEW, 1);
+        END IF;
+        RETURN NEW;
+    END IF;
+    RETURN OLD;
+END;
+$function$;
+
+DROP TRIGGER IF EXISTS trg_venta_detalle_costo ON public.venta_detalle;
+CREATE TRIGGER trg_venta_detalle_costo
+    BEFORE INSERT ON public.venta_detalle
+    FOR EACH ROW EXECUTE FUNCTION public.trg_venta_detalle_costo();
+
+DROP TRIGGER IF EXISTS trg_ventas_diarias_ins_upd ON public.ventas;
+CREATE TRIGGER trg_ventas_diarias_ins_upd
+    AFTER INSERT OR UPDATE OF negocio_id, sucursal_id, fecha, total ON public.ventas
+    FOR EACH ROW EXECUTE FUNCTION public.trg_ventas_diarias_venta();
+
+-- BEFORE: el borrado en cascada de venta_detalle corre antes que un AFTER DELETE
+DROP TRIGGER IF EXISTS trg_ventas_diarias_del ON public.ventas;
+CREATE TRIGGER trg_ventas_diarias_del
+    BEFORE DELETE ON public.ventas
+    FOR EACH ROW EXECUTE FUNCTION public.trg_ventas_diarias_venta();
+
+DROP TRIGGER IF EXISTS trg_ventas_diarias_detalle ON public.venta_detalle;
+CREATE TRIGGER trg_ventas_diarias_detalle
+    AFTER INSERT OR DELETE
+       OR UPDATE OF venta_id, producto_id, servicio_id, cantidad, precio_unitario, subtotal, costo_unitario
+    ON public.venta_detalle
+    FOR EACH ROW EXECUTE FUNCTION public.trg_ventas_diarias_detalle();
+
+-- ---------------------------------------------------------------------------
+-- Lecturas
+-- ---------------------------------------------------------------------------
+
+-- Totales de un rango de días (sin límites = todo el historial)
+CREATE OR REPLACE FUNCTION public.get_ventas_resumen(
+    p_negocio_id uuid,
+    p_sucursal_id uuid DEFAULT NULL,
+    p_desde date DEFAULT NULL,
+    p_hasta date DEFAULT NULL
+)
+ RETURNS TABLE (
+    cantidad_ventas bigint,
+    total_ingresos numeric,
+    costo_estimado numeric
+ )
+ LANGUAGE sql
+ STABLE
+AS $function$
+    SELECT COALESCE(SUM(vd.cantidad_ventas), 0)::bigint,
+           COALESCE(SUM(vd.total_ingresos), 0)::numeric,
+           COALESCE(SUM(vd.costo_estimado), 0)::numeric
+    FROM public.ventas_diarias vd
+    WHERE vd.negocio_id = p_negocio_id
+      AND (p_sucursal_id IS NULL OR vd.sucursal_id = p_sucursal_id)
+      AND (p_desde IS NULL OR vd.dia >= p_desde)
+      AND (p_hasta IS NULL OR vd.dia <= p_hasta);
+$function$;
+
+GRANT EXECUTE ON FUNCTION public.get_ventas_resumen(uuid, uuid, date, date) TO authenticated;
+
+-- RPCs del dashboard (dashboard_rpcs.sql) sobre el resumen en vez de ventas
+CREATE OR REPLACE FUNCTION get_dashboard_sales_trend(
+    p_negocio_id UUID,
+    p_sucursal_id UUID DEFAULT NULL,
+    p_start_date DATE DEFAULT (CURRENT_DATE - INTERVAL '6 days')
+)
+RETURNS TABLE (
+    sale_date DATE,
+    daily_total NUMERIC
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        vd.dia AS sale_date,
+        SUM(vd.total_ingresos)::NUMERIC AS daily_total
+    FROM
+        ventas_diarias vd
+    WHERE
+        vd.negocio_id = p_negocio_id
+        AND (p_sucursal_id IS NULL OR vd.sucursal_id = p_sucursal_id)
+        AND vd.dia >= p_start_date
+        AND vd.cantidad_ventas > 0
+    GROUP BY
+        vd.dia
+    ORDER BY
+        vd.dia ASC;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+CREATE OR REPLACE FUNCTION get_dashboard_sales_today(
+    p_negocio_id UUID,
+    p_sucursal_id UUID DEFAULT NULL,
+    p_target_date DATE DEFAULT CURRENT_DATE
+)
+RETURNS TABLE (
+    total_sales NUMERIC,
+    sales_count BIGINT
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        COALESCE(SUM(vd.total_ingresos), 0)::NUMERIC AS total_sales,
+        COALESCE(SUM(vd.cantidad_ventas), 0)::BIGINT AS sales_count
+    FROM
+        ventas_diarias vd
+    WHERE
+        vd.negocio_id = p_negocio_id
+        AND (p_sucursal_id IS NULL OR vd.sucursal_id = p_sucursal_id)
+        AND vd.dia = p_target_date;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+COMMIT;
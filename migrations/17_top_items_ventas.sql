@@ -0,0 +1,98 @@
+-- Ranking de productos/servicios más vendidos en un solo round-trip.
+-- Agrega ventas_diarias_items (migración 16) en la base y resuelve los nombres
+-- con un JOIN solo para las filas del top, en vez de leer todas las líneas de
+-- venta_detalle y consultar productos/servicios una vez por línea.
+--
+-- Se invoca con el token del usuario (SECURITY INVOKER): RLS sobre
+-- ventas_diarias_items y productos/servicios sigue aplicando.
+
+CREATE OR REPLACE FUNCTION public.get_top_items_ventas(
+    p_negocio_id uuid,
+    p_sucursal_id uuid DEFAULT NULL,
+    p_desde date DEFAULT (CURRENT_DATE - 30),
+    p_hasta date DEFAULT CURRENT_DATE,
+    p_limit integer DEFAULT 5,
+    p_tipo text DEFAULT NULL
+)
+ RETURNS TABLE (
+    tipo text,
+    item_id uuid,
+    nombre text,
+    cantidad_total numeric,
+    ingreso_total numeric,
+    total_items bigint
+ )
+ LANGUAGE sql
+ STABLE
+AS $function$
+    WITH agregados AS (
+        SELECT vi.tipo,
+               vi.item_id,
+               SUM(vi.cantidad) AS cantidad_total,
+               SUM(vi.ingresos) AS ingreso_total
+        FROM public.ventas_diarias_items vi
+        WHERE vi.negocio_id = p_negocio_id
+          AND (p_sucursal_id IS NULL OR vi.sucursal_id = p_sucursal_id)
+          AND vi.dia BETWEEN p_desde AND p_hasta
+          AND (p_tipo IS NULL OR vi.tipo = p_tipo)
+        GROUP BY vi.tipo, vi.item_id
+        HAVING SUM(vi.cantidad) > 0
+    ),
+    ranking AS (
+        SELECT a.*, COUNT(*) OVER () AS total_items
+        FROM agregados a
+        ORDER BY a.cantidad_total DESC, a.ingreso_total DESC
+        LIMIT GREATEST(p_limit, 1)
+    )
+    SELECT r.tipo,
+           r.item_id,
+           COALESCE(p.nombre, s.nombre,
+                    CASE WHEN r.tipo = 'producto' THEN 'Producto sin nombre' ELSE 'Servicio sin nombre' END),
+           r.cantidad_total,
+           r.ingreso_total,
+           r.total_items
+    FROM ranking r
+    LEFT JOIN public.productos p ON r.tipo = 'producto' AND p.id = r.item_id
+    LEFT JOIN public.servicios s ON r.tipo = 'servicio' AND s.id = r.item_id
+    ORDER BY r.cantidad_total DESC, r.ingreso_total DESC;
+$function$;
+
+GRANT EXECUTE ON FUNCTION public.get_top_items_ventas(uuid, uuid, date, date, integer, text) TO authenticated;
+
+-- RPC del dashboard (dashboard_rpcs.sql) sobre el mismo resumen
+CREATE OR REPLACE FUNCTION get_dashboard_top_products(
+    p_negocio_id UUID,
+    p_sucursal_id UUID DEFAULT NULL,
+    p_start_date DATE DEFAULT (CURRENT_DATE - INTERVAL '30 days')
+)
+RETURNS TABLE (
+    producto_id UUID,
+    nombre TEXT,
+    total_cantidad NUMERIC,
+    total_ingresos NUMERIC
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        vi.item_id AS producto_id,
+        p.nombre,
+        SUM(vi.cantidad)::NUMERIC AS total_cantidad,
+        SUM(vi.ingresos)::NUMERIC AS total_ingresos
+    FROM
+        ventas_diarias_items vi
+    JOIN
+        productos p ON p.id = vi.item_id
+    WHERE
+        vi.negocio_id = p_negocio_id
+        AND (p_sucursal_id IS NULL OR vi.sucursal_id = p_sucursal_id)
+        AND vi.dia >= p_start_date
+        AND vi.tipo = 'producto'
+    GROUP BY
+        vi.item_id, p.nombre
+    HAVING
+        SUM(vi.cantidad) > 0
+    ORDER BY
+        total_cantidad DESC
+    LIMIT 5;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
@@ -0,0 +1,118 @@
+-- Feed de movimientos financieros (GET /finanzas/movimientos) paginado en la base.
+-- Une movimientos_financieros manuales y ventas (como ingresos de la categoría
+-- virtual "Ventas"), aplica todos los filtros en SQL y pagina por keyset sobre
+-- (fecha, id) descendente: cada página lee a lo sumo p_limit filas de cada
+-- origen, sin importar el tamaño del historial.
+--
+-- id de las ventas: 'venta_<uuid>' (mismo formato que devolvía la API).
+-- fecha de las ventas: día UTC de ventas.fecha.
+-- Con p_categoria_id solo se devuelven movimientos manuales (las ventas no tienen categoría).
+--
+-- SECURITY INVOKER: se llama con el token del usuario y RLS sigue aplicando.
+
+CREATE INDEX IF NOT EXISTS idx_movimientos_financieros_feed
+    ON public.movimientos_financieros (negocio_id, fecha DESC, (id::text) DESC);
+
+CREATE INDEX IF NOT EXISTS idx_ventas_feed
+    ON public.ventas (negocio_id, ((fecha AT TIME ZONE 'UTC')::date) DESC, ('venta_' || id::text) DESC);
+
+CREATE OR REPLACE FUNCTION public.get_movimientos_feed(
+    p_negocio_id uuid,
+    p_sucursal_id uuid DEFAULT NULL,
+    p_tipo text DEFAULT NULL,
+    p_categoria_id uuid DEFAULT NULL,
+    p_desde date DEFAULT NULL,
+    p_hasta date DEFAULT NULL,
+    p_cursor_fecha date DEFAULT NULL,
+    p_cursor_id text DEFAULT NULL,
+    p_limit integer DEFAULT 100
+)
+ RETURNS TABLE (
+    id text,
+    tipo text,
+    categoria_id text,
+    categoria_nombre text,
+    monto numeric,
+    fecha date,
+    metodo_pago text,
+    descripcion text,
+    observaciones text,
+    cliente_id text,
+    cliente_nombre text,
+    venta_id text,
+    creado_en timestamp with time zone,
+    actualizado_en timestamp with time zone,
+    creado_por text
+ )
+ LANGUAGE sql
+ STABLE
+AS $function$
+    WITH manuales AS (
+        SELECT m.id::text AS id,
+               m.tipo::text AS tipo,
+               m.categoria_id::text AS categoria_id,
+               c.nombre::text AS categoria_nombre,
+               m.monto::numeric AS monto,
+               m.fecha::date AS fecha,
+               m.metodo_pago::text AS metodo_pago,
+               m.descripcion::text AS descripcion,
+               m.observaciones::text AS observaciones,
+               m.cliente_id::text AS cliente_id,
+               NULLIF(TRIM(COALESCE(cl.nombre, '') || ' ' || COALESCE(cl.apellido, '')), '') AS cliente_nombre,
+               m.venta_id::text AS venta_id,
+               m.creado_en::timestamptz AS creado_en,
+               m.actualizado_en::timestamptz AS actualizado_en,
+               m.creado_por::text AS creado_por
+        FROM public.movimientos_financieros m
+        JOIN public.categorias_financieras c ON c.id = m.categoria_id
+        LEFT JOIN public.clientes cl ON cl.id = m.cliente_id
+        WHERE m.negocio_id = p_negocio_id
+          AND (p_sucursal_id IS NULL OR m.sucursal_id = p_sucursal_id)
+          AND (p_tipo IS NULL OR m.tipo = p_tipo)
+          AND (p_categoria_id IS NULL OR m.categoria_id = p_categoria_id)
+          AND (p_desde IS NULL OR m.fecha >= p_desde)
+          AND (p_hasta IS NULL OR m.fecha <= p_hasta)
+          AND (p_cursor_fecha IS NULL OR (m.fecha, m.id::text) < (p_cursor_fecha, p_cursor_id))
+        ORDER BY m.fecha DESC, m.id::text DESC
+        LIMIT GREATEST(p_limit, 1)
+    ),
+    ventas_feed AS (
+        SELECT 'venta_' || v.id::text AS id,
+               'ingreso'::text AS tipo,
+               NULL::text AS categoria_id,
+               'Ventas'::text AS categoria_nombre,
+               v.total::numeric AS monto,
+               (v.fecha AT TIME ZONE 'UTC')::date AS fecha,
+               'venta'::text AS metodo_pago,
+               'Venta #' || LEFT(v.id::text, 8) || '...' AS descripcion,
+               COALESCE(v.observaciones, '')::text AS observaciones,
+               NULL::text AS cliente_id,
+               NULLIF(TRIM(COALESCE(cl.nombre, '') || ' ' || COALESCE(cl.apellido, '')), '') AS cliente_nombre,
+               v.id::text AS venta_id,
+               v.fecha::timestamptz AS creado_en,
+               v.fecha::timestamptz AS actualizado_en,
+               NULL::text AS creado_por
+        FROM public.ventas v
+        LEFT JOIN public.clientes cl ON cl.id = v.cliente_id
+        WHERE v.negocio_id = p_negocio_id
+          AND (p_tipo IS NULL OR p_tipo = 'ingreso')
+          AND p_categoria_id IS NULL
+          AND (p_sucursal_id IS NULL OR v.sucursal_id = p_sucursal_id)
+          AND (p_desde IS NULL OR (v.fecha AT TIME ZONE 'UTC')::date >= p_desde)
+          AND (p_hasta IS NULL OR (v.fecha AT TIME ZONE 'UTC')::date <= p_hasta)
+          AND (p_cursor_fecha IS NULL
+               OR ((v.fecha AT TIME ZONE 'UTC')::date, 'venta_' || v.id::text) < (p_cursor_fecha, p_cursor_id))
+        ORDER BY (v.fecha AT TIME ZONE 'UTC')::date DESC, 'venta_' || v.id::text DESC
+        LIMIT GREATEST(p_limit, 1)
+    )
+    SELECT *
+    FROM (
+        SELECT * FROM manuales
+        UNION ALL
+        SELECT * FROM ventas_feed
+    ) feed
+    ORDER BY feed.fecha DESC, feed.id DESC
+    LIMIT GREATEST(p_limit, 1);
+$function$;
+
+GRANT EXECUTE ON FUNCTION public.get_movimientos_feed(uuid, uuid, text, uuid, date, date, date, text, integer) TO authenticated;
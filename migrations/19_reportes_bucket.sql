@@ -0,0 +1,7 @@
+-- Bucket privado para las exportaciones CSV/XLSX generadas por app/workers/export_worker.py.
+-- Sin políticas para authenticated: el worker sube con la service key y los
+-- usuarios descargan solo mediante URLs firmadas (report_export.get_export_status).
+
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('reportes', 'reportes', false)
+ON CONFLICT (id) DO NOTHING;
@@ -0,0 +1,180 @@
+-- Ajuste de stock en lote para compras (alta, cambio de estado y baja).
+-- Reemplaza el loop select → calcular en Python → update (3-5 round-trips por
+-- línea, con pérdida de actualizaciones si una venta descuenta en el medio) por
+-- un único RPC transaccional con incrementos relativos, sobre la idea de
+-- inventory.apply_stock_batch (scripts/stock_bulk_operations.sql).
+--
+-- p_items: array de {producto_id, cantidad, precio_compra?}
+--   cantidad con signo: > 0 suma (compra recibida), < 0 resta (compra revertida).
+--   Líneas repetidas del mismo producto se agregan antes de aplicar.
+-- p_inventario_modo: 'por_sucursal' actualiza inventario_sucursal de p_sucursal_id
+--   (creando la fila si falta; sin sucursal el lote se rechaza); 'centralizado'
+--   actualiza productos.stock_actual y sincroniza inventario_negocio.stock_total.
+-- precio_compra (si viene) se guarda en productos en ambos modos.
+--
+-- El stock nunca queda por debajo de 0 (mismo criterio que deduct_stock_on_sale).
+-- Las filas se bloquean en orden de producto_id para no generar deadlocks entre
+-- lotes concurrentes; en 'por_sucursal' productos solo se bloquea si cambia
+-- precio_compra. Devuelve [{producto_id, stock_nuevo}].
+--
+-- El lote agregado se guarda en arrays (sin tabla temporal: nada de churn en el
+-- catálogo por compra) y cada sentencia lo lee con unnest().
+--
+-- Se invoca con el token del usuario: SECURITY DEFINER para no depender de RLS
+-- en las tablas de inventario, pero exige que auth.uid() sea miembro aceptado del
+-- negocio y que p_sucursal_id pertenezca a p_negocio_id. pg_temp va último en el
+-- search_path para que no pueda sombrear objetos de public.
+
+CREATE OR REPLACE FUNCTION public.apply_stock_batch(
+    p_negocio_id uuid,
+    p_sucursal_id uuid,
+    p_items jsonb,
+    p_inventario_modo text DEFAULT 'centralizado'::text
+)
+ RETURNS jsonb
+ LANGUAGE plpgsql
+ SECURITY DEFINER
+ SET search_path = public, pg_temp
+AS $function$
+DECLARE
+    v_result jsonb := '[]'::jsonb;
+    v_por_sucursal BOOLEAN := p_inventario_modo = 'por_sucursal';
+    v_ids uuid[];
+    v_deltas numeric[];
+    v_precios numeric[];
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM usuarios_negocios
+        WHERE usuario_id = auth.uid()
+          AND negocio_id = p_negocio_id
+          AND estado = 'aceptado'
+    ) THEN
+        RAISE EXCEPTION 'Usuario no pertenece al negocio %', p_negocio_id USING ERRCODE = '42501';
+    END IF;
+
+    IF v_por_sucursal AND p_sucursal_id IS NULL THEN
+        RAISE EXCEPTION 'Inventario por sucursal: falta la sucursal del ajuste de stock'
+            USING ERRCODE = '22023';
+    END IF;
+
+    IF p_sucursal_id IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM sucursales
+        WHERE id = p_sucursal_id
+          AND negocio_id = p_negocio_id
+    ) THEN
+        RAISE EXCEPTION 'Sucursal % no pertenece al negocio %', p_sucursal_id, p_negocio_id
+            USING ERRCODE = '42501';
+    END IF;
+
+    IF p_items IS NULL OR jsonb_array_length(p_items) = 0 THEN
+        RETURN v_result;
+    END IF;
+
+    -- Una posición por producto del negocio, en orden de id (orden fijo de bloqueo)
+    SELECT array_agg(b.producto_id ORDER BY b.producto_id),
+           array_agg(b.delta ORDER BY b.producto_id),
+           array_agg(b.precio_compra ORDER BY b.producto_id)
+    INTO v_ids, v_deltas, v_precios
+    FROM (
+        SELECT i.producto_id,
+               SUM(COALESCE(i.cantidad, 0)) AS delta,
+               (ARRAY_AGG(i.precio_compra) FILTER (WHERE i.precio_compra IS NOT NULL))[1] AS precio_compra
+        FROM jsonb_to_recordset(p_items) AS i(producto_id uuid, cantidad numeric, precio_compra numeric)
+        JOIN productos p ON p.id = i.producto_id AND p.negocio_id = p_negocio_id
+        GROUP BY i.producto_id
+    ) b;
+
+    IF v_ids IS NULL THEN
+        RETURN v_result;
+    END IF;
+
+    -- productos solo se bloquea si se escribe: siempre en centralizado, y en
+    -- por_sucursal únicamente las filas cuyo precio_compra cambia
+    PERFORM 1 FROM productos p
+    JOIN unnest(v_ids, v_deltas, v_precios) AS b(producto_id, delta, precio_compra) ON b.producto_id = p.id
+    WHERE NOT v_por_sucursal OR b.precio_compra IS NOT NULL
+    ORDER BY p.id
+    FOR NO KEY UPDATE OF p;
+
+    UPDATE productos p
+    SET precio_compra = b.precio_compra
+    FROM unnest(v_ids, v_precios) AS b(producto_id, precio_compra)
+    WHERE p.id = b.producto_id
+      AND b.precio_compra IS NOT NULL;
+
+    IF v_por_sucursal THEN
+        PERFORM 1 FROM inventario_sucursal s
+        JOIN unnest(v_ids) AS b(producto_id) ON b.producto_id = s.producto_id
+        WHERE s.sucursal_id = p_sucursal_id
+          AND s.negocio_id = p_negocio_id
+        ORDER BY s.producto_id
+        FOR NO KEY UPDATE OF s;
+
+        WITH upd AS (
+            UPDATE inventario_sucursal s
+            SET stock_actual = GREATEST(0, COALESCE(s.stock_actual, 0) + b.delta)
+            FROM unnest(v_ids, v_deltas) AS b(producto_id, delta)
+            WHERE s.producto_id = b.producto_id
+              AND s.sucursal_id = p_sucursal_id
+              AND s.negocio_id = p_negocio_id
+              AND b.delta <> 0
+            RETURNING s.producto_id, s.stock_actual
+        )
+        SELECT COALESCE(jsonb_agg(jsonb_build_object('producto_id', producto_id, 'stock_nuevo', stock_actual)), '[]'::jsonb)
+        INTO v_result
+        FROM upd;
+
+        -- Productos sin fila en la sucursal: se crean con el ingreso. El lock
+        -- serializa altas concurrentes del mismo lote de filas faltantes.
+        IF EXISTS (
+            SELECT 1 FROM unnest(v_ids, v_deltas) AS b(producto_id, delta)
+            WHERE b.delta > 0
+              AND NOT EXISTS (
+                  SELECT 1 FROM inventario_sucursal s
+                  WHERE s.producto_id = b.producto_id AND s.sucursal_id = p_sucursal_id
+              )
+        ) THEN
+            PERFORM pg_advisory_xact_lock(hashtext('inventario_sucursal:' || p_sucursal_id::text));
+
+            WITH ins AS (
+                INSERT INTO inventario_sucursal (negocio_id, sucursal_id, producto_id, stock_actual)
+                SELECT p_negocio_id, p_sucursal_id, b.producto_id, b.delta
+                FROM unnest(v_ids, v_deltas) AS b(producto_id, delta)
+                WHERE b.delta > 0
+                  AND NOT EXISTS (
+                      SELECT 1 FROM inventario_sucursal s
+                      WHERE s.producto_id = b.producto_id AND s.sucursal_id = p_sucursal_id
+                  )
+                RETURNING producto_id, stock_actual
+            )
+            SELECT v_result || COALESCE(jsonb_agg(jsonb_build_object('producto_id', producto_id, 'stock_nuevo', stock_actual)), '[]'::jsonb)
+            INTO v_result
+            FROM ins;
+        END IF;
+    ELSE
+        WITH upd AS (
+            UPDATE productos p
+            SET stock_actual = GREATEST(0, COALESCE(p.stock_actual, 0) + b.delta)
+            FROM unnest(v_ids, v_deltas) AS b(producto_id, delta)
+            WHERE p.id = b.producto_id
+              AND b.delta <> 0
+            RETURNING p.id AS producto_id, p.stock_actual
+        ),
+        sync AS (
+            -- Sincronizar inventario_negocio si existe
+            UPDATE inventario_negocio n
+            SET stock_total = upd.stock_actual
+            FROM upd
+            WHERE n.producto_id = upd.producto_id
+              AND n.negocio_id = p_negocio_id
+        )
+        SELECT COALESCE(jsonb_agg(jsonb_build_object('producto_id', producto_id, 'stock_nuevo', stock_actual)), '[]'::jsonb)
+        INTO v_result
+        FROM upd;
+    END IF;
+
+    RETURN v_result;
+END;
+$function$;
+
+GRANT EXECUTE ON FUNCTION public.apply_stock_batch(uuid, uuid, jsonb, text) TO authenticated;
@@ -0,0 +1,53 @@
+-- Serie diaria de ventas de un negocio para el store incremental de ML
+-- (app/services/ml/sales_store.py).
+--
+-- Suma ventas_diarias (migración 16) de todas las sucursales por día, así el
+-- worker lee una fila por día en vez de todas las ventas de la ventana.
+--
+-- p_actualizado_desde NULL: todos los días desde p_desde (carga inicial).
+-- p_actualizado_desde con valor: solo los días con alguna fila modificada desde
+--   ese instante (ventas nuevas, bajas o cambios retroactivos), con el total
+--   completo del día. Es el watermark por negocio que guarda el store.
+--
+-- Se invoca con el cliente de servicio desde Celery; SECURITY INVOKER, así que
+-- con el token de un usuario sigue aplicando RLS sobre ventas_diarias.
+
+CREATE INDEX IF NOT EXISTS idx_ventas_diarias_negocio_actualizado
+    ON public.ventas_diarias(negocio_id, actualizado_en);
+
+CREATE OR REPLACE FUNCTION public.get_ventas_diarias_serie(
+    p_negocio_id uuid,
+    p_desde date,
+    p_actualizado_desde timestamp with time zone DEFAULT NULL
+)
+ RETURNS TABLE (
+    dia date,
+    cantidad_ventas bigint,
+    total_ingresos numeric,
+    actualizado_en timestamp with time zone
+ )
+ LANGUAGE sql
+ STABLE
+AS $function$
+    SELECT vd.dia,
+           COALESCE(SUM(vd.cantidad_ventas), 0)::bigint,
+           COALESCE(SUM(vd.total_ingresos), 0)::numeric,
+           MAX(vd.actualizado_en)
+    FROM public.ventas_diarias vd
+    WHERE vd.negocio_id = p_negocio_id
+      AND vd.dia >= p_desde
+      AND (
+          p_actualizado_desde IS NULL
+          OR vd.dia IN (
+              SELECT c.dia
+              FROM public.ventas_diarias c
+              WHERE c.negocio_id = p_negocio_id
+                AND c.dia >= p_desde
+                AND c.actualizado_en >= p_actualizado_desde
+          )
+      )
+    GROUP BY vd.dia
+    ORDER BY vd.dia;
+$function$;
+
+GRANT EXECUTE ON FUNCTION public.get_ventas_diarias_serie(uuid, date, timestamp with time zone) TO authenticated;
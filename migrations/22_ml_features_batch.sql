@@ -0,0 +1,68 @@
+-- Agregados de features ML para muchos negocios en un solo round-trip.
+-- Lo usa la tarea horaria update_business_features (app/workers/ml_worker.py)
+-- en vez de leer ventas y productos negocio por negocio.
+--
+-- Devuelve un único jsonb (no sujeto al límite de filas de PostgREST):
+--   ventas:     [{negocio_id, dia, cantidad_ventas, total_ingresos}]  desde p_desde,
+--               sumando sucursales (ventas_diarias, migración 16), solo días con ventas.
+--   inventario: [{negocio_id, total_items, active_items, total_stock_units}]
+--               desde productos (activo NULL cuenta como activo, stock truncado a entero
+--               como en FeatureEngineer.inventory_snapshot).
+--
+-- Solo para el cliente de servicio (Celery): no se expone a usuarios.
+
+CREATE OR REPLACE FUNCTION public.get_ml_features_batch(
+    p_negocio_ids uuid[],
+    p_desde date
+)
+ RETURNS jsonb
+ LANGUAGE sql
+ STABLE
+AS $function$
+    SELECT jsonb_build_object(
+        'ventas', COALESCE((
+            SELECT jsonb_agg(
+                jsonb_build_object(
+                    'negocio_id', v.negocio_id,
+                    'dia', v.dia,
+                    'cantidad_ventas', v.cantidad_ventas,
+                    'total_ingresos', v.total_ingresos
+                )
+                ORDER BY v.negocio_id, v.dia
+            )
+            FROM (
+                SELECT vd.negocio_id,
+                       vd.dia,
+                       SUM(vd.cantidad_ventas) AS cantidad_ventas,
+                       COALESCE(SUM(vd.total_ingresos), 0) AS total_ingresos
+                FROM public.ventas_diarias vd
+                WHERE vd.negocio_id = ANY(p_negocio_ids)
+                  AND vd.dia >= p_desde
+                GROUP BY vd.negocio_id, vd.dia
+                HAVING SUM(vd.cantidad_ventas) > 0
+            ) v
+        ), '[]'::jsonb),
+        'inventario', COALESCE((
+            SELECT jsonb_agg(
+                jsonb_build_object(
+                    'negocio_id', i.negocio_id,
+                    'total_items', i.total_items,
+                    'active_items', i.active_items,
+                    'total_stock_units', i.total_stock_units
+                )
+            )
+            FROM (
+                SELECT p.negocio_id,
+                       COUNT(*) AS total_items,
+                       COUNT(*) FILTER (WHERE COALESCE(p.activo, true)) AS active_items,
+                       COALESCE(SUM(TRUNC(COALESCE(p.stock_actual, 0))), 0)::bigint AS total_stock_units
+                FROM public.productos p
+                WHERE p.negocio_id = ANY(p_negocio_ids)
+                GROUP BY p.negocio_id
+            ) i
+        ), '[]'::jsonb)
+    );
+$function$;
+
+REVOKE EXECUTE ON FUNCTION public.get_ml_features_batch(uuid[], date) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_ml_features_batch(uuid[], date) TO service_role;
@@ -12,7 +12,7 @@ if errorlevel 1 (
 
 REM Iniciar Celery Worker en una nueva ventana
 echo Iniciando Celery Worker...
-start "Celery Worker" cmd /k "python -m celery -A app.celery_app worker --loglevel=info --concurrency=2 -Q notifications,ml_processing,celery"
+start "Celery Worker" cmd /k "python -m celery -A app.celery_app worker --loglevel=info --concurrency=2 -Q notifications,ml_processing,afip_invoicing,exports,celery"
 
 REM Esperar un poco
 timeout /t 2 >nul
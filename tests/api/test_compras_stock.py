@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.api_v1.endpoints.compras import _apply_purchase_stock
+
+
+class FakeResponse:
+    def __init__(self, data: Any) -> None:
+        self.data = data
+
+
+class FakeRpc:
+    def __init__(self, data: Any) -> None:
+        self._data = data
+
+    def execute(self) -> FakeResponse:
+        return FakeResponse(self._data)
+
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.rpc_calls: List[tuple] = []
+        self.table_calls: List[str] = []
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> FakeRpc:
+        self.rpc_calls.append((name, params))
+        return FakeRpc([{"producto_id": it["producto_id"], "stock_nuevo": 1} for it in params["p_items"]])
+
+    def table(self, name: str) -> None:
+        self.table_calls.append(name)
+        raise AssertionError("el stock no debe tocarse tabla por tabla")
+
+
+def _context(modo: str, branch_id: Any = "br") -> SimpleNamespace:
+    return SimpleNamespace(branch_id=branch_id, branch_settings={"inventario_modo": modo})
+
+
+def _items(n: int) -> List[dict]:
+    return [{"producto_id": f"p{i}", "cantidad": 2, "precio_unitario": 10.5} for i in range(n)]
+
+
+def test_whole_receipt_posts_in_one_rpc() -> None:
+    client = FakeClient()
+
+    result = _apply_purchase_stock(client, "biz", _context("por_sucursal"), _items(250), signo=1, con_precio=True)
+
+    assert len(client.rpc_calls) == 1
+    name, params = client.rpc_calls[0]
+    assert name == "apply_stock_batch"
+    assert params["p_negocio_id"] == "biz"
+    assert params["p_sucursal_id"] == "br"
+    assert params["p_inventario_modo"] == "por_sucursal"
+    assert params["p_items"][0] == {"producto_id": "p0", "cantidad": 2.0, "precio_compra": 10.5}
+    assert len(result) == 250
+
+
+def test_reversal_sends_negative_deltas_without_price() -> None:
+    client = FakeClient()
+
+    _apply_purchase_stock(client, "biz", _context("centralizado"), _items(2), signo=-1)
+
+    items = client.rpc_calls[0][1]["p_items"]
+    assert [(i["cantidad"], i["precio_compra"]) for i in items] == [(-2.0, None), (-2.0, None)]
+
+
+def test_empty_purchase_skips_the_rpc() -> None:
+    client = FakeClient()
+
+    assert _apply_purchase_stock(client, "biz", _context("centralizado"), [], signo=1) == []
+    assert client.rpc_calls == []
+
+
+def test_branch_reversal_sends_no_prices() -> None:
+    # Sin precio_compra el RPC no bloquea productos en modo por_sucursal
+    client = FakeClient()
+
+    _apply_purchase_stock(client, "biz", _context("por_sucursal"), _items(3), signo=-1)
+
+    params = client.rpc_calls[0][1]
+    assert params["p_inventario_modo"] == "por_sucursal"
+    assert all(i["precio_compra"] is None for i in params["p_items"])
+
+
+def test_branch_inventory_without_branch_is_rejected() -> None:
+    client = FakeClient()
+
+    with pytest.raises(HTTPException) as exc:
+        _apply_purchase_stock(client, "biz", _context("por_sucursal", branch_id=None), _items(2), signo=1)
+
+    assert exc.value.status_code == 400
+    assert client.rpc_calls == []
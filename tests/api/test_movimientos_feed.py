@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.api_v1.endpoints.finanzas import get_movimientos_financieros
+
+
+class FakeResponse:
+    def __init__(self, data: List[dict]) -> None:
+        self.data = data
+
+
+class FakeRpc:
+    def __init__(self, data: List[dict]) -> None:
+        self._data = data
+
+    async def execute(self) -> FakeResponse:
+        return FakeResponse(self._data)
+
+
+class FakeAsyncClient:
+    """Simula get_movimientos_feed: filas ya ordenadas por (fecha, id) desc."""
+
+    def __init__(self, rows: List[dict]) -> None:
+        self.rows = rows
+        self.rpc_calls: List[tuple] = []
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> FakeRpc:
+        self.rpc_calls.append((name, params))
+        rows = self.rows
+        if params["p_cursor_fecha"]:
+            key = (params["p_cursor_fecha"], params["p_cursor_id"])
+            rows = [r for r in rows if (r["fecha"], r["id"]) < key]
+        return FakeRpc(rows[: params["p_limit"]])
+
+
+def _row(fecha: str, row_id: str, monto: float = 10) -> dict:
+    return {
+        "id": row_id,
+        "tipo": "ingreso",
+        "categoria_id": None,
+        "categoria_nombre": "Ventas",
+        "monto": monto,
+        "fecha": fecha,
+        "metodo_pago": "venta",
+        "descripcion": None,
+        "observaciones": "",
+        "cliente_id": None,
+        "cliente_nombre": None,
+        "venta_id": None,
+        "creado_en": f"{fecha}T10:00:00+00:00",
+        "actualizado_en": f"{fecha}T10:00:00+00:00",
+        "creado_por": None,
+    }
+
+
+async def _page(client: FakeAsyncClient, limit: int, cursor: str = None, offset: int = 0):
+    scoped = SimpleNamespace(client=client, context=SimpleNamespace(branch_id="br"))
+    return await get_movimientos_financieros(
+        business_id="biz",
+        tipo=None,
+        categoria_id=None,
+        fecha_desde=None,
+        fecha_hasta=None,
+        limit=limit,
+        offset=offset,
+        cursor=cursor,
+        scoped=scoped,
+    )
+
+
+@pytest.mark.asyncio
+async def test_cursor_walks_the_feed_one_page_at_a_time() -> None:
+    rows = [
+        _row("2025-03-02", "venta_b"),
+        _row("2025-03-02", "venta_a"),
+        _row("2025-03-01", "m2"),
+        _row("2025-03-01", "m1"),
+        _row("2025-02-28", "venta_c"),
+    ]
+    client = FakeAsyncClient(rows)
+
+    seen: List[str] = []
+    cursor = None
+    while True:
+        response = await _page(client, limit=2, cursor=cursor)
+        seen += [m["id"] for m in json.loads(response.body)]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert seen == [r["id"] for r in rows]
+    # Cada llamada pide una página + 1 fila, nunca el historial completo
+    assert [params["p_limit"] for _, params in client.rpc_calls] == [3, 3, 3]
+    assert client.rpc_calls[0][1]["p_sucursal_id"] == "br"
+    assert client.rpc_calls[1][1]["p_cursor_fecha"] == "2025-03-02"
+    assert client.rpc_calls[1][1]["p_cursor_id"] == "venta_a"
+
+
+@pytest.mark.asyncio
+async def test_invalid_cursor_is_rejected() -> None:
+    with pytest.raises(HTTPException) as exc:
+        await _page(FakeAsyncClient([]), limit=10, cursor="no-es-un-cursor")
+
+    assert exc.value.status_code == 400
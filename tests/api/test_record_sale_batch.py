@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+from app.api.api_v1.endpoints.ventas import VentaItem, VentaRequest, _fetch_sale_lookups
+
+
+class FakeResponse:
+    def __init__(self, data: List[dict]) -> None:
+        self.data = data
+
+
+class FakeAsyncQuery:
+    def __init__(self, client: "FakeAsyncClient", table: str) -> None:
+        self._client = client
+        self._table = table
+        self._eq: List[Tuple[str, Any]] = []
+        self._in: List[Tuple[str, List[Any]]] = []
+
+    def select(self, *_args: Any) -> "FakeAsyncQuery":
+        return self
+
+    def eq(self, column: str, value: Any) -> "FakeAsyncQuery":
+        self._eq.append((column, value))
+        return self
+
+    def in_(self, column: str, values: List[Any]) -> "FakeAsyncQuery":
+        self._in.append((column, list(values)))
+        return self
+
+    async def execute(self) -> FakeResponse:
+        self._client.executed.append(self._table)
+        rows = [
+            row
+            for row in self._client.rows.get(self._table, [])
+            if all(row.get(c) == v for c, v in self._eq) and all(row.get(c) in vals for c, vals in self._in)
+        ]
+        return FakeResponse(rows)
+
+
+class FakeAsyncClient:
+    def __init__(self, rows: Dict[str, List[dict]]) -> None:
+        self.rows = rows
+        self.executed: List[str] = []
+
+    def table(self, name: str) -> FakeAsyncQuery:
+        return FakeAsyncQuery(self, name)
+
+
+def _cart(lines: int) -> VentaRequest:
+    items = [VentaItem(id=f"p{i % 3}", tipo="producto", cantidad=1, precio=10) for i in range(lines)]
+    items.append(VentaItem(id="s1", tipo="servicio", cantidad=1, precio=50))
+    return VentaRequest(items=items, metodo_pago="efectivo", cliente_id="c1")
+
+
+def _rows() -> Dict[str, List[dict]]:
+    return {
+        "productos": [
+            {"id": f"p{i}", "negocio_id": "biz", "nombre": f"Prod {i}", "precio_venta": 10, "stock_actual": 100}
+            for i in range(3)
+        ],
+        "servicios": [{"id": "s1", "negocio_id": "biz", "nombre": "Serv", "precio": 50}],
+        "inventario_sucursal": [
+            {"producto_id": "p0", "sucursal_id": "br", "stock_actual": 4},
+            {"producto_id": "p1", "sucursal_id": "other", "stock_actual": 9},
+        ],
+        "clientes": [{"id": "c1", "negocio_id": "biz"}],
+    }
+
+
+@pytest.mark.asyncio
+async def test_lookups_use_one_query_per_table_regardless_of_cart_size() -> None:
+    client = FakeAsyncClient(_rows())
+
+    productos, servicios, stock, cliente_ok = await _fetch_sale_lookups(
+        client, "biz", "br", _cart(30), "c1", "por_sucursal"
+    )
+
+    assert sorted(client.executed) == ["clientes", "inventario_sucursal", "productos", "servicios"]
+    assert set(productos) == {"p0", "p1", "p2"}
+    assert set(servicios) == {"s1"}
+    assert stock == {"p0": 4}
+    assert cliente_ok is True
+
+
+@pytest.mark.asyncio
+async def test_centralized_mode_skips_branch_stock_snapshot() -> None:
+    client = FakeAsyncClient(_rows())
+
+    _, _, stock, cliente_ok = await _fetch_sale_lookups(client, "biz", "br", _cart(5), None, "centralizado")
+
+    assert "inventario_sucursal" not in client.executed
+    assert "clientes" not in client.executed
+    assert stock == {}
+    assert cliente_ok is False
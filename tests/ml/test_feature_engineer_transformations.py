@@ -3,6 +3,7 @@ import pytest
 from decimal import Decimal
 from typing import Any, cast
 
+from app.config.ml_settings import ml_settings
 from app.services.ml.feature_engineer import FeatureEngineer
 
 
@@ -13,6 +14,8 @@ def test_sales_timeseries_daily_fills_missing_and_parses_tz(monkeypatch: pytest.
         {"id": "2", "negocio_id": "t1", "fecha": "2024-01-03T23:59:59+00:00", "total": 5},
     ]
 
+    # Raw-rows path (the incremental store is covered in test_sales_store.py)
+    monkeypatch.setattr(ml_settings, "ML_SALES_STORE_ENABLED", False)
     # Patch DB access so FE doesn't hit Supabase
     monkeypatch.setattr(
         FeatureEngineer,
@@ -49,6 +52,7 @@ def test_sales_timeseries_daily_numeric_and_imputation(monkeypatch: pytest.Monke
         {"id": "4", "negocio_id": "t1", "fecha": "2024-02-03T13:00:00Z", "total": ""},
     ]
 
+    monkeypatch.setattr(ml_settings, "ML_SALES_STORE_ENABLED", False)
     monkeypatch.setattr(
         FeatureEngineer,
         "get_sales_rows",
@@ -0,0 +1,103 @@
+import types
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import pandas as pd
+import pytest
+
+from app.services.ml.feature_engineer import FeatureEngineer
+
+
+TODAY = datetime.now(timezone.utc).date()
+
+
+class FakeTable:
+    def __init__(self) -> None:
+        self.upserts: list[tuple[Any, str | None]] = []
+
+    def upsert(self, data: Any, on_conflict: str | None = None, returning: Any | None = None) -> "FakeTable":
+        self.upserts.append((data, on_conflict))
+        return self
+
+    def execute(self) -> Any:
+        return types.SimpleNamespace(data=[])
+
+
+class FakeSupabase:
+    def __init__(self, batch: dict[str, Any]) -> None:
+        self.batch = batch
+        self.rpc_calls: list[tuple[str, dict[str, Any]]] = []
+        self.ml_features = FakeTable()
+
+    def rpc(self, name: str, params: dict[str, Any]) -> Any:
+        self.rpc_calls.append((name, params))
+        return types.SimpleNamespace(execute=lambda: types.SimpleNamespace(data=self.batch))
+
+    def table(self, name: str) -> FakeTable:
+        assert name == "ml_features"
+        return self.ml_features
+
+
+def _day(days_ago: int) -> str:
+    return (TODAY - timedelta(days=days_ago)).isoformat()
+
+
+@pytest.fixture
+def batch() -> dict[str, Any]:
+    ventas = [
+        {"negocio_id": "t1", "dia": _day(40 - i), "cantidad_ventas": 1, "total_ingresos": float(i)}
+        for i in range(0, 40, 3)
+    ] + [
+        {"negocio_id": "t2", "dia": _day(2), "cantidad_ventas": 2, "total_ingresos": "12.5"},
+        {"negocio_id": "t2", "dia": _day(0), "cantidad_ventas": 1, "total_ingresos": 4},
+    ]
+    inventario = [{"negocio_id": "t1", "total_items": 4, "active_items": 3, "total_stock_units": 10}]
+    return {"ventas": ventas, "inventario": inventario}
+
+
+def test_batch_matches_per_tenant_metrics(monkeypatch: pytest.MonkeyPatch, batch: dict[str, Any]):
+    import app.services.ml.feature_engineer as fe_mod
+    fake = FakeSupabase(batch)
+    monkeypatch.setattr(fe_mod, "get_supabase_service_client", lambda: fake)
+    fe = FeatureEngineer()
+
+    daily, _ = fe.feature_aggregates_batch(["t1", "t2"], days=90)
+    sales = fe.sales_metrics_batch(daily, tail_days=30)
+
+    for tenant in ("t1", "t2"):
+        rows = [r for r in batch["ventas"] if r["negocio_id"] == tenant]
+        first = pd.Timestamp(rows[0]["dia"])
+        last = pd.Timestamp(rows[-1]["dia"])
+        expected = pd.Series(0.0, index=pd.date_range(first, last, freq="D"))
+        for r in rows:
+            expected[pd.Timestamp(r["dia"])] = float(r["total_ingresos"])
+        expected = expected.tail(30)
+
+        got = sales[sales["tenant_id"] == tenant]
+        assert [d.date() for d in got["ds"]] == [d.date() for d in expected.index]
+        assert got["y"].tolist() == expected.tolist()
+        assert got["ma7"].tolist() == pytest.approx(expected.rolling(7, min_periods=1).mean().tolist())
+        assert got["ma28"].tolist() == pytest.approx(expected.rolling(28, min_periods=1).mean().tolist())
+
+
+def test_one_rpc_and_chunked_multi_tenant_upserts(monkeypatch: pytest.MonkeyPatch, batch: dict[str, Any]):
+    import app.services.ml.feature_engineer as fe_mod
+    fake = FakeSupabase(batch)
+    monkeypatch.setattr(fe_mod, "get_supabase_service_client", lambda: fake)
+    fe = FeatureEngineer()
+
+    daily, inventory = fe.feature_aggregates_batch(["t1", "t2", "t3"], days=90)
+    sales = fe.sales_metrics_batch(daily, tail_days=30)
+    written = fe.persist_features_batch(sales, inventory, ["t1", "t2", "t3"], chunk=10)
+
+    assert [name for name, _ in fake.rpc_calls] == ["get_ml_features_batch"]
+    assert fake.rpc_calls[0][1]["p_negocio_ids"] == ["t1", "t2", "t3"]
+    payloads = [p for data, _ in fake.ml_features.upserts for p in data]
+    assert written == len(payloads) == len(sales) + 3
+    assert all(len(data) <= 10 for data, _ in fake.ml_features.upserts)
+    assert all(on_conflict == "tenant_id,feature_date,feature_type" for _, on_conflict in fake.ml_features.upserts)
+
+    inv = {p["tenant_id"]: p["features"] for p in payloads if p["feature_type"] == "inventory_metrics"}
+    assert inv["t1"] == {"total_items": 4, "active_items": 3, "total_stock_units": 10, "avg_stock_per_item": 2.5}
+    # Sin productos: ceros, como inventory_snapshot
+    assert inv["t3"] == {"total_items": 0, "active_items": 0, "total_stock_units": 0, "avg_stock_per_item": 0.0}
@@ -0,0 +1,39 @@
+import time
+
+from app.services.ml.fold_executor import FoldSpec, plan_folds, run_folds
+
+
+def _slow_fit(spec: FoldSpec, offset: int, delay: float = 0.0) -> dict[str, object]:
+    # Later folds finish first so ordering must come from the specs, not completion time
+    time.sleep(delay * (3 - spec.fold))
+    return {"model": spec.model_name, "fold": spec.fold, "value": spec.cutoff + offset}
+
+
+def test_plan_folds_forward_chaining_per_candidate():
+    specs = plan_folds(["prophet", "naive"], n_rows=50, possible_folds=3, horizon_days=14)
+
+    # Cutoff 50 - 3*14 = 8 > min_train(7); all three folds are kept, oldest first
+    assert [(s.model_name, s.fold, s.cutoff) for s in specs] == [
+        ("prophet", 0, 8), ("prophet", 1, 22), ("prophet", 2, 36),
+        ("naive", 0, 8), ("naive", 1, 22), ("naive", 2, 36),
+    ]
+
+
+def test_plan_folds_drops_cutoffs_without_enough_history():
+    specs = plan_folds(["prophet"], n_rows=35, possible_folds=2, horizon_days=14)
+
+    assert [s.cutoff for s in specs] == [21]
+
+
+def test_parallel_results_match_serial_order():
+    specs = plan_folds(["sarimax", "prophet"], n_rows=60, possible_folds=3, horizon_days=14)
+
+    serial = run_folds(_slow_fit, specs, 100, n_jobs=1)
+    parallel = run_folds(_slow_fit, specs, 100, n_jobs=2, delay=0.05)
+
+    assert parallel == serial
+    assert [(r["model"], r["fold"]) for r in serial] == [(s.model_name, s.fold) for s in specs]
+
+
+def test_run_folds_without_specs_is_a_noop():
+    assert run_folds(_slow_fit, [], 0) == []
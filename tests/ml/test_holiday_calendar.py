@@ -0,0 +1,95 @@
+import types
+from datetime import date
+from typing import Any
+
+import pandas as pd
+import pytest
+
+import app.db.supabase_client as sb
+import app.services.ml.holiday_calendar as hc_mod
+from app.services.ml.holiday_calendar import HolidayCalendar
+from app.services.ml.ml_engine import BusinessMLEngine
+
+
+class FakeHolidaysQuery:
+    def __init__(self, owner: "FakeSupabase") -> None:
+        self.owner = owner
+
+    def select(self, fields: str) -> "FakeHolidaysQuery":
+        return self
+
+    def eq(self, field: str, value: Any) -> "FakeHolidaysQuery":
+        return self
+
+    def execute(self) -> Any:
+        self.owner.queries += 1
+        return types.SimpleNamespace(data=[{"holiday_date": d} for d in self.owner.custom])
+
+
+class FakeSupabase:
+    def __init__(self, custom: list[str]) -> None:
+        self.custom = custom
+        self.queries = 0
+
+    def table(self, name: str) -> FakeHolidaysQuery:
+        assert name == "tenant_holidays"
+        return FakeHolidaysQuery(self)
+
+
+@pytest.fixture
+def calendar(monkeypatch: pytest.MonkeyPatch) -> tuple[HolidayCalendar, FakeSupabase]:
+    fake = FakeSupabase(["2024-03-19"])
+    monkeypatch.setattr(sb, "get_supabase_service_client", lambda: fake)
+    cal = HolidayCalendar()
+    monkeypatch.setattr(hc_mod, "holiday_calendar", cal)
+    import app.services.ml.ml_engine as engine_mod
+    monkeypatch.setattr(engine_mod, "holiday_calendar", cal)
+    return cal, fake
+
+
+def test_mask_flags_national_and_custom_days(calendar: tuple[HolidayCalendar, FakeSupabase]):
+    cal, _ = calendar
+    ds = pd.Series(pd.to_datetime(["2024-01-01", "2024-03-19", "2024-07-15", None]))
+
+    mask = cal.holiday_mask(ds, "t1")
+
+    assert mask.tolist() == [True, True, False, False]
+
+
+def test_repeated_time_features_query_tenant_holidays_once(
+    calendar: tuple[HolidayCalendar, FakeSupabase], monkeypatch: pytest.MonkeyPatch
+):
+    cal, fake = calendar
+    builds: list[object] = []
+    real_ar = getattr(hc_mod.holidays, "AR")
+    monkeypatch.setattr(hc_mod.holidays, "AR", lambda **kw: builds.append(kw) or real_ar(**kw))
+    engine = BusinessMLEngine()
+
+    # Como en CV: muchos folds y el frame exógeno futuro del mismo negocio
+    for end in ("2024-03-31", "2024-06-30", "2024-12-31", "2025-01-14"):
+        feats = engine._make_time_features(pd.Series(pd.date_range("2024-01-01", end, freq="D")), "t1")
+        assert feats.loc[feats.index[78], "is_holiday"] == 1  # 2024-03-19, custom
+
+    assert fake.queries == 1
+    assert len(builds) == 2  # 2024 y 2025, una vez cada uno
+
+    cal.invalidate("t1")
+    _ = engine._get_holidays_for_tenant("t1", [2024])
+    assert fake.queries == 2
+    assert date(2024, 1, 1) in engine._get_holidays_for_tenant("t1", [2024])
+
+
+def test_primed_tenant_holidays_skip_the_query(calendar: tuple[HolidayCalendar, FakeSupabase]):
+    # Proceso padre: lee tenant_holidays una vez
+    parent, fake = calendar
+    days = parent.tenant_dates("t1")
+    assert fake.queries == 1
+
+    # Worker de CV con su propio calendario: usa lo que leyó el padre, sin consultar
+    worker = HolidayCalendar()
+    worker.prime("t1", days)
+    fake.custom = ["2024-08-01"]
+    mask = worker.holiday_mask(pd.Series(pd.to_datetime(["2024-03-19", "2024-08-01"])), "t1")
+
+    assert mask.tolist() == [True, False]
+    assert fake.queries == 1
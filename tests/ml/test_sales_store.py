@@ -0,0 +1,84 @@
+import types
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from app.services.ml.sales_store import DailySalesStore
+
+
+TODAY = datetime.now(timezone.utc).date()
+
+
+class FakeRollupClient:
+    """In-memory get_ventas_diarias_serie: {dia: (cantidad, total, actualizado_en)}."""
+
+    def __init__(self) -> None:
+        self.days: dict[str, tuple[int, float, str]] = {}
+        self.calls: list[dict[str, Any]] = []
+
+    def put(self, days_ago: int, cantidad: int, total: float, ts: str) -> None:
+        self.days[(TODAY - timedelta(days=days_ago)).isoformat()] = (cantidad, total, ts)
+
+    def rpc(self, name: str, params: dict[str, Any]) -> Any:
+        assert name == "get_ventas_diarias_serie"
+        self.calls.append(params)
+        since = params["p_actualizado_desde"]
+        rows = [
+            {"dia": dia, "cantidad_ventas": c, "total_ingresos": t, "actualizado_en": ts}
+            for dia, (c, t, ts) in sorted(self.days.items())
+            if dia >= params["p_desde"] and (since is None or ts >= since)
+        ]
+        return types.SimpleNamespace(execute=lambda: types.SimpleNamespace(data=rows))
+
+
+def test_cold_load_trims_to_days_with_sales_and_zero_fills():
+    client = FakeRollupClient()
+    client.put(5, 2, 30.0, "2025-01-01T10:00:00+00:00")
+    client.put(3, 1, 12.5, "2025-01-01T11:00:00+00:00")
+    store = DailySalesStore(max_tenants=10)
+
+    first_day, totals = store.daily_totals(client, "t1", days=30)
+
+    assert first_day == TODAY - timedelta(days=5)
+    assert totals.tolist() == [30.0, 0.0, 12.5]
+    assert client.calls[0]["p_actualizado_desde"] is None
+
+
+def test_refresh_reads_only_days_changed_since_the_watermark():
+    client = FakeRollupClient()
+    client.put(10, 4, 100.0, "2025-01-01T10:00:00+00:00")
+    client.put(1, 1, 5.0, "2025-01-02T10:00:00+00:00")
+    store = DailySalesStore(max_tenants=10)
+    _ = store.daily_totals(client, "t1", days=30)
+
+    # New sale today and a back-dated deletion 10 days ago
+    client.put(0, 1, 7.0, "2025-01-03T10:00:00+00:00")
+    client.put(10, 3, 80.0, "2025-01-03T10:05:00+00:00")
+    first_day, totals = store.daily_totals(client, "t1", days=30)
+
+    since = client.calls[-1]["p_actualizado_desde"]
+    assert since is not None and since < "2025-01-02T10:00:00+00:00"  # watermark minus overlap
+    assert first_day == TODAY - timedelta(days=10)
+    assert totals[0] == 80.0
+    assert totals[-2:].tolist() == [5.0, 7.0]
+
+
+def test_wider_window_than_loaded_reloads_and_lru_evicts():
+    client = FakeRollupClient()
+    client.put(2, 1, 1.0, "2025-01-01T10:00:00+00:00")
+    store = DailySalesStore(max_tenants=1)
+
+    _ = store.daily_totals(client, "t1", days=800)
+    _ = store.daily_totals(client, "t1", days=900)
+    _ = store.daily_totals(client, "t2", days=30)
+    _ = store.daily_totals(client, "t1", days=30)
+
+    assert [c["p_actualizado_desde"] is None for c in client.calls] == [True, True, True, True]
+
+
+def test_no_sales_returns_empty():
+    store = DailySalesStore(max_tenants=10)
+
+    first_day, totals = store.daily_totals(FakeRollupClient(), "t1", days=30)
+
+    assert first_day is None
+    assert totals.size == 0
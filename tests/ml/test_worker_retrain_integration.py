@@ -44,6 +44,24 @@ class FakeSupabase:
         return FakeQuery(name)
 
 
+def _run_chords_inline(monkeypatch: pytest.MonkeyPatch) -> dict[str, Any]:
+    """Run chord header and callback in-process; the single shard still goes through retrain_tenant_shard."""
+    captured: dict[str, Any] = {}
+
+    def _fake_chord(header: list[Any]) -> Any:
+        def _apply(callback: Any) -> Any:
+            results = [ml_worker.retrain_tenant_shard.run(*sig.args) for sig in header]  # type: ignore[attr-defined]
+            captured["header"] = header
+            captured["summary"] = ml_worker.aggregate_retrain_results.run(results, *callback.args)  # type: ignore[attr-defined]
+            return types.SimpleNamespace(id="chord-1")
+
+        return _apply
+
+    import celery
+    monkeypatch.setattr(celery, "chord", _fake_chord)
+    return captured
+
+
 def test_retrain_all_models_integration(monkeypatch: pytest.MonkeyPatch):
     # Patch Supabase service client where worker looks it up
     # Workers import get_supabase_service_client inside the function from app.db.supabase_client
@@ -68,11 +86,15 @@ def test_retrain_all_models_integration(monkeypatch: pytest.MonkeyPatch):
 
     from app.workers import ml_worker as mw
     monkeypatch.setattr(mw, "train_and_predict_sales", _fake_train_and_predict_sales)
+    captured = _run_chords_inline(monkeypatch)
 
     # Act: call the Celery task body via .run() to avoid needing a worker
-    result = ml_worker.retrain_all_models.run()  # type: ignore[attr-defined]
+    dispatched = ml_worker.retrain_all_models.run()  # type: ignore[attr-defined]
+    result = captured["summary"]
 
-    # Assert
+    # Assert: one shard, still dispatched through retrain_tenant_shard
+    assert dispatched["shards"] == 1
+    assert len(captured["header"]) == 1
     assert isinstance(result, dict)
     assert result.get("task") == "retrain_all_models"
     # Two businesses processed
@@ -82,3 +104,82 @@ def test_retrain_all_models_integration(monkeypatch: pytest.MonkeyPatch):
     assert result.get("forecasts_inserted") == 14  # 2 * 7
     # Ensure our stub was called for both tenants
     assert set(calls) == {"t1", "t2"}
+
+
+def test_retrain_fans_out_shards_as_a_chord(monkeypatch: pytest.MonkeyPatch):
+    import app.db.supabase_client as sb
+    monkeypatch.setattr(sb, "get_supabase_service_client", lambda: FakeSupabase())
+    monkeypatch.setattr(ml_worker.ml_settings, "ML_RETRAIN_SHARD_SIZE", 1)
+
+    dispatched: dict[str, Any] = {}
+
+    def _fake_chord(header: list[Any]) -> Any:
+        dispatched["header"] = header
+
+        def _apply(callback: Any) -> Any:
+            dispatched["callback"] = callback
+            return types.SimpleNamespace(id="chord-1")
+
+        return _apply
+
+    import celery
+    monkeypatch.setattr(celery, "chord", _fake_chord)
+
+    result = ml_worker.retrain_all_models.run()  # type: ignore[attr-defined]
+
+    assert result["shards"] == 2
+    assert result["chord_id"] == "chord-1"
+    assert [sig.args[0] for sig in dispatched["header"]] == [
+        [{"id": "t1", "nombre": "Negocio 1"}],
+        [{"id": "t2", "nombre": "Negocio 2"}],
+    ]
+
+
+def test_shard_results_aggregate_into_one_summary(monkeypatch: pytest.MonkeyPatch):
+    from billiard.exceptions import SoftTimeLimitExceeded
+
+    def _fake_tenant(bid: str, nombre: object) -> dict[str, object]:
+        if bid == "t3":
+            raise SoftTimeLimitExceeded()
+        if bid == "t2":
+            raise RuntimeError("prophet failed")
+        return {"trained": True, "forecasts": 7, "anomalies": 1}
+
+    monkeypatch.setattr(ml_worker, "_retrain_tenant", _fake_tenant)
+
+    shard_a = ml_worker._retrain_shard([{"id": "t1"}, {"id": "t2"}])
+    shard_b = ml_worker._retrain_shard([{"id": "t3"}, {"id": "t4"}])
+    summary = ml_worker.aggregate_retrain_results.run([shard_a, shard_b], 4, 0.0)  # type: ignore[attr-defined]
+
+    assert summary["task"] == "retrain_all_models"
+    assert summary["businesses_processed"] == 4
+    assert summary["models_retrained"] == 1
+    assert summary["forecasts_inserted"] == 7
+    assert summary["anomalies_inserted"] == 1
+    assert summary["failed_tenants"] == ["t2"]
+    assert summary["timed_out_tenants"] == ["t3", "t4"]
+
+
+def test_chord_error_callback_keeps_partial_results(monkeypatch: pytest.MonkeyPatch):
+    finished = {"tenants": 1, "models_retrained": 1, "forecasts_inserted": 7, "anomalies_inserted": 0,
+                "failed": [], "timed_out": []}
+    states = {"shard-a": finished, "shard-b": None}  # shard-b murió en su hard time limit
+
+    class _FakeResult:
+        def __init__(self, task_id: str, app: Any = None) -> None:
+            self.result = states[task_id]
+
+        def successful(self) -> bool:
+            return self.result is not None
+
+    import celery.result
+    monkeypatch.setattr(celery.result, "AsyncResult", _FakeResult)
+
+    summary = ml_worker.aggregate_retrain_errors.run(  # type: ignore[attr-defined]
+        None, RuntimeError("TimeLimitExceeded"), None, ["shard-a", "shard-b"], [["t1"], ["t2"]], 2, 0.0
+    )
+
+    assert summary["models_retrained"] == 1
+    assert summary["forecasts_inserted"] == 7
+    assert summary["failed_shards"] == 1
+    assert summary["failed_tenants"] == ["t2"]
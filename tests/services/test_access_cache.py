@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+from app.services import access_cache
+
+
+class MockResponse:
+    def __init__(self, data: List[Dict[str, Any]]) -> None:
+        self.data = data
+
+
+class MockQuery:
+    def __init__(self, client: "MockClient", table: str) -> None:
+        self._client = client
+        self._table = table
+        self._filters: List[Tuple[str, Any]] = []
+
+    def select(self, _columns: str = "*") -> "MockQuery":
+        return self
+
+    def eq(self, column: str, value: Any) -> "MockQuery":
+        self._filters.append((column, value))
+        return self
+
+    def limit(self, _value: int) -> "MockQuery":
+        return self
+
+    def execute(self) -> MockResponse:
+        self._client.calls.append(self._table)
+        rows = self._client.rows.get(self._table, [])
+        return MockResponse([row for row in rows if all(row.get(c) == v for c, v in self._filters)])
+
+
+class MockClient:
+    def __init__(self, rows: Dict[str, List[Dict[str, Any]]]) -> None:
+        self.rows = rows
+        self.calls: List[str] = []
+
+    def table(self, name: str) -> MockQuery:
+        return MockQuery(self, name)
+
+
+class FakeCacheManager:
+    def __init__(self) -> None:
+        self.store: Dict[str, Any] = {}
+
+    @staticmethod
+    def _key(namespace: str, identifier: str, scope: Optional[str]) -> str:
+        return f"cache:{namespace}:{scope}:{identifier}" if scope else f"cache:{namespace}:{identifier}"
+
+    def get(self, namespace: str, identifier: str, ttl: Optional[int] = None, scope: Optional[str] = None) -> Any:
+        return self.store.get(self._key(namespace, identifier, scope))
+
+    def set(
+        self, namespace: str, identifier: str, value: Any, ttl: Optional[int] = None, scope: Optional[str] = None
+    ) -> None:
+        self.store[self._key(namespace, identifier, scope)] = value
+
+    def delete(self, namespace: str, identifier: str, scope: Optional[str] = None) -> None:
+        self.store.pop(self._key(namespace, identifier, scope), None)
+
+    def invalidate_scope(self, namespace: str, scope: str) -> None:
+        for key in [k for k in self.store if k.startswith(f"cache:{namespace}:{scope}:")]:
+            del self.store[key]
+
+
+def _employee_rows() -> Dict[str, List[Dict[str, Any]]]:
+    return {
+        "usuarios_negocios": [
+            {"id": "un-1", "usuario_id": "user-1", "negocio_id": "biz-1", "estado": "aceptado", "rol": "empleado"}
+        ],
+        "negocios": [{"id": "biz-1", "creada_por": "owner-1"}],
+        "permisos_usuario_negocio": [
+            {"usuario_negocio_id": "un-1", "acceso_total": False, "puede_ver_ventas": True}
+        ],
+        "usuarios_sucursales": [
+            {"usuario_id": "user-1", "negocio_id": "biz-1", "sucursal_id": "branch-1", "activo": True}
+        ],
+    }
+
+
+def _request() -> Any:
+    return SimpleNamespace(state=SimpleNamespace())
+
+
+@pytest.fixture
+def fake_cache(monkeypatch: pytest.MonkeyPatch) -> FakeCacheManager:
+    cache = FakeCacheManager()
+    monkeypatch.setattr(access_cache, "cache_manager", cache)
+    return cache
+
+
+def test_resolves_employee_access_and_caches_it(fake_cache: FakeCacheManager) -> None:
+    client = MockClient(_employee_rows())
+
+    access = access_cache.get_resolved_access(_request(), client, "user-1", "biz-1")
+
+    assert access is not None
+    assert access.usuario_negocio_id == "un-1"
+    assert access.is_owner is False
+    assert access.has_all_permissions is False
+    assert access.permissions and access.permissions["puede_ver_ventas"] is True
+    assert access.can_access_branch("branch-1")
+    assert not access.can_access_branch("branch-2")
+    db_calls = len(client.calls)
+
+    # New request: served from L1/L2 without touching the database
+    again = access_cache.get_resolved_access(_request(), client, "user-1", "biz-1")
+    assert again == access
+    assert len(client.calls) == db_calls
+
+
+def test_same_request_reuses_resolved_access(fake_cache: FakeCacheManager) -> None:
+    client = MockClient(_employee_rows())
+    request = _request()
+
+    first = access_cache.get_resolved_access(request, client, "user-1", "biz-1")
+    fake_cache.store.clear()
+    second = access_cache.get_resolved_access(request, client, "user-1", "biz-1")
+
+    assert first is second
+
+
+def test_admin_skips_permission_and_branch_queries(fake_cache: FakeCacheManager) -> None:
+    rows = _employee_rows()
+    rows["usuarios_negocios"][0]["rol"] = "admin"
+    client = MockClient(rows)
+
+    access = access_cache.get_resolved_access(_request(), client, "user-1", "biz-1")
+
+    assert access is not None and access.has_all_permissions
+    assert access.can_access_branch("any-branch")
+    assert client.calls == ["usuarios_negocios", "negocios"]
+
+
+def test_non_member_is_not_cached(fake_cache: FakeCacheManager) -> None:
+    client = MockClient({"usuarios_negocios": []})
+
+    assert access_cache.get_resolved_access(_request(), client, "user-1", "biz-1") is None
+    assert fake_cache.store == {}
+
+
+def test_invalidate_business_access_drops_all_users(fake_cache: FakeCacheManager) -> None:
+    client = MockClient(_employee_rows())
+    access_cache.get_resolved_access(_request(), client, "user-1", "biz-1")
+    fake_cache.set(access_cache.NAMESPACE, "biz-2_user-1", {"keep": True}, scope="biz-2")
+
+    access_cache.invalidate_business_access("biz-1")
+
+    assert list(fake_cache.store) == ["cache:access:biz-2:biz-2_user-1"]
+
+    rows = client.rows
+    rows["permisos_usuario_negocio"][0]["puede_ver_ventas"] = False
+    refreshed = access_cache.get_resolved_access(_request(), client, "user-1", "biz-1")
+    assert refreshed is not None and refreshed.permissions["puede_ver_ventas"] is False
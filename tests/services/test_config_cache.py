@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+from app.services import config_cache
+
+
+class FakeCacheManager:
+    def __init__(self) -> None:
+        self.store: Dict[str, Any] = {}
+        self.evicted: List[str] = []
+
+    def get(self, namespace: str, identifier: str, ttl: Optional[int] = None, scope: Optional[str] = None) -> Any:
+        return self.store.get(f"{namespace}:{identifier}")
+
+    def set(
+        self, namespace: str, identifier: str, value: Any, ttl: Optional[int] = None, scope: Optional[str] = None
+    ) -> None:
+        self.store[f"{namespace}:{identifier}"] = value
+
+    def delete(self, namespace: str, identifier: str, scope: Optional[str] = None) -> None:
+        self.store.pop(f"{namespace}:{identifier}", None)
+
+    def evict_local(self, namespace: str, identifier: str, scope: Optional[str] = None) -> None:
+        self.evicted.append(f"{namespace}:{identifier}")
+
+    def evict_local_namespace(self, namespace: str) -> int:
+        self.evicted.append(f"{namespace}:*")
+        return 0
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.published: List[Tuple[str, str]] = []
+
+    def publish(self, channel: str, message: str) -> int:
+        self.published.append((channel, message))
+        return 1
+
+
+class FakeResponse:
+    def __init__(self, data: List[Dict[str, Any]]) -> None:
+        self.data = data
+
+
+class FakeServiceClient:
+    def __init__(self, rows: List[Dict[str, Any]]) -> None:
+        self.rows = rows
+        self.queries = 0
+
+    def table(self, name: str) -> "FakeServiceClient":
+        assert name == "negocio_configuracion"
+        return self
+
+    def select(self, _columns: str) -> "FakeServiceClient":
+        return self
+
+    def eq(self, _column: str, value: Any) -> "FakeServiceClient":
+        self._business_id = value
+        return self
+
+    def limit(self, _value: int) -> "FakeServiceClient":
+        return self
+
+    def execute(self) -> FakeResponse:
+        self.queries += 1
+        return FakeResponse([dict(r) for r in self.rows if r["negocio_id"] == self._business_id])
+
+
+@pytest.fixture
+def fake_cache(monkeypatch: pytest.MonkeyPatch) -> FakeCacheManager:
+    cache = FakeCacheManager()
+    monkeypatch.setattr(config_cache, "cache_manager", cache)
+    monkeypatch.setattr(config_cache, "_ensure_listener", lambda: True)
+    return cache
+
+
+@pytest.fixture
+def fake_redis(monkeypatch: pytest.MonkeyPatch) -> FakeRedis:
+    redis = FakeRedis()
+    monkeypatch.setattr(config_cache, "_get_redis", lambda: redis)
+    return redis
+
+
+@pytest.fixture
+def service_client(monkeypatch: pytest.MonkeyPatch) -> FakeServiceClient:
+    import app.db.supabase_client as supabase_client
+
+    client = FakeServiceClient([{"negocio_id": "biz1", "inventario_modo": "por_sucursal", "metadata": {}}])
+    monkeypatch.setattr(supabase_client, "get_supabase_service_client", lambda: client)
+    return client
+
+
+def test_settings_are_read_once_and_returned_as_copies(
+    fake_cache: FakeCacheManager, service_client: FakeServiceClient
+) -> None:
+    first = config_cache.get_negocio_settings("biz1")
+    assert first is not None
+    first["inventario_modo"] = "centralizado"
+
+    second = config_cache.get_negocio_settings("biz1")
+
+    assert second is not None and second["inventario_modo"] == "por_sucursal"
+    assert service_client.queries == 1
+
+
+def test_missing_row_is_cached_and_defaults_are_applied(
+    fake_cache: FakeCacheManager, service_client: FakeServiceClient
+) -> None:
+    assert config_cache.get_negocio_settings("biz2") is None
+    config = config_cache.get_negocio_config("biz2")
+
+    assert config["catalogo_producto_modo"] == "compartido"
+    assert config["inventario_modo"] == "centralizado"
+    assert service_client.queries == 1
+
+
+def test_missing_row_is_only_cached_for_the_miss_ttl(
+    fake_cache: FakeCacheManager, service_client: FakeServiceClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    now = [1000.0]
+    monkeypatch.setattr(config_cache.time, "time", lambda: now[0])
+    assert config_cache.get_negocio_settings("biz2") is None
+
+    # Otro camino crea la fila sin invalidar: aparece al vencer el TTL corto
+    service_client.rows.append({"negocio_id": "biz2", "inventario_modo": "por_sucursal"})
+    now[0] += config_cache.settings.NEGOCIO_CONFIG_MISS_TTL + 1
+
+    settings = config_cache.get_negocio_settings("biz2")
+    assert settings is not None and settings["inventario_modo"] == "por_sucursal"
+    assert service_client.queries == 2
+
+
+def test_invalidate_deletes_entry_and_publishes(
+    fake_cache: FakeCacheManager, fake_redis: FakeRedis, service_client: FakeServiceClient
+) -> None:
+    config_cache.get_negocio_settings("biz1")
+
+    config_cache.invalidate_negocio_config("biz1")
+
+    assert "negocio_config:biz1" not in fake_cache.store
+    assert fake_redis.published == [(config_cache.INVALIDATION_CHANNEL, "biz1")]
+
+
+def test_invalidation_message_evicts_local_copy(fake_cache: FakeCacheManager) -> None:
+    config_cache._on_invalidation({"type": "message", "channel": b"negocio_config:invalidate", "data": b"biz1"})
+
+    assert fake_cache.evicted == ["negocio_config:biz1"]
+
+
+class FakeThread:
+    def __init__(self) -> None:
+        self.stopped = False
+
+    def stop(self) -> None:
+        self.stopped = True
+
+    def is_alive(self) -> bool:
+        return not self.stopped
+
+
+class FakePubSub:
+    def __init__(self) -> None:
+        self.closed = False
+
+    def subscribe(self, **_handlers: Any) -> None:
+        pass
+
+    def run_in_thread(self, **_kwargs: Any) -> FakeThread:
+        return FakeThread()
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_subscriber_failure_and_restart_flush_local_copies(monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = FakeCacheManager()
+    monkeypatch.setattr(config_cache, "cache_manager", cache)
+    monkeypatch.setattr(config_cache, "_listener", None)
+    monkeypatch.setattr(config_cache, "_listener_retry_at", 0.0)
+    monkeypatch.setattr(config_cache, "_listener_failed", False)
+
+    class PubSubRedis:
+        def pubsub(self, ignore_subscribe_messages: bool = False) -> FakePubSub:
+            return FakePubSub()
+
+    monkeypatch.setattr(config_cache, "_get_redis", lambda: PubSubRedis())
+
+    assert config_cache._ensure_listener()
+    assert cache.evicted == []
+
+    thread = config_cache._listener
+    config_cache._on_listener_error(ConnectionError("redis down"), FakePubSub(), thread)
+    assert cache.evicted == ["negocio_config:*"]
+    assert not config_cache._ensure_listener()  # esperando el reintento
+
+    monkeypatch.setattr(config_cache, "_listener_retry_at", 0.0)
+    assert config_cache._ensure_listener()
+    assert cache.evicted == ["negocio_config:*", "negocio_config:*"]
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import csv
+import io
+from typing import Any, Dict, List
+
+from app.services import report_export
+
+
+class FakeResponse:
+    def __init__(self, data: List[Dict[str, Any]]) -> None:
+        self.data = data
+
+
+class FakePagedQuery:
+    """Devuelve una página distinta por execute() y registra los filtros usados."""
+
+    def __init__(self, client: "FakeClient") -> None:
+        self.client = client
+        self.calls: List[tuple] = []
+
+    def __getattr__(self, name: str):
+        def _record(*args: Any, **kwargs: Any) -> "FakePagedQuery":
+            self.calls.append((name,) + args)
+            return self
+
+        return _record
+
+    def execute(self) -> FakeResponse:
+        self.client.queries.append(self.calls)
+        return FakeResponse(self.client.pages.pop(0))
+
+
+class FakeClient:
+    def __init__(self, pages: List[List[Dict[str, Any]]]) -> None:
+        self.pages = pages
+        self.queries: List[List[tuple]] = []
+        self.rpc_params: List[Dict[str, Any]] = []
+
+    def table(self, _name: str) -> FakePagedQuery:
+        return FakePagedQuery(self)
+
+    def rpc(self, _name: str, params: Dict[str, Any]) -> FakePagedQuery:
+        self.rpc_params.append(params)
+        return FakePagedQuery(self)
+
+
+def _venta(venta_id: str, fecha: str, lineas: int = 1) -> Dict[str, Any]:
+    return {
+        "id": venta_id,
+        "fecha": fecha,
+        "total": 10 * lineas,
+        "medio_pago": "efectivo",
+        "venta_detalle": [
+            {"tipo": "producto", "cantidad": 1, "precio_unitario": 10, "subtotal": 10, "productos": {"nombre": f"P{i}"}}
+            for i in range(lineas)
+        ],
+    }
+
+
+def test_ventas_are_read_page_by_page_with_keyset_cursor() -> None:
+    client = FakeClient(
+        [
+            [_venta("a", "2025-01-01T10:00:00+00:00", 2), _venta("b", "2025-01-01T10:00:00+00:00")],
+            [_venta("c", "2025-01-02T09:00:00+00:00")],
+        ]
+    )
+
+    rows = list(report_export.iter_ventas(client, "biz", fecha_inicio="2025-01-01", page_size=2))
+
+    assert [(r["venta_id"], r["item"]) for r in rows] == [("a", "P0"), ("a", "P1"), ("b", "P0"), ("c", "P0")]
+    assert rows[0]["metodo_pago"] == "efectivo"
+    assert len(client.queries) == 2
+    assert ("limit", 2) in client.queries[0]
+    assert not any(call[0] == "or_" for call in client.queries[0])
+    assert ("or_", 'fecha.gt."2025-01-01T10:00:00+00:00",and(fecha.eq."2025-01-01T10:00:00+00:00",id.gt.b)') in client.queries[1]
+
+
+def test_movimientos_follow_the_feed_cursor() -> None:
+    client = FakeClient(
+        [
+            [{"id": "venta_b", "fecha": "2025-03-02"}, {"id": "m1", "fecha": "2025-03-01"}],
+            [],
+        ]
+    )
+
+    rows = list(report_export.iter_movimientos(client, "biz", tipo="ingreso", page_size=2))
+
+    assert [r["id"] for r in rows] == ["venta_b", "m1"]
+    assert [(p["p_cursor_fecha"], p["p_cursor_id"]) for p in client.rpc_params] == [(None, None), ("2025-03-01", "m1")]
+
+
+def test_csv_is_streamed_in_chunks() -> None:
+    columns = [("id", "ID"), ("monto", "Monto")]
+    rows = ({"id": f"m{i}", "monto": i * 1.5} for i in range(20000))
+
+    chunks = list(report_export.iter_csv(rows, columns))
+
+    assert len(chunks) > 1
+    assert all(len(c) < 2 * 64 * 1024 for c in chunks)
+    parsed = list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8-sig"))))
+    assert parsed[0] == ["ID", "Monto"]
+    assert parsed[-1] == ["m19999", "29998.5"]
+    assert len(parsed) == 20001
+
+
+def test_large_or_open_ranges_are_offloaded() -> None:
+    assert report_export.should_offload(None, None)
+    assert report_export.should_offload("2024-01-01", "2024-12-31")
+    assert not report_export.should_offload("2024-01-01", "2024-01-31")
+    assert report_export.should_offload("2024-01-01", "2024-01-31", en_segundo_plano=True)
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.data: Dict[str, Any] = {}
+
+    def setex(self, key: str, ttl: int, value: str) -> None:
+        self.data[key] = value.encode()
+
+    def get(self, key: str) -> Any:
+        return self.data.get(key)
+
+
+def test_export_status_is_hidden_from_other_businesses(monkeypatch) -> None:
+    redis = FakeRedis()
+    monkeypatch.setattr(report_export, "_get_redis", lambda: redis)
+    report_export._register_export_owner("task-1", "biz")
+
+    # Ids desconocidos o de otro negocio no se informan como "pendiente"
+    assert report_export.get_export_status("task-unknown", "biz") is None
+    assert report_export.get_export_status("task-1", "otro") is None
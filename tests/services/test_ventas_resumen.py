@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from app.services import ventas_resumen
+
+
+class FakeResponse:
+    def __init__(self, data: List[Dict[str, Any]]) -> None:
+        self.data = data
+
+
+class FakeQuery:
+    def __init__(self, rows: List[Dict[str, Any]]) -> None:
+        self.rows = rows
+        self.filters: List[tuple] = []
+
+    def select(self, _columns: str) -> "FakeQuery":
+        return self
+
+    def eq(self, column: str, value: Any) -> "FakeQuery":
+        self.filters.append(("eq", column, value))
+        return self
+
+    def gte(self, column: str, value: Any) -> "FakeQuery":
+        self.filters.append(("gte", column, value))
+        return self
+
+    def lte(self, column: str, value: Any) -> "FakeQuery":
+        self.filters.append(("lte", column, value))
+        return self
+
+    def execute(self) -> FakeResponse:
+        rows = self.rows
+        for op, column, value in self.filters:
+            if op == "eq":
+                rows = [r for r in rows if r.get(column) == value]
+            elif op == "gte":
+                rows = [r for r in rows if r[column] >= value]
+            else:
+                rows = [r for r in rows if r[column] <= value]
+        return FakeResponse(rows)
+
+
+class FakeClient:
+    def __init__(self, tables: Dict[str, List[Dict[str, Any]]], rpc_data: Optional[List[Dict[str, Any]]] = None) -> None:
+        self.tables = tables
+        self.rpc_data = rpc_data or []
+        self.rpc_calls: List[tuple] = []
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self.tables[name])
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> FakeQuery:
+        self.rpc_calls.append((name, params))
+        return FakeQuery(self.rpc_data)
+
+
+def _dia(dia: str, sucursal: str, ventas: int, total: float, costo: float = 0) -> Dict[str, Any]:
+    return {
+        "negocio_id": "biz1",
+        "sucursal_id": sucursal,
+        "dia": dia,
+        "cantidad_ventas": ventas,
+        "total_ingresos": total,
+        "costo_estimado": costo,
+    }
+
+
+def test_por_dia_merges_branches_and_skips_empty_days() -> None:
+    client = FakeClient(
+        {
+            "ventas_diarias": [
+                _dia("2025-03-01", "s1", 2, 100, 40),
+                _dia("2025-03-01", "s2", 1, 50, 10),
+                _dia("2025-03-02", "s1", 0, 0),  # venta anulada
+                _dia("2025-02-28", "s1", 5, 500),
+            ]
+        }
+    )
+
+    dias = ventas_resumen.get_por_dia(client, "biz1", desde=date(2025, 3, 1))
+
+    assert dias == {date(2025, 3, 1): {"cantidad_ventas": 3, "total_ingresos": 150.0, "costo_estimado": 50.0}}
+
+
+def test_top_items_come_ranked_from_one_rpc() -> None:
+    client = FakeClient(
+        {},
+        rpc_data=[
+            {"tipo": "producto", "item_id": "p1", "nombre": "Yerba", "cantidad_total": 5, "ingreso_total": "50.0", "total_items": 12},
+            {"tipo": "servicio", "item_id": "s1", "nombre": "Envío", "cantidad_total": 4, "ingreso_total": 80, "total_items": 12},
+        ],
+    )
+
+    items, total = ventas_resumen.get_top_items(
+        client, "biz1", desde=date(2025, 3, 1), hasta=date(2025, 3, 31), sucursal_id="s1", limit=2
+    )
+
+    assert [(i["nombre"], i["cantidad"], i["ingresos"]) for i in items] == [("Yerba", 5.0, 50.0), ("Envío", 4.0, 80.0)]
+    assert total == 12
+    assert client.rpc_calls == [
+        (
+            "get_top_items_ventas",
+            {
+                "p_negocio_id": "biz1",
+                "p_sucursal_id": "s1",
+                "p_desde": "2025-03-01",
+                "p_hasta": "2025-03-31",
+                "p_limit": 2,
+                "p_tipo": None,
+            },
+        )
+    ]
+
+
+def test_resumen_uses_single_rpc() -> None:
+    client = FakeClient({}, rpc_data=[{"cantidad_ventas": 7, "total_ingresos": "1234.5", "costo_estimado": None}])
+
+    resumen = ventas_resumen.get_resumen(client, "biz1", desde=date(2025, 3, 1), hasta=date(2025, 3, 31))
+
+    assert resumen == {"cantidad_ventas": 7, "total_ingresos": 1234.5, "costo_estimado": 0.0}
+    assert client.rpc_calls == [
+        (
+            "get_ventas_resumen",
+            {"p_negocio_id": "biz1", "p_sucursal_id": None, "p_desde": "2025-03-01", "p_hasta": "2025-03-31"},
+        )
+    ]
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import pytest
+
+from app.services.afip import credentials
+
+
+class FakeBucket:
+    def __init__(self, files: Dict[str, bytes], downloads: List[str]) -> None:
+        self._files = files
+        self._downloads = downloads
+
+    def download(self, path: str) -> bytes:
+        self._downloads.append(path)
+        return self._files[path]
+
+
+class FakeStorage:
+    def __init__(self, files: Dict[str, bytes]) -> None:
+        self.files = files
+        self.downloads: List[str] = []
+
+    def from_(self, bucket: str) -> FakeBucket:
+        assert bucket == credentials.CERT_BUCKET
+        return FakeBucket(self.files, self.downloads)
+
+
+class FakeClient:
+    def __init__(self, files: Dict[str, bytes]) -> None:
+        self.storage = FakeStorage(files)
+
+
+@pytest.fixture(autouse=True)
+def _clean_registry() -> Any:
+    credentials._credentials.clear()
+    credentials._parsed.clear()
+    yield
+    credentials._credentials.clear()
+    credentials._parsed.clear()
+
+
+FILES = {
+    "biz/certificado_1.crt": b"CERT-1",
+    "biz/clave_privada_1.key": b"KEY-1",
+    "biz/certificado_2.crt": b"CERT-2",
+}
+CONFIG = {"cert_path": "biz/certificado_1.crt", "key_path": "biz/clave_privada_1.key"}
+
+
+def test_material_is_downloaded_once_per_negocio() -> None:
+    client = FakeClient(FILES)
+
+    first = credentials.get_afip_credentials(client, "biz", CONFIG)
+    second = credentials.get_afip_credentials(client, "biz", CONFIG)
+
+    assert first is second
+    assert first.cert_pem == b"CERT-1" and first.key_pem == b"KEY-1"
+    assert client.storage.downloads == ["biz/certificado_1.crt", "biz/clave_privada_1.key"]
+
+
+def test_new_storage_path_reloads_material() -> None:
+    client = FakeClient(FILES)
+    credentials.get_afip_credentials(client, "biz", CONFIG)
+
+    updated = credentials.get_afip_credentials(client, "biz", {**CONFIG, "cert_path": "biz/certificado_2.crt"})
+
+    assert updated.cert_pem == b"CERT-2"
+    assert len(client.storage.downloads) == 4
+
+
+def test_invalidate_forces_download() -> None:
+    client = FakeClient(FILES)
+    credentials.get_afip_credentials(client, "biz", CONFIG)
+
+    credentials.invalidate_afip_credentials("biz")
+    credentials.get_afip_credentials(client, "biz", CONFIG)
+
+    assert len(client.storage.downloads) == 4
+
+
+def test_missing_file_source_returns_none(tmp_path: Any) -> None:
+    assert credentials.load_signing_material(tmp_path / "nope.crt", tmp_path / "nope.key") is None
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import pytest
+from celery.exceptions import MaxRetriesExceededError
+
+from app.api.api_v1.endpoints import afip_helper
+from app.workers import afip_worker
+
+
+class FakeResponse:
+    def __init__(self, data: List[dict]) -> None:
+        self.data = data
+
+
+class FakeTable:
+    def __init__(self, client: "FakeClient", name: str) -> None:
+        self._client = client
+        self._name = name
+        self._op = "select"
+        self._payload: Any = None
+
+    def select(self, *_args: Any) -> "FakeTable":
+        return self
+
+    def insert(self, payload: Dict[str, Any]) -> "FakeTable":
+        self._op, self._payload = "insert", payload
+        return self
+
+    def update(self, payload: Dict[str, Any]) -> "FakeTable":
+        self._op, self._payload = "update", payload
+        return self
+
+    def eq(self, *_args: Any) -> "FakeTable":
+        return self
+
+    def limit(self, *_args: Any) -> "FakeTable":
+        return self
+
+    def execute(self) -> FakeResponse:
+        self._client.ops.append((self._name, self._op, self._payload))
+        if self._name == "configuracion_fiscal":
+            return FakeResponse([self._client.config] if self._client.config else [])
+        if self._op == "insert":
+            return FakeResponse([{"id": "fact-1", **self._payload}])
+        if self._name == "facturas" and self._op == "select":
+            return FakeResponse(self._client.facturas)
+        return FakeResponse([])
+
+
+class FakeClient:
+    def __init__(self, config: Dict[str, Any] | None) -> None:
+        self.config = config
+        self.ops: List[tuple] = []
+        self.facturas: List[dict] = []
+
+    def table(self, name: str) -> FakeTable:
+        return FakeTable(self, name)
+
+
+CONFIG = {"habilitada": True, "cert_path": "c.crt", "key_path": "k.key", "cuit": "20123456789", "punto_venta": 3}
+
+
+def test_enqueue_registers_pending_invoice_and_dispatches(monkeypatch: pytest.MonkeyPatch) -> None:
+    dispatched: List[tuple] = []
+    monkeypatch.setattr(afip_worker.emitir_factura_afip, "delay", lambda *args: dispatched.append(args))
+    client = FakeClient(CONFIG)
+
+    factura = afip_helper.encolar_facturacion_afip(client, "biz", "venta-1", None, 121.0, [], sucursal_id="br")
+
+    assert factura is not None
+    assert factura["id"] == "fact-1"
+    assert factura["estado"] == "pendiente"
+    assert factura["punto_venta"] == 3
+    assert dispatched == [("fact-1", "biz", "venta-1", None, 121.0, [], "br")]
+
+
+def test_enqueue_skips_when_invoicing_disabled(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(afip_worker.emitir_factura_afip, "delay", lambda *args: pytest.fail("no debe encolar"))
+    client = FakeClient({**CONFIG, "habilitada": False})
+
+    assert afip_helper.encolar_facturacion_afip(client, "biz", "venta-1", None, 10.0, []) is None
+    assert not any(name == "facturas" for name, _, _ in client.ops)
+
+
+def test_enqueue_marks_error_when_broker_unavailable(monkeypatch: pytest.MonkeyPatch) -> None:
+    def _fail(*_args: Any) -> None:
+        raise ConnectionError("broker down")
+
+    monkeypatch.setattr(afip_worker.emitir_factura_afip, "delay", _fail)
+    client = FakeClient(CONFIG)
+
+    factura = afip_helper.encolar_facturacion_afip(client, "biz", "venta-1", None, 10.0, [])
+
+    assert factura is not None and factura["estado"] == "error"
+    assert ("facturas", "update") in [(name, op) for name, op, _ in client.ops]
+
+
+def test_lock_name_is_per_cuit_and_point_of_sale() -> None:
+    assert afip_worker._lock_name("20123456789", 3) == "afip:cbte_lock:20123456789:3"
+    assert afip_worker._lock_name("20123456789", 3) != afip_worker._lock_name("20123456789", 4)
+
+
+class BusyLock:
+    def acquire(self) -> bool:
+        return False
+
+
+class FakeRedis:
+    def lock(self, *_args: Any, **_kwargs: Any) -> BusyLock:
+        return BusyLock()
+
+
+def test_exhausted_lock_retries_mark_invoice_as_error(monkeypatch: pytest.MonkeyPatch) -> None:
+    client = FakeClient(CONFIG)
+    client.facturas = [{"id": "fact-1", "estado": "pendiente"}]
+
+    def _exhausted(*_args: Any, **_kwargs: Any) -> None:
+        raise MaxRetriesExceededError()
+
+    monkeypatch.setattr(afip_worker, "get_supabase_service_client", lambda: client)
+    monkeypatch.setattr(afip_worker, "_get_redis", lambda: FakeRedis())
+    monkeypatch.setattr(afip_helper, "obtener_config_facturable", lambda *_args: CONFIG)
+    monkeypatch.setattr(afip_worker.emitir_factura_afip, "retry", _exhausted)
+
+    result = afip_worker.emitir_factura_afip.run("fact-1", "biz", "venta-1", None, 10.0, [])
+
+    assert result["estado"] == "error"
+    updates = [payload for name, op, payload in client.ops if name == "facturas" and op == "update"]
+    assert updates[-1]["estado"] == "error"
+
+
+class FreeLock:
+    def __init__(self) -> None:
+        self.released = False
+
+    def acquire(self) -> bool:
+        return True
+
+    def release(self) -> None:
+        self.released = True
+
+
+def test_invoice_is_marked_error_when_config_disappears_while_queued(monkeypatch: pytest.MonkeyPatch) -> None:
+    client = FakeClient(CONFIG)
+    client.facturas = [{"id": "fact-1", "estado": "pendiente"}]
+    lock = FreeLock()
+
+    class FreeRedis:
+        def lock(self, *_args: Any, **_kwargs: Any) -> FreeLock:
+            return lock
+
+    async def _no_config(*_args: Any, **_kwargs: Any) -> None:
+        return None
+
+    monkeypatch.setattr(afip_worker, "get_supabase_service_client", lambda: client)
+    monkeypatch.setattr(afip_worker, "_get_redis", lambda: FreeRedis())
+    monkeypatch.setattr(afip_helper, "obtener_config_facturable", lambda *_args: CONFIG)
+    monkeypatch.setattr(afip_helper, "procesar_facturacion_afip", _no_config)
+
+    result = afip_worker.emitir_factura_afip.run("fact-1", "biz", "venta-1", None, 10.0, [])
+
+    assert result["estado"] == "error"
+    updates = [payload for name, op, payload in client.ops if name == "facturas" and op == "update"]
+    assert [u["estado"] for u in updates] == ["procesando", "error"]
+    assert lock.released
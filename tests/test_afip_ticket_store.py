@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import datetime
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from app.services.afip import ticket_access, ticket_store
+
+
+class FakeLock:
+    def __init__(self, redis: "FakeRedis", name: str) -> None:
+        self._redis = redis
+        self._name = name
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if self._name in self._redis.locks:
+            return False
+        self._redis.locks.add(self._name)
+        return True
+
+    def release(self) -> None:
+        self._redis.locks.discard(self._name)
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.data: Dict[str, str] = {}
+        self.ttls: Dict[str, int] = {}
+        self.locks: set = set()
+
+    def get(self, key: str) -> Optional[str]:
+        return self.data.get(key)
+
+    def set(self, key: str, value: str, ex: int = 0) -> None:
+        self.data[key] = value
+        self.ttls[key] = ex
+
+    def delete(self, key: str) -> None:
+        self.data.pop(key, None)
+
+    def lock(self, name: str, timeout: int = 0) -> FakeLock:
+        return FakeLock(self, name)
+
+
+WSAA_HOMO = "https://wsaahomo.afip.gov.ar/ws/services/LoginCms?wsdl"
+AMBIENTE = "homologacion"
+
+
+def _ticket(hours: float, token: str = "TOKEN") -> Dict[str, str]:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return {
+        "token": token,
+        "sign": "SIGN",
+        "expiration": (now + datetime.timedelta(hours=hours)).isoformat(),
+        "generation": now.isoformat(),
+    }
+
+
+@pytest.fixture
+def fake_redis(monkeypatch: pytest.MonkeyPatch) -> FakeRedis:
+    redis = FakeRedis()
+    monkeypatch.setattr(ticket_store, "_get_redis", lambda: redis)
+    ticket_store._local.clear()
+    ticket_store._backoff_until.clear()
+    yield redis
+    ticket_store._local.clear()
+    ticket_store._backoff_until.clear()
+
+
+@pytest.fixture
+def login_calls(monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    calls: List[str] = []
+
+    async def _fake_request(service: str, *_args: Any) -> Dict[str, str]:
+        calls.append(service)
+        return _ticket(12, token=f"NEW-{len(calls)}")
+
+    monkeypatch.setattr(ticket_access, "_request_new_ticket", _fake_request)
+    return calls
+
+
+def test_saved_ticket_expires_with_redis_ttl(fake_redis: FakeRedis) -> None:
+    ticket_store.save_ticket("wsfe", "20123456789", AMBIENTE, _ticket(2))
+
+    ttl = fake_redis.ttls[ticket_store.ticket_key("wsfe", "20123456789", AMBIENTE)]
+    assert 7000 < ttl <= 7200
+
+
+@pytest.mark.asyncio
+async def test_cold_process_reuses_shared_ticket(fake_redis: FakeRedis, login_calls: List[str]) -> None:
+    ticket_store.save_ticket("wsfe", "20123456789", AMBIENTE, _ticket(6, token="SHARED"))
+    ticket_store._local.clear()  # otro proceso: sin copia local
+
+    ticket = await ticket_access.get_access_ticket("wsfe", b"c", b"k", WSAA_HOMO, "20123456789")
+
+    assert ticket["token"] == "SHARED"
+    assert ticket["cuit"] == "20123456789"
+    assert login_calls == []
+
+
+@pytest.mark.asyncio
+async def test_homologation_ticket_is_not_used_in_production(fake_redis: FakeRedis, login_calls: List[str]) -> None:
+    ticket_store.save_ticket("wsfe", "20123456789", AMBIENTE, _ticket(6, token="HOMO"))
+
+    ticket = await ticket_access.get_access_ticket(
+        "wsfe", b"c", b"k", "https://wsaa.afip.gov.ar/ws/services/LoginCms?wsdl", "20123456789"
+    )
+
+    assert ticket["token"] == "NEW-1"
+    assert ticket_store.get_ticket("wsfe", "20123456789", AMBIENTE)["token"] == "HOMO"
+
+
+@pytest.mark.asyncio
+async def test_missing_ticket_is_requested_and_published(fake_redis: FakeRedis, login_calls: List[str]) -> None:
+    ticket = await ticket_access.get_access_ticket("wsfe", b"c", b"k", WSAA_HOMO, "20123456789")
+
+    assert ticket["token"] == "NEW-1"
+    assert ticket_store.ticket_key("wsfe", "20123456789", AMBIENTE) in fake_redis.data
+    assert not fake_redis.locks
+
+
+@pytest.mark.asyncio
+async def test_ticket_near_expiry_is_renewed_proactively(fake_redis: FakeRedis, login_calls: List[str]) -> None:
+    ticket_store.save_ticket("wsfe", "20123456789", AMBIENTE, _ticket(0.05, token="OLD"))
+
+    ticket = await ticket_access.get_access_ticket("wsfe", b"c", b"k", WSAA_HOMO, "20123456789")
+
+    assert ticket["token"] == "NEW-1"
+    assert login_calls == ["wsfe"]
+
+
+@pytest.mark.asyncio
+async def test_busy_lock_keeps_current_ticket(fake_redis: FakeRedis, login_calls: List[str]) -> None:
+    ticket_store.save_ticket("wsfe", "20123456789", AMBIENTE, _ticket(0.05, token="OLD"))
+    fake_redis.locks.add(ticket_store.lock_name("wsfe", "20123456789", AMBIENTE))
+
+    ticket = await ticket_access.get_access_ticket("wsfe", b"c", b"k", WSAA_HOMO, "20123456789")
+
+    assert ticket["token"] == "OLD"
+    assert login_calls == []
+
+
+@pytest.mark.asyncio
+async def test_failed_early_renewal_falls_back_to_valid_ticket(fake_redis: FakeRedis, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def _rejected(*_args: Any) -> Dict[str, str]:
+        raise Exception("WSAA Error: El CEE ya posee un TA valido")
+
+    monkeypatch.setattr(ticket_access, "_request_new_ticket", _rejected)
+    ticket_store.save_ticket("wsfe", "20123456789", AMBIENTE, _ticket(0.05, token="OLD"))
+
+    ticket = await ticket_access.get_access_ticket("wsfe", b"c", b"k", WSAA_HOMO, "20123456789")
+
+    assert ticket["token"] == "OLD"
+    assert not fake_redis.locks
+
+
+@pytest.mark.asyncio
+async def test_failed_early_renewal_backs_off(fake_redis: FakeRedis, monkeypatch: pytest.MonkeyPatch) -> None:
+    attempts: List[str] = []
+
+    async def _rejected(service: str, *_args: Any) -> Dict[str, str]:
+        attempts.append(service)
+        raise Exception("WSAA Error: El CEE ya posee un TA valido")
+
+    monkeypatch.setattr(ticket_access, "_request_new_ticket", _rejected)
+    ticket_store.save_ticket("wsfe", "20123456789", AMBIENTE, _ticket(0.05, token="OLD"))
+
+    await ticket_access.get_access_ticket("wsfe", b"c", b"k", WSAA_HOMO, "20123456789")
+    ticket_store._backoff_until.clear()  # otro proceso: solo ve la clave en Redis
+    ticket = await ticket_access.get_access_ticket("wsfe", b"c", b"k", WSAA_HOMO, "20123456789")
+
+    assert ticket["token"] == "OLD"
+    assert attempts == ["wsfe"]
+    assert ticket_store.backoff_key("wsfe", "20123456789", AMBIENTE) in fake_redis.data
+
+
+def test_store_degrades_to_local_copy_without_redis(monkeypatch: pytest.MonkeyPatch) -> None:
+    def _down() -> Any:
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(ticket_store, "_get_redis", _down)
+    ticket_store._local.clear()
+    ticket_store.save_ticket("wsfe", "20123456789", AMBIENTE, _ticket(0.05, token="LOCAL"))
+
+    assert ticket_store.get_ticket("wsfe", "20123456789", AMBIENTE)["token"] == "LOCAL"
+    ticket_store._local.clear()
+
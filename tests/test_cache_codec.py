@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import datetime
+import json
+import uuid
+from decimal import Decimal
+
+import pytest
+
+from app.core import cache_codec
+
+VALUE = {
+    "fecha": datetime.date(2025, 3, 1),
+    "creado": datetime.datetime(2025, 3, 1, 12, 30, tzinfo=datetime.timezone.utc),
+    "total": Decimal("1234.50"),
+    "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+    "serie": [{"ds": "2025-01-01", "y": 10.5}, {"ds": "2025-01-02", "y": None}],
+}
+
+
+@pytest.mark.parametrize("codec", [cache_codec.CODEC_MSGPACK, cache_codec.CODEC_JSON])
+def test_typed_round_trip(codec: int) -> None:
+    if codec == cache_codec.CODEC_MSGPACK and cache_codec.msgpack is None:
+        pytest.skip("msgpack no instalado")
+
+    data = cache_codec.encode(VALUE, codec=codec)
+
+    assert data.startswith(cache_codec.MAGIC)
+    assert cache_codec.decode(data) == VALUE
+
+
+def test_numpy_arrays_round_trip() -> None:
+    np = pytest.importorskip("numpy")
+    arr = np.arange(12, dtype="float32").reshape(3, 4)
+
+    decoded = cache_codec.decode(cache_codec.encode({"arr": arr, "n": np.int64(7)}))
+
+    assert decoded["n"] == 7
+    assert decoded["arr"].dtype == arr.dtype
+    assert (decoded["arr"] == arr).all()
+
+
+def test_large_payloads_are_compressed() -> None:
+    series = [{"ds": f"2025-01-{i % 28 + 1:02d}", "y": float(i)} for i in range(365)]
+
+    small = cache_codec.encode({"a": 1})
+    large = cache_codec.encode(series)
+
+    assert small[len(cache_codec.MAGIC) + 1] == cache_codec.COMPRESSION_NONE
+    assert large[len(cache_codec.MAGIC) + 1] != cache_codec.COMPRESSION_NONE
+    assert len(large) < len(json.dumps(series))
+    assert cache_codec.decode(large) == series
+
+
+def test_zlib_payload_is_readable_by_any_reader() -> None:
+    series = list(range(2000))
+    data = cache_codec.encode(series, codec=cache_codec.CODEC_JSON, compression=cache_codec.COMPRESSION_ZLIB)
+
+    assert cache_codec.decode(data) == series
+
+
+def test_legacy_json_values_are_still_decoded() -> None:
+    assert cache_codec.decode(json.dumps({"rules": [1, 2]}, default=str)) == {"rules": [1, 2]}
+    assert cache_codec.decode(b'"texto"') == "texto"
+
+
+def test_unknown_header_raises_codec_error() -> None:
+    with pytest.raises(cache_codec.CodecError):
+        cache_codec.decode(cache_codec.MAGIC + bytes((99, 0)) + b"...")
+    with pytest.raises(cache_codec.CodecError):
+        cache_codec.decode(b"not json")
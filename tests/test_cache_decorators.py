@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+import pytest
+
+from app.core import cache_decorators
+from app.core.cache_decorators import cached
+
+
+class FakeCacheManager:
+    default_ttl = 3600
+
+    def __init__(self) -> None:
+        self.store: Dict[str, Any] = {}
+        self.leases: Set[str] = set()
+        self.shared = True  # False simula un proceso sin Redis
+
+    def get(self, namespace: str, identifier: str, ttl: Optional[int] = None, scope: Optional[str] = None) -> Any:
+        return self.store.get(f"{namespace}:{identifier}")
+
+    def set(
+        self, namespace: str, identifier: str, value: Any, ttl: Optional[int] = None, scope: Optional[str] = None
+    ) -> None:
+        self.store[f"{namespace}:{identifier}"] = value
+
+    def delete(self, namespace: str, identifier: str, scope: Optional[str] = None) -> None:
+        self.store.pop(f"{namespace}:{identifier}", None)
+
+    def acquire_lease(
+        self, namespace: str, identifier: str, seconds: int, scope: Optional[str] = None, shared_only: bool = False
+    ) -> bool:
+        if not self.shared:
+            return not shared_only
+        key = f"{namespace}:{identifier}"
+        if key in self.leases:
+            return False
+        self.leases.add(key)
+        return True
+
+    def release_lease(self, namespace: str, identifier: str, scope: Optional[str] = None) -> None:
+        self.leases.discard(f"{namespace}:{identifier}")
+
+
+@pytest.fixture
+def fake_cache(monkeypatch: pytest.MonkeyPatch) -> FakeCacheManager:
+    cache = FakeCacheManager()
+    monkeypatch.setattr(cache_decorators, "cache_manager", cache)
+    return cache
+
+
+def _key(*args: object, **kwargs: object) -> str:
+    return f"ts_{args[0]}"
+
+
+def test_concurrent_sync_misses_compute_once(fake_cache: FakeCacheManager) -> None:
+    calls = []
+
+    @cached("ml_features", ttl=60, key_func=_key, early_refresh_beta=0)
+    def load(business_id: str) -> list:
+        calls.append(business_id)
+        time.sleep(0.05)
+        return [1, 2, 3]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(load("biz"))) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert calls == ["biz"]
+    assert results == [[1, 2, 3]] * 10
+    assert not fake_cache.leases
+
+
+@pytest.mark.asyncio
+async def test_concurrent_async_misses_compute_once(fake_cache: FakeCacheManager) -> None:
+    calls = []
+
+    @cached("ml_features", ttl=60, key_func=_key, early_refresh_beta=0)
+    async def load(business_id: str) -> dict:
+        calls.append(business_id)
+        await asyncio.sleep(0.01)
+        return {"y": 1}
+
+    results = await asyncio.gather(*(load("biz") for _ in range(10)))
+
+    assert calls == ["biz"]
+    assert all(r == {"y": 1} for r in results)
+
+
+def test_stale_value_is_served_while_one_refresh_runs(fake_cache: FakeCacheManager) -> None:
+    gate = threading.Event()
+    calls = []
+
+    @cached("ml_features", ttl=60, key_func=_key, stale_ttl=600, early_refresh_beta=0)
+    def load(business_id: str) -> str:
+        calls.append(business_id)
+        gate.wait(2)
+        return "new"
+
+    fake_cache.store["ml_features:ts_biz"] = {"__cached__": 1, "value": "old", "expires_at": time.time() - 1, "delta": 0}
+
+    assert [load("biz") for _ in range(5)] == ["old"] * 5
+    gate.set()
+    for _ in range(50):
+        if not fake_cache.leases:
+            break
+        time.sleep(0.01)
+
+    assert calls == ["biz"]
+    assert load("biz") == "new"
+
+
+def test_waits_for_other_process_holding_the_lease(fake_cache: FakeCacheManager) -> None:
+    @cached("ml_features", ttl=60, key_func=_key, early_refresh_beta=0)
+    def load(business_id: str) -> str:
+        pytest.fail("otro proceso ya está calculando")
+
+    fake_cache.leases.add("ml_features:ts_biz")
+
+    def _other_process_finishes() -> None:
+        time.sleep(0.15)
+        fake_cache.store["ml_features:ts_biz"] = {"__cached__": 1, "value": "theirs", "expires_at": time.time() + 60}
+
+    threading.Thread(target=_other_process_finishes).start()
+
+    assert load("biz") == "theirs"
+
+
+@pytest.mark.asyncio
+async def test_functions_sharing_a_key_do_not_share_a_flight(fake_cache: FakeCacheManager) -> None:
+    @cached("ml_features", ttl=60, key_func=_key)
+    async def features(business_id: str) -> str:
+        await asyncio.sleep(0.01)
+        return "features"
+
+    @cached("ml_predictions", ttl=60, key_func=_key)
+    async def predictions(business_id: str) -> str:
+        await asyncio.sleep(0.01)
+        return "predictions"
+
+    assert await asyncio.gather(features("biz"), predictions("biz")) == ["features", "predictions"]
+
+
+def _near_expiry(value: str) -> Dict[str, Any]:
+    return {"__cached__": 1, "value": value, "expires_at": time.time() + 5, "delta": 60}
+
+
+def test_early_refresh_is_opt_in(fake_cache: FakeCacheManager) -> None:
+    calls = []
+
+    @cached("ml_features", ttl=60, key_func=_key)
+    def load(business_id: str) -> str:
+        calls.append(business_id)
+        return "new"
+
+    fake_cache.store["ml_features:ts_biz"] = _near_expiry("cached")
+
+    assert load("biz") == "cached"
+    time.sleep(0.05)
+    assert calls == []
+
+
+def test_early_refresh_needs_a_redis_lease(fake_cache: FakeCacheManager) -> None:
+    calls = []
+
+    @cached("ml_features", ttl=60, key_func=_key, early_refresh=True)
+    def load(business_id: str) -> str:
+        calls.append(business_id)
+        return "new"
+
+    fake_cache.shared = False
+    fake_cache.store["ml_features:ts_biz"] = _near_expiry("cached")
+
+    assert [load("biz") for _ in range(5)] == ["cached"] * 5
+    time.sleep(0.05)
+    assert calls == []
+
+
+def test_early_refresh_probability_grows_near_expiry() -> None:
+    now = time.time()
+    far = sum(cache_decorators._should_refresh(now + 3600, 0.5, 1.0) for _ in range(500))
+    near = sum(cache_decorators._should_refresh(now + 0.5, 0.5, 1.0) for _ in range(500))
+
+    assert far == 0
+    assert near > 100
+    assert cache_decorators._should_refresh(now - 1, 0.0, 0.0)
+
+
+def test_legacy_unwrapped_entries_are_still_served(fake_cache: FakeCacheManager) -> None:
+    @cached("ml_features", ttl=60, key_func=_key)
+    def load(business_id: str) -> str:
+        pytest.fail("debe usar el valor cacheado")
+
+    fake_cache.store["ml_features:ts_biz"] = ["legacy"]
+
+    assert load("biz") == ["legacy"]
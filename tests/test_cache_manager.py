@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import fnmatch
+import threading
+from typing import Any, Dict, Iterable, List
+
+import pytest
+
+from app.core import cache_manager as cache_module
+from app.core.cache_manager import CacheManager, _MemoryLRU
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.data: Dict[str, Any] = {}
+        self.commands: List[str] = []
+
+    def get(self, key: str) -> Any:
+        self.commands.append("GET")
+        return self.data.get(key)
+
+    def setex(self, key: str, ttl: int, value: str) -> None:
+        self.commands.append("SETEX")
+        self.data[key] = value
+
+    def delete(self, *keys: str) -> None:
+        self.commands.append("DEL")
+        for key in keys:
+            self.data.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        self.commands.append("INCR")
+        self.data[key] = int(self.data.get(key) or 0) + 1
+        return self.data[key]
+
+    def scan_iter(self, match: str, count: int) -> Iterable[str]:
+        self.commands.append("SCAN")
+        return [k for k in list(self.data) if fnmatch.fnmatch(k, match)]
+
+    def mget(self, keys: List[str]) -> List[Any]:
+        self.commands.append("MGET")
+        return [self.data.get(k) for k in keys]
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis) -> None:
+        self._redis = redis
+        self._ops: List[tuple] = []
+
+    def setex(self, key: str, ttl: int, value: bytes) -> None:
+        self._ops.append((key, value))
+
+    def execute(self) -> None:
+        self._redis.commands.append(f"PIPELINE:{len(self._ops)}")
+        for key, value in self._ops:
+            self._redis.data[key] = value
+
+
+@pytest.fixture
+def manager(monkeypatch: pytest.MonkeyPatch) -> CacheManager:
+    # Solo L1: sin Redis
+    monkeypatch.setattr(CacheManager, "_init_redis", lambda self: None)
+    return CacheManager(default_ttl=60, max_memory_entries=3)
+
+
+def test_lru_evicts_least_recently_used() -> None:
+    lru = _MemoryLRU(2)
+    lru.put("a", 1, 60)
+    lru.put("b", 2, 60)
+    assert lru.get("a") == 1  # "b" pasa a ser el menos usado
+    lru.put("c", 3, 60)
+
+    assert lru.get("b") is None
+    assert lru.get("a") == 1 and lru.get("c") == 3
+    assert lru.evictions == 1
+    assert len(lru) == 2
+
+
+def test_entry_expires_with_its_own_ttl(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    lru = _MemoryLRU(10)
+    lru.put("short", "x", 5)
+    lru.put("long", "y", 600)
+
+    now[0] += 10
+
+    assert lru.get("short") is None
+    assert lru.get("long") == "y"
+    assert lru.expirations == 1
+
+
+def test_stats_expose_hits_misses_and_evictions(manager: CacheManager) -> None:
+    for i in range(5):
+        manager.set("ns", f"k{i}", {"i": i})
+    assert manager.get("ns", "k4") == {"i": 4}
+    assert manager.get("ns", "k0") is None
+
+    stats: dict[str, Any] = manager.get_stats()
+
+    assert stats["memory_entries"] == 3
+    assert stats["memory_max_entries"] == 3
+    assert stats["l1_hits"] == 1
+    assert stats["l1_misses"] == 1
+    assert stats["l1_evictions"] == 2
+
+
+def test_invalidate_pattern_clears_matching_memory_entries(manager: CacheManager) -> None:
+    manager.set("access", "biz1_u1", 1)
+    manager.set("access", "biz1_u2", 2)
+    manager.set("access", "biz2_u1", 3)
+
+    manager.invalidate_pattern("access:biz1_")
+
+    assert manager.get("access", "biz1_u1") is None
+    assert manager.get("access", "biz2_u1") == 3
+
+
+def test_evict_local_namespace_only_drops_that_namespace(redis_manager: CacheManager) -> None:
+    redis_manager.set("negocio_config", "biz1", {"a": 1})
+    redis_manager.set("access", "biz1_u1", 1)
+
+    assert redis_manager.evict_local_namespace("negocio_config") == 1
+
+    assert redis_manager._memory.get("cache:negocio_config:biz1") is None
+    assert redis_manager.get("access", "biz1_u1") == 1
+    assert redis_manager.get("negocio_config", "biz1") == {"a": 1}  # L2 intacto
+
+
+def test_concurrent_writers_keep_bound() -> None:
+    lru = _MemoryLRU(50)
+
+    def _writer(offset: int) -> None:
+        for i in range(500):
+            lru.put(f"{offset}:{i}", i, 60)
+            lru.get(f"{offset}:{i // 2}")
+
+    threads = [threading.Thread(target=_writer, args=(t,)) for t in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(lru) == 50
+    assert lru.evictions == 8 * 500 - 50
+
+
+@pytest.fixture
+def redis_manager(manager: CacheManager) -> CacheManager:
+    manager.redis_client = FakeRedis()
+    return manager
+
+
+def _other_process(redis: FakeRedis) -> CacheManager:
+    other = CacheManager(default_ttl=60, max_memory_entries=10)
+    other.redis_client = redis
+    return other
+
+
+def test_invalidate_scope_is_a_single_incr(redis_manager: CacheManager) -> None:
+    redis: FakeRedis = redis_manager.redis_client  # type: ignore[assignment]
+    for i in range(20):
+        redis_manager.set("ml_features", f"features_biz1_{i}", i, scope="biz1")
+    redis_manager.set("ml_features", "features_biz2", "keep", scope="biz2")
+    redis.commands.clear()
+
+    redis_manager.invalidate_scope("ml_features", "biz1")
+
+    assert redis.commands == ["INCR"]
+    assert redis_manager.get("ml_features", "features_biz1_3", scope="biz1") is None
+    assert redis_manager.get("ml_features", "features_biz2", scope="biz2") == "keep"
+
+
+def test_other_process_sees_new_generation_after_refresh(
+    redis_manager: CacheManager, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    redis: FakeRedis = redis_manager.redis_client  # type: ignore[assignment]
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    other = _other_process(redis)
+    redis_manager.set("access", "biz1_u1", {"role": "admin"}, scope="biz1")
+    assert other.get("access", "biz1_u1", scope="biz1") == {"role": "admin"}
+
+    redis_manager.invalidate_scope("access", "biz1")
+    now[0] += other.generation_refresh + 0.1
+
+    # L1 del otro proceso queda en la generación anterior: no se sirve
+    assert other.get("access", "biz1_u1", scope="biz1") is None
+
+
+def test_generation_survives_redis_outage(manager: CacheManager) -> None:
+    manager.set("ml_predictions", "prediction_biz1_sales", [1, 2], scope="biz1")
+
+    manager.invalidate_scope("ml_predictions", "biz1")
+
+    assert manager.get("ml_predictions", "prediction_biz1_sales", scope="biz1") is None
+
+
+def test_pattern_invalidation_uses_scan_not_keys(redis_manager: CacheManager) -> None:
+    redis: FakeRedis = redis_manager.redis_client  # type: ignore[assignment]
+    redis_manager.set("legacy", "a_1", 1)
+    redis_manager.set("legacy", "b_1", 2)
+
+    redis_manager.invalidate_pattern("legacy:a_")
+
+    assert "SCAN" in redis.commands
+    assert "cache:legacy:a_1" not in redis.data
+    assert "cache:legacy:b_1" in redis.data
+
+
+def test_clear_all_keeps_generation_counters(redis_manager: CacheManager) -> None:
+    redis: FakeRedis = redis_manager.redis_client  # type: ignore[assignment]
+    redis_manager.invalidate_scope("access", "biz1")
+    redis_manager.set("access", "biz1_u1", {"role": "admin"}, scope="biz1")
+
+    redis_manager.clear_all()
+
+    assert redis.data == {"cache:gen:access:biz1": 1}
+
+
+def test_miss_without_loader_does_not_query_anything(manager: CacheManager) -> None:
+    assert manager.get("ml_features", "features_biz1") is None
+    with pytest.raises(LookupError):
+        manager.get_or_load("ml_features", "features_biz1")
+
+
+def test_get_or_load_calls_registered_loader_once(manager: CacheManager) -> None:
+    calls: List[str] = []
+
+    def _load_rules(identifier: str) -> List[str]:
+        calls.append(identifier)
+        return ["stock_bajo"]
+
+    manager.register_loader("notification_rules", _load_rules, ttl=600)
+
+    assert manager.get_or_load("notification_rules", "rules_biz1") == ["stock_bajo"]
+    assert manager.get_or_load("notification_rules", "rules_biz1") == ["stock_bajo"]
+    assert calls == ["rules_biz1"]
+    assert manager.get_or_load("notification_rules", "rules_biz2", loader=lambda _id: None) is None
+
+
+def test_bulk_operations_use_one_round_trip(redis_manager: CacheManager) -> None:
+    redis: FakeRedis = redis_manager.redis_client  # type: ignore[assignment]
+    redis_manager.set_many("ml_features", {f"features_{i}": {"i": i} for i in range(10)}, scope="biz1")
+    assert redis.commands == ["GET", "PIPELINE:10"]
+
+    redis_manager._memory.clear()
+    redis.commands.clear()
+    found = redis_manager.get_many("ml_features", [f"features_{i}" for i in range(12)], scope="biz1")
+
+    assert found == {f"features_{i}": {"i": i} for i in range(10)}
+    assert redis.commands == ["MGET"]
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+from app.db import client_pool
+from app.db.client_pool import UserScopedClient, _AuthorizedSession, normalize_token
+
+
+class RecordingSession:
+    def __init__(self) -> None:
+        self.calls: List[Dict[str, Any]] = []
+        self.is_closed = False
+
+    def request(self, method: str, url: str, **kwargs: Any) -> Dict[str, Any]:
+        call = {"method": method, "url": url, **kwargs}
+        self.calls.append(call)
+        return call
+
+
+def test_normalize_token_strips_bearer_and_undefined() -> None:
+    assert normalize_token("Bearer abc.def") == "abc.def"
+    assert normalize_token("  abc  ") == "abc"
+    assert normalize_token("undefined") == ""
+    assert normalize_token(None) == ""
+
+
+def test_authorized_session_only_swaps_authorization_header() -> None:
+    shared = RecordingSession()
+    session = _AuthorizedSession(shared, "user-token")  # type: ignore[arg-type]
+
+    session.request("GET", "/ventas", headers={"Prefer": "count=exact"}, params={"select": "*"})
+
+    call = shared.calls[0]
+    assert call["headers"]["Authorization"] == "Bearer user-token"
+    assert call["headers"]["Prefer"] == "count=exact"
+    assert call["params"] == {"select": "*"}
+
+
+def test_user_clients_share_the_process_pool(monkeypatch) -> None:
+    shared = RecordingSession()
+    monkeypatch.setattr(client_pool, "get_shared_rest_session", lambda: shared)
+
+    first = UserScopedClient("token-a")
+    second = UserScopedClient("token-b")
+
+    assert first._session._session is second._session._session is shared
+    assert first._session._auth_headers != second._session._auth_headers
+
+
+def test_each_event_loop_keeps_its_async_pool_until_it_shuts_down(monkeypatch) -> None:
+    import asyncio
+    import threading
+
+    monkeypatch.setattr(client_pool.settings, "SUPABASE_URL", "https://example.supabase.co")
+    monkeypatch.setattr(client_pool.settings, "SUPABASE_ANON_KEY", "anon")
+    monkeypatch.setattr(client_pool, "_async_sessions", {})
+
+    app_loop_ready = threading.Event()
+    release_app_loop = threading.Event()
+    seen: Dict[str, Any] = {}
+
+    async def _app_loop() -> None:
+        seen["app"] = client_pool.get_shared_async_rest_session()
+        app_loop_ready.set()
+        while not release_app_loop.is_set():
+            await asyncio.sleep(0.01)
+        seen["app_open_at_release"] = not seen["app"].is_closed
+        assert client_pool.get_shared_async_rest_session() is seen["app"]
+
+    async def _task() -> Any:  # p.ej. asyncio.run de una tarea de Celery
+        return client_pool.get_shared_async_rest_session()
+
+    thread = threading.Thread(target=asyncio.run, args=(_app_loop(),))
+    thread.start()
+    assert app_loop_ready.wait(5)
+
+    task_session = asyncio.run(_task())
+    assert task_session is not seen["app"]
+    assert task_session.is_closed  # cerrado al terminar su propio loop
+
+    release_app_loop.set()
+    thread.join(5)
+    assert seen["app_open_at_release"]
+    assert seen["app"].is_closed
+    assert not any(client_pool._async_sessions.values())
+
+
+def test_aclose_shared_sessions_closes_only_the_running_loop_pool(monkeypatch) -> None:
+    import asyncio
+
+    monkeypatch.setattr(client_pool.settings, "SUPABASE_URL", "https://example.supabase.co")
+    monkeypatch.setattr(client_pool.settings, "SUPABASE_ANON_KEY", "anon")
+    monkeypatch.setattr(client_pool, "_async_sessions", {})
+    monkeypatch.setattr(client_pool, "_sync_sessions", {})
+
+    async def _shutdown() -> Any:
+        session = client_pool.get_shared_async_rest_session()
+        await client_pool.aclose_shared_sessions()
+        assert session.is_closed
+        assert client_pool.get_shared_async_rest_session() is not session
+        return session
+
+    asyncio.run(_shutdown())
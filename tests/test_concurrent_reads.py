@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from app.db.concurrent_reads import run_reads
+
+
+async def _response(data: Any, delay: float) -> SimpleNamespace:
+    await asyncio.sleep(delay)
+    return SimpleNamespace(data=data)
+
+
+async def _boom() -> None:
+    raise RuntimeError("PostgREST 500")
+
+
+@pytest.mark.asyncio
+async def test_reads_run_concurrently() -> None:
+    started = time.perf_counter()
+
+    results = await run_reads({f"q{i}": _response([i], 0.1) for i in range(5)}, timeout=2)
+
+    assert time.perf_counter() - started < 0.3
+    assert [results[f"q{i}"].data for i in range(5)] == [[0], [1], [2], [3], [4]]
+
+
+@pytest.mark.asyncio
+async def test_failures_and_timeouts_leave_partial_results() -> None:
+    results = await run_reads(
+        {
+            "ok": _response([{"id": 1}], 0),
+            "slow": _response([{"id": 2}], 1),
+            "broken": _boom(),
+        },
+        timeout=2,
+        timeouts={"slow": 0.05},
+    )
+
+    assert results["ok"].ok and results["ok"].data == [{"id": 1}]
+    assert results["slow"].timed_out and results["slow"].data == []
+    assert isinstance(results["broken"].error, RuntimeError)
+    assert results["broken"].data == []
+
+
+@pytest.mark.asyncio
+async def test_sync_callables_run_in_threads() -> None:
+    def _blocking() -> dict:
+        time.sleep(0.1)
+        return {"inventario_modo": "por_sucursal"}
+
+    started = time.perf_counter()
+    results = await run_reads({"a": _blocking, "b": _blocking, "c": _response([], 0.1)}, timeout=2)
+
+    assert time.perf_counter() - started < 0.3
+    assert results["a"].value == {"inventario_modo": "por_sucursal"}
+    assert results["c"].data == []
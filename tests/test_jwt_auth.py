@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import time
+from types import SimpleNamespace
+
+import jwt
+import pytest
+
+from app.core import jwt_auth
+from app.core.jwt_auth import TokenVerificationError, identity_from_request, verify_token
+
+SECRET = "test-project-jwt-secret"
+
+
+@pytest.fixture(autouse=True)
+def _configure_secret(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(jwt_auth.settings, "SUPABASE_JWT_SECRET", SECRET)
+    monkeypatch.setattr(jwt_auth.settings, "SUPABASE_JWT_AUDIENCE", "authenticated")
+    jwt_auth.clear_identity_cache()
+    yield
+    jwt_auth.clear_identity_cache()
+
+
+def _token(sub: str = "user-1", exp_in: int = 3600, secret: str = SECRET) -> str:
+    payload = {
+        "sub": sub,
+        "email": f"{sub}@example.com",
+        "role": "authenticated",
+        "aud": "authenticated",
+        "exp": int(time.time()) + exp_in,
+    }
+    return jwt.encode(payload, secret, algorithm="HS256")
+
+
+def test_verify_token_checks_signature_locally_and_caches(monkeypatch: pytest.MonkeyPatch) -> None:
+    token = _token()
+    identity = verify_token(f"Bearer {token}")
+    assert identity.user_id == "user-1"
+    assert identity.email == "user-1@example.com"
+
+    def _fail(*_args, **_kwargs):
+        raise AssertionError("cached token must not be decoded again")
+
+    monkeypatch.setattr(jwt_auth, "_decode_locally", _fail)
+    assert verify_token(token) is identity
+
+
+def test_verify_token_rejects_bad_signature_and_expired_tokens() -> None:
+    with pytest.raises(TokenVerificationError):
+        verify_token(_token(secret="another-secret"))
+    with pytest.raises(TokenVerificationError):
+        verify_token(_token(exp_in=-10))
+
+
+def test_cache_entries_expire_with_the_token(monkeypatch: pytest.MonkeyPatch) -> None:
+    token = _token(exp_in=60)
+    verify_token(token)
+    now = time.time()
+    monkeypatch.setattr(jwt_auth.time, "time", lambda: now + 120)
+    assert jwt_auth._identity_cache.get(jwt_auth._token_key(token)) is None
+
+
+def test_identity_lru_is_bounded() -> None:
+    cache = jwt_auth._IdentityLRU(max_entries=2)
+    for idx in range(3):
+        cache.put(str(idx), jwt_auth.VerifiedIdentity(str(idx), "", "authenticated", time.time() + 60))
+    assert len(cache) == 2
+    assert cache.get("0") is None
+
+
+def test_identity_from_request_prefers_middleware_identity() -> None:
+    identity = jwt_auth.VerifiedIdentity("user-9", "", "authenticated", time.time() + 60)
+    request = SimpleNamespace(state=SimpleNamespace(identity=identity), headers={})
+    assert identity_from_request(request) is identity
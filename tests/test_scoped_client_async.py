@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from typing import Any, List, Tuple
+
+import pytest
+
+from app.db.scoped_client import AsyncScopedSupabaseClient
+
+
+class FakeResponse:
+    def __init__(self, data: List[dict]) -> None:
+        self.data = data
+
+
+class FakeAsyncBuilder:
+    def __init__(self) -> None:
+        self.filters: List[Tuple[str, Any]] = []
+
+    def select(self, *_args: Any) -> "FakeAsyncBuilder":
+        return self
+
+    def eq(self, column: str, value: Any) -> "FakeAsyncBuilder":
+        self.filters.append((column, value))
+        return self
+
+    async def execute(self) -> FakeResponse:
+        return FakeResponse([{"filters": list(self.filters)}])
+
+
+class FakeAsyncClient:
+    def __init__(self) -> None:
+        self.builders: List[FakeAsyncBuilder] = []
+
+    def table(self, _name: str) -> FakeAsyncBuilder:
+        builder = FakeAsyncBuilder()
+        self.builders.append(builder)
+        return builder
+
+
+@pytest.mark.asyncio
+async def test_async_scoped_table_applies_business_and_branch_scope() -> None:
+    client = AsyncScopedSupabaseClient(FakeAsyncClient(), "neg-1", "suc-1")  # type: ignore[arg-type]
+
+    response = await client.table("ventas").select("id").eq("id", "v-1").execute()
+
+    assert response.data[0]["filters"] == [
+        ("id", "v-1"),
+        ("negocio_id", "neg-1"),
+        ("sucursal_id", "suc-1"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_async_scoped_table_skips_filters_for_unscoped_tables() -> None:
+    client = AsyncScopedSupabaseClient(FakeAsyncClient(), "neg-1")  # type: ignore[arg-type]
+
+    response = await client.table("configuracion_fiscal").select("*").eq("negocio_id", "neg-1").execute()
+
+    assert response.data[0]["filters"] == [("negocio_id", "neg-1")]
+
+
+def test_async_scoped_client_requires_business_id() -> None:
+    with pytest.raises(ValueError):
+        AsyncScopedSupabaseClient(FakeAsyncClient(), "")  # type: ignore[arg-type]